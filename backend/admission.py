@@ -0,0 +1,254 @@
+"""
+Admission control and load shedding for the profile API.
+
+A crawl request holds its worker for as long as its scrapes take, so during
+a traffic spike threads pile up behind slow crawls and reads slow down with
+them. Requests are instead admitted against fixed capacity pools:
+
+- crawls: crawl requests (POST /profiles and bulk imports) in flight
+- urls: URLs submitted by the in-flight POST /profiles requests, only
+  when FIASCO_MAX_QUEUED_URLS is set, since it also caps a single request
+- reads: profile reads in flight, kept separate so crawl overload never
+  uses up the capacity reads need
+
+A request that does not fit is rejected at once instead of queueing: crawls
+with 429 and reads with 503, both with a Retry-After header. Health, ping and
+metrics are never limited. The limits are per process; by default half of
+the gunicorn worker threads (FIASCO_WORKER_THREADS) may crawl, leaving the
+rest for reads. Set FIASCO_ADMISSION=0 to disable admission control.
+"""
+
+import os
+import threading
+
+from flask import current_app, g, jsonify, request
+
+from metrics import REGISTRY
+
+ADMISSION_DEFAULTS = {
+    'ADMISSION_ENABLED': os.environ.get('FIASCO_ADMISSION', '1').lower() not in ('0', 'false', 'no'),
+    'ADMISSION_MAX_CRAWLS': int(os.environ.get(
+        'FIASCO_MAX_CRAWLS', max(1, int(os.environ.get('FIASCO_WORKER_THREADS', 8)) // 2)
+    )),
+    # 0 leaves the URLs of in-flight crawls, and of a single request, unlimited
+    'ADMISSION_MAX_QUEUED_URLS': int(os.environ.get('FIASCO_MAX_QUEUED_URLS', 0)),
+    'ADMISSION_MAX_READS': int(os.environ.get('FIASCO_MAX_READS', 32)),
+    # Seconds rejected clients are asked to wait before retrying
+    'ADMISSION_CRAWL_RETRY_AFTER': 5,
+    'ADMISSION_READ_RETRY_AFTER': 1,
+}
+
+CRAWL_ENDPOINTS = ('submit_profiles', 'bulk_import_profiles')
+READ_ENDPOINTS = ('get_profiles', 'list_profiles', 'search_profiles')
+
+ADMISSION_IN_USE = REGISTRY.gauge(
+    'fiasco_admission_in_use',
+    'Capacity in use by admitted requests, by pool.',
+    ('pool',)
+)
+ADMISSION_REJECTED_TOTAL = REGISTRY.counter(
+    'fiasco_admission_rejected_total',
+    'Requests rejected by admission control, by the pool that was full.',
+    ('pool',)
+)
+
+class Overloaded(Exception):
+    """
+    A request was rejected by admission control.
+
+    Attributes:
+        status: The HTTP status to respond with
+        message: The error message
+        retry_after: Seconds the client should wait, or None if retrying cannot help
+    """
+
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+    def headers(self):
+        return {'Retry-After': str(self.retry_after)} if self.retry_after is not None else {}
+
+class CapacityPool:
+    """A fixed amount of capacity acquired without waiting."""
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.in_use = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, amount=1):
+        """Take capacity if enough is free; return whether it was taken."""
+        with self._lock:
+            if self.in_use + amount > self.limit:
+                return False
+            self.in_use += amount
+            ADMISSION_IN_USE.set(self.in_use, self.name)
+            return True
+
+    def release(self, amount=1):
+        with self._lock:
+            self.in_use -= amount
+            ADMISSION_IN_USE.set(self.in_use, self.name)
+
+class Admission:
+    """Capacity held by one admitted request; release() is safe to call more than once."""
+
+    def __init__(self, grants):
+        self._grants = grants
+
+    def release(self):
+        grants, self._grants = self._grants, []
+        for pool, amount in grants:
+            pool.release(amount)
+
+    def detach(self):
+        """Move the held capacity to a new Admission, leaving this one empty."""
+        grants, self._grants = self._grants, []
+        return Admission(grants)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+class AdmissionController:
+    """
+    Admit crawl and read requests against the configured capacity pools.
+
+    Args:
+        config: A mapping with the ADMISSION_* settings
+    """
+
+    def __init__(self, config):
+        self.crawls = CapacityPool('crawls', config['ADMISSION_MAX_CRAWLS'])
+        self.urls = CapacityPool('urls', config['ADMISSION_MAX_QUEUED_URLS'])
+        self.reads = CapacityPool('reads', config['ADMISSION_MAX_READS'])
+        self.crawl_retry_after = config['ADMISSION_CRAWL_RETRY_AFTER']
+        self.read_retry_after = config['ADMISSION_READ_RETRY_AFTER']
+
+    def _reject(self, pool, status, retry_after):
+        ADMISSION_REJECTED_TOTAL.inc(pool.name)
+        raise Overloaded(status, f"Server is over {pool.name} capacity, retry later", retry_after)
+
+    def admit_crawl(self, urls=0):
+        """
+        Admit a crawl request.
+
+        Args:
+            urls: The number of URLs it submits
+
+        Returns:
+            The Admission to release when the request finishes
+
+        Raises:
+            Overloaded: 413 if the request has more URLs than could ever be
+                admitted, 429 if there is no crawl capacity right now
+        """
+        limit_urls = self.urls.limit > 0
+        if limit_urls and urls > self.urls.limit:
+            raise Overloaded(413, f"Too many URLs in one request (at most {self.urls.limit})")
+        if not self.crawls.try_acquire():
+            self._reject(self.crawls, 429, self.crawl_retry_after)
+        if not limit_urls:
+            return Admission([(self.crawls, 1)])
+        if urls and not self.urls.try_acquire(urls):
+            self.crawls.release()
+            self._reject(self.urls, 429, self.crawl_retry_after)
+        return Admission([(self.crawls, 1), (self.urls, urls)])
+
+    def admit_read(self):
+        """
+        Admit a profile read.
+
+        Raises:
+            Overloaded: 503 if the read pool is full
+        """
+        if not self.reads.try_acquire():
+            self._reject(self.reads, 503, self.read_retry_after)
+        return Admission([(self.reads, 1)])
+
+    def stats(self):
+        """Return the limit and current use of every pool."""
+        return {
+            pool.name: {'limit': pool.limit, 'in_use': pool.in_use}
+            for pool in (self.crawls, self.urls, self.reads)
+        }
+
+def submitted_url_count(data):
+    """Return the number of distinct URLs in a POST /profiles body, or 0 if it is malformed."""
+    urls = data.get('urls') if isinstance(data, dict) else None
+    if not isinstance(urls, list):
+        return 0
+    try:
+        # Repeated URLs are crawled once
+        return len(set(urls))
+    except TypeError:
+        return len(urls)
+
+def rejection_response(error):
+    """Build the Flask response for an Overloaded error."""
+    body = {"error": error.message}
+    if error.retry_after is not None:
+        body["retry_after"] = error.retry_after
+    return jsonify(body), error.status, error.headers()
+
+def admit_request():
+    """before_request hook admitting crawl and read requests."""
+    controller = current_app.extensions.get('admission')
+    if controller is None or request.method == 'OPTIONS':
+        return None
+
+    try:
+        if request.endpoint in CRAWL_ENDPOINTS:
+            urls = submitted_url_count(request.get_json(silent=True)) if request.endpoint == 'submit_profiles' else 0
+            g.admission = controller.admit_crawl(urls)
+        elif request.endpoint in READ_ENDPOINTS:
+            g.admission = controller.admit_read()
+    except Overloaded as e:
+        return rejection_response(e)
+    return None
+
+def detach_admission():
+    """
+    Take over the current request's admission, for work that outlives the request.
+
+    Returns:
+        The Admission, which the caller must release, or an empty one if the
+        request holds none
+    """
+    admission = g.pop('admission', None)
+    return admission if admission is not None else Admission([])
+
+def release_admission(exc):
+    # Runs after a streamed response has finished, so bulk imports hold their slot until done
+    admission = g.pop('admission', None)
+    if admission is not None:
+        admission.release()
+
+def init_admission(app):
+    """
+    Apply admission control to the app's crawl and read endpoints if it is enabled.
+
+    Args:
+        app: The Flask application
+
+    Returns:
+        The AdmissionController, or None if admission control is disabled
+    """
+    for key, value in ADMISSION_DEFAULTS.items():
+        app.config.setdefault(key, value)
+
+    if not app.config['ADMISSION_ENABLED']:
+        app.extensions['admission'] = None
+        return None
+
+    controller = AdmissionController(app.config)
+    app.extensions['admission'] = controller
+    app.before_request(admit_request)
+    app.teardown_request(release_admission)
+    return controller
@@ -1,39 +1,516 @@
-from flask import Flask, jsonify, request
+"""
+Flask application for the profile API.
+
+Use create_app() to build an application; it has no side effects beyond
+configuring the app, so importing this module is cheap. Database tables are
+created explicitly with ``flask --app app init-db`` (or ``python init_db.py``).
+The module-level ``app`` is a default application created on first access,
+for servers and tools that expect ``app:app``.
+"""
+
+from flask import Flask, Response, current_app, g, jsonify, request, stream_with_context
 from flask_cors import CORS
+import functools
+import json
 import logging
+import threading
+import time
 import uuid
 import os
-from crawler import crawl_profile
-from models import db, User, Profile, PrivacySetting, ActivityData, RiskAssessment
-
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+from concurrent.futures import wait
+from datetime import datetime
+from sqlalchemy.orm.attributes import flag_modified
+from crawler import crawl_profile_result, crawl_profile_results, scraping_enabled
+from crawl_result import as_dict, as_profile_result
+from admission import detach_admission, init_admission
+from idempotency import init_idempotency
+from compression import init_compression
+from deadline import DEADLINE_CRAWLS_TOTAL, LateCrawls, deadline_placeholder, parse_deadline, parse_fallback, submit_crawl
+from json_codec import FastJSONProvider, dumps_text
+from pagination import list_profiles_page, parse_limit
+from projection import parse_fields, profile_query_options
+from search import find_profiles, index_profile, parse_search_params, rebuild_search_index
+from sharding import init_sharding, shard_engines, use_user_shard, user_sharded
+from metrics import CONTENT_TYPE_LATEST, REGISTRY
+from profiling import init_profiling
+from log_config import SampledLogger, configure_logging, request_id_var
+from bulk_import import (
+    DEFAULT_CHUNK_SIZE,
+    MAX_CHUNK_SIZE,
+    detect_format,
+    iter_import_chunks,
+    iter_upload_urls,
+    new_import_stats,
+)
+from models import (
+    db, create_schema, User, Profile, PrivacySetting, ActivityData, RiskAssessment, SubmissionResult, IdempotencyKey
+)
+from result_store import create_result_store
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+url_logger = SampledLogger(logger)
+
+# Serializes late crawls updating the same stored submission
+_submission_update_lock = threading.Lock()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    'fiasco_http_request_duration_seconds',
+    'HTTP request latency by endpoint.',
+    ('endpoint', 'method', 'status')
+)
+SUBMIT_STAGE_SECONDS = REGISTRY.histogram(
+    'fiasco_submit_stage_duration_seconds',
+    'Time spent crawling and persisting each submitted URL.',
+    ('stage', 'platform', 'data_source')
+)
+PROFILE_WRITES_TOTAL = REGISTRY.counter(
+    'fiasco_profile_writes_total',
+    'Profile writes by outcome.',
+    ('result',)
+)
+PROFILE_CHANGES_TOTAL = REGISTRY.counter(
+    'fiasco_profile_changes_total',
+    'Saved profiles by whether their content changed (created, updated or unchanged).',
+    ('outcome',)
+)
+PROFILE_ROW_WRITES_TOTAL = REGISTRY.counter(
+    'fiasco_profile_row_writes_total',
+    'Settings, activity and risk assessment rows written when saving profiles.',
+    ('table', 'operation')
+)
+
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.request_id_token = request_id_var.set(request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16])
+
+def record_request_duration(response):
+    start = g.get('request_start')
+    if start is not None:
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            request.endpoint or 'unmatched',
+            request.method,
+            str(response.status_code)
+        )
+    return response
+
+def clear_request_id(exc):
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        request_id_var.reset(token)
+
+def save_profile(user_id, url, profile_data, checked_at=None):
+    """
+    Persist crawled profile data for a user, replacing any previous crawl of the same URL.
+    
+    Profiles store a hash of their crawl content. If the previous crawl of
+    the URL has the same hash, only its last_checked_at is updated; otherwise
+    only the settings, activity and risk rows that differ are written.
+    
+    The caller is responsible for committing the session.
+    
+    Args:
+        user_id: The ID of the user that owns the profile
+        url: The profile URL that was crawled
+        profile_data: The ProfileResult (or equivalent dict) returned by the crawler
+        checked_at: When the profile data was scraped (defaults to now)
+        
+    Returns:
+        The Profile instance that was created or updated
+    """
+    profile_data = as_profile_result(profile_data)
+    content_hash = profile_data.content_hash()
+    now = checked_at or datetime.utcnow()
+    
+    # Check if profile already exists for this URL and user
+    profile = Profile.query.filter_by(user_id=user_id, url=url).first()
+    
+    if profile is None:
+        # Create new profile
+        outcome = 'created'
+        profile = Profile(url=url, user_id=user_id)
+        db.session.add(profile)
+    elif profile.content_hash == content_hash:
+        # Nothing changed; updated_at keeps the time the data last changed
+        profile.last_checked_at = now
+        flag_modified(profile, 'updated_at')
+        PROFILE_CHANGES_TOTAL.inc('unchanged')
+        return profile
+    else:
+        outcome = 'updated'
+    
+    profile.platform = profile_data.platform or 'unknown'
+    profile.username = profile_data.username or 'unknown'
+    index_profile(profile)
+    profile.content_hash = content_hash
+    profile.last_checked_at = now
+    
+    sync_values(profile, profile.privacy_settings, PrivacySetting, profile_data.privacy_settings)
+    sync_values(profile, profile.activity_data, ActivityData, profile_data.activity_data)
+    sync_risk_assessment(profile, profile_data.risk_assessment)
+    
+    PROFILE_CHANGES_TOTAL.inc(outcome)
+    return profile
+
+def sync_values(profile, rows, model, values):
+    """
+    Make a profile's key/value rows (privacy settings or activity data) match values.
+    
+    Rows whose value is unchanged are left alone.
+    
+    Args:
+        profile: The Profile the rows belong to
+        rows: The current rows
+        model: PrivacySetting or ActivityData
+        values: The new FieldSet (or dict) of values, or None for no values
+    """
+    table = model.__tablename__
+    existing = {}
+    for row in rows:
+        if row.key in existing:
+            db.session.delete(row)
+            PROFILE_ROW_WRITES_TOTAL.inc(table, 'delete')
+        else:
+            existing[row.key] = row
+    
+    if values is not None:
+        for key, value in values.items():
+            row = existing.pop(key, None)
+            if row is None:
+                row = model(profile=profile, key=key)
+                row.set_value(value)
+                db.session.add(row)
+                PROFILE_ROW_WRITES_TOTAL.inc(table, 'insert')
+            elif not row.has_value(value):
+                row.set_value(value)
+                PROFILE_ROW_WRITES_TOTAL.inc(table, 'update')
+    
+    for row in existing.values():
+        db.session.delete(row)
+        PROFILE_ROW_WRITES_TOTAL.inc(table, 'delete')
+
+def sync_risk_assessment(profile, risk_data):
+    """Make a profile's risk assessment row match risk_data, writing it only if it differs."""
+    assessments = list(profile.risk_assessment)
+    for assessment in assessments[1 if risk_data is not None else 0:]:
+        db.session.delete(assessment)
+        PROFILE_ROW_WRITES_TOTAL.inc('risk_assessment', 'delete')
+    
+    if risk_data is None:
+        profile.risk_level = None
+        return
+    
+    privacy_score = risk_data.privacy_score or 0
+    risk_level = risk_data.risk_level or 'unknown'
+    risk_factors = dumps_text(risk_data.risk_factors)
+    recommendations = dumps_text(risk_data.recommendations)
+    profile.risk_level = risk_level
+    
+    if assessments:
+        risk = assessments[0]
+        if (risk.privacy_score, risk.risk_level, risk.risk_factors, risk.recommendations) == \
+                (privacy_score, risk_level, risk_factors, recommendations):
+            return
+        operation = 'update'
+    else:
+        risk = RiskAssessment(profile=profile)
+        db.session.add(risk)
+        operation = 'insert'
+    
+    risk.privacy_score = privacy_score
+    risk.risk_level = risk_level
+    risk.risk_factors = risk_factors
+    risk.recommendations = recommendations
+    PROFILE_ROW_WRITES_TOTAL.inc('risk_assessment', operation)
+
+def store_crawl_result(user_id, url, profile_data):
+    """
+    Persist an already crawled profile for a user and commit, recording per-stage timings.
+    
+    Args:
+        user_id: The ID of the user that owns the profile
+        url: The profile URL that was crawled
+        profile_data: The ProfileResult (or equivalent dict) returned by the crawler
+    """
+    profile_data = as_profile_result(profile_data)
+    platform = profile_data.platform or 'unknown'
+    data_source = profile_data.data_source or 'unknown'
+    
+    try:
+        with SUBMIT_STAGE_SECONDS.time('db_write', platform, data_source):
+            save_profile(user_id, url, profile_data)
+        with SUBMIT_STAGE_SECONDS.time('commit', platform, data_source):
+            db.session.commit()
+    except Exception:
+        PROFILE_WRITES_TOTAL.inc('error')
+        raise
+    
+    PROFILE_WRITES_TOTAL.inc('success')
+
+def observe_crawl(profile_data, start):
+    """Record the crawl stage of a submitted URL."""
+    SUBMIT_STAGE_SECONDS.observe(
+        time.perf_counter() - start,
+        'crawl',
+        profile_data.platform or 'unknown',
+        profile_data.data_source or 'unknown'
+    )
 
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///fiasco.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+@user_sharded
+def store_submission(user_id, urls, results):
+    """
+    Persist crawl results for a submission that was crawled up front.
+    
+    Each profile is committed separately to ensure partial success; entries
+    that fail to save are replaced with an error in results.
+    
+    Args:
+        user_id: The ID of the user that submitted the URLs
+        urls: The submitted URLs
+        results: A dict of URL to ProfileResult, replaced in place by the
+            API dict shape of each result
+    """
+    if not db.session.get(User, user_id):
+        db.session.add(User(id=user_id))
+    
+    store_results(user_id, urls, results)
+    record_submission(user_id, urls, results)
 
-# Create tables when the app starts
-with app.app_context():
-    db.create_all()
+def store_results(user_id, urls, results):
+    """Persist the crawled results of some URLs, committing each separately; see store_submission."""
+    for url in urls:
+        try:
+            store_crawl_result(user_id, url, results[url])
+            results[url] = as_dict(results[url])
+        except Exception as e:
+            logger.error("Error crawling %s: %s", url, e, extra={'url': url})
+            results[url] = {"error": str(e)}
+            db.session.rollback()
+
+@user_sharded
+def store_partial_submission(user_id, urls, results, fallback):
+    """
+    Persist a submission answered at its deadline, with placeholders for unfinished URLs.
+    
+    Args:
+        user_id: The ID of the user that submitted the URLs
+        urls: The submitted URLs
+        results: A dict of URL to ProfileResult for the URLs crawled in time,
+            completed in place with the API dict shape of every URL
+        fallback: The deadline placeholder for the other URLs ('pending' or 'mock')
+        
+    Returns:
+        The URLs still crawling, in submission order
+    """
+    if not db.session.get(User, user_id):
+        db.session.add(User(id=user_id))
+    
+    pending = [url for url in dict.fromkeys(urls) if url not in results]
+    store_results(user_id, [url for url in dict.fromkeys(urls) if url in results], results)
+    for url in pending:
+        results[url] = deadline_placeholder(url, fallback)
+    
+    DEADLINE_CRAWLS_TOTAL.inc('in_time', amount=len(results) - len(pending))
+    DEADLINE_CRAWLS_TOTAL.inc('pending', amount=len(pending))
+    
+    record_submission(user_id, urls, results)
+    # Late crawls are stored by other threads, which need the user to exist
+    db.session.commit()
+    return pending
+
+@user_sharded
+def complete_late_crawl(user_id, url, profile_data):
+    """
+    Store a crawl that finished after its submission's deadline, in an app context.
+    
+    The profile is saved like any other crawl and the placeholder in the
+    user's latest submission is replaced, unless a newer submission has
+    taken its place.
+    """
+    try:
+        store_crawl_result(user_id, url, profile_data)
+    except Exception as e:
+        logger.error("Error storing late crawl of %s: %s", url, e, extra={'url': url})
+        db.session.rollback()
+        result = {"error": str(e)}
+    else:
+        result = as_dict(profile_data)
+    DEADLINE_CRAWLS_TOTAL.inc('completed_late')
+    
+    store = get_result_store()
+    with _submission_update_lock:
+        submission = store.get(user_id)
+        if submission is None or not submission['results'].get(url, {}).get('pending'):
+            return
+        submission['results'][url] = result
+        store[user_id] = submission
+
+def timed_crawl(url):
+    """Crawl a URL, recording the crawl stage of the submission."""
+    start = time.perf_counter()
+    profile_data = crawl_profile_result(url)
+    observe_crawl(profile_data, start)
+    return profile_data
+
+def crawl_urls(urls):
+    """
+    Crawl several URLs, recording the crawl stage of each.
+    
+    With a Firecrawl client the URLs are scraped together, in batch scrape
+    requests where the client supports them (see crawler.scrape_urls). With
+    mock data only there is nothing to batch and each URL is crawled on its own.
+    
+    Returns:
+        A dict of URL to ProfileResult
+    """
+    urls = list(dict.fromkeys(urls))
+    if not scraping_enabled():
+        return {url: timed_crawl(url) for url in urls}
+    
+    start = time.perf_counter()
+    results = dict(zip(urls, crawl_profile_results(urls)))
+    for profile_data in results.values():
+        observe_crawl(profile_data, start)
+    return results
+
+def submit_with_deadline(user_id, urls, deadline, fallback):
+    """
+    Crawl a submission's URLs concurrently and answer at the deadline.
+    
+    URLs still crawling at the deadline get a placeholder. Their crawls
+    keep running on the crawl pool and are stored when they finish, holding
+    the request's admission until the last one is done.
+    
+    Args:
+        user_id: The ID of the user that submitted the URLs
+        urls: The submitted URLs
+        deadline: The time budget in seconds
+        fallback: The placeholder for late URLs ('pending' or 'mock')
+        
+    Returns:
+        The results by URL and the list of pending URLs
+    """
+    crawls = {url: submit_crawl(timed_crawl, url) for url in dict.fromkeys(urls)}
+    wait(crawls.values(), timeout=deadline)
+    
+    results = {url: future.result() for url, future in crawls.items() if future.done()}
+    pending = store_partial_submission(user_id, urls, results, fallback)
+    if not pending:
+        return results, pending
+    
+    app = current_app._get_current_object()
+    late = LateCrawls(len(pending), detach_admission().release)
+    
+    def finish(url, future):
+        try:
+            with app.app_context():
+                complete_late_crawl(user_id, url, future.result())
+        except Exception as e:
+            logger.error("Late crawl of %s failed: %s", url, e, extra={'url': url})
+        finally:
+            late.finished()
+    
+    for url in pending:
+        crawls[url].add_done_callback(functools.partial(finish, url))
+    return results, pending
+
+@user_sharded
+def crawl_submission(user_id, urls):
+    """
+    Crawl a submission's URLs together, then persist them.
+    
+    Each profile is committed separately to ensure partial success.
+    
+    Returns:
+        The API dict shape of each URL's result, or an error, by URL
+    """
+    results = crawl_urls(urls)
+    store_submission(user_id, urls, results)
+    return results
+
+@user_sharded
+def ensure_user(user_id):
+    """Create a user if it does not exist yet, and commit."""
+    if not db.session.get(User, user_id):
+        db.session.add(User(id=user_id))
+        db.session.commit()
+
+def record_submission(user_id, urls, results):
+    """Keep the latest submission for a user in the result store."""
+    get_result_store()[user_id] = {
+        "urls": urls,
+        "results": results,
+        "timestamp": current_app.config.get('REQUEST_TIME', None)
+    }
+    
+    logger.info("Stored results for user_id: %s", user_id, extra={'user_id': user_id})
+
+@user_sharded
+def load_user_profiles(user_id, fragments=True, fields=None):
+    """
+    Build the GET /profiles/<user_id> response body.
+    
+    Args:
+        user_id: The ID of the user
+        fragments: Splice the stored risk lists into the response as
+            pre-encoded json_codec Fragments instead of decoding them
+        fields: A projection from projection.parse_fields; only the columns
+            and child tables it needs are loaded
+    
+    Returns:
+        The response dict, or None if the user does not exist
+    """
+    # Check if user exists
+    user = db.session.get(User, user_id)
+    if not user:
+        logger.warning("User ID not found: %s", user_id, extra={'user_id': user_id})
+        return None
+    
+    logger.info("Retrieving results for user_id: %s", user_id, extra={'user_id': user_id})
+    
+    # Get all profiles for this user, loading only what the projection needs
+    profiles = Profile.query.filter_by(user_id=user_id).order_by(Profile.id).options(
+        *profile_query_options(fields)
+    ).all()
+    
+    # Build response
+    results = {}
+    for profile in profiles:
+        results[profile.url] = profile.to_dict(fragments, fields)
+    
+    return {
+        "urls": [profile.url for profile in profiles],
+        "results": results,
+        "timestamp": user.updated_at.isoformat() if user.updated_at else None
+    }
 
-# For testing: access to the in-memory storage
-crawler_results = {}
+@user_sharded
+def load_profiles_page(user_id, limit, cursor=None, platform=None, risk_level=None, fields=None):
+    """
+    Build the GET /profiles/<user_id>/list response body.
+    
+    Returns:
+        The response dict, or None if the user does not exist
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if not db.session.get(User, user_id):
+        return None
+    
+    page = list_profiles_page(user_id, limit=limit, cursor=cursor, platform=platform,
+                              risk_level=risk_level, fields=fields)
+    return {"user_id": user_id, "limit": limit, **page}
 
-@app.route('/health', methods=['GET'])
 def health():
     return jsonify({"status": "ok"})
 
-@app.route('/ping', methods=['GET'])
 def ping():
     return "pong"
 
-@app.route('/profiles', methods=['POST'])
+def metrics_endpoint():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE_LATEST)
+
 def submit_profiles():
     data = request.get_json()
     urls = data.get('urls', [])
@@ -43,92 +520,27 @@ def submit_profiles():
     if not user_id:
         user_id = str(uuid.uuid4())
     
-    logger.info(f"Received URLs for user_id {user_id}: {urls}")
-    
-    # Find or create user
-    user = db.session.get(User, user_id)
-    if not user:
-        user = User(id=user_id)
-        db.session.add(user)
+    try:
+        deadline = parse_deadline(data.get('deadline_ms'))
+        fallback = parse_fallback(data.get('on_deadline'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    # Process each URL with the crawler
-    results = {}
-    for url in urls:
-        logger.info(f"Crawling URL: {url}")
-        try:
-            # Call crawler
-            profile_data = crawl_profile(url)
-            results[url] = profile_data
-            
-            # Check if profile already exists for this URL and user
-            existing_profile = Profile.query.filter_by(user_id=user_id, url=url).first()
-            
-            if existing_profile:
-                # Update existing profile
-                existing_profile.platform = profile_data.get('platform', 'unknown')
-                existing_profile.username = profile_data.get('username', 'unknown')
-                
-                # Delete old data
-                for setting in existing_profile.privacy_settings:
-                    db.session.delete(setting)
-                for data in existing_profile.activity_data:
-                    db.session.delete(data)
-                for assessment in existing_profile.risk_assessment:
-                    db.session.delete(assessment)
-                
-                profile = existing_profile
-            else:
-                # Create new profile
-                profile = Profile(
-                    url=url,
-                    user_id=user_id,
-                    platform=profile_data.get('platform', 'unknown'),
-                    username=profile_data.get('username', 'unknown')
-                )
-                db.session.add(profile)
-            
-            # Save privacy settings
-            if 'privacy_settings' in profile_data:
-                for key, value in profile_data['privacy_settings'].items():
-                    setting = PrivacySetting(profile=profile, key=key)
-                    setting.set_value(value)
-                    db.session.add(setting)
-            
-            # Save activity data
-            if 'activity_data' in profile_data:
-                for key, value in profile_data['activity_data'].items():
-                    activity = ActivityData(profile=profile, key=key)
-                    activity.set_value(value)
-                    db.session.add(activity)
-            
-            # Save risk assessment
-            if 'risk_assessment' in profile_data:
-                risk_data = profile_data['risk_assessment']
-                risk = RiskAssessment(
-                    profile=profile,
-                    privacy_score=risk_data.get('privacy_score', 0),
-                    risk_level=risk_data.get('risk_level', 'unknown')
-                )
-                risk.set_risk_factors(risk_data.get('risk_factors', []))
-                risk.set_recommendations(risk_data.get('recommendations', []))
-                db.session.add(risk)
-            
-            # Commit after each profile to ensure partial success
-            db.session.commit()
-            
-        except Exception as e:
-            logger.error(f"Error crawling {url}: {str(e)}")
-            results[url] = {"error": str(e)}
-            db.session.rollback()
+    logger.info("Received %d URLs for user_id %s", len(urls), user_id, extra={'user_id': user_id, 'url_count': len(urls)})
+    logger.debug("URLs for user_id %s: %s", user_id, urls)
     
-    # Also store in-memory for compatibility with tests
-    crawler_results[user_id] = {
-        "urls": urls,
-        "results": results,
-        "timestamp": app.config.get('REQUEST_TIME', None)
-    }
+    if deadline is not None:
+        # Crawl concurrently and answer at the deadline (see deadline)
+        results, pending = submit_with_deadline(user_id, urls, deadline, fallback)
+        return jsonify({
+            "status": "partial" if pending else "processed",
+            "user_id": user_id,
+            "urls": urls,
+            "results": results,
+            "pending": pending
+        })
     
-    logger.info(f"Stored results for user_id: {user_id}")
+    results = crawl_submission(user_id, urls)
     
     response = {
         "status": "processed",
@@ -139,31 +551,207 @@ def submit_profiles():
     
     return jsonify(response)
 
-@app.route('/profiles/<user_id>', methods=['GET'])
+def bulk_import_profiles():
+    """
+    Import a large batch of URLs from a streamed CSV or NDJSON upload.
+    
+    The body is parsed incrementally and crawled in chunks. Progress is
+    streamed back as one JSON object per line after every chunk.
+    """
+    upload_format = detect_format(request.mimetype, request.args.get('format'))
+    if not upload_format:
+        return jsonify({"error": "Upload must be CSV or NDJSON"}), 415
+    
+    try:
+        chunk_size = int(request.args.get('chunk_size', DEFAULT_CHUNK_SIZE))
+    except ValueError:
+        return jsonify({"error": "chunk_size must be an integer"}), 400
+    chunk_size = max(1, min(chunk_size, MAX_CHUNK_SIZE))
+    
+    user_id = request.args.get('user_id') or str(uuid.uuid4())
+    ensure_user(user_id)
+    
+    logger.info("Starting bulk import for user_id %s (%s)", user_id, upload_format, extra={'user_id': user_id})
+    
+    def generate():
+        stats = new_import_stats()
+        urls = iter_upload_urls(request.stream, upload_format)
+        
+        for chunk_number, chunk in enumerate(iter_import_chunks(urls, stats, chunk_size), start=1):
+            results = crawl_urls(chunk)
+            with use_user_shard(user_id):
+                for url in chunk:
+                    try:
+                        store_crawl_result(user_id, url, results[url])
+                        stats['succeeded'] += 1
+                    except Exception as e:
+                        logger.error("Error importing %s: %s", url, e, extra={'url': url})
+                        db.session.rollback()
+                        stats['failed'] += 1
+                    stats['processed'] += 1
+            
+            yield json.dumps({"event": "progress", "user_id": user_id, "chunk": chunk_number, **stats}) + "\n"
+        
+        logger.info("Finished bulk import for user_id %s: %d URLs processed", user_id, stats['processed'],
+                    extra={'user_id': user_id, 'processed': stats['processed']})
+        yield json.dumps({"event": "complete", "user_id": user_id, **stats}) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 def get_profiles(user_id):
-    # Check if user exists
-    user = db.session.get(User, user_id)
-    if not user:
-        logger.warning(f"User ID not found: {user_id}")
-        return jsonify({"error": "User ID not found"}), 404
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    logger.info(f"Retrieving results for user_id: {user_id}")
+    response = load_user_profiles(user_id, fields=fields)
+    if response is None:
+        return jsonify({"error": "User ID not found"}), 404
     
-    # Get all profiles for this user
-    profiles = Profile.query.filter_by(user_id=user_id).all()
+    return jsonify(response)
+
+def list_profiles(user_id):
+    """
+    List a user's profiles one page at a time, in a stable order.
     
-    # Build response
-    results = {}
-    for profile in profiles:
-        results[profile.url] = profile.to_dict()
+    Query params: limit, cursor (the next_cursor of the previous page),
+    platform, risk_level and fields.
+    """
+    try:
+        limit = parse_limit(request.args.get('limit'))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    response = {
-        "urls": [profile.url for profile in profiles],
-        "results": results,
-        "timestamp": user.updated_at.isoformat() if user.updated_at else None
-    }
+    try:
+        response = load_profiles_page(user_id, limit, request.args.get('cursor'), request.args.get('platform'),
+                                      request.args.get('risk_level'), fields)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if response is None:
+        return jsonify({"error": "User ID not found"}), 404
     
     return jsonify(response)
 
+def search_profiles():
+    """
+    Find stored profiles of every user by username.
+    
+    Query params: q, mode (prefix, exact or fuzzy; default prefix), platform
+    and limit (default 20, max 100).
+    """
+    try:
+        key, mode, platform, limit = parse_search_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    results = find_profiles(key, mode, platform, limit)
+    return jsonify({"query": key, "mode": mode, "results": results})
+
+def get_result_store():
+    """Return the result store of the current application."""
+    return current_app.extensions['result_store']
+
+def init_db_command():
+    """Create the database tables, adding new columns and indexes to existing ones."""
+    create_schema()
+    print("Database tables created.")
+
+def reindex_search_command():
+    """Recompute the username search index of every stored profile."""
+    indexed = 0
+    for engine in shard_engines(db):
+        with engine.begin() as conn:
+            indexed += rebuild_search_index(conn)
+    print(f"Indexed {indexed} profiles.")
+
+def register_routes(app):
+    """Register the request hooks and API routes on an application."""
+    app.before_request(start_request_timer)
+    app.after_request(record_request_duration)
+    app.teardown_request(clear_request_id)
+    
+    app.add_url_rule('/health', view_func=health, methods=['GET'])
+    app.add_url_rule('/ping', view_func=ping, methods=['GET'])
+    app.add_url_rule('/metrics', view_func=metrics_endpoint, methods=['GET'])
+    app.add_url_rule('/profiles', view_func=submit_profiles, methods=['POST'])
+    app.add_url_rule('/profiles/bulk', view_func=bulk_import_profiles, methods=['POST'])
+    app.add_url_rule('/profiles/<user_id>', view_func=get_profiles, methods=['GET'])
+    app.add_url_rule('/profiles/<user_id>/list', view_func=list_profiles, methods=['GET'])
+    app.add_url_rule('/search/profiles', view_func=search_profiles, methods=['GET'])
+
+def create_app(config=None):
+    """
+    Create and configure the Flask application.
+    
+    Args:
+        config: Optional mapping of config values applied after the defaults
+        
+    Returns:
+        The configured Flask application
+    """
+    app = Flask(__name__)
+    # orjson-backed jsonify when available, see json_codec
+    app.json = FastJSONProvider(app)
+    CORS(app)  # Enable CORS for all routes
+    
+    # Database configuration
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///fiasco.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Set to create missing tables on startup instead of running init-db
+    app.config['AUTO_CREATE_TABLES'] = os.environ.get('FIASCO_AUTO_CREATE_TABLES', '').lower() in ('1', 'true', 'yes')
+    if config:
+        app.config.update(config)
+    
+    db.init_app(app)
+    # Shard databases by user_id when FIASCO_SHARDS is set (see sharding)
+    init_sharding(app)
+    
+    # Latest submission per user; set FIASCO_RESULT_STORE=database when running several workers
+    app.extensions['result_store'] = create_result_store(app, db, SubmissionResult)
+    
+    register_routes(app)
+    # Idempotency-Key handling for POST /profiles, ahead of admission control (see idempotency)
+    init_idempotency(app, db, IdempotencyKey)
+    # Load shedding for crawls, with reserved capacity for reads (see admission)
+    init_admission(app)
+    # Negotiated gzip/brotli for large responses (see compression)
+    init_compression(app)
+    app.cli.command('init-db')(init_db_command)
+    app.cli.command('reindex-search')(reindex_search_command)
+    
+    # Wrap the profile handlers with the opt-in profiler (no-op unless enabled)
+    init_profiling(app)
+    
+    if app.config['AUTO_CREATE_TABLES']:
+        with app.app_context():
+            create_schema()
+    
+    return app
+
+_default_app = None
+
+def get_app():
+    """Return the default application, creating it on first use."""
+    global _default_app
+    
+    if _default_app is None:
+        # Configure logging (see log_config for the structured/async modes)
+        configure_logging()
+        _default_app = create_app()
+    return _default_app
+
+def __getattr__(name):
+    # The default app and its result store are created lazily on first access
+    if name == 'app':
+        return get_app()
+    if name == 'crawler_results':
+        return get_app().extensions['result_store']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app = create_app({'AUTO_CREATE_TABLES': True})
+    app.run(debug=True, host='0.0.0.0', port=5000)
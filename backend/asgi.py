@@ -0,0 +1,407 @@
+"""
+ASGI entry point serving the profile API on an event loop.
+
+The routes and response bodies match app.py, but POST /profiles awaits its
+crawls with crawl_profile_result_async, so a slow scrape holds a coroutine
+instead of a worker thread and one process can keep thousands of crawls in
+flight.
+The URLs of a submission are crawled concurrently. Database work still goes
+through Flask-SQLAlchemy and runs in the default thread pool.
+
+Run with any ASGI server, for example:
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+or ``python asgi.py``. The bulk import endpoint is only served by the Flask app.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from urllib.parse import parse_qs, unquote
+
+from app import (
+    REQUEST_SECONDS,
+    app as flask_app,
+    complete_late_crawl,
+    load_profiles_page,
+    load_user_profiles,
+    observe_crawl,
+    store_partial_submission,
+    store_submission,
+    url_logger,
+)
+from admission import Admission, Overloaded, submitted_url_count
+from compression import choose_encoding, compress, is_compressible
+from crawler import crawl_profile_result_async
+from deadline import LateCrawls, parse_deadline, parse_fallback
+from idempotency import (
+    IDEMPOTENCY_HEADER,
+    REPLAYED_HEADER,
+    IdempotencyConflict,
+    StoredResponse,
+    finish_claim,
+    parse_key,
+    request_fingerprint,
+    stored_body,
+)
+from log_config import request_id_var
+from metrics import CONTENT_TYPE_LATEST, REGISTRY
+from models import create_schema
+from pagination import parse_limit
+from projection import parse_fields
+from search import find_profiles, parse_search_params
+
+logger = logging.getLogger(__name__)
+
+JSON_CONTENT_TYPE = 'application/json'
+
+# Largest request body accepted by POST /profiles
+MAX_BODY_BYTES = int(os.environ.get('FIASCO_ASGI_MAX_BODY_BYTES', 10 * 1024 * 1024))
+
+# Late crawls of deadline submissions, referenced until they finish
+_background_tasks = set()
+
+CORS_HEADERS = [(b'access-control-allow-origin', b'*')]
+PREFLIGHT_HEADERS = CORS_HEADERS + [
+    (b'access-control-allow-methods', b'GET, HEAD, POST, OPTIONS'),
+    (b'access-control-allow-headers', b'Content-Type, X-Request-ID, Idempotency-Key'),
+]
+
+class HTTPError(Exception):
+    """An error response for the current request."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def json_response(payload, status=200):
+    """Encode a response body the same way Flask's jsonify does."""
+    return status, JSON_CONTENT_TYPE, flask_app.json.dumps_bytes(payload) + b'\n'
+
+async def read_body(receive):
+    """Read the full request body, enforcing MAX_BODY_BYTES."""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise HTTPError(400, "Client disconnected")
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+def _with_app_context(func, *args):
+    with flask_app.app_context():
+        return func(*args)
+
+async def health(scope, receive):
+    return json_response({"status": "ok"})
+
+async def ping(scope, receive):
+    return 200, 'text/html; charset=utf-8', b'pong'
+
+async def metrics_endpoint(scope, receive):
+    return 200, CONTENT_TYPE_LATEST, REGISTRY.render().encode('utf-8')
+
+def _admit(kind, urls=0):
+    """Admit a crawl or read like the Flask app does; the Admission holds nothing if admission control is off."""
+    controller = flask_app.extensions.get('admission')
+    if controller is None:
+        return Admission([])
+    return controller.admit_crawl(urls) if kind == 'crawl' else controller.admit_read()
+
+async def _crawl(url):
+    url_logger.info("Crawling URL: %s", url, extra={'url': url})
+    start = time.perf_counter()
+    profile_data = await crawl_profile_result_async(url)
+    observe_crawl(profile_data, start)
+    return profile_data
+
+async def _complete_late_crawl(user_id, url, crawl, late):
+    try:
+        profile_data = await crawl
+        await asyncio.to_thread(_with_app_context, complete_late_crawl, user_id, url, profile_data)
+    except Exception as e:
+        logger.error("Late crawl of %s failed: %s", url, e, extra={'url': url})
+    finally:
+        late.finished()
+
+async def _submit_with_deadline(user_id, urls, deadline, fallback, admission):
+    """Crawl concurrently and answer at the deadline, like app.submit_with_deadline."""
+    crawls = {url: asyncio.ensure_future(_crawl(url)) for url in dict.fromkeys(urls)}
+    await asyncio.wait(crawls.values(), timeout=deadline)
+
+    results = {url: task.result() for url, task in crawls.items() if task.done()}
+    pending = await asyncio.to_thread(_with_app_context, store_partial_submission, user_id, urls, results, fallback)
+    if pending:
+        late = LateCrawls(len(pending), admission.detach().release)
+        for url in pending:
+            task = asyncio.ensure_future(_complete_late_crawl(user_id, url, crawls[url], late))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+    return results, pending
+
+def request_header(scope, name):
+    """Return a request header by lowercase name, or None."""
+    for header, value in scope.get('headers') or ():
+        if header == name:
+            return value.decode('latin-1')
+    return None
+
+async def submit_profiles(scope, receive):
+    """POST /profiles, answering duplicates by Idempotency-Key like the Flask app (see idempotency)."""
+    body = await read_body(receive)
+    store = flask_app.extensions.get('idempotency')
+    header = request_header(scope, IDEMPOTENCY_HEADER.lower().encode('latin-1'))
+    if store is None or header is None:
+        return await _submit_profiles(body)
+
+    try:
+        key = parse_key(header)
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+    fingerprint = request_fingerprint(scope['method'], scope['path'], body)
+    claim, stored = await asyncio.to_thread(store.claim, key, fingerprint, flask_app.config['IDEMPOTENCY_WAIT'])
+    if stored is not None:
+        return stored.status, stored.content_type, stored_body(stored), [(REPLAYED_HEADER.lower().encode(), b'true')]
+
+    try:
+        try:
+            response = await _submit_profiles(body)
+        except HTTPError as e:
+            response = json_response({"error": e.message}, e.status)
+    except BaseException:
+        await asyncio.to_thread(store.release, claim)
+        raise
+    await asyncio.to_thread(finish_claim, store, claim, StoredResponse(*response))
+    return response
+
+async def _submit_profiles(body):
+    try:
+        data = json.loads(body)
+    except ValueError:
+        raise HTTPError(400, "Request body must be JSON")
+    if not isinstance(data, dict):
+        raise HTTPError(400, "Request body must be a JSON object")
+
+    urls = data.get('urls', [])
+
+    # Get or generate user_id
+    user_id = data.get('user_id')
+    if not user_id:
+        user_id = str(uuid.uuid4())
+
+    try:
+        deadline = parse_deadline(data.get('deadline_ms'))
+        fallback = parse_fallback(data.get('on_deadline'))
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+
+    logger.info("Received %d URLs for user_id %s", len(urls), user_id, extra={'user_id': user_id, 'url_count': len(urls)})
+    logger.debug("URLs for user_id %s: %s", user_id, urls)
+
+    with _admit('crawl', submitted_url_count(data)) as admission:
+        if deadline is not None:
+            results, pending = await _submit_with_deadline(user_id, urls, deadline, fallback, admission)
+            return json_response({
+                "status": "partial" if pending else "processed",
+                "user_id": user_id,
+                "urls": urls,
+                "results": results,
+                "pending": pending
+            })
+
+        # Crawl every distinct URL concurrently, then persist the results off the event loop
+        unique_urls = list(dict.fromkeys(urls))
+        profiles = await asyncio.gather(*(_crawl(url) for url in unique_urls))
+        results = dict(zip(unique_urls, profiles))
+        await asyncio.to_thread(_with_app_context, store_submission, user_id, urls, results)
+
+    return json_response({
+        "status": "processed",
+        "user_id": user_id,
+        "urls": urls,
+        "results": results
+    })
+
+def query_params(scope):
+    """Return the last value of each query string parameter."""
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    return {name: values[-1] for name, values in query.items()}
+
+def _parse_fields(params):
+    try:
+        return parse_fields(params.get('fields'))
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+
+async def get_profiles(scope, receive, user_id):
+    fields = _parse_fields(query_params(scope))
+
+    with _admit('read'):
+        response = await asyncio.to_thread(_with_app_context, load_user_profiles, user_id, True, fields)
+    if response is None:
+        return json_response({"error": "User ID not found"}, 404)
+    return json_response(response)
+
+async def list_profiles(scope, receive, user_id):
+    params = query_params(scope)
+    try:
+        limit = parse_limit(params.get('limit'))
+    except ValueError:
+        raise HTTPError(400, "limit must be an integer")
+    fields = _parse_fields(params)
+
+    try:
+        with _admit('read'):
+            response = await asyncio.to_thread(
+                _with_app_context, load_profiles_page, user_id, limit, params.get('cursor'),
+                params.get('platform'), params.get('risk_level'), fields
+            )
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+    if response is None:
+        return json_response({"error": "User ID not found"}, 404)
+    return json_response(response)
+
+async def search_profiles(scope, receive):
+    try:
+        key, mode, platform, limit = parse_search_params(query_params(scope))
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+
+    with _admit('read'):
+        results = await asyncio.to_thread(_with_app_context, find_profiles, key, mode, platform, limit)
+    return json_response({"query": key, "mode": mode, "results": results})
+
+STATIC_ROUTES = {
+    '/health': ('health', ('GET', 'HEAD'), health),
+    '/ping': ('ping', ('GET', 'HEAD'), ping),
+    '/metrics': ('metrics_endpoint', ('GET', 'HEAD'), metrics_endpoint),
+    '/profiles': ('submit_profiles', ('POST',), submit_profiles),
+    '/search/profiles': ('search_profiles', ('GET', 'HEAD'), search_profiles),
+}
+
+def match_route(path):
+    """
+    Resolve a request path to its route.
+
+    Returns:
+        A tuple of (endpoint, methods, handler, args), or None if nothing matches
+    """
+    route = STATIC_ROUTES.get(path)
+    if route is not None:
+        return route + ((),)
+
+    prefix, _, user_id = path.rpartition('/')
+    if prefix == '/profiles' and user_id:
+        return 'get_profiles', ('GET', 'HEAD'), get_profiles, (unquote(user_id),)
+    if user_id == 'list':
+        prefix, _, user_id = prefix.rpartition('/')
+        if prefix == '/profiles' and user_id:
+            return 'list_profiles', ('GET', 'HEAD'), list_profiles, (unquote(user_id),)
+    return None
+
+def compress_response(headers, status, content_type, body, extra_headers):
+    """Compress a response body like the Flask app's compression hook."""
+    config = flask_app.config
+    if not config.get('COMPRESSION_ENABLED') or not is_compressible(content_type.partition(';')[0].strip()):
+        return body, extra_headers
+
+    extra_headers = extra_headers + [(b'vary', b'Accept-Encoding')]
+    if status < 200 or status >= 300 or len(body) < config['COMPRESSION_MIN_BYTES']:
+        return body, extra_headers
+
+    encoding = choose_encoding(headers.get(b'accept-encoding', b'').decode('latin-1'))
+    if encoding is None:
+        return body, extra_headers
+    return compress(body, encoding, config), extra_headers + [(b'content-encoding', encoding.encode('latin-1'))]
+
+async def _send_response(send, status, content_type, body, extra_headers, head_only=False):
+    headers = [
+        (b'content-type', content_type.encode('latin-1')),
+        (b'content-length', str(len(body)).encode('latin-1')),
+    ] + extra_headers
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': b'' if head_only else body})
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def _handle_http(scope, receive, send):
+    method = scope['method']
+    headers = dict(scope.get('headers') or ())
+    start = time.perf_counter()
+    token = request_id_var.set(headers.get(b'x-request-id', b'').decode('latin-1') or uuid.uuid4().hex[:16])
+    endpoint = 'unmatched'
+    try:
+        route = match_route(scope['path'])
+        if method == 'OPTIONS' and route is not None:
+            endpoint = route[0]
+            status, content_type, body = 200, 'text/html; charset=utf-8', b''
+            extra_headers = PREFLIGHT_HEADERS
+        else:
+            extra_headers = CORS_HEADERS
+            try:
+                if route is None:
+                    raise HTTPError(404, "Not Found")
+                endpoint, methods, handler, args = route
+                if method not in methods:
+                    raise HTTPError(405, "Method Not Allowed")
+                status, content_type, body, *response_headers = await handler(scope, receive, *args)
+                if response_headers:
+                    extra_headers = extra_headers + response_headers[0]
+            except HTTPError as e:
+                status, content_type, body = json_response({"error": e.message}, e.status)
+            except (Overloaded, IdempotencyConflict) as e:
+                payload = {"error": e.message}
+                if e.retry_after is not None:
+                    payload["retry_after"] = e.retry_after
+                status, content_type, body = json_response(payload, e.status)
+                extra_headers = extra_headers + [
+                    (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in e.headers().items()
+                ]
+            except Exception:
+                logger.exception("Unhandled error serving %s %s", method, scope['path'])
+                status, content_type, body = json_response({"error": "Internal Server Error"}, 500)
+
+        if method != 'HEAD':
+            body, extra_headers = compress_response(headers, status, content_type, body, extra_headers)
+        await _send_response(send, status, content_type, body, extra_headers, head_only=method == 'HEAD')
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint, method, str(status))
+    finally:
+        request_id_var.reset(token)
+
+async def application(scope, receive, send):
+    """The ASGI application callable."""
+    if scope['type'] == 'http':
+        await _handle_http(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+    else:
+        raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+if __name__ == '__main__':
+    import uvicorn
+
+    with flask_app.app_context():
+        create_schema()
+
+    port = int(os.environ.get('PORT', 5000))
+    print(f"Starting ASGI server at http://localhost:{port}")
+    uvicorn.run(application, host='0.0.0.0', port=port, log_level='warning')
@@ -0,0 +1,128 @@
+"""
+Minimal asyncio client for the Firecrawl scrape API.
+
+Used by crawl_profile_async so that a slow scrape holds a coroutine rather
+than an OS thread. It speaks just enough HTTP/1.1 for ``POST /v1/scrape``,
+using one connection per request.
+"""
+
+import asyncio
+import json
+from urllib.parse import urlparse
+
+class FirecrawlError(Exception):
+    """Raised when a scrape request fails."""
+
+async def _read_chunked(reader):
+    chunks = []
+    while True:
+        size_line = await reader.readline()
+        size = int(size_line.split(b';', 1)[0].strip() or b'0', 16)
+        if size == 0:
+            # Skip trailers up to the final blank line
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            return b''.join(chunks)
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+
+async def http_request(method, url, body=None, headers=None, timeout=30.0):
+    """
+    Send a single HTTP request and return (status, body bytes).
+
+    Args:
+        method: The HTTP method
+        url: The absolute http(s) URL
+        body: Optional request body bytes
+        headers: Optional extra request headers
+        timeout: Total time allowed for the request in seconds
+    """
+    return await asyncio.wait_for(_http_request(method, url, body, headers or {}), timeout)
+
+async def _http_request(method, url, body, headers):
+    parsed = urlparse(url)
+    secure = parsed.scheme == 'https'
+    port = parsed.port or (443 if secure else 80)
+    path = parsed.path or '/'
+    if parsed.query:
+        path += '?' + parsed.query
+
+    ssl_context = None
+    if secure:
+        import ssl
+        ssl_context = ssl.create_default_context()
+
+    reader, writer = await asyncio.open_connection(parsed.hostname, port, ssl=ssl_context)
+    try:
+        request_headers = {
+            'Host': parsed.netloc,
+            'Connection': 'close',
+            'Accept': 'application/json',
+            **headers,
+        }
+        if body is not None:
+            request_headers['Content-Length'] = str(len(body))
+
+        head = f'{method} {path} HTTP/1.1\r\n' + ''.join(f'{k}: {v}\r\n' for k, v in request_headers.items())
+        writer.write(head.encode('latin-1') + b'\r\n' + (body or b''))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        parts = status_line.split(None, 2)
+        if len(parts) < 2:
+            raise FirecrawlError(f"Invalid HTTP response from {parsed.netloc}")
+        status = int(parts[1])
+
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            response_body = await _read_chunked(reader)
+        elif 'content-length' in response_headers:
+            response_body = await reader.readexactly(int(response_headers['content-length']))
+        else:
+            response_body = await reader.read()
+
+        return status, response_body
+    finally:
+        writer.close()
+
+class AsyncFirecrawlClient:
+    """
+    Async counterpart of FirecrawlApp.scrape_url for the Firecrawl v1 API.
+
+    Args:
+        api_key: The Firecrawl API key
+        api_url: The base URL of the Firecrawl API
+        timeout: Time allowed per scrape in seconds
+    """
+
+    def __init__(self, api_key, api_url='https://api.firecrawl.dev', timeout=60.0):
+        self.api_key = api_key
+        self.api_url = api_url.rstrip('/')
+        self.timeout = timeout
+
+    async def scrape_url(self, url, formats=None, **params):
+        """Scrape a URL and return the page data dict, raising FirecrawlError on failure."""
+        body = json.dumps({'url': url, 'formats': formats or ['markdown'], **params}).encode('utf-8')
+        status, payload = await http_request(
+            'POST',
+            f'{self.api_url}/v1/scrape',
+            body=body,
+            headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {self.api_key}'},
+            timeout=self.timeout,
+        )
+
+        try:
+            data = json.loads(payload or b'{}')
+        except ValueError:
+            raise FirecrawlError(f"Scrape failed with status {status}: invalid JSON response")
+
+        if status != 200 or not data.get('success'):
+            raise FirecrawlError(f"Scrape failed with status {status}: {data.get('error')}")
+        return data['data']
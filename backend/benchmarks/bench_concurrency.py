@@ -0,0 +1,153 @@
+"""
+Benchmark concurrent-connection capacity of the WSGI and ASGI servers.
+
+Each server runs in its own process against the local Firecrawl stand-in
+with a slow scrape latency. For every concurrency level the benchmark opens
+that many simultaneous POST /profiles requests (one URL each) and reports how
+many completed, the wall-clock time and the peak thread count of the server
+process. The WSGI server is the threaded werkzeug server used by the load
+test harness, which holds one thread per in-flight crawl; like the harness it
+scrapes through StandinScraper, while the ASGI server uses the async client.
+
+Usage:
+    python benchmarks/bench_concurrency.py [latency_ms] [concurrency ...]
+"""
+
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+
+from async_firecrawl import http_request
+from loadtest.firecrawl_standin import FirecrawlStandin
+
+SERVERS = {
+    'wsgi (werkzeug threaded)': (
+        "import os, crawler\n"
+        "from werkzeug.serving import make_server\n"
+        "from app import app\n"
+        "from loadtest.firecrawl_standin import StandinScraper\n"
+        "crawler.firecrawl_app = StandinScraper(os.environ['FIRECRAWL_API_URL'])\n"
+        "server = make_server('127.0.0.1', {port}, app, threaded=True)\n"
+        "server.socket.listen(4096)\n"
+        "server.serve_forever()\n"
+    ),
+    'asgi (uvicorn)': (
+        "import uvicorn\n"
+        "from asgi import application\n"
+        "uvicorn.run(application, host='127.0.0.1', port={port}, log_level='critical', backlog=4096)\n"
+    ),
+}
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def thread_count(pid):
+    """Return the number of threads of a process, read from /proc (Linux only)."""
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('Threads:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+class ThreadSampler:
+    """Track the peak thread count of a process while the block runs."""
+
+    def __init__(self, pid, interval=0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, thread_count(self.pid))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+
+def start_server(source, port, env):
+    process = subprocess.Popen(
+        [sys.executable, '-c', source.format(port=port)],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Server did not start")
+
+async def submit(base_url, index, timeout):
+    body = json.dumps({'user_id': f'bench-{index}', 'urls': [f'https://twitter.com/bench_{index}']}).encode()
+    try:
+        status, payload = await http_request(
+            'POST', f'{base_url}/profiles', body=body,
+            headers={'Content-Type': 'application/json'}, timeout=timeout,
+        )
+    except Exception:
+        return False
+    if status != 200:
+        return False
+    result = json.loads(payload)['results'][f'https://twitter.com/bench_{index}']
+    return result.get('data_source') == 'firecrawl'
+
+async def burst(base_url, concurrency, timeout):
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*(submit(base_url, i, timeout) for i in range(concurrency)))
+    return sum(outcomes), time.perf_counter() - start
+
+def run(latency_ms, levels, timeout=60):
+    print(f"Scrape latency {latency_ms}ms, request timeout {timeout}s")
+    print(f"{'server':<26} {'concurrent':>10} {'completed':>10} {'wall s':>8} {'peak threads':>13}")
+    with FirecrawlStandin(latency_ms=latency_ms) as standin:
+        for name, source in SERVERS.items():
+            port = free_port()
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(
+                    os.environ,
+                    FIRECRAWL_API_KEY='bench-key',
+                    FIRECRAWL_API_URL=standin.url,
+                    DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                    FIASCO_LOG_LEVEL='CRITICAL',
+                )
+                process = start_server(source, port, env)
+                try:
+                    for concurrency in levels:
+                        with ThreadSampler(process.pid) as sampler:
+                            completed, elapsed = asyncio.run(burst(f'http://127.0.0.1:{port}', concurrency, timeout))
+                        print(f"{name:<26} {concurrency:>10} {completed:>10} {elapsed:>8.2f} {sampler.peak:>13}")
+                finally:
+                    process.terminate()
+                    process.wait()
+
+if __name__ == '__main__':
+    latency_ms = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    levels = [int(arg) for arg in sys.argv[2:]] or [100, 500, 1000]
+    run(latency_ms, levels)
@@ -0,0 +1,99 @@
+"""
+Benchmark JSON encoding of large GET /profiles responses.
+
+Stores one user with many mock profiles in a throwaway SQLite database and
+loads them once, then times building the GET /profiles/<user_id> body from the
+loaded rows and encoding it:
+
+- flask:   Flask's stdlib provider, with risk lists decoded on read (the old path)
+- json:    FastJSONProvider on the stdlib backend, risk lists spliced as fragments
+- orjson:  FastJSONProvider on orjson, risk lists spliced as fragments
+
+Usage:
+    python benchmarks/bench_json.py [profiles] [repeats]
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy.orm import selectinload
+
+import json_codec
+from app import create_app, save_profile
+from crawler import generate_mock_results
+from json_codec import FastJSONProvider
+from models import db, Profile, User
+
+PLATFORMS = ('twitter', 'instagram', 'facebook', 'linkedin', 'tiktok')
+USER_ID = 'bench-json'
+
+def populate(app, count):
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=USER_ID))
+        per_platform = count // len(PLATFORMS)
+        # New URLs only, so skip flushing before save_profile's lookup
+        with db.session.no_autoflush:
+            for seed, platform in enumerate(PLATFORMS):
+                for index, profile in enumerate(generate_mock_results(platform, per_platform, seed)):
+                    save_profile(USER_ID, f'https://{platform}.com/bench_{index}', profile)
+        db.session.commit()
+
+def load_profiles():
+    return Profile.query.filter_by(user_id=USER_ID).options(
+        selectinload(Profile.privacy_settings),
+        selectinload(Profile.activity_data),
+        selectinload(Profile.risk_assessment),
+    ).all()
+
+def build_body(profiles, fragments):
+    return {
+        'urls': [profile.url for profile in profiles],
+        'results': {profile.url: profile.to_dict(fragments) for profile in profiles},
+        'timestamp': None
+    }
+
+def measure(app, mode, repeats):
+    if mode == 'flask':
+        app.json = DefaultJSONProvider(app)
+    else:
+        json_codec.set_backend(mode)
+        app.json = FastJSONProvider(app)
+    fragments = mode != 'flask'
+
+    build_times, encode_times = [], []
+    with app.app_context():
+        profiles = load_profiles()
+        for _ in range(repeats):
+            start = time.perf_counter()
+            body = build_body(profiles, fragments)
+            built = time.perf_counter()
+            encoded = app.json.response(body).get_data()
+            encode_times.append(time.perf_counter() - built)
+            build_times.append(built - start)
+    return {
+        'bytes': len(encoded),
+        'build_ms': statistics.median(build_times) * 1000,
+        'encode_ms': statistics.median(encode_times) * 1000,
+    }
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}"})
+        populate(app, count)
+
+        modes = ['flask', 'json'] + (['orjson'] if json_codec.orjson is not None else [])
+        print(f"{'mode':>8} {'bytes':>10} {'build ms':>9} {'encode ms':>10} {'total ms':>9}")
+        for mode in modes:
+            stats = measure(app, mode, repeats)
+            print(f"{mode:>8} {stats['bytes']:>10} {stats['build_ms']:>9.1f} {stats['encode_ms']:>10.1f} "
+                  f"{stats['build_ms'] + stats['encode_ms']:>9.1f}")
@@ -0,0 +1,81 @@
+"""
+Benchmark request-thread logging cost for the crawl path.
+
+Each iteration emits the lines a single mocked URL crawl produces. The
+baseline is the previous setup: basicConfig-style handler and f-string
+messages formatted on the calling thread.
+
+Usage:
+    python benchmarks/bench_logging.py [iterations]
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from log_config import SampledLogger, configure_logging, crawl_id_var, shutdown_logging
+
+logger = logging.getLogger('bench')
+url_logger = SampledLogger(logger)
+
+URL = 'https://twitter.com/benchmark_user'
+URLS = [f'https://twitter.com/user{i}' for i in range(20)]
+
+def fstring_crawl(user_id):
+    logger.info(f"Received URLs for user_id {user_id}: {URLS}")
+    logger.info(f"Crawling URL: {URL}")
+    logger.info("Crawling twitter profile for benchmark_user")
+    logger.info(f"Using mock data generation for {URL}")
+
+def structured_crawl(user_id):
+    logger.info("Received %d URLs for user_id %s", len(URLS), user_id, extra={'user_id': user_id, 'url_count': len(URLS)})
+    logger.debug("URLs for user_id %s: %s", user_id, URLS)
+    url_logger.info("Crawling URL: %s", URL, extra={'url': URL})
+    url_logger.info("Crawling %s profile for %s", 'twitter', 'benchmark_user', extra={'url': URL, 'platform': 'twitter'})
+    url_logger.info("Using mock data generation for %s", URL, extra={'url': URL})
+    url_logger.info("Crawled %s in %.1fms (%s)", URL, 1.25, 'mock',
+                    extra={'url': URL, 'platform': 'twitter', 'data_source': 'mock', 'duration_ms': 1.25})
+
+def run(name, func, iterations, stream):
+    token = crawl_id_var.set('0123456789abcdef')
+    start = time.perf_counter()
+    for i in range(iterations):
+        func('user-123')
+    elapsed = time.perf_counter() - start
+    crawl_id_var.reset(token)
+    # Include draining the queue separately so the request-thread cost is clear
+    drain_start = time.perf_counter()
+    shutdown_logging()
+    drain = time.perf_counter() - drain_start
+    stream.flush()
+    print(f"{name:<36} {elapsed / iterations * 1e6:8.2f} us/crawl on request thread"
+          f"  (+{drain / iterations * 1e6:.2f} us/crawl drained in background)")
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    with tempfile.TemporaryFile('w') as stream:
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        logging.basicConfig(level=logging.INFO, stream=stream)
+        run('baseline (basicConfig, f-strings)', fstring_crawl, iterations, stream)
+
+        configure_logging(log_format='text', async_logging=False, sample_rate=1.0, level='INFO', stream=stream)
+        run('text, sync', structured_crawl, iterations, stream)
+
+        configure_logging(log_format='json', async_logging=False, sample_rate=1.0, level='INFO', stream=stream)
+        run('json, sync', structured_crawl, iterations, stream)
+
+        configure_logging(log_format='json', async_logging=True, sample_rate=1.0, level='INFO', stream=stream)
+        run('json, async', structured_crawl, iterations, stream)
+
+        configure_logging(log_format='json', async_logging=True, sample_rate=0.1, level='INFO', stream=stream)
+        run('json, async, 10% per-URL sampling', structured_crawl, iterations, stream)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark the per-stage overhead of the metrics instrumentation.
+
+Usage:
+    python benchmarks/bench_metrics.py [iterations]
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from metrics import MetricsRegistry, StageTimer, stage
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    registry = MetricsRegistry()
+    histogram = registry.histogram('bench_stage_seconds', 'Benchmark stages.', ('stage', 'platform', 'data_source'))
+    counter = registry.counter('bench_total', 'Benchmark runs.', ('platform', 'data_source'))
+
+    def bare():
+        pass
+
+    def one_stage():
+        with stage('scrape'):
+            pass
+
+    def timed_crawl():
+        # Four stages plus the total, as recorded for a mock crawl
+        with StageTimer(histogram, counter) as timer:
+            with stage('mock_generate'):
+                pass
+            with stage('risk_assessment'):
+                pass
+            with stage('scrape'):
+                pass
+            with stage('extract'):
+                pass
+            timer.finish('twitter', 'mock')
+
+    def untimed_stage():
+        # stage() outside of a StageTimer, e.g. when called from a CLI
+        with stage('scrape'):
+            pass
+
+    baseline = min(timeit.repeat(bare, number=iterations, repeat=5)) / iterations
+
+    def per_call(func):
+        return min(timeit.repeat(func, number=iterations, repeat=5)) / iterations - baseline
+
+    crawl = per_call(timed_crawl)
+
+    print(f"iterations: {iterations}")
+    print(f"stage() without active timer: {per_call(untimed_stage) * 1e6:.3f} us")
+    with StageTimer(histogram, counter):
+        print(f"stage() with active timer:    {per_call(one_stage) * 1e6:.3f} us")
+    print(f"full crawl (4 stages + total): {crawl * 1e6:.3f} us ({crawl / 5 * 1e6:.3f} us per stage)")
+
+if __name__ == '__main__':
+    main()
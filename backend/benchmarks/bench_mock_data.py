@@ -0,0 +1,72 @@
+"""
+Benchmark mock profile generation.
+
+Compares per-profile generation for one platform against the previous
+approach of building every platform's dict and keeping one, and measures
+bulk column generation throughput.
+
+Usage:
+    python benchmarks/bench_mock_data.py [bulk_count]
+"""
+
+import os
+import random
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mock_data import (
+    DEFAULT_PRIVACY_SPEC,
+    PLATFORM_ACTIVITY_SPECS,
+    PRIVACY_SPECS,
+    COMMON_ACTIVITY_SPEC,
+    generate_activity_data,
+    generate_from_spec,
+    generate_mock_columns,
+    generate_privacy_settings,
+    np,
+    rng_for_url,
+)
+
+def all_platforms_then_pick(platform):
+    # What the old generators did: draw values for every platform, keep one
+    privacy = {name: generate_from_spec(spec) for name, spec in PRIVACY_SPECS.items()}
+    default = generate_from_spec(DEFAULT_PRIVACY_SPEC)
+    activity = generate_from_spec(COMMON_ACTIVITY_SPEC)
+    specific = {name: generate_from_spec(spec) for name, spec in PLATFORM_ACTIVITY_SPECS.items()}
+    activity.update(specific.get(platform, {}))
+    return privacy.get(platform, default), activity
+
+def single_platform(platform):
+    return generate_privacy_settings(platform), generate_activity_data(platform)
+
+def seeded_single_platform(platform):
+    rng = rng_for_url('https://twitter.com/benchmark_user', 42)
+    return generate_privacy_settings(platform, rng), generate_activity_data(platform, rng)
+
+def main():
+    bulk_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    number = 5000
+
+    for name, func in (('all platforms, pick one', all_platforms_then_pick),
+                       ('requested platform only', single_platform),
+                       ('requested platform, seeded per URL', seeded_single_platform)):
+        per_call = min(timeit.repeat(lambda: func('twitter'), number=number, repeat=3)) / number
+        print(f"{name:<36} {per_call * 1e6:8.2f} us/profile")
+
+    for use_numpy in (True, False):
+        if use_numpy and np is None:
+            print("bulk (numpy): NumPy not installed, skipped")
+            continue
+        count = bulk_count if use_numpy else min(bulk_count, 100000)
+        start = time.perf_counter()
+        generate_mock_columns('twitter', count, seed=1, use_numpy=use_numpy)
+        elapsed = time.perf_counter() - start
+        label = 'numpy' if use_numpy else 'pure python'
+        print(f"bulk ({label}): {count} profiles in {elapsed:.2f}s ({count / elapsed:,.0f} profiles/s)")
+
+if __name__ == '__main__':
+    random.seed(0)
+    main()
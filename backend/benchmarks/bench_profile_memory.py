@@ -0,0 +1,69 @@
+"""
+Benchmark the memory used per crawled profile.
+
+Generates a batch of mock profiles and measures the traced Python memory
+held while the batch is alive, once as the nested dicts the API returns and
+once as ProfileResults, and how long each takes to build and encode.
+
+Usage:
+    python benchmarks/bench_profile_memory.py [count]
+"""
+
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler import generate_mock_profiles, generate_mock_results
+
+PLATFORMS = ('twitter', 'instagram', 'facebook', 'linkedin', 'tiktok')
+
+def build(kind, count):
+    per_platform = count // len(PLATFORMS)
+    generate = generate_mock_profiles if kind == 'dict' else generate_mock_results
+    profiles = []
+    for seed, platform in enumerate(PLATFORMS):
+        profiles.extend(generate(platform, per_platform, seed))
+    return profiles
+
+def encode(kind, profiles):
+    if kind == 'dict':
+        return [json.dumps(profile, separators=(',', ':')) for profile in profiles]
+    return [profile.to_json() for profile in profiles]
+
+def measure(kind, count):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        profiles = build(kind, count)
+        built = time.perf_counter()
+        gc.collect()
+        held = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    encode_start = time.perf_counter()
+    encode(kind, profiles)
+    encoded = time.perf_counter()
+    return {
+        'profiles': len(profiles),
+        'bytes_per_profile': held / len(profiles),
+        'build_us': (built - start) / len(profiles) * 1e6,
+        'encode_us': (encoded - encode_start) / len(profiles) * 1e6,
+    }
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    # Warm up imports and the interned key tuples outside the measurement
+    build('result', len(PLATFORMS))
+
+    print(f"{'kind':>8} {'profiles':>9} {'bytes/profile':>14} {'build us':>9} {'encode us':>10}")
+    for kind in ('dict', 'result'):
+        stats = measure(kind, count)
+        print(f"{kind:>8} {stats['profiles']:>9} {stats['bytes_per_profile']:>14.0f} "
+              f"{stats['build_us']:>9.1f} {stats['encode_us']:>10.1f}")
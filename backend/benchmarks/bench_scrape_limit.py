@@ -0,0 +1,75 @@
+"""
+Benchmark the adaptive scrape limit against fixed scrape concurrency.
+
+Many threads scrape a LoadDependentScraper through crawler._scrape_one,
+which takes latency_ms per scrape up to capacity concurrent scrapes, slows
+down in proportion beyond that and fails beyond three times capacity. Each
+run uses no limit, a fixed limit or the adaptive limit, and reports
+successful scrapes per second, failed scrapes, latency percentiles
+(including the wait for a slot) and the final limit.
+
+Usage:
+    python benchmarks/bench_scrape_limit.py [threads] [scrapes] [latency_ms] [capacity]
+"""
+
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def run(limiter, threads, scrapes, latency_ms, capacity):
+    import crawler
+    from loadtest.firecrawl_standin import LoadDependentScraper
+    from scrape_limit import set_scrape_limiter
+
+    set_scrape_limiter(limiter)
+    scraper = LoadDependentScraper(base=latency_ms / 1000, capacity=capacity, overload=capacity * 3)
+
+    def scrape(index):
+        start = time.perf_counter()
+        result = crawler._scrape_one(scraper, f'https://twitter.com/bench_{index}')
+        return time.perf_counter() - start, isinstance(result, Exception)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(scrape, range(scrapes)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for latency, failed in results)
+    failed = sum(failed for latency, failed in results)
+    return {
+        'rate': (scrapes - failed) / elapsed,
+        'failed': failed,
+        'p50': _percentile(latencies, 0.5) * 1000,
+        'p99': _percentile(latencies, 0.99) * 1000,
+    }
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    scrapes = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    latency_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+    capacity = int(sys.argv[4]) if len(sys.argv) > 4 else 16
+
+    logging.disable(logging.INFO)
+    from scrape_limit import AdaptiveLimiter
+
+    print(f"{threads} threads, {scrapes} scrapes, {latency_ms:g}ms latency up to {capacity} concurrent scrapes, "
+          f"{os.cpu_count()} CPU(s)")
+    limiters = [('no limit', None)]
+    for limit in (capacity // 2, capacity, capacity * 2):
+        limiters.append((f'fixed {limit}', AdaptiveLimiter(initial=limit, min_limit=limit, max_limit=limit)))
+    limiters.append(('adaptive', AdaptiveLimiter(max_limit=threads)))
+
+    for name, limiter in limiters:
+        result = run(limiter, threads, scrapes, latency_ms, capacity)
+        final = f"  limit={limiter.limit:.1f}" if limiter is not None else ''
+        print(f"{name:>10}: {result['rate']:8.1f} ok scrapes/s  failed={result['failed']:5d}  "
+              f"p50={result['p50']:6.1f}ms  p99={result['p99']:6.1f}ms{final}")
+
+if __name__ == '__main__':
+    main()
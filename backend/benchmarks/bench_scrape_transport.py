@@ -0,0 +1,72 @@
+"""
+Benchmark the pooled scrape transport against a connection per scrape.
+
+Starts the load test's Firecrawl stand-in and has many threads scrape it
+as fast as they can, first with StandinScraper, which opens a new
+connection per scrape, then with FirecrawlClient on a ConnectionPool of
+each given size. Reports throughput, latency percentiles and the
+connections the stand-in accepted. connect_ms is added to every new
+connection, standing in for the TCP and TLS handshakes with a remote API
+that loopback does not have.
+
+Usage:
+    python benchmarks/bench_scrape_transport.py [threads] [scrapes] [latency_ms] [connect_ms] [pool sizes ...]
+"""
+
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def run(standin, client, threads, scrapes):
+    def scrape(index):
+        start = time.perf_counter()
+        client.scrape_url(f'https://twitter.com/bench_{index % 100}')
+        return time.perf_counter() - start
+
+    connections = standin.connections
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = sorted(executor.map(scrape, range(scrapes)))
+    elapsed = time.perf_counter() - start
+    return {
+        'rate': scrapes / elapsed,
+        'p50': _percentile(latencies, 0.5) * 1000,
+        'p99': _percentile(latencies, 0.99) * 1000,
+        'connections': standin.connections - connections,
+    }
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    scrapes = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    latency_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+    connect_ms = float(sys.argv[4]) if len(sys.argv) > 4 else 0
+    pool_sizes = [int(value) for value in sys.argv[5:]] or [8, 32, 64]
+
+    logging.disable(logging.INFO)
+    from loadtest.firecrawl_standin import FirecrawlStandin, StandinScraper
+    from scrape_transport import ConnectionPool, FirecrawlClient
+
+    print(f"{threads} threads, {scrapes} scrapes, {latency_ms:g}ms stand-in latency, "
+          f"{connect_ms:g}ms per connection, {os.cpu_count()} CPU(s)")
+    with FirecrawlStandin(latency_ms=latency_ms, connect_latency_ms=connect_ms) as standin:
+        clients = [('connection per scrape', StandinScraper(standin.url))]
+        for size in pool_sizes:
+            pool = ConnectionPool(standin.url, maxsize=size)
+            clients.append((f'pool of {size}', FirecrawlClient('bench', standin.url, pool=pool)))
+
+        for name, client in clients:
+            result = run(standin, client, threads, scrapes)
+            print(f"{name:>22}: {result['rate']:8.1f} scrapes/s  p50={result['p50']:6.1f}ms  "
+                  f"p99={result['p99']:6.1f}ms  connections={result['connections']}")
+            if hasattr(client, 'close'):
+                client.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark username search over many stored profiles.
+
+Fills a throwaway SQLite database with profiles whose usernames are built
+from random syllables, separators and digits, indexes them, then times
+searches in every mode:
+
+- exact:        a stored username
+- prefix:       the first 2 and the first 5 characters of a stored username
+- fuzzy:        a stored username with one character changed, from the
+                profile_trigram table and from the FTS5 table
+
+Profiles are inserted with raw SQL, so only the search index is exercised.
+
+Usage:
+    python benchmarks/bench_search.py [profiles] [queries]
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import search
+from app import create_app
+from models import db
+from search import find_profiles, normalize_username, username_trigrams
+
+PLATFORMS = ('twitter', 'instagram', 'facebook', 'linkedin', 'tiktok')
+SYLLABLES = (
+    'ka', 'lo', 'mi', 'ra', 'jo', 'hn', 'sm', 'ith', 'an', 'na', 'el', 'le', 'ma', 'ri', 'to', 'ny',
+    'sa', 'ra', 'be', 'ck', 'da', 'vi', 'dd', 'ol', 'ly', 'em', 'ily', 'ch', 'ris', 'ta', 'ni', 'ko',
+    'zu', 'pe', 'dro', 'lu', 'ca', 'al', 'ex', 'ia', 'mo', 'ham', 'ed', 'fa', 'ti', 'ma', 'yu', 'ki',
+)
+BATCH = 20000
+
+def random_username(rng):
+    name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+    if rng.random() < 0.5:
+        name += rng.choice(('_', '.', '')) + ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3)))
+    if rng.random() < 0.6:
+        name += str(rng.randint(0, 9999))
+    return name.capitalize() if rng.random() < 0.3 else name
+
+def populate(app, count, rng):
+    usernames = []
+    with app.app_context():
+        db.create_all()
+        connection = db.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("INSERT INTO user (id) VALUES ('bench')")
+            for start in range(1, count + 1, BATCH):
+                profiles, trigrams = [], []
+                for profile_id in range(start, min(start + BATCH, count + 1)):
+                    username = random_username(rng)
+                    key = normalize_username(username)
+                    usernames.append(username)
+                    profiles.append((profile_id, f'https://x.com/{username}', rng.choice(PLATFORMS),
+                                     username, key, 'bench'))
+                    trigrams.extend((trigram, profile_id) for trigram in username_trigrams(key))
+                cursor.executemany(
+                    'INSERT INTO profile (id, url, platform, username, username_key, user_id) VALUES (?, ?, ?, ?, ?, ?)',
+                    profiles
+                )
+                cursor.executemany('INSERT INTO profile_trigram (trigram, profile_id) VALUES (?, ?)', trigrams)
+            connection.commit()
+        finally:
+            connection.close()
+    return usernames
+
+def typo(rng, key):
+    index = rng.randrange(len(key))
+    return key[:index] + rng.choice('abcdefghijklmnopqrstuvwxyz') + key[index + 1:]
+
+def time_queries(app, queries, mode):
+    timings, hits = [], 0
+    with app.app_context():
+        for key in queries:
+            start = time.perf_counter()
+            hits += bool(find_profiles(key, mode))
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings, hits
+
+def report(label, timings, hits):
+    timings.sort()
+    print(f"{label:<24} p50={statistics.median(timings):7.2f}ms  p95={timings[int(len(timings) * 0.95) - 1]:7.2f}ms  "
+          f"max={timings[-1]:7.2f}ms  hits={hits}/{len(timings)}")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    query_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmpdir, 'search.db')}"})
+
+        start = time.perf_counter()
+        usernames = populate(app, count, rng)
+        print(f"Inserted {count} profiles with trigrams in {time.perf_counter() - start:.1f}s")
+
+        keys = [normalize_username(username) for username in rng.sample(usernames, query_count)]
+        report('exact', *time_queries(app, keys, 'exact'))
+        report('prefix (2 chars)', *time_queries(app, [key[:2] for key in keys], 'prefix'))
+        report('prefix (5 chars)', *time_queries(app, [key[:5] for key in keys], 'prefix'))
+        typos = [typo(rng, key) for key in keys]
+        report('fuzzy (trigram table)', *time_queries(app, typos, 'fuzzy'))
+
+        with app.app_context(), db.engine.begin() as conn:
+            start = time.perf_counter()
+            enabled = search.create_fts_index(conn, enabled=True)
+        if enabled:
+            print(f"Built FTS5 index in {time.perf_counter() - start:.1f}s")
+            search.SEARCH_FTS5 = True
+            report('fuzzy (FTS5)', *time_queries(app, typos, 'fuzzy'))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Benchmark profile write throughput against the number of SQLite shards.
+
+For each shard count, a fresh set of database files is created in a temp
+directory and several writer processes each store one-profile submissions
+for new random users (a user row, a profile with its settings, activity,
+risk and trigram rows, and a commit) for a fixed time. SQLite lets one
+writer at a time hold a database file, so with one shard the writers queue
+behind each other; with more shards writes to different files proceed in
+parallel. Writes that fail (e.g. "database is locked") are counted as errors.
+
+In 'app' mode writers go through store_submission and the ORM. In 'raw'
+mode they insert the same rows with sqlite3 directly, routed by the same
+hash ring, which shows the storage ceiling without the ORM's CPU cost.
+Databases are created under TMPDIR; point it at the disk to measure.
+
+Usage:
+    python benchmarks/bench_sharding.py [app|raw] [writers] [seconds] [shard counts ...]
+"""
+
+import logging
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from itertools import islice
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+def _make_app(directory, shards):
+    from app import create_app
+
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(directory, 'single.db')}",
+        'SHARD_COUNT': shards,
+        'SHARD_DATABASE_URL': f"sqlite:///{os.path.join(directory, 'shard{shard}.db')}",
+    })
+
+def app_writer(directory, shards, seed, ready, start, stop_at, results):
+    logging.disable(logging.INFO)
+    from app import store_submission
+    from crawler import generate_mock_results
+
+    app = _make_app(directory, shards)
+    profiles = list(islice(generate_mock_results('twitter', 100, seed=seed), 100))
+    writes = errors = 0
+    ready.release()
+    start.wait()
+    with app.app_context():
+        while time.time() < stop_at.value:
+            user_id = str(uuid.uuid4())
+            url = f'https://twitter.com/{user_id[:8]}'
+            results_by_url = {url: profiles[writes % len(profiles)]}
+            store_submission(user_id, [url], results_by_url)
+            if 'error' in results_by_url[url]:
+                errors += 1
+            else:
+                writes += 1
+    results.put((writes, errors))
+
+def raw_writer(directory, shards, seed, ready, start, stop_at, results):
+    from sharding import ShardRing, shard_name
+
+    ring = ShardRing([shard_name(index) for index in range(shards)])
+    connections = {
+        shard_name(index): sqlite3.connect(os.path.join(directory, f'shard{index}.db'), timeout=30)
+        for index in range(shards)
+    }
+    writes = errors = 0
+    ready.release()
+    start.wait()
+    while time.time() < stop_at.value:
+        user_id = str(uuid.uuid4())
+        conn = connections[ring.shard_for(user_id)]
+        try:
+            with conn:
+                conn.execute('INSERT INTO user (id) VALUES (?)', (user_id,))
+                profile_id = conn.execute(
+                    "INSERT INTO profile (url, platform, username, username_key, user_id) "
+                    "VALUES (?, 'twitter', ?, ?, ?)", (f'https://twitter.com/{user_id[:8]}', user_id[:8], user_id[:8], user_id)
+                ).lastrowid
+                conn.executemany(
+                    "INSERT INTO privacy_setting (key, value_type, value_boolean, profile_id) VALUES (?, 'boolean', 1, ?)",
+                    [(f'setting_{index}', profile_id) for index in range(6)]
+                )
+                conn.executemany(
+                    "INSERT INTO activity_data (key, value_type, value_number, profile_id) VALUES (?, 'number', 1, ?)",
+                    [(f'activity_{index}', profile_id) for index in range(4)]
+                )
+                conn.execute("INSERT INTO risk_assessment (privacy_score, risk_level, profile_id) VALUES (50, 'medium', ?)",
+                             (profile_id,))
+            writes += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    results.put((writes, errors))
+
+WRITERS = {'app': app_writer, 'raw': raw_writer}
+
+def run(mode, shards, writers, seconds):
+    from models import create_schema
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = _make_app(directory, shards)
+        with app.app_context():
+            create_schema()
+
+        context = multiprocessing.get_context('spawn')
+        ready, start, results = context.Semaphore(0), context.Event(), context.Queue()
+        stop_at = context.Value('d', 0.0)
+        processes = [
+            context.Process(target=WRITERS[mode], args=(directory, shards, seed, ready, start, stop_at, results))
+            for seed in range(writers)
+        ]
+        for process in processes:
+            process.start()
+        for _ in processes:
+            ready.acquire()
+
+        stop_at.value = time.time() + seconds
+        start.set()
+        totals = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    writes = sum(count for count, _ in totals)
+    errors = sum(count for _, count in totals)
+    return writes / seconds, errors
+
+def main():
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'app'
+    writers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    shard_counts = [int(value) for value in sys.argv[4:]] or [1, 2, 4, 8]
+
+    print(f"{mode} mode, {writers} writer processes on {os.cpu_count()} CPU(s), {seconds:g}s per run")
+    baseline = None
+    for shards in shard_counts:
+        rate, errors = run(mode, shards, writers, seconds)
+        baseline = baseline or rate
+        print(f"{shards:>2} shard(s): {rate:8.1f} writes/s  ({rate / baseline:4.2f}x)  errors={errors}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark cold start: module import, app creation and the first requests.
+
+Every sample runs in a fresh interpreter. The 'lazy' mode is the default
+startup path. The 'eager' mode does the work that used to happen on import:
+creating tables and importing the Firecrawl SDK and NumPy up front.
+
+Usage:
+    python benchmarks/bench_startup.py [runs]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+SAMPLE = r'''
+import json, sys, time
+start = time.perf_counter()
+if sys.argv[1] == 'eager':
+    import firecrawl, numpy
+import app as app_module
+imported = time.perf_counter()
+app = app_module.create_app({'AUTO_CREATE_TABLES': sys.argv[1] == 'eager'})
+created = time.perf_counter()
+client = app.test_client()
+client.get('/health')
+first_get = time.perf_counter()
+if sys.argv[1] == 'lazy':
+    with app.app_context():
+        app_module.db.create_all()
+client.post('/profiles', json={'urls': ['https://twitter.com/cold_start']})
+first_post = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'create_app': created - imported,
+    'first_get': first_get - created,
+    'first_post': first_post - first_get,
+    'total': first_post - start,
+}))
+'''
+
+def sample(mode, database_url):
+    env = dict(os.environ, DATABASE_URL=database_url, FIASCO_LOG_LEVEL='CRITICAL')
+    output = subprocess.run(
+        [sys.executable, '-c', SAMPLE, mode], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def run(runs):
+    stages = ('import', 'create_app', 'first_get', 'first_post', 'total')
+    print(f"{'mode':<6} " + ' '.join(f'{stage:>11}' for stage in stages) + "   (median ms)")
+    for mode in ('eager', 'lazy'):
+        samples = []
+        for i in range(runs):
+            with tempfile.TemporaryDirectory() as tmp:
+                samples.append(sample(mode, f"sqlite:///{os.path.join(tmp, 'bench.db')}"))
+        medians = [statistics.median(s[stage] for s in samples) * 1000 for stage in stages]
+        print(f"{mode:<6} " + ' '.join(f'{value:>11.1f}' for value in medians))
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
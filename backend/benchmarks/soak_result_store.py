@@ -0,0 +1,96 @@
+"""
+Soak test for the in-memory result store.
+
+Writes mock crawl results for a new user at a fixed rate and samples the
+process RSS, traced Python memory and store stats at every interval. With a
+bounded store, memory should rise while the store fills and then stay flat.
+The unbounded dict the store replaced is available as a baseline.
+
+Usage:
+    python benchmarks/soak_result_store.py [--hours 3] [--rate 50] [--simulate] [--store bounded|dict]
+
+--simulate advances a fake clock instead of sleeping, so hours of traffic
+run in seconds; use it for quick checks and a real run for the soak itself.
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler import crawl_profile
+from log_config import configure_logging
+from result_store import MemoryResultStore
+
+PLATFORMS = ('twitter.com', 'instagram.com', 'facebook.com', 'linkedin.com', 'tiktok.com')
+
+def rss_bytes():
+    """Return the resident set size of this process (Linux only, else 0)."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def make_payload(index, urls_per_user=3):
+    urls = [f'https://{PLATFORMS[(index + i) % len(PLATFORMS)]}/soak_{index}_{i}' for i in range(urls_per_user)]
+    return {'urls': urls, 'results': {url: crawl_profile(url) for url in urls}, 'timestamp': None}
+
+def run(hours, rate, interval, simulate, store_kind, max_entries, ttl):
+    clock = SimulatedClock() if simulate else time.monotonic
+    if store_kind == 'dict':
+        store = {}
+    else:
+        store = MemoryResultStore(max_entries=max_entries, ttl=ttl, clock=clock)
+
+    total_seconds = hours * 3600
+    writes_per_interval = max(1, int(rate * interval))
+    start = clock()
+    index = 0
+
+    tracemalloc.start()
+    print(f"{'elapsed':>8} {'writes':>9} {'entries':>8} {'store MB':>9} {'traced MB':>10} {'rss MB':>8}")
+    try:
+        while clock() - start < total_seconds:
+            interval_start = clock()
+            for _ in range(writes_per_interval):
+                store[f'user_{index}'] = make_payload(index)
+                index += 1
+
+            if simulate:
+                clock.now += interval
+            else:
+                time.sleep(max(0.0, interval - (clock() - interval_start)))
+
+            gc.collect()
+            stats = store.stats() if hasattr(store, 'stats') else {'entries': len(store), 'bytes': 0}
+            traced = tracemalloc.get_traced_memory()[0]
+            print(f"{(clock() - start) / 60:>7.1f}m {index:>9} {stats['entries']:>8} "
+                  f"{stats['bytes'] / 1e6:>9.2f} {traced / 1e6:>10.2f} {rss_bytes() / 1e6:>8.1f}", flush=True)
+    finally:
+        tracemalloc.stop()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Soak test the in-memory result store.")
+    parser.add_argument('--hours', type=float, default=3.0)
+    parser.add_argument('--rate', type=float, default=50.0, help="Submissions per second")
+    parser.add_argument('--interval', type=float, default=60.0, help="Seconds between samples")
+    parser.add_argument('--simulate', action='store_true')
+    parser.add_argument('--store', choices=('bounded', 'dict'), default='bounded')
+    parser.add_argument('--max-entries', type=int, default=10000)
+    parser.add_argument('--ttl', type=float, default=3600)
+    args = parser.parse_args()
+
+    configure_logging(level='WARNING')
+    run(args.hours, args.rate, args.interval, args.simulate, args.store, args.max_entries, args.ttl)
@@ -0,0 +1,218 @@
+"""
+Incremental parsing helpers for bulk profile imports.
+
+Uploads are read line by line from the request stream so memory use does not
+depend on the size of the body. URLs are classified and deduplicated as they
+are read, then handed to the crawl pipeline in fixed-size chunks.
+"""
+
+import csv
+import hashlib
+import json
+import logging
+from urllib.parse import urlparse
+
+from crawler import extract_platform_and_username
+
+logger = logging.getLogger(__name__)
+
+# Longest line we accept from an upload; anything longer is not a URL
+MAX_LINE_BYTES = 8192
+
+DEFAULT_CHUNK_SIZE = 100
+MAX_CHUNK_SIZE = 1000
+
+FORMAT_CSV = 'csv'
+FORMAT_NDJSON = 'ndjson'
+
+CONTENT_TYPE_FORMATS = {
+    'text/csv': FORMAT_CSV,
+    'application/csv': FORMAT_CSV,
+    'application/x-ndjson': FORMAT_NDJSON,
+    'application/ndjson': FORMAT_NDJSON,
+    'application/jsonl': FORMAT_NDJSON,
+    'application/x-jsonlines': FORMAT_NDJSON,
+}
+
+def detect_format(content_type, explicit_format=None):
+    """
+    Work out the upload format from an explicit override or the request content type.
+
+    Args:
+        content_type: The mimetype of the upload (without parameters)
+        explicit_format: Optional format name passed by the client
+
+    Returns:
+        FORMAT_CSV or FORMAT_NDJSON, or None if the format is not supported
+    """
+    if explicit_format:
+        explicit_format = explicit_format.lower()
+        return explicit_format if explicit_format in (FORMAT_CSV, FORMAT_NDJSON) else None
+
+    return CONTENT_TYPE_FORMATS.get((content_type or '').lower())
+
+def iter_lines(stream, max_line_bytes=MAX_LINE_BYTES):
+    """
+    Yield decoded lines from a binary stream without reading it all into memory.
+
+    Lines longer than max_line_bytes are skipped rather than buffered.
+    """
+    while True:
+        raw = stream.readline(max_line_bytes + 1)
+        if not raw:
+            return
+
+        if len(raw) > max_line_bytes and not raw.endswith(b'\n'):
+            # Discard the rest of an oversized line
+            while raw and not raw.endswith(b'\n'):
+                raw = stream.readline(max_line_bytes + 1)
+            logger.warning("Skipping oversized line in bulk upload")
+            continue
+
+        yield raw.decode('utf-8', errors='replace').rstrip('\r\n')
+
+def iter_csv_urls(lines):
+    """
+    Yield URLs from CSV lines.
+
+    If the first row has a column named 'url' that column is used, otherwise
+    the first column of every row is treated as a URL.
+    """
+    url_column = 0
+    first_row = True
+
+    for row in csv.reader(lines):
+        if not row:
+            continue
+
+        if first_row:
+            first_row = False
+            header = [cell.strip().lower() for cell in row]
+            if 'url' in header:
+                url_column = header.index('url')
+                continue
+
+        if url_column < len(row):
+            yield row[url_column].strip()
+
+def iter_ndjson_urls(lines):
+    """
+    Yield URLs from NDJSON lines.
+
+    Each line may be a JSON string or an object with a 'url' key. Lines that
+    cannot be parsed are yielded as empty strings so they count as invalid.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            item = json.loads(line)
+        except ValueError:
+            yield ''
+            continue
+
+        if isinstance(item, dict):
+            item = item.get('url', '')
+
+        yield item.strip() if isinstance(item, str) else ''
+
+def iter_upload_urls(stream, upload_format):
+    """Yield raw URLs from an upload stream in the given format."""
+    lines = iter_lines(stream)
+
+    if upload_format == FORMAT_CSV:
+        return iter_csv_urls(lines)
+    return iter_ndjson_urls(lines)
+
+def classify_url(url):
+    """
+    Classify a URL from an upload.
+
+    Args:
+        url: The raw URL string
+
+    Returns:
+        The detected platform name, or None if the URL is not a usable http(s) URL
+    """
+    if not url:
+        return None
+
+    parsed_url = urlparse(url)
+    if parsed_url.scheme not in ('http', 'https') or not parsed_url.netloc:
+        return None
+
+    platform, _ = extract_platform_and_username(url)
+    return platform
+
+class UrlDeduplicator:
+    """
+    Track URLs already seen in an import.
+
+    Only an 8-byte digest of each URL is kept, so memory grows with the number
+    of unique URLs rather than with the size of the upload.
+    """
+
+    def __init__(self):
+        self._seen = set()
+
+    def __len__(self):
+        return len(self._seen)
+
+    def add(self, url):
+        """Record a URL and return True if it had not been seen before."""
+        digest = int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big')
+        if digest in self._seen:
+            return False
+        self._seen.add(digest)
+        return True
+
+def iter_import_chunks(urls, stats, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Classify, deduplicate and group URLs into chunks for crawling.
+
+    Args:
+        urls: An iterable of raw URLs
+        stats: A dict of counters that is updated in place
+        chunk_size: The number of URLs per chunk
+
+    Yields:
+        Lists of unique, valid URLs no longer than chunk_size
+    """
+    deduplicator = UrlDeduplicator()
+    chunk = []
+
+    for url in urls:
+        stats['received'] += 1
+
+        platform = classify_url(url)
+        if platform is None:
+            stats['invalid'] += 1
+            continue
+
+        if not deduplicator.add(url):
+            stats['duplicates'] += 1
+            continue
+
+        stats['platforms'][platform] = stats['platforms'].get(platform, 0) + 1
+        chunk.append(url)
+
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+def new_import_stats():
+    """Return an empty set of bulk import counters."""
+    return {
+        'received': 0,
+        'invalid': 0,
+        'duplicates': 0,
+        'processed': 0,
+        'succeeded': 0,
+        'failed': 0,
+        'platforms': {},
+    }
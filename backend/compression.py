@@ -0,0 +1,131 @@
+"""
+Negotiated gzip/brotli compression of large API responses.
+
+Responses with a compressible content type and a body of at least
+COMPRESSION_MIN_BYTES are compressed with the best encoding the client
+accepts: brotli when the ``brotli`` package is installed, otherwise gzip.
+Streamed responses, such as bulk import progress, are left alone.
+Set FIASCO_COMPRESSION=0 to disable compression.
+"""
+
+import gzip
+import os
+
+from flask import request
+from werkzeug.http import parse_accept_header
+
+from metrics import REGISTRY
+
+COMPRESSION_DEFAULTS = {
+    'COMPRESSION_ENABLED': os.environ.get('FIASCO_COMPRESSION', '1').lower() not in ('0', 'false', 'no'),
+    'COMPRESSION_MIN_BYTES': int(os.environ.get('FIASCO_COMPRESSION_MIN_BYTES', 1024)),
+    # Fast settings suited to dynamic responses
+    'COMPRESSION_GZIP_LEVEL': 5,
+    'COMPRESSION_BROTLI_QUALITY': 4,
+}
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/plain', 'text/html')
+
+COMPRESSED_BYTES_TOTAL = REGISTRY.counter(
+    'fiasco_response_compression_bytes_total',
+    'Response body bytes before and after compression, by encoding.',
+    ('encoding', 'size')
+)
+
+# brotli is imported on first use, see load_brotli()
+_brotli = None
+_brotli_checked = False
+
+def load_brotli():
+    """Return the brotli module, or None if it is not installed."""
+    global _brotli, _brotli_checked
+
+    if not _brotli_checked:
+        try:
+            import brotli
+            _brotli = brotli
+        except ImportError:
+            _brotli = None
+        _brotli_checked = True
+    return _brotli
+
+def available_encodings():
+    """Return the supported encodings, most preferred first."""
+    return ('br', 'gzip') if load_brotli() is not None else ('gzip',)
+
+def choose_encoding(accept_encoding):
+    """
+    Pick the content encoding for a request.
+
+    Args:
+        accept_encoding: The Accept-Encoding header value, or None
+
+    Returns:
+        'br', 'gzip' or None to send the body uncompressed
+    """
+    if not accept_encoding:
+        return None
+    accept = parse_accept_header(accept_encoding)
+    return accept.best_match(available_encodings())
+
+def compress(body, encoding, config=COMPRESSION_DEFAULTS):
+    """Compress a response body with the given encoding."""
+    if encoding == 'br':
+        compressed = load_brotli().compress(body, quality=config['COMPRESSION_BROTLI_QUALITY'])
+    else:
+        compressed = gzip.compress(body, compresslevel=config['COMPRESSION_GZIP_LEVEL'], mtime=0)
+    COMPRESSED_BYTES_TOTAL.inc(encoding, 'original', amount=len(body))
+    COMPRESSED_BYTES_TOTAL.inc(encoding, 'compressed', amount=len(compressed))
+    return compressed
+
+def is_compressible(mimetype):
+    """Return True for the content types worth compressing."""
+    return mimetype in COMPRESSIBLE_MIMETYPES
+
+class ResponseCompressor:
+    """after_request hook compressing eligible Flask responses."""
+
+    def __init__(self, config):
+        self.config = config
+        self.min_bytes = config['COMPRESSION_MIN_BYTES']
+
+    def __call__(self, response):
+        if (response.direct_passthrough or response.is_streamed or not is_compressible(response.mimetype)
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if response.status_code < 200 or response.status_code >= 300 or request.method == 'HEAD':
+            return response
+
+        body = response.get_data()
+        if len(body) < self.min_bytes:
+            return response
+
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+
+        response.set_data(compress(body, encoding, self.config))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+def init_compression(app):
+    """
+    Compress the app's large responses if it is configured for it.
+
+    Args:
+        app: The Flask application
+
+    Returns:
+        The ResponseCompressor, or None if compression is disabled
+    """
+    for key, value in COMPRESSION_DEFAULTS.items():
+        app.config.setdefault(key, value)
+
+    if not app.config['COMPRESSION_ENABLED']:
+        return None
+
+    compressor = ResponseCompressor(app.config)
+    app.after_request(compressor)
+    return compressor
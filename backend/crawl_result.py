@@ -0,0 +1,170 @@
+"""
+Compact, typed crawl results.
+
+Crawls used to pass nested dicts around, repeating every key string in every
+profile. ProfileResult and RiskResult are slotted dataclasses, and privacy
+settings and activity data are FieldSets: a tuple of values plus a key tuple
+shared by every result with the same fields. The crawler and persistence code
+use these classes; to_dict() produces the dict shape the JSON API returns.
+"""
+
+import hashlib
+from dataclasses import dataclass
+
+from json_codec import dumps, dumps_text
+
+# Shared key tuples, so results with the same fields reference one tuple
+_KEY_TUPLES = {}
+MAX_INTERNED_KEY_TUPLES = 1024
+
+def intern_keys(keys):
+    """Return a shared tuple equal to keys."""
+    keys = tuple(keys)
+    shared = _KEY_TUPLES.get(keys)
+    if shared is not None:
+        return shared
+    if len(_KEY_TUPLES) < MAX_INTERNED_KEY_TUPLES:
+        _KEY_TUPLES[keys] = keys
+    return keys
+
+@dataclass(slots=True)
+class FieldSet:
+    """An ordered set of named values, such as privacy settings or activity data."""
+
+    keys: tuple
+    values: tuple
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(intern_keys(data), tuple(data.values()))
+
+    def to_dict(self):
+        return dict(zip(self.keys, self.values))
+
+    def get(self, key, default=None):
+        try:
+            return self.values[self.keys.index(key)]
+        except ValueError:
+            return default
+
+    def items(self):
+        return zip(self.keys, self.values)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.keys
+
+@dataclass(slots=True)
+class RiskResult:
+    """The risk assessment of a profile."""
+
+    privacy_score: int
+    risk_level: str
+    risk_factors: list
+    recommendations: list
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data.get('privacy_score'),
+            data.get('risk_level'),
+            list(data.get('risk_factors') or ()),
+            list(data.get('recommendations') or ()),
+        )
+
+    def to_dict(self):
+        return {
+            'privacy_score': self.privacy_score,
+            'risk_level': self.risk_level,
+            'risk_factors': self.risk_factors,
+            'recommendations': self.recommendations
+        }
+
+@dataclass(slots=True)
+class ProfileResult:
+    """
+    The structured result of crawling one profile.
+
+    A failed crawl has an error message and no settings, activity or risk
+    assessment, matching the dicts crawl_profile has always returned.
+    """
+
+    platform: str
+    username: str
+    timestamp: str
+    data_source: str
+    privacy_settings: FieldSet = None
+    activity_data: FieldSet = None
+    risk_assessment: RiskResult = None
+    error: str = None
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a result from the dict shape returned by the API."""
+        privacy_settings = data.get('privacy_settings')
+        activity_data = data.get('activity_data')
+        risk_assessment = data.get('risk_assessment')
+        return cls(
+            data.get('platform'),
+            data.get('username'),
+            data.get('timestamp'),
+            data.get('data_source'),
+            FieldSet.from_dict(privacy_settings) if privacy_settings is not None else None,
+            FieldSet.from_dict(activity_data) if activity_data is not None else None,
+            RiskResult.from_dict(risk_assessment) if risk_assessment is not None else None,
+            data.get('error'),
+        )
+
+    def to_dict(self):
+        """Return the dict shape returned by the API."""
+        if self.error is not None:
+            return {
+                'platform': self.platform,
+                'username': self.username,
+                'timestamp': self.timestamp,
+                'error': self.error,
+                'data_source': self.data_source
+            }
+        return {
+            'platform': self.platform,
+            'username': self.username,
+            'timestamp': self.timestamp,
+            'privacy_settings': self.privacy_settings.to_dict() if self.privacy_settings is not None else {},
+            'activity_data': self.activity_data.to_dict() if self.activity_data is not None else {},
+            'risk_assessment': self.risk_assessment.to_dict() if self.risk_assessment is not None else None,
+            'data_source': self.data_source
+        }
+
+    def content_hash(self):
+        """
+        Hash the content that is stored for a profile.
+
+        The timestamp and data source are left out, so re-crawling a profile
+        whose data did not change yields the same hash.
+        """
+        content = [
+            self.platform,
+            self.username,
+            self.privacy_settings.to_dict() if self.privacy_settings is not None else None,
+            self.activity_data.to_dict() if self.activity_data is not None else None,
+            self.risk_assessment.to_dict() if self.risk_assessment is not None else None,
+        ]
+        return hashlib.blake2b(dumps(content, sort_keys=True), digest_size=16).hexdigest()
+
+    def to_json(self):
+        """Encode the result as compact JSON."""
+        return dumps_text(self.to_dict())
+
+def as_profile_result(data):
+    """Return data as a ProfileResult, converting from the API dict shape if needed."""
+    if isinstance(data, ProfileResult):
+        return data
+    return ProfileResult.from_dict(data)
+
+def as_dict(result):
+    """Return the API dict shape of a ProfileResult; other values are returned unchanged."""
+    if isinstance(result, ProfileResult):
+        return result.to_dict()
+    return result
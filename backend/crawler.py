@@ -3,30 +3,145 @@ Crawler module for fetching profile data from social media platforms.
 Uses Firecrawl for real web crawling with fallback to mock data generation.
 """
 
+import asyncio
+import contextlib
+import contextvars
+import functools
 import re
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 import random
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
 import json
-from firecrawl import FirecrawlApp
+import time
+import uuid
+from metrics import REGISTRY, StageTimer, stage
+from log_config import SampledLogger, crawl_id_var
+from async_firecrawl import AsyncFirecrawlClient, FirecrawlError
+from crawl_result import FieldSet, ProfileResult, RiskResult
+from scrape_archive import archive_scrape, get_scrape_archive
+from scrape_limit import ScrapeLimitExceeded, get_scrape_limiter
+from scrape_transport import create_firecrawl_client
+from mock_data import (
+    generate_activity_data,
+    generate_mock_columns,
+    generate_privacy_settings,
+    iter_column_rows,
+    rng_for_url,
+)
 
 logger = logging.getLogger(__name__)
+# Per-URL lines, sampled by FIASCO_LOG_SAMPLE_RATE
+url_logger = SampledLogger(logger)
 
-# Initialize Firecrawl with API key
+CRAWL_STAGE_SECONDS = REGISTRY.histogram(
+    'fiasco_crawl_stage_duration_seconds',
+    'Time spent in each stage of crawl_profile.',
+    ('stage', 'platform', 'data_source')
+)
+CRAWLS_TOTAL = REGISTRY.counter(
+    'fiasco_crawls_total',
+    'Profiles crawled by platform and data source.',
+    ('platform', 'data_source')
+)
+
+BATCH_SCRAPES_TOTAL = REGISTRY.counter(
+    'fiasco_batch_scrapes_total',
+    'Batch scrape requests by outcome; failed batches are retried one URL at a time.',
+    ('outcome',)
+)
+
+# Formats requested for every scraped page
+SCRAPE_FORMATS = ['markdown', 'html']
+# Most URLs sent in one batch scrape request
+BATCH_SCRAPE_MAX_URLS = int(os.environ.get("FIASCO_BATCH_SCRAPE_MAX_URLS", 100))
+# Concurrent single scrapes when the client cannot batch
+SCRAPE_THREADS = int(os.environ.get("FIASCO_SCRAPE_THREADS", 8))
+
+# Firecrawl configuration; clients are created per process on first use
 FIRECRAWL_API_KEY = os.environ.get("FIRECRAWL_API_KEY", "")
+FIRECRAWL_API_URL = os.environ.get("FIRECRAWL_API_URL", "https://api.firecrawl.dev")
 firecrawl_app = None
+async_firecrawl_app = None
 
-# Only initialize if API key is available
-if FIRECRAWL_API_KEY:
-    try:
-        firecrawl_app = FirecrawlApp(api_key=FIRECRAWL_API_KEY)
-        logger.info("Firecrawl initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize Firecrawl: {str(e)}")
-else:
-    logger.warning("No Firecrawl API key found, using mock data generation only")
+# Process that initialized the clients, and which of them it created
+_clients_pid = None
+_owned_clients = set()
+_clients_lock = threading.Lock()
+
+def init_firecrawl_clients():
+    """
+    Create the Firecrawl clients for the current process if needed.
+    
+    Clients are built lazily rather than at import, so a server that imports
+    the app before forking workers does not share client state between them.
+    Clients assigned from outside (such as test doubles) are left alone.
+    """
+    global firecrawl_app, async_firecrawl_app, _clients_pid
+    
+    if _clients_pid == os.getpid():
+        return
+    with _clients_lock:
+        # Another thread may have built them while this one waited
+        if _clients_pid == os.getpid():
+            return
+        
+        # Only initialize if API key is available
+        if not FIRECRAWL_API_KEY:
+            logger.warning("No Firecrawl API key found, using mock data generation only")
+            _clients_pid = os.getpid()
+            return
+        
+        if firecrawl_app is None:
+            try:
+                # A pooled keep-alive client, or the SDK per thread (see scrape_transport)
+                firecrawl_app = create_firecrawl_client(FIRECRAWL_API_KEY, FIRECRAWL_API_URL)
+                _owned_clients.add('firecrawl_app')
+                logger.info("Firecrawl initialized successfully")
+            except Exception as e:
+                logger.error("Failed to initialize Firecrawl: %s", e)
+        
+        # Async client used by crawl_profile_async
+        if async_firecrawl_app is None:
+            async_firecrawl_app = AsyncFirecrawlClient(FIRECRAWL_API_KEY, FIRECRAWL_API_URL)
+            _owned_clients.add('async_firecrawl_app')
+        # Set last, so other threads never see the clients as ready before they are
+        _clients_pid = os.getpid()
+
+def reset_firecrawl_clients():
+    """Drop the clients this module created so the next crawl builds new ones."""
+    global _clients_pid
+    
+    for name in _owned_clients:
+        globals()[name] = None
+    _owned_clients.clear()
+    _clients_pid = None
+
+def get_firecrawl_app():
+    """Return the Firecrawl client for this process, or None without an API key."""
+    init_firecrawl_clients()
+    return firecrawl_app
+
+def get_async_firecrawl_app():
+    """Return the async Firecrawl client for this process, or None without an API key."""
+    init_firecrawl_clients()
+    return async_firecrawl_app
+
+def _reset_firecrawl_clients_after_fork():
+    global _clients_lock
+    
+    # The lock may have been held by a thread that does not exist in the child
+    _clients_lock = threading.Lock()
+    reset_firecrawl_clients()
+
+# Forked workers must not reuse the parent's clients
+os.register_at_fork(after_in_child=_reset_firecrawl_clients_after_fork)
+
+# Seed for reproducible mock data; when set, the same URL always yields the same profile
+MOCK_SEED = os.environ.get("FIASCO_MOCK_SEED")
 
 def extract_platform_and_username(url: str) -> tuple:
     """
@@ -74,124 +189,75 @@ def extract_platform_and_username(url: str) -> tuple:
     
     return platform, username
 
-def generate_mock_privacy_settings(platform: str) -> dict:
+def generate_mock_privacy_settings(platform: str, rng=random) -> dict:
     """Generate mock privacy settings for a given platform."""
-    
-    privacy_options = {
-        'twitter': {
-            'account_privacy': random.choice(['public', 'private']),
-            'who_can_message': random.choice(['everyone', 'followers only', 'no one']),
-            'location_sharing': random.choice([True, False]),
-            'data_personalization': random.choice([True, False]),
-            'tagged_photo_review': random.choice([True, False])
-        },
-        'facebook': {
-            'profile_visibility': random.choice(['public', 'friends', 'friends of friends', 'only me']),
-            'friend_list_visibility': random.choice(['public', 'friends', 'only me']),
-            'future_post_privacy': random.choice(['public', 'friends', 'only me']),
-            'tagged_photo_review': random.choice([True, False]),
-            'face_recognition': random.choice([True, False])
-        },
-        'instagram': {
-            'account_privacy': random.choice(['public', 'private']),
-            'activity_status': random.choice([True, False]),
-            'story_sharing': random.choice(['public', 'close friends only']),
-            'mentioned_story_sharing': random.choice([True, False]),
-            'data_sharing_with_partners': random.choice([True, False])
-        },
-        'linkedin': {
-            'profile_visibility': random.choice(['public', 'connections only']),
-            'connection_visibility': random.choice(['public', 'connections only']),
-            'profile_photo_visibility': random.choice(['public', 'connections only']),
-            'active_status': random.choice([True, False]),
-            'profile_edit_notifications': random.choice([True, False])
-        },
-        'tiktok': {
-            'account_privacy': random.choice(['public', 'private']),
-            'comment_permissions': random.choice(['everyone', 'friends', 'no one']),
-            'duet_permissions': random.choice(['everyone', 'friends', 'no one']),
-            'stitch_permissions': random.choice(['everyone', 'friends', 'no one']),
-            'download_permissions': random.choice([True, False])
-        }
-    }
-    
-    # Default privacy settings for platforms not specifically listed
-    default_privacy = {
-        'account_privacy': random.choice(['public', 'private']),
-        'content_visibility': random.choice(['public', 'followers/friends', 'private']),
-        'message_permissions': random.choice(['everyone', 'followers/friends', 'no one']),
-        'data_usage_consent': random.choice([True, False]),
-        'targeted_ads': random.choice([True, False])
-    }
-    
-    return privacy_options.get(platform, default_privacy)
+    return generate_privacy_settings(platform, rng)
 
-def generate_mock_activity_data(platform: str) -> dict:
+def generate_mock_activity_data(platform: str, rng=random) -> dict:
     """Generate mock activity data for a given platform."""
+    return generate_activity_data(platform, rng)
+
+def mock_rng_for(url: str):
+    """Return the rng for mock data: seeded per URL when FIASCO_MOCK_SEED is set."""
+    if MOCK_SEED is None:
+        return random
+    return rng_for_url(url, MOCK_SEED)
+
+def generate_mock_profiles(platform: str, count: int, seed: int = 0):
+    """
+    Generate complete mock profiles in bulk, e.g. to fill benchmark databases.
     
-    now = datetime.now()
-    
-    # Common activity metrics for most platforms
-    data = {
-        'post_count': random.randint(10, 500),
-        'follower_count': random.randint(50, 10000),
-        'following_count': random.randint(50, 1000),
-        'last_active': (now - timedelta(days=random.randint(0, 30))).strftime('%Y-%m-%d'),
-        'account_created': (now - timedelta(days=random.randint(365, 3650))).strftime('%Y-%m-%d'),
-        'posts_per_month': random.randint(1, 30),
-        'mentions_other_users': random.randint(0, 100),
-        'hashtags_used': random.randint(0, 200),
-        'engagement_rate': round(random.uniform(0.5, 15.0), 2),
-        'posts_with_location': random.randint(0, 50)
-    }
-    
-    # Platform-specific metrics
-    platform_specific = {
-        'twitter': {
-            'retweet_count': random.randint(10, 500),
-            'like_count': random.randint(50, 5000),
-            'lists_count': random.randint(0, 20),
-            'verification_status': random.choice([True, False]),
-            'tweets_with_media': random.randint(0, 100)
-        },
-        'facebook': {
-            'friend_count': random.randint(50, 2000),
-            'page_likes': random.randint(10, 500),
-            'group_memberships': random.randint(0, 50),
-            'events_attended': random.randint(0, 100),
-            'photos_uploaded': random.randint(0, 300)
-        },
-        'instagram': {
-            'average_likes': random.randint(10, 500),
-            'highlight_reels': random.randint(0, 20),
-            'saved_posts': random.randint(0, 200),
-            'tagged_photos': random.randint(0, 100),
-            'stories_posted': random.randint(0, 1000)
-        },
-        'linkedin': {
-            'connections': random.randint(50, 2000),
-            'endorsements': random.randint(0, 100),
-            'articles_published': random.randint(0, 50),
-            'skills_listed': random.randint(0, 50),
-            'recommendations': random.randint(0, 20)
-        },
-        'tiktok': {
-            'video_count': random.randint(10, 300),
-            'total_likes': random.randint(1000, 1000000),
-            'average_watch_time': random.randint(5, 30),
-            'completion_rate': round(random.uniform(0.2, 0.9), 2),
-            'most_viewed_video': random.randint(1000, 1000000)
-        }
-    }
-    
-    # Add platform-specific data if available
-    if platform in platform_specific:
-        data.update(platform_specific[platform])
+    Args:
+        platform: The platform to generate profiles for
+        count: The number of profiles to generate
+        seed: The seed for the generator
+        
+    Yields:
+        Profile dicts in the same shape crawl_profile returns
+    """
+    for profile in generate_mock_results(platform, count, seed):
+        yield profile.to_dict()
+
+def generate_mock_results(platform: str, count: int, seed: int = 0):
+    """
+    Generate mock profiles in bulk as ProfileResults; see generate_mock_profiles.
     
-    return data
+    Yields:
+        ProfileResult instances
+    """
+    privacy_columns, activity_columns = generate_mock_columns(platform, count, seed)
+    timestamp = datetime.now().isoformat()
+    rows = zip(iter_column_rows(privacy_columns), iter_column_rows(activity_columns))
+    
+    for index, (privacy_settings, activity_data) in enumerate(rows):
+        privacy_settings = FieldSet.from_dict(privacy_settings)
+        activity_data = FieldSet.from_dict(activity_data)
+        yield ProfileResult(
+            platform=platform,
+            username=f"{platform}_user_{seed}_{index}",
+            timestamp=timestamp,
+            privacy_settings=privacy_settings,
+            activity_data=activity_data,
+            risk_assessment=assess_risk(platform, privacy_settings, activity_data),
+            data_source='mock'
+        )
 
 def generate_risk_assessment(platform: str, privacy_settings: dict, activity_data: dict) -> dict:
     """Generate a risk assessment based on the privacy settings and activity data."""
+    return assess_risk(platform, privacy_settings, activity_data).to_dict()
+
+def assess_risk(platform: str, privacy_settings, activity_data) -> RiskResult:
+    """
+    Assess the privacy risk of a profile.
+    
+    Args:
+        platform: The platform of the profile
+        privacy_settings: A dict or FieldSet of privacy settings
+        activity_data: A dict or FieldSet of activity data
+        
+    Returns:
+        A RiskResult
+    """
     
     # Calculate privacy score (0-100)
     # Higher is better (more private)
@@ -266,12 +332,12 @@ def generate_risk_assessment(platform: str, privacy_settings: dict, activity_dat
     if activity_data.get('posts_with_location', 0) > 0:
         recommendations.append('Remove location data from existing posts')
     
-    return {
-        'privacy_score': privacy_score,
-        'risk_level': 'high' if privacy_score < 40 else 'medium' if privacy_score < 70 else 'low',
-        'risk_factors': risk_factors,
-        'recommendations': recommendations
-    }
+    return RiskResult(
+        privacy_score,
+        'high' if privacy_score < 40 else 'medium' if privacy_score < 70 else 'low',
+        risk_factors,
+        recommendations
+    )
 
 def crawl_profile(url: str) -> dict:
     """
@@ -284,63 +350,402 @@ def crawl_profile(url: str) -> dict:
     Returns:
         A dictionary containing structured profile data
     """
+    return crawl_profile_result(url).to_dict()
+
+def crawl_profile_result(url: str) -> ProfileResult:
+    """
+    Crawl a profile like crawl_profile, returning a ProfileResult.
+    
+    Args:
+        url: The URL of the profile to crawl
+        
+    Returns:
+        A ProfileResult with the structured profile data
+    """
+    token = crawl_id_var.set(uuid.uuid4().hex[:16])
+    start = time.perf_counter()
     try:
-        platform, username = extract_platform_and_username(url)
+        with StageTimer(CRAWL_STAGE_SECONDS, CRAWLS_TOTAL) as timer:
+            profile = _crawl_profile(url)
+            _finish_crawl(timer, url, profile, start)
+        return profile
+    finally:
+        crawl_id_var.reset(token)
+
+def crawl_profile_results(urls) -> list:
+    """
+    Crawl several profiles like crawl_profile_result, scraping them together.
+    
+    The URLs are scraped with scrape_urls, in batches when the Firecrawl
+    client supports them, and then extracted one at a time. Every URL still
+    gets its own crawl ID, metrics and fallback to mock data, so a failed
+    scrape only affects its own URL.
+    
+    Args:
+        urls: The URLs of the profiles to crawl
+        
+    Returns:
+        A ProfileResult per URL, in the order of urls
+    """
+    crawl_ids = {url: uuid.uuid4().hex[:16] for url in urls}
+    start = time.perf_counter()
+    
+    targets = {}
+    for url, crawl_id in crawl_ids.items():
+        token = crawl_id_var.set(crawl_id)
+        try:
+            targets[url] = _crawl_target(url)
+        except Exception as e:
+            targets[url] = e
+        finally:
+            crawl_id_var.reset(token)
+    
+    scrapes = {}
+    scrape_seconds = 0.0
+    scraped = [url for url, target in targets.items() if not isinstance(target, Exception)]
+    if scraped and scraping_enabled():
+        scrape_start = time.perf_counter()
+        scrapes = scrape_urls(get_firecrawl_app(), scraped)
+        scrape_seconds = time.perf_counter() - scrape_start
+    
+    profiles = {}
+    for url, crawl_id in crawl_ids.items():
+        token = crawl_id_var.set(crawl_id)
+        try:
+            with StageTimer(CRAWL_STAGE_SECONDS, CRAWLS_TOTAL) as timer:
+                if url in scrapes:
+                    timer.add('scrape', scrape_seconds)
+                profiles[url] = _crawl_scraped_profile(url, targets[url], scrapes.get(url))
+                _finish_crawl(timer, url, profiles[url], start)
+        finally:
+            crawl_id_var.reset(token)
+    return [profiles[url] for url in urls]
+
+def scraping_enabled() -> bool:
+    """Return whether crawls scrape with Firecrawl rather than generate mock data."""
+    return get_firecrawl_app() is not None and bool(FIRECRAWL_API_KEY)
+
+def scrape_urls(firecrawl, urls) -> dict:
+    """
+    Scrape several URLs with as few round trips as the client allows.
+    
+    Clients with batch_scrape_urls (like FirecrawlApp) get the URLs in
+    batches of up to FIASCO_BATCH_SCRAPE_MAX_URLS. Other clients, and the
+    URLs of a batch request that fails as a whole, are scraped with
+    concurrent scrape_url calls instead. Each batch request holds one slot
+    under the adaptive scrape limit and counts against it only when it
+    fails; a batch that finds no free slot in time fails as a whole without
+    a fallback.
+    
+    Args:
+        firecrawl: The Firecrawl client
+        urls: The URLs to scrape
+        
+    Returns:
+        A dict of each URL to its page data, or to the exception its scrape
+        failed with
+    """
+    urls = list(dict.fromkeys(urls))
+    batch_scrape = getattr(firecrawl, 'batch_scrape_urls', None)
+    if len(urls) < 2 or batch_scrape is None:
+        return _scrape_each(firecrawl, urls)
+    
+    results = {}
+    for offset in range(0, len(urls), BATCH_SCRAPE_MAX_URLS):
+        batch = urls[offset:offset + BATCH_SCRAPE_MAX_URLS]
+        logger.info("Batch scraping %d URLs with Firecrawl", len(batch))
+        try:
+            with _scrape_slot(timed=False):
+                response = batch_scrape(batch, formats=SCRAPE_FORMATS)
+            results.update(map_batch_results(batch, response))
+            BATCH_SCRAPES_TOTAL.inc('success')
+        except ScrapeLimitExceeded as e:
+            results.update(dict.fromkeys(batch, e))
+        except Exception as e:
+            logger.warning("Batch scrape of %d URLs failed, scraping them one at a time: %s", len(batch), e)
+            BATCH_SCRAPES_TOTAL.inc('fallback')
+            results.update(_scrape_each(firecrawl, batch))
+    return results
+
+def map_batch_results(urls, response) -> dict:
+    """
+    Match the documents of a batch scrape response to the URLs requested.
+    
+    Documents are matched by their metadata's sourceURL, ignoring case in
+    the host and a trailing slash. Documents with an error or an HTTP error
+    status, and URLs without a document, map to a FirecrawlError.
+    
+    Args:
+        urls: The URLs of the batch
+        response: The batch scrape status, as a dict or an SDK object
         
-        if not username:
-            username = f"user_{random.randint(1000, 9999)}"
+    Returns:
+        A dict of each URL to its page data or a FirecrawlError
+    """
+    documents = {}
+    for document in _field(response, 'data') or []:
+        document = _as_dict(document)
+        metadata = _as_dict(document.get('metadata') or {})
+        source_url = metadata.get('sourceURL') or metadata.get('url')
+        if source_url:
+            documents.setdefault(_url_key(source_url), (document, metadata))
+    
+    results = {}
+    for url in urls:
+        document, metadata = documents.get(_url_key(url), (None, None))
+        if document is None:
+            results[url] = FirecrawlError(f"No result for {url} in the batch scrape")
+        elif metadata.get('error') or (metadata.get('statusCode') or 200) >= 400:
+            results[url] = FirecrawlError(
+                f"Scrape of {url} failed with status {metadata.get('statusCode')}: {metadata.get('error')}"
+            )
+        else:
+            results[url] = document
+    return results
+
+def _field(obj, name):
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+def _as_dict(obj):
+    """Return a dict of an SDK response object (a pydantic model or a plain object)."""
+    if isinstance(obj, dict):
+        return obj
+    if hasattr(obj, 'model_dump'):
+        return obj.model_dump()
+    return dict(vars(obj))
+
+def _url_key(url):
+    parsed = urlparse(url)
+    return parsed._replace(scheme=parsed.scheme.lower(), netloc=parsed.netloc.lower(),
+                           path=parsed.path.rstrip('/')).geturl()
+
+# The single scrape pool of this process, see _get_scrape_executor()
+_scrape_executor = None
+_scrape_executor_pid = None
+_scrape_executor_lock = threading.Lock()
+
+def _get_scrape_executor():
+    global _scrape_executor, _scrape_executor_pid
+    
+    with _scrape_executor_lock:
+        if _scrape_executor is None or _scrape_executor_pid != os.getpid():
+            _scrape_executor = ThreadPoolExecutor(max_workers=SCRAPE_THREADS, thread_name_prefix='fiasco-scrape')
+            _scrape_executor_pid = os.getpid()
+        return _scrape_executor
+
+def _scrape_slot(timed=True):
+    """Hold a slot under the adaptive scrape limit (see scrape_limit), if it is on."""
+    limiter = get_scrape_limiter()
+    return contextlib.nullcontext() if limiter is None else limiter.slot(timed=timed)
+
+def _async_scrape_slot():
+    """Like _scrape_slot, for coroutines."""
+    limiter = get_scrape_limiter()
+    return contextlib.nullcontext() if limiter is None else limiter.async_slot()
+
+def _scrape_one(firecrawl, url):
+    """
+    Scrape a URL under the adaptive scrape limit (see scrape_limit).
+    
+    Returns:
+        The page data, or the exception the scrape failed with
+    """
+    try:
+        with _scrape_slot():
+            return firecrawl.scrape_url(url, formats=SCRAPE_FORMATS)
+    except Exception as e:
+        return e
+
+def _scrape_each(firecrawl, urls) -> dict:
+    """Scrape URLs with concurrent single scrape_url calls; see scrape_urls."""
+    if len(urls) < 2:
+        return {url: _scrape_one(firecrawl, url) for url in urls}
+    
+    executor = _get_scrape_executor()
+    futures = {url: executor.submit(contextvars.copy_context().run, _scrape_one, firecrawl, url) for url in urls}
+    return {url: future.result() for url, future in futures.items()}
+
+async def crawl_profile_async(url: str) -> dict:
+    """
+    Async variant of crawl_profile for the ASGI server.
+    
+    Uses the async Firecrawl client when one is configured, so a slow scrape
+    does not hold a thread. Falls back to running the sync client in the
+    default executor, and to mock data generation like crawl_profile.
+    
+    Args:
+        url: The URL of the profile to crawl
         
-        logger.info(f"Crawling {platform} profile for {username}")
+    Returns:
+        A dictionary containing structured profile data
+    """
+    return (await crawl_profile_result_async(url)).to_dict()
+
+async def crawl_profile_result_async(url: str) -> ProfileResult:
+    """Async variant of crawl_profile_result; see crawl_profile_async."""
+    token = crawl_id_var.set(uuid.uuid4().hex[:16])
+    start = time.perf_counter()
+    try:
+        with StageTimer(CRAWL_STAGE_SECONDS, CRAWLS_TOTAL) as timer:
+            profile = await _crawl_profile_async(url)
+            _finish_crawl(timer, url, profile, start)
+        return profile
+    finally:
+        crawl_id_var.reset(token)
+
+def _finish_crawl(timer, url, profile, start):
+    """Record metrics and the completion log line for a crawl."""
+    timer.finish(profile.platform or 'unknown', profile.data_source or 'unknown')
+    
+    duration_ms = (time.perf_counter() - start) * 1000
+    url_logger.info("Crawled %s in %.1fms (%s)", url, duration_ms, profile.data_source,
+                    extra={'url': url, 'platform': profile.platform,
+                           'data_source': profile.data_source, 'duration_ms': round(duration_ms, 3)})
+
+def _crawl_target(url: str) -> tuple:
+    """Return the platform, username and mock rng for a URL."""
+    platform, username = extract_platform_and_username(url)
+    rng = mock_rng_for(url)
+    
+    if not username:
+        username = f"user_{rng.randint(1000, 9999)}"
+    
+    url_logger.info("Crawling %s profile for %s", platform, username, extra={'url': url, 'platform': platform})
+    return platform, username, rng
+
+def _mock_profile(platform: str, username: str, rng) -> ProfileResult:
+    """Generate a complete mock profile."""
+    with stage('mock_generate'):
+        privacy_settings = FieldSet.from_dict(generate_mock_privacy_settings(platform, rng))
+        activity_data = FieldSet.from_dict(generate_mock_activity_data(platform, rng))
+    with stage('risk_assessment'):
+        risk_assessment = assess_risk(platform, privacy_settings, activity_data)
+    
+    # Create the structured response
+    return ProfileResult(
+        platform=platform,
+        username=username,
+        timestamp=datetime.now().isoformat(),
+        privacy_settings=privacy_settings,
+        activity_data=activity_data,
+        risk_assessment=risk_assessment,
+        data_source='mock'  # Indicate this is mock data
+    )
+
+def _error_profile(url: str, error: Exception) -> ProfileResult:
+    """Return minimal data for a crawl that failed outright, to not break the flow."""
+    logger.error("Error crawling %s: %s", url, error, extra={'url': url})
+    return ProfileResult(
+        platform='unknown',
+        username='unknown',
+        timestamp=datetime.now().isoformat(),
+        error=str(error),
+        data_source='error'
+    )
+
+def _crawl_profile(url: str) -> ProfileResult:
+    """Crawl a profile without recording metrics; see crawl_profile."""
+    try:
+        target = _crawl_target(url)
         
         # Try to use Firecrawl if it's available
-        if firecrawl_app and FIRECRAWL_API_KEY:
+        scrape_result = None
+        if scraping_enabled():
+            url_logger.info("Attempting to scrape %s with Firecrawl", url, extra={'url': url})
+            with stage('scrape'):
+                scrape_result = _scrape_one(get_firecrawl_app(), url)
+        
+        return _profile_from_scrape(url, target, scrape_result)
+        
+    except Exception as e:
+        return _error_profile(url, e)
+
+def _crawl_scraped_profile(url: str, target, scrape_result) -> ProfileResult:
+    """Build the profile of a URL scraped by crawl_profile_results, without recording metrics."""
+    try:
+        if isinstance(target, Exception):
+            raise target
+        return _profile_from_scrape(url, target, scrape_result)
+    except Exception as e:
+        return _error_profile(url, e)
+
+def _profile_from_scrape(url: str, target: tuple, scrape_result) -> ProfileResult:
+    """
+    Build the profile of a scraped URL, falling back to mock data.
+    
+    Args:
+        url: The URL of the profile
+        target: The platform, username and mock rng from _crawl_target
+        scrape_result: The page data, the exception the scrape failed with,
+            or None when Firecrawl is not used
+    """
+    platform, username, rng = target
+    if scrape_result is None:
+        url_logger.info("Using mock data generation for %s", url, extra={'url': url})
+        return _mock_profile(platform, username, rng)
+    
+    try:
+        if isinstance(scrape_result, Exception):
+            raise scrape_result
+        
+        # Keep the raw page for offline re-extraction (see scrape_archive)
+        if get_scrape_archive() is not None:
+            with stage('archive'):
+                archive_scrape(url, platform, username, scrape_result)
+        
+        # Extract relevant data from the scrape result
+        with stage('extract'):
+            profile_data = extract_profile_data_from_scrape(scrape_result, platform, username)
+        
+        url_logger.info("Successfully scraped %s with Firecrawl", url, extra={'url': url})
+        return profile_data
+        
+    except Exception as e:
+        logger.error("Firecrawl scraping failed for %s: %s", url, e, extra={'url': url})
+        logger.info("Falling back to mock data generation")
+        return _mock_profile(platform, username, rng)
+
+async def _crawl_profile_async(url: str) -> ProfileResult:
+    """Crawl a profile without recording metrics; see crawl_profile_async."""
+    try:
+        platform, username, rng = _crawl_target(url)
+        
+        async_firecrawl = get_async_firecrawl_app()
+        firecrawl = get_firecrawl_app()
+        if FIRECRAWL_API_KEY and (async_firecrawl or firecrawl):
             try:
-                logger.info(f"Attempting to scrape {url} with Firecrawl")
+                url_logger.info("Attempting to scrape %s with Firecrawl", url, extra={'url': url})
                 
-                # Scrape the URL with Firecrawl
-                scrape_result = firecrawl_app.scrape_url(url, formats=['markdown', 'html'])
+                with stage('scrape'):
+                    async with _async_scrape_slot():
+                        if async_firecrawl:
+                            scrape_result = await async_firecrawl.scrape_url(url, formats=['markdown', 'html'])
+                        else:
+                            loop = asyncio.get_running_loop()
+                            scrape_result = await loop.run_in_executor(
+                                None, functools.partial(firecrawl.scrape_url, url, formats=['markdown', 'html'])
+                            )
                 
-                # Extract relevant data from the scrape result
-                profile_data = extract_profile_data_from_scrape(scrape_result, platform, username)
+                if get_scrape_archive() is not None:
+                    with stage('archive'):
+                        await asyncio.to_thread(archive_scrape, url, platform, username, scrape_result)
                 
-                logger.info(f"Successfully scraped {url} with Firecrawl")
+                with stage('extract'):
+                    profile_data = extract_profile_data_from_scrape(scrape_result, platform, username)
+                
+                url_logger.info("Successfully scraped %s with Firecrawl", url, extra={'url': url})
                 return profile_data
                 
             except Exception as e:
-                logger.error(f"Firecrawl scraping failed for {url}: {str(e)}")
+                logger.error("Firecrawl scraping failed for %s: %s", url, e, extra={'url': url})
                 logger.info("Falling back to mock data generation")
-                # Continue with mock data generation
         else:
-            logger.info(f"Using mock data generation for {url}")
-        
-        # Generate mock data
-        privacy_settings = generate_mock_privacy_settings(platform)
-        activity_data = generate_mock_activity_data(platform)
-        risk_assessment = generate_risk_assessment(platform, privacy_settings, activity_data)
+            url_logger.info("Using mock data generation for %s", url, extra={'url': url})
         
-        # Create the structured response
-        profile_data = {
-            'platform': platform,
-            'username': username,
-            'timestamp': datetime.now().isoformat(),
-            'privacy_settings': privacy_settings,
-            'activity_data': activity_data,
-            'risk_assessment': risk_assessment,
-            'data_source': 'mock'  # Indicate this is mock data
-        }
-        
-        return profile_data
+        return _mock_profile(platform, username, rng)
         
     except Exception as e:
-        logger.error(f"Error crawling {url}: {str(e)}")
-        # Return minimal data to not break the flow
-        return {
-            'platform': 'unknown',
-            'username': 'unknown',
-            'timestamp': datetime.now().isoformat(),
-            'error': str(e),
-            'data_source': 'error'
-        }
+        return _error_profile(url, e)
         
 def extract_profile_data_from_scrape(scrape_result, platform, username):
     """
@@ -352,7 +757,7 @@ def extract_profile_data_from_scrape(scrape_result, platform, username):
         username: The detected username
         
     Returns:
-        A dictionary containing structured profile data
+        A ProfileResult with the structured profile data
     """
     try:
         # Extract content from scrape result
@@ -431,35 +836,38 @@ def extract_profile_data_from_scrape(scrape_result, platform, username):
             activity_data = generate_mock_activity_data(platform)
         
         # Generate risk assessment
-        risk_assessment = generate_risk_assessment(platform, privacy_settings, activity_data)
+        privacy_settings = FieldSet.from_dict(privacy_settings)
+        activity_data = FieldSet.from_dict(activity_data)
+        with stage('risk_assessment'):
+            risk_assessment = assess_risk(platform, privacy_settings, activity_data)
         
         # Create the structured response
-        return {
-            'platform': platform,
-            'username': username,
-            'timestamp': datetime.now().isoformat(),
-            'privacy_settings': privacy_settings,
-            'activity_data': activity_data,
-            'risk_assessment': risk_assessment,
-            'data_source': 'firecrawl'  # Indicate this is from real scraping
-        }
+        return ProfileResult(
+            platform=platform,
+            username=username,
+            timestamp=datetime.now().isoformat(),
+            privacy_settings=privacy_settings,
+            activity_data=activity_data,
+            risk_assessment=risk_assessment,
+            data_source='firecrawl'  # Indicate this is from real scraping
+        )
     
     except Exception as e:
-        logger.error(f"Error extracting data from scrape result: {str(e)}")
+        logger.error("Error extracting data from scrape result: %s", e, extra={'platform': platform})
         # Fall back to mock data
-        privacy_settings = generate_mock_privacy_settings(platform)
-        activity_data = generate_mock_activity_data(platform)
-        risk_assessment = generate_risk_assessment(platform, privacy_settings, activity_data)
+        privacy_settings = FieldSet.from_dict(generate_mock_privacy_settings(platform))
+        activity_data = FieldSet.from_dict(generate_mock_activity_data(platform))
+        risk_assessment = assess_risk(platform, privacy_settings, activity_data)
         
-        return {
-            'platform': platform,
-            'username': username,
-            'timestamp': datetime.now().isoformat(),
-            'privacy_settings': privacy_settings,
-            'activity_data': activity_data,
-            'risk_assessment': risk_assessment,
-            'data_source': 'mock_fallback'  # Indicate this is fallback mock data
-        }
+        return ProfileResult(
+            platform=platform,
+            username=username,
+            timestamp=datetime.now().isoformat(),
+            privacy_settings=privacy_settings,
+            activity_data=activity_data,
+            risk_assessment=risk_assessment,
+            data_source='mock_fallback'  # Indicate this is fallback mock data
+        )
         
 def parse_count(count_str):
     """Parse count strings like '1.2k' or '3.4m' into integers."""
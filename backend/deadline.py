@@ -0,0 +1,141 @@
+"""
+Deadline-aware crawling for POST /profiles.
+
+A submission normally takes as long as its slowest URL. A submission with a
+``deadline_ms`` crawls its URLs concurrently on a shared thread pool and
+responds when they are done or the deadline passes, whichever comes first.
+URLs crawled in time return their data. URLs still crawling return a
+placeholder marked ``"pending": true`` and keep crawling in the background.
+When they finish, their profile is stored and the submission kept in the
+result store is updated. Placeholders are never stored, so a deadline never
+replaces a stored profile with mock data.
+"""
+
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from crawl_result import FieldSet, ProfileResult
+from crawler import (
+    assess_risk,
+    extract_platform_and_username,
+    generate_mock_activity_data,
+    generate_mock_privacy_settings,
+    mock_rng_for,
+)
+from metrics import REGISTRY
+
+# Placeholders returned for URLs still crawling at the deadline
+DEADLINE_FALLBACKS = ('pending', 'mock')
+
+# Longer budgets are clamped; gunicorn kills requests after 120 seconds
+MAX_DEADLINE_MS = 120000
+
+CRAWL_THREADS = int(os.environ.get('FIASCO_CRAWL_THREADS', 32))
+
+DEADLINE_CRAWLS_TOTAL = REGISTRY.counter(
+    'fiasco_deadline_crawls_total',
+    'Crawls of submissions with a deadline: in_time, pending at the deadline, or completed_late.',
+    ('outcome',)
+)
+
+def parse_deadline(value):
+    """
+    Parse a deadline_ms value.
+
+    Returns:
+        The deadline in seconds, or None if no deadline was given
+
+    Raises:
+        ValueError: If the value is not a positive number
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        raise ValueError("deadline_ms must be a positive number of milliseconds")
+    return min(value, MAX_DEADLINE_MS) / 1000
+
+def parse_fallback(value):
+    """
+    Parse the on_deadline value naming the placeholder for late URLs.
+
+    Raises:
+        ValueError: If the value is not one of DEADLINE_FALLBACKS
+    """
+    if value is None:
+        return 'pending'
+    if value not in DEADLINE_FALLBACKS:
+        raise ValueError(f"on_deadline must be one of {', '.join(DEADLINE_FALLBACKS)}")
+    return value
+
+def deadline_placeholder(url, fallback='pending'):
+    """
+    Return the placeholder for a URL still crawling at the deadline, in the API dict shape.
+
+    Args:
+        url: The URL being crawled
+        fallback: 'pending' for a result with no data, or 'mock' for mock
+            data marked as mock_fallback
+    """
+    platform, username = extract_platform_and_username(url)
+    rng = mock_rng_for(url)
+    if not username:
+        username = f"user_{rng.randint(1000, 9999)}"
+
+    if fallback == 'mock':
+        privacy_settings = FieldSet.from_dict(generate_mock_privacy_settings(platform, rng))
+        activity_data = FieldSet.from_dict(generate_mock_activity_data(platform, rng))
+        result = ProfileResult(
+            platform=platform,
+            username=username,
+            timestamp=datetime.now().isoformat(),
+            privacy_settings=privacy_settings,
+            activity_data=activity_data,
+            risk_assessment=assess_risk(platform, privacy_settings, activity_data),
+            data_source='mock_fallback'
+        )
+    else:
+        result = ProfileResult(platform, username, datetime.now().isoformat(), 'pending')
+    return {**result.to_dict(), 'pending': True}
+
+# The crawl pool of this process, see get_crawl_executor()
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def get_crawl_executor():
+    """Return this process's crawl thread pool, creating it on first use (and after a fork)."""
+    global _executor, _executor_pid
+
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=CRAWL_THREADS, thread_name_prefix='fiasco-crawl')
+            _executor_pid = os.getpid()
+        return _executor
+
+def submit_crawl(func, *args):
+    """Run func(*args) on the crawl pool in a copy of the current context, so log fields carry over."""
+    return get_crawl_executor().submit(contextvars.copy_context().run, func, *args)
+
+class LateCrawls:
+    """
+    Run a callback once every late crawl of a submission has been handled.
+
+    Args:
+        count: The number of late crawls
+        on_done: Called with no arguments after the last one
+    """
+
+    def __init__(self, count, on_done):
+        self._remaining = count
+        self._on_done = on_done
+        self._lock = threading.Lock()
+
+    def finished(self):
+        with self._lock:
+            self._remaining -= 1
+            last = self._remaining == 0
+        if last:
+            self._on_done()
@@ -0,0 +1,31 @@
+"""
+Gunicorn settings for running the API with several worker processes.
+
+Usage (from the backend directory):
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master and forked into the workers, so each
+worker resets its inherited database pool and Firecrawl clients in post_fork.
+"""
+
+import os
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('FIASCO_WORKERS', os.cpu_count() or 1))
+worker_class = 'gthread'
+# Admission control lets half of these threads crawl by default (FIASCO_MAX_CRAWLS)
+threads = int(os.environ.get('FIASCO_WORKER_THREADS', 8))
+preload_app = True
+# Crawls wait on Firecrawl, so allow slow requests
+timeout = 120
+graceful_timeout = 30
+
+# Workers share submission results through the database
+if workers > 1:
+    os.environ.setdefault('FIASCO_RESULT_STORE', 'database')
+
+def post_fork(server, worker):
+    from app import app
+    from serve import init_worker
+
+    init_worker(app)
@@ -0,0 +1,405 @@
+"""
+Idempotency keys for POST /profiles.
+
+A client that times out and retries would otherwise crawl and rewrite the
+same URLs a second time, doubling the load just when the server is slow.
+A request may instead carry an Idempotency-Key header. Before admission
+control, the key is claimed together with a fingerprint of the request:
+
+- The first request with a key runs as usual, and its response is stored
+  under the key.
+- A duplicate of a request still running waits for it, for up to
+  FIASCO_IDEMPOTENCY_WAIT seconds, and gets the same response.
+- A duplicate of a finished request gets the stored response at once.
+
+Replayed responses carry an Idempotent-Replayed: true header. Reusing a key
+for a different request is refused with 422. A duplicate that is still
+waiting when FIASCO_IDEMPOTENCY_WAIT runs out gets 409 with Retry-After.
+Server errors (5xx) and requests rejected by admission control are not
+stored. Their key is released, so the waiting duplicates and later retries
+run the request again.
+
+Keys expire FIASCO_IDEMPOTENCY_TTL seconds after they were claimed. The
+store is picked with FIASCO_IDEMPOTENCY_STORE, like the result store:
+
+- 'memory' (the default) keeps the newest FIASCO_IDEMPOTENCY_MAX_KEYS keys
+  in this process, which is only correct with a single worker.
+- 'database' keeps them in the idempotency_key table, bounded per
+  database. Duplicates on other workers wait for an in-progress key by
+  polling. Claims older than FIASCO_IDEMPOTENCY_CLAIM_TIMEOUT are taken
+  over, in case their worker died. With sharding on, each key is stored on
+  the shard its key hashes to. Keys are not moved by reshard.py, since
+  they expire.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+
+from flask import Response, current_app, g, request
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+
+from admission import rejection_response
+from metrics import REGISTRY
+from sharding import use_user_shard
+
+IDEMPOTENCY_STORES = ('memory', 'database')
+
+IDEMPOTENCY_DEFAULTS = {
+    'IDEMPOTENCY_ENABLED': os.environ.get('FIASCO_IDEMPOTENCY', '1').lower() not in ('0', 'false', 'no'),
+    'IDEMPOTENCY_STORE': os.environ.get('FIASCO_IDEMPOTENCY_STORE', 'memory').lower(),
+    'IDEMPOTENCY_TTL': float(os.environ.get('FIASCO_IDEMPOTENCY_TTL', 24 * 3600)),
+    'IDEMPOTENCY_MAX_KEYS': int(os.environ.get('FIASCO_IDEMPOTENCY_MAX_KEYS', 10000)),
+    # Seconds a duplicate waits for the original request before getting 409
+    'IDEMPOTENCY_WAIT': float(os.environ.get('FIASCO_IDEMPOTENCY_WAIT', 60)),
+    'IDEMPOTENCY_CLAIM_TIMEOUT': float(os.environ.get('FIASCO_IDEMPOTENCY_CLAIM_TIMEOUT', 600)),
+    # Seconds between polls of an in-progress key in the database store
+    'IDEMPOTENCY_POLL_INTERVAL': 0.1,
+}
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+IDEMPOTENT_ENDPOINTS = ('submit_profiles',)
+MAX_KEY_LENGTH = 255
+
+IDEMPOTENCY_REQUESTS_TOTAL = REGISTRY.counter(
+    'fiasco_idempotency_requests_total',
+    'Requests with an Idempotency-Key by outcome: claimed, replayed (stored response), '
+    'attached (waited for the original), mismatch, in_progress (gave up waiting) and released.',
+    ('outcome',)
+)
+IDEMPOTENCY_KEYS = REGISTRY.gauge(
+    'fiasco_idempotency_keys',
+    'Keys held by the in-memory idempotency store.'
+)
+
+StoredResponse = namedtuple('StoredResponse', ('status', 'content_type', 'body'))
+
+class IdempotencyConflict(Exception):
+    """
+    A duplicate request that cannot be answered from the store.
+
+    Attributes:
+        status: The HTTP status to respond with
+        message: The error message
+        retry_after: Seconds the client should wait, or None if retrying cannot help
+    """
+
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+    def headers(self):
+        return {'Retry-After': str(self.retry_after)} if self.retry_after is not None else {}
+
+def parse_key(value):
+    """Validate an Idempotency-Key header value, raising ValueError."""
+    key = value.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f"{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters")
+    return key
+
+def request_fingerprint(method, path, body):
+    """Hash a request so a reused key can be told apart from a duplicate; JSON bodies are compared by value."""
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, separators=(',', ':')).encode('utf-8')
+    except ValueError:
+        pass
+    digest = hashlib.sha256(f'{method} {path}\n'.encode('utf-8'))
+    digest.update(body)
+    return digest.hexdigest()
+
+def _mismatch():
+    IDEMPOTENCY_REQUESTS_TOTAL.inc('mismatch')
+    return IdempotencyConflict(422, f"{IDEMPOTENCY_HEADER} was already used for a different request")
+
+def _in_progress(wait):
+    IDEMPOTENCY_REQUESTS_TOTAL.inc('in_progress')
+    return IdempotencyConflict(409, f"A request with this {IDEMPOTENCY_HEADER} is still in progress",
+                               retry_after=max(1, round(wait)))
+
+class _Claim:
+    __slots__ = ('key', 'fingerprint', 'expires_at', 'done', 'response')
+
+    def __init__(self, key, fingerprint, expires_at):
+        self.key = key
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        self.done = threading.Event()
+        self.response = None
+
+class MemoryIdempotencyStore:
+    """
+    Idempotency keys held in this process, oldest evicted first.
+
+    Args:
+        max_keys: Maximum number of keys kept
+        ttl: Seconds a key is kept after it was claimed
+        clock: Monotonic time source, replaceable in tests
+    """
+
+    backend = 'memory'
+
+    def __init__(self, max_keys, ttl, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        # key -> _Claim in claim order, which is also expiry order
+        self._claims = OrderedDict()
+
+    def _expire(self, now):
+        while self._claims:
+            claim = next(iter(self._claims.values()))
+            if claim.expires_at > now:
+                return
+            del self._claims[claim.key]
+
+    def claim(self, key, fingerprint, wait):
+        """
+        Claim a key, or wait for the request holding it.
+
+        Returns:
+            (claim, None) if the caller now holds the key and must complete()
+            or release() the claim, or (None, StoredResponse) for a duplicate
+
+        Raises:
+            IdempotencyConflict: The key belongs to a different request, or
+                the original request did not finish within wait seconds
+        """
+        give_up_at = time.monotonic() + wait
+        waited = False
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._expire(now)
+                claim = self._claims.get(key)
+                if claim is None:
+                    claim = self._claims[key] = _Claim(key, fingerprint, now + self.ttl)
+                    while len(self._claims) > self.max_keys:
+                        self._claims.popitem(last=False)
+                    IDEMPOTENCY_KEYS.set(len(self._claims))
+                    IDEMPOTENCY_REQUESTS_TOTAL.inc('claimed')
+                    return claim, None
+
+            if claim.fingerprint != fingerprint:
+                raise _mismatch()
+            waited = waited or not claim.done.is_set()
+            if not claim.done.wait(max(0.0, give_up_at - time.monotonic())):
+                raise _in_progress(wait)
+            if claim.response is not None:
+                IDEMPOTENCY_REQUESTS_TOTAL.inc('attached' if waited else 'replayed')
+                return None, claim.response
+            # Released without a response; try to claim it again
+
+    def complete(self, claim, response):
+        """Store the response of a claimed key and wake its duplicates."""
+        claim.response = StoredResponse(response.status, response.content_type, zlib.compress(response.body, 1))
+        claim.done.set()
+
+    def release(self, claim):
+        """Give up a claimed key without a response, so it can be claimed again."""
+        with self._lock:
+            if self._claims.get(claim.key) is claim:
+                del self._claims[claim.key]
+            IDEMPOTENCY_KEYS.set(len(self._claims))
+        IDEMPOTENCY_REQUESTS_TOTAL.inc('released')
+        claim.done.set()
+
+    def __len__(self):
+        with self._lock:
+            self._expire(self.clock())
+            return len(self._claims)
+
+class DatabaseIdempotencyStore:
+    """
+    Idempotency keys in the database, shared between worker processes.
+
+    Every operation runs in its own application context, and so in its own
+    session, like DatabaseResultStore.
+
+    Args:
+        app: The Flask application whose database is used
+        db: The Flask-SQLAlchemy extension
+        model: The IdempotencyKey model
+        max_keys: Maximum number of keys kept per database
+        ttl: Seconds a key is kept after it was claimed
+        claim_timeout: Seconds after which an unfinished claim is taken over
+        poll_interval: Seconds between polls of an in-progress key
+    """
+
+    backend = 'database'
+
+    def __init__(self, app, db, model, max_keys, ttl, claim_timeout, poll_interval):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.claim_timeout = claim_timeout
+        self.poll_interval = poll_interval
+
+    def _prune(self, now):
+        table = self.model.__table__
+        session = self.db.session
+        session.execute(delete(table).where(table.c.expires_at <= now))
+        newest = select(table.c.key).order_by(table.c.expires_at.desc()).offset(self.max_keys)
+        session.execute(delete(table).where(table.c.key.in_(newest.scalar_subquery())))
+
+    def claim(self, key, fingerprint, wait):
+        """Claim a key, or wait for the request holding it; see MemoryIdempotencyStore.claim."""
+        give_up_at = time.monotonic() + wait
+        waited = False
+        while True:
+            with self.app.app_context(), use_user_shard(key):
+                session = self.db.session
+                now = datetime.utcnow()
+                row = session.get(self.model, key)
+                if row is not None and (row.expires_at <= now or (
+                        row.status is None and row.claimed_at <= now - timedelta(seconds=self.claim_timeout))):
+                    session.delete(row)
+                    row = None
+                if row is None:
+                    session.add(self.model(key=key, fingerprint=fingerprint, claimed_at=now,
+                                           expires_at=now + timedelta(seconds=self.ttl)))
+                    try:
+                        session.flush()
+                    except IntegrityError:
+                        # Another worker claimed it first
+                        session.rollback()
+                        continue
+                    self._prune(now)
+                    session.commit()
+                    IDEMPOTENCY_REQUESTS_TOTAL.inc('claimed')
+                    return key, None
+
+                if row.fingerprint != fingerprint:
+                    raise _mismatch()
+                if row.status is not None:
+                    IDEMPOTENCY_REQUESTS_TOTAL.inc('attached' if waited else 'replayed')
+                    return None, StoredResponse(row.status, row.content_type, row.body)
+
+            if time.monotonic() >= give_up_at:
+                raise _in_progress(wait)
+            waited = True
+            time.sleep(self.poll_interval)
+
+    def complete(self, key, response):
+        """Store the response of a claimed key."""
+        with self.app.app_context(), use_user_shard(key):
+            row = self.db.session.get(self.model, key)
+            if row is not None:
+                row.status = response.status
+                row.content_type = response.content_type
+                row.body = zlib.compress(response.body, 1)
+                self.db.session.commit()
+
+    def release(self, key):
+        """Give up a claimed key without a response, so it can be claimed again."""
+        with self.app.app_context(), use_user_shard(key):
+            self.model.query.filter_by(key=key, status=None).delete()
+            self.db.session.commit()
+        IDEMPOTENCY_REQUESTS_TOTAL.inc('released')
+
+def create_idempotency_store(app, db, model):
+    """Create the store configured by IDEMPOTENCY_STORE."""
+    config = app.config
+    backend = config['IDEMPOTENCY_STORE']
+    if backend == 'memory':
+        return MemoryIdempotencyStore(config['IDEMPOTENCY_MAX_KEYS'], config['IDEMPOTENCY_TTL'])
+    if backend == 'database':
+        return DatabaseIdempotencyStore(app, db, model, config['IDEMPOTENCY_MAX_KEYS'], config['IDEMPOTENCY_TTL'],
+                                        config['IDEMPOTENCY_CLAIM_TIMEOUT'], config['IDEMPOTENCY_POLL_INTERVAL'])
+    raise ValueError(f"Unknown idempotency store {backend!r}, expected one of {IDEMPOTENCY_STORES}")
+
+def stored_body(response):
+    """Return the uncompressed body of a StoredResponse."""
+    return zlib.decompress(response.body)
+
+def finish_claim(store, claim, response):
+    """Store a finished request's response under its key, or release the key after a server error."""
+    if response.status < 500:
+        store.complete(claim, response)
+    else:
+        store.release(claim)
+
+def claim_idempotency_key():
+    """before_request hook answering duplicates of idempotent requests; runs before admission control."""
+    store = current_app.extensions.get('idempotency')
+    header = request.headers.get(IDEMPOTENCY_HEADER)
+    if store is None or header is None or request.endpoint not in IDEMPOTENT_ENDPOINTS:
+        return None
+
+    try:
+        key = parse_key(header)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    wait = current_app.config['IDEMPOTENCY_WAIT']
+    try:
+        claim, stored = store.claim(key, request_fingerprint(request.method, request.path, request.get_data()), wait)
+    except IdempotencyConflict as e:
+        return rejection_response(e)
+
+    if stored is not None:
+        response = Response(stored_body(stored), status=stored.status, content_type=stored.content_type)
+        response.headers[REPLAYED_HEADER] = 'true'
+        return response
+    g.idempotency_claim = claim
+    return None
+
+def idempotent(view):
+    """Wrap a view to store its response under the request's claimed key."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        response = current_app.make_response(view(*args, **kwargs))
+        claim = g.pop('idempotency_claim', None)
+        if claim is not None:
+            finish_claim(current_app.extensions['idempotency'], claim,
+                         StoredResponse(response.status_code, response.content_type, response.get_data()))
+        return response
+    return wrapper
+
+def release_idempotency_key(exc):
+    # Requests that never reached the view (rejected by admission control) or raised
+    claim = g.pop('idempotency_claim', None)
+    if claim is not None:
+        current_app.extensions['idempotency'].release(claim)
+
+def init_idempotency(app, db, model):
+    """
+    Honour Idempotency-Key headers on the app's idempotent endpoints if enabled.
+
+    Must be called after the routes are registered and before
+    init_admission, so duplicates are answered without taking capacity.
+
+    Args:
+        app: The Flask application
+        db: The Flask-SQLAlchemy extension
+        model: The IdempotencyKey model used by the database store
+
+    Returns:
+        The idempotency store, or None if disabled
+    """
+    for key, value in IDEMPOTENCY_DEFAULTS.items():
+        app.config.setdefault(key, value)
+
+    if not app.config['IDEMPOTENCY_ENABLED']:
+        app.extensions['idempotency'] = None
+        return None
+
+    store = create_idempotency_store(app, db, model)
+    app.extensions['idempotency'] = store
+    for endpoint in IDEMPOTENT_ENDPOINTS:
+        app.view_functions[endpoint] = idempotent(app.view_functions[endpoint])
+    app.before_request(claim_idempotency_key)
+    app.teardown_request(release_idempotency_key)
+    return store
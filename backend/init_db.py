@@ -1,8 +1,8 @@
 """
 Initialize the database for the Flask application.
 """
-from app import app, db
+from app import create_app, init_db_command
 
-with app.app_context():
-    db.create_all()
-    print("Database tables created.")
\ No newline at end of file
+if __name__ == '__main__':
+    with create_app().app_context():
+        init_db_command()
\ No newline at end of file
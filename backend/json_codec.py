@@ -0,0 +1,197 @@
+"""
+JSON encoding for API responses and stored JSON columns.
+
+dumps() and loads() use orjson when it is installed and the stdlib json
+module otherwise; FIASCO_JSON_BACKEND ('auto', 'orjson' or 'json') forces one.
+Both backends produce compact UTF-8 JSON with the same content.
+
+A Fragment wraps text that is already encoded JSON, such as the risk factors
+stored on a RiskAssessment, and is written into the output as is, so reads
+can return stored JSON without decoding and re-encoding it.
+
+FastJSONProvider plugs the same encoder into Flask, so jsonify() and
+app.json.dumps() use it too.
+"""
+
+import json
+import os
+import re
+import secrets
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+JSON_BACKENDS = ('auto', 'orjson', 'json')
+
+# Stand-in strings for fragments on backends without native fragment support;
+# the token makes a collision with real data practically impossible
+_PLACEHOLDER_TOKEN = secrets.token_hex(8)
+_PLACEHOLDER_RE = re.compile(rb'"\\u0000' + _PLACEHOLDER_TOKEN.encode('ascii') + rb':(\d+)\\u0000"')
+
+class Fragment:
+    """
+    Already encoded JSON, written into the output unchanged.
+
+    Args:
+        data: The encoded JSON, as str or UTF-8 bytes
+    """
+
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data.encode('utf-8') if isinstance(data, str) else data
+
+    def load(self):
+        """Decode the fragment."""
+        return loads(self.data)
+
+    def __eq__(self, other):
+        return isinstance(other, Fragment) and self.data == other.data
+
+    def __repr__(self):
+        return f'Fragment({self.data!r})'
+
+def resolve_backend(name=None):
+    """
+    Return the backend to use for a configured name.
+
+    Args:
+        name: 'auto', 'orjson' or 'json' (defaults to FIASCO_JSON_BACKEND, then 'auto')
+
+    Returns:
+        'orjson' or 'json'
+    """
+    if name is None:
+        name = os.environ.get('FIASCO_JSON_BACKEND', 'auto').lower()
+    if name not in JSON_BACKENDS:
+        raise ValueError(f"Unknown JSON backend {name!r}, expected one of {JSON_BACKENDS}")
+    if name == 'orjson' and orjson is None:
+        raise ValueError("FIASCO_JSON_BACKEND=orjson but orjson is not installed")
+    if name == 'auto':
+        return 'orjson' if orjson is not None else 'json'
+    return name
+
+BACKEND = resolve_backend()
+
+def set_backend(name):
+    """Switch the backend used by this module, e.g. from tests and benchmarks."""
+    global BACKEND
+    BACKEND = resolve_backend(name)
+
+class _FragmentSplicer:
+    """Default hook replacing fragments with placeholders that are spliced in afterwards."""
+
+    __slots__ = ('fallback', 'fragments')
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+        self.fragments = []
+
+    def __call__(self, obj):
+        if isinstance(obj, Fragment):
+            self.fragments.append(obj.data)
+            return f'\x00{_PLACEHOLDER_TOKEN}:{len(self.fragments) - 1}\x00'
+        if self.fallback is not None:
+            return self.fallback(obj)
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    def splice(self, encoded):
+        if not self.fragments:
+            return encoded
+        return _PLACEHOLDER_RE.sub(lambda match: self.fragments[int(match.group(1))], encoded)
+
+def _native_fragment_default(fallback):
+    def default(obj):
+        if isinstance(obj, Fragment):
+            return orjson.Fragment(obj.data)
+        if fallback is not None:
+            return fallback(obj)
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    return default
+
+def _dumps_orjson(obj, sort_keys, default):
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    if hasattr(orjson, 'Fragment'):
+        return orjson.dumps(obj, default=_native_fragment_default(default), option=option)
+    splicer = _FragmentSplicer(default)
+    return splicer.splice(orjson.dumps(obj, default=splicer, option=option))
+
+def _dumps_json(obj, sort_keys, default, **kwargs):
+    # Indented output keeps json's ': ' and line-ending ',' like Flask's provider
+    if kwargs.get('indent') is None:
+        kwargs.setdefault('separators', (',', ':'))
+    kwargs.setdefault('ensure_ascii', False)
+    splicer = _FragmentSplicer(default)
+    encoded = json.dumps(obj, sort_keys=sort_keys, default=splicer, **kwargs).encode('utf-8')
+    return splicer.splice(encoded)
+
+def dumps(obj, sort_keys=False, default=None):
+    """
+    Encode obj as compact UTF-8 JSON.
+
+    Args:
+        obj: The value to encode; Fragments are written as is
+        sort_keys: Sort the keys of every object
+        default: Called for values the encoder does not support, returning a supported value
+
+    Returns:
+        The encoded bytes
+    """
+    if BACKEND == 'orjson':
+        try:
+            return _dumps_orjson(obj, sort_keys, default)
+        except TypeError:
+            # Values orjson refuses (e.g. integers beyond 64 bits) go through json
+            pass
+    return _dumps_json(obj, sort_keys, default)
+
+def dumps_text(obj, sort_keys=False, default=None):
+    """Like dumps, returning str, for storing in text columns."""
+    return dumps(obj, sort_keys=sort_keys, default=default).decode('utf-8')
+
+def loads(data):
+    """Decode JSON from str or bytes."""
+    if BACKEND == 'orjson':
+        return orjson.loads(data)
+    return json.loads(data)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider using this module's encoder.
+
+    Keeps Flask's key sorting and its handling of dates, dataclasses and
+    UUIDs. Pretty-printed debug output and calls with extra json.dumps
+    arguments go through the stdlib encoder.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return self._dumps(obj, **kwargs).decode('utf-8')
+
+    def dumps_bytes(self, obj):
+        """Encode obj as compact UTF-8 JSON bytes."""
+        return dumps(obj, sort_keys=self.sort_keys, default=self.default)
+
+    def _dumps(self, obj, **kwargs):
+        if not kwargs:
+            return self.dumps_bytes(obj)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        sort_keys = kwargs.pop('sort_keys', self.sort_keys)
+        default = kwargs.pop('default', self.default)
+        return _dumps_json(obj, sort_keys, default, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,334 @@
+"""
+Local HTTP stand-in for the Firecrawl API.
+
+Serves ``POST /v0/scrape`` and ``POST /v1/scrape`` with synthetic profile pages
+after a configurable latency, failing a configurable fraction of requests.
+Batch scrapes are started with ``POST /v1/batch/scrape`` and polled with
+``GET /v1/batch/scrape/<id>`` like Firecrawl's; a batch takes one latency and
+its failed URLs are reported per document. StandinScraper is a minimal client
+with the same scrape_url() and batch_scrape_urls() interface as FirecrawlApp,
+so it can be swapped in for ``crawler.firecrawl_app``. LoadDependentScraper
+simulates an upstream that slows down and then fails as it is given more
+concurrent scrapes, without HTTP.
+"""
+
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from crawler import extract_platform_and_username
+from mock_data import rng_for_url
+
+SCRAPE_PATHS = ('/v0/scrape', '/v1/scrape')
+BATCH_PATH = '/v1/batch/scrape'
+
+def synthetic_page(url):
+    """Build a deterministic fake scrape result for a profile URL."""
+    platform, username = extract_platform_and_username(url)
+    rng = rng_for_url(url)
+    followers = rng.randint(50, 100000)
+    following = rng.randint(50, 2000)
+    posts = rng.randint(10, 5000)
+    private = rng.random() < 0.3
+
+    markdown = (
+        f"# {username or 'profile'} on {platform}\n\n"
+        f"{followers:,} Followers {following:,} Following {posts} posts\n"
+    )
+    if private:
+        markdown += "\nThis account is private\nProtected Tweets\n"
+    if rng.random() < 0.2:
+        markdown += "\nLocation: Chicago, IL\n"
+
+    return {
+        'markdown': markdown,
+        'html': f"<html><body><h1>{username}</h1></body></html>",
+        'metadata': {'sourceURL': url, 'statusCode': 200},
+    }
+
+class _StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        # Keep load test output readable
+        pass
+
+    def setup(self):
+        super().setup()
+        # Runs once per connection, like the TCP and TLS handshakes of a remote API
+        standin = self.server.standin
+        standin.record_connection()
+        if standin.connect_latency_ms > 0:
+            time.sleep(standin.connect_latency_ms / 1000)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_unknown(self):
+        self._send_json(404, {'success': False, 'error': f'Unknown endpoint {self.path}'})
+
+    def do_GET(self):
+        standin = self.server.standin
+        prefix = BATCH_PATH + '/'
+        if not standin.batch or not self.path.startswith(prefix):
+            self._send_unknown()
+            return
+
+        status = standin.batch_status(self.path[len(prefix):])
+        if status is None:
+            self._send_json(404, {'success': False, 'error': 'Unknown batch'})
+            return
+        self._send_json(200, status)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'success': False, 'error': 'Invalid JSON'})
+            return
+
+        standin = self.server.standin
+        if self.path == BATCH_PATH and standin.batch:
+            self._start_batch(standin, payload)
+            return
+        if self.path not in SCRAPE_PATHS:
+            self._send_unknown()
+            return
+
+        standin.record_request()
+        standin.simulate_latency()
+
+        url = payload.get('url')
+        if standin.should_fail(url):
+            standin.record_error()
+            self._send_json(500, {'success': False, 'error': 'Simulated upstream failure'})
+            return
+
+        if not url:
+            self._send_json(400, {'success': False, 'error': 'Missing url'})
+            return
+
+        self._send_json(200, {'success': True, 'data': synthetic_page(url)})
+
+    def _start_batch(self, standin, payload):
+        urls = payload.get('urls')
+        if not urls or not isinstance(urls, list):
+            self._send_json(400, {'success': False, 'error': 'Missing urls'})
+            return
+
+        standin.record_request()
+        standin.record_batch()
+        batch_id = standin.start_batch(urls)
+        self._send_json(200, {'success': True, 'id': batch_id, 'url': f'{standin.url}{BATCH_PATH}/{batch_id}'})
+
+class _StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Accept bursts of thousands of concurrent scrapes
+    request_queue_size = 4096
+
+    def handle_error(self, request, client_address):
+        # Clients that time out or hang up before the answer are expected, not errors
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+class FirecrawlStandin:
+    """
+    A threaded local HTTP server imitating the Firecrawl scrape endpoints.
+
+    Args:
+        latency_ms: Base latency added to every scrape, and to every batch
+        jitter_ms: Random extra latency, uniformly distributed in [0, jitter_ms]
+        error_rate: Fraction of scrapes (or URLs of a batch) that fail with HTTP 500
+        fail_urls: URLs whose scrapes always fail
+        batch: Serve the batch scrape endpoints
+        connect_latency_ms: Latency added once per new connection
+        host: The interface to bind to
+        port: The port to bind to (0 picks a free port)
+    """
+
+    def __init__(self, latency_ms=50, jitter_ms=0, error_rate=0.0, fail_urls=(), batch=True,
+                 connect_latency_ms=0, host='127.0.0.1', port=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.fail_urls = set(fail_urls)
+        self.batch = batch
+        self.connect_latency_ms = connect_latency_ms
+        self.connections = 0
+        # Scrape and batch start requests; status polls are not counted
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+        self._batches = {}
+        self._lock = threading.Lock()
+        self._server = _StandinServer((host, port), _StandinHandler)
+        self._server.standin = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='firecrawl-standin', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def simulate_latency(self):
+        delay = self.latency_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def should_fail(self, url=None):
+        if url in self.fail_urls:
+            return True
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def record_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def record_batch(self):
+        with self._lock:
+            self.batches += 1
+
+    def start_batch(self, urls):
+        """Start scraping a batch in the background and return its ID."""
+        batch_id = uuid.uuid4().hex
+        with self._lock:
+            self._batches[batch_id] = {'success': True, 'status': 'scraping', 'total': len(urls),
+                                       'completed': 0, 'data': []}
+
+        def scrape():
+            self.simulate_latency()
+            data = []
+            for url in urls:
+                if self.should_fail(url):
+                    self.record_error()
+                    data.append({'metadata': {'sourceURL': url, 'statusCode': 500,
+                                              'error': 'Simulated upstream failure'}})
+                else:
+                    data.append(synthetic_page(url))
+            with self._lock:
+                self._batches[batch_id].update(status='completed', completed=len(urls), data=data)
+
+        threading.Thread(target=scrape, name='firecrawl-standin-batch', daemon=True).start()
+        return batch_id
+
+    def batch_status(self, batch_id):
+        """Return the status of a batch as served by the API, or None if unknown."""
+        with self._lock:
+            status = self._batches.get(batch_id)
+            return dict(status) if status is not None else None
+
+class StandinScraper:
+    """
+    Minimal Firecrawl-compatible client for the stand-in server.
+
+    Opens a new connection per call; it exists to exercise the crawl path,
+    not to model client-side connection handling.
+    """
+
+    def __init__(self, api_url, timeout=30):
+        parsed = urlparse(api_url)
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.timeout = timeout
+
+    def _request(self, method, path, payload=None):
+        body = json.dumps(payload) if payload is not None else None
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            payload = json.loads(response.read() or b'{}')
+        finally:
+            connection.close()
+
+        if response.status != 200 or not payload.get('success'):
+            raise Exception(f"Scrape failed with status {response.status}: {payload.get('error')}")
+        return payload
+
+    def scrape_url(self, url, formats=None, **params):
+        """Scrape a URL and return the page data, raising on failure."""
+        return self._request('POST', '/v1/scrape', {'url': url, 'formats': formats or ['markdown'], **params})['data']
+
+    def batch_scrape_urls(self, urls, formats=None, poll_interval=0.01, **params):
+        """Scrape URLs in one batch and return the completed batch status, raising if the batch fails."""
+        batch_id = self._request('POST', BATCH_PATH, {'urls': urls, 'formats': formats or ['markdown'], **params})['id']
+        while True:
+            status = self._request('GET', f'{BATCH_PATH}/{batch_id}')
+            if status['status'] == 'completed':
+                return status
+            time.sleep(poll_interval)
+
+class LoadDependentScraper:
+    """
+    In-process scraper whose latency depends on how many scrapes it is given at once.
+
+    Scrapes take base seconds while at most capacity of them run, and
+    proportionally longer beyond that, like an upstream queueing work. Scrapes
+    beyond overload concurrent ones fail at once.
+    """
+
+    def __init__(self, base=0.002, capacity=8, overload=24):
+        self.base = base
+        self.capacity = capacity
+        self.overload = overload
+        self.in_flight = 0
+        self.peak = 0
+        self.scrapes = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def scrape_url(self, url, formats=None, **params):
+        """Scrape a URL after the load-dependent latency, raising when overloaded."""
+        with self._lock:
+            self.in_flight += 1
+            self.scrapes += 1
+            in_flight = self.in_flight
+            self.peak = max(self.peak, in_flight)
+        try:
+            if in_flight > self.overload:
+                with self._lock:
+                    self.errors += 1
+                raise Exception(f"Scrape failed with status 429: {in_flight} scrapes in flight")
+            time.sleep(self.base * max(1, in_flight / self.capacity))
+            return {'markdown': url}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
@@ -0,0 +1,449 @@
+"""
+Load-test harness for the Flask API.
+
+Starts the app under a threaded WSGI server, swaps the crawler's Firecrawl
+client for the local stand-in, and drives mixed POST/GET /profiles traffic at
+a target request rate. Requests are scheduled open-loop, so latency is
+measured from when a request was due rather than when a worker picked it up.
+
+Usage (from the backend directory):
+    python -m loadtest.runner run --rps 50 --duration 30 --latency-ms 200
+    python -m loadtest.runner run --rps 100 --post-ratio 0.7 --latency-ms 1000 --max-crawls 4
+    python -m loadtest.runner run --rps 100 --post-ratio 0.7 --latency-ms 1000 --no-admission
+    python -m loadtest.runner compare loadtest/results/a.json loadtest/results/b.json
+"""
+
+import argparse
+import contextlib
+import http.client
+import json
+import math
+import os
+import queue
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from werkzeug.serving import make_server
+
+from async_firecrawl import AsyncFirecrawlClient
+from loadtest.firecrawl_standin import FirecrawlStandin, StandinScraper
+
+POST_ENDPOINT = 'POST /profiles'
+GET_ENDPOINT = 'GET /profiles/<user_id>'
+
+# Statuses sent by admission control when it sheds load
+SHED_STATUSES = (429, 503)
+
+PROFILE_DOMAINS = ('twitter.com', 'instagram.com', 'facebook.com', 'linkedin.com', 'tiktok.com')
+
+DEFAULT_CONFIG = {
+    'rps': 20.0,
+    'duration': 10.0,
+    'post_ratio': 0.3,
+    'refresh_ratio': 0.3,
+    'urls_per_post': 3,
+    'url_pool': 1000,
+    'workers': 32,
+    'latency_ms': 100,
+    'jitter_ms': 50,
+    'error_rate': 0.0,
+    # Sent as deadline_ms with each POST when non-zero
+    'deadline_ms': 0,
+    'timeout': 60.0,
+    'seed': 0,
+}
+
+def percentile(sorted_values, fraction):
+    """Return the nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def histogram_quantile(bounds, bucket_counts, fraction):
+    """Estimate a quantile from histogram buckets as the upper bound of the matching bucket."""
+    total = sum(bucket_counts)
+    if not total:
+        return None
+    threshold = fraction * total
+    cumulative = 0
+    for bound, count in zip(tuple(bounds) + (float('inf'),), bucket_counts):
+        cumulative += count
+        if cumulative >= threshold:
+            return bound
+    return float('inf')
+
+def git_commit():
+    """Return the short hash of the current commit, or 'unknown'."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+@contextlib.contextmanager
+def serve_app(app, host='127.0.0.1', port=0):
+    """Run a WSGI app on a threaded server for the duration of the block, yielding its base URL."""
+    server = make_server(host, port, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name='loadtest-wsgi', daemon=True)
+    thread.start()
+    try:
+        yield f'http://{host}:{server.server_port}'
+    finally:
+        server.shutdown()
+        thread.join()
+
+@contextlib.contextmanager
+def standin_crawler(standin):
+    """Point the crawler at the stand-in instead of the real Firecrawl client."""
+    import crawler
+
+    previous = (crawler.firecrawl_app, crawler.async_firecrawl_app, crawler.FIRECRAWL_API_KEY)
+    crawler.firecrawl_app = StandinScraper(standin.url)
+    crawler.async_firecrawl_app = AsyncFirecrawlClient('standin', standin.url)
+    crawler.FIRECRAWL_API_KEY = 'standin'
+    try:
+        yield
+    finally:
+        crawler.firecrawl_app, crawler.async_firecrawl_app, crawler.FIRECRAWL_API_KEY = previous
+
+class _Client:
+    """A keep-alive HTTP connection owned by one worker thread."""
+
+    def __init__(self, base_url, timeout):
+        host, port = base_url.split('//', 1)[1].split(':')
+        self.host = host
+        self.port = int(port)
+        self.timeout = timeout
+        self.connection = None
+
+    def request(self, method, path, body=None):
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                headers = {'Content-Type': 'application/json'} if body is not None else {}
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # Stale keep-alive connection; reconnect once
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+
+class TrafficGenerator:
+    """Schedule and send mixed POST/GET traffic, collecting one sample per request."""
+
+    def __init__(self, base_url, config):
+        self.base_url = base_url
+        self.config = config
+        self.rng = random.Random(config['seed'])
+        self.user_ids = []
+        self.user_ids_lock = threading.Lock()
+        self.samples = []
+        self.samples_lock = threading.Lock()
+        self.jobs = queue.Queue()
+
+    def _random_urls(self):
+        return [
+            f"https://{self.rng.choice(PROFILE_DOMAINS)}/user{self.rng.randrange(self.config['url_pool'])}"
+            for _ in range(self.config['urls_per_post'])
+        ]
+
+    def _next_job(self):
+        with self.user_ids_lock:
+            known = list(self.user_ids[-1000:])
+
+        if not known or self.rng.random() < self.config['post_ratio']:
+            body = {'urls': self._random_urls()}
+            if self.config['deadline_ms']:
+                body['deadline_ms'] = self.config['deadline_ms']
+            if known and self.rng.random() < self.config['refresh_ratio']:
+                body['user_id'] = self.rng.choice(known)
+            return POST_ENDPOINT, 'POST', '/profiles', json.dumps(body)
+
+        return GET_ENDPOINT, 'GET', f'/profiles/{self.rng.choice(known)}', None
+
+    def _worker(self):
+        client = _Client(self.base_url, self.config['timeout'])
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            due, (endpoint, method, path, body) = job
+
+            error = None
+            status = None
+            lock_errors = 0
+            try:
+                status, payload = client.request(method, path, body)
+                if endpoint == POST_ENDPOINT and status == 200:
+                    data = json.loads(payload)
+                    with self.user_ids_lock:
+                        self.user_ids.append(data['user_id'])
+                    lock_errors = sum(
+                        1 for result in data.get('results', {}).values()
+                        if 'locked' in str(result.get('error', ''))
+                    )
+            except Exception as e:
+                error = type(e).__name__
+
+            latency = time.perf_counter() - due
+            with self.samples_lock:
+                self.samples.append((endpoint, status, latency, error, lock_errors))
+
+    def run(self):
+        """Send traffic for the configured duration and return the elapsed wall time."""
+        workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.config['workers'])]
+        for worker in workers:
+            worker.start()
+
+        interval = 1.0 / self.config['rps']
+        total = int(self.config['rps'] * self.config['duration'])
+        start = time.perf_counter()
+
+        for index in range(total):
+            due = start + index * interval
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self.jobs.put((due, self._next_job()))
+
+        for _ in workers:
+            self.jobs.put(None)
+        for worker in workers:
+            worker.join()
+
+        return time.perf_counter() - start
+
+def summarize_samples(samples):
+    """Summarize per-endpoint latency percentiles and error rates."""
+    endpoints = {}
+    for endpoint in sorted({sample[0] for sample in samples}):
+        endpoint_samples = [sample for sample in samples if sample[0] == endpoint]
+        latencies = sorted(sample[2] * 1000 for sample in endpoint_samples)
+        errors = sum(1 for sample in endpoint_samples if sample[3] or (sample[1] or 0) >= 500)
+        shed = sum(1 for sample in endpoint_samples if sample[1] in SHED_STATUSES)
+        status_counts = {}
+        for sample in endpoint_samples:
+            key = str(sample[1]) if sample[1] is not None else sample[3]
+            status_counts[key] = status_counts.get(key, 0) + 1
+
+        endpoints[endpoint] = {
+            'count': len(endpoint_samples),
+            'errors': errors,
+            'error_rate': errors / len(endpoint_samples),
+            'shed': shed,
+            'p50_ms': percentile(latencies, 0.50),
+            'p90_ms': percentile(latencies, 0.90),
+            'p99_ms': percentile(latencies, 0.99),
+            'max_ms': latencies[-1],
+            'status_counts': status_counts,
+        }
+    return endpoints
+
+def _commit_stats(histogram):
+    bucket_totals = [0] * (len(histogram.buckets) + 1)
+    total_sum, total_count = 0.0, 0
+    for labelvalues, (bucket_counts, series_sum, series_count) in histogram.collect().items():
+        if labelvalues[0] != 'commit':
+            continue
+        bucket_totals = [a + b for a, b in zip(bucket_totals, bucket_counts)]
+        total_sum += series_sum
+        total_count += series_count
+    return bucket_totals, total_sum, total_count
+
+def run_load_test(app, config):
+    """
+    Run one load test against an app and return the report.
+
+    Args:
+        app: The Flask application, with its database tables already created
+        config: Load test settings; missing keys fall back to DEFAULT_CONFIG
+
+    Returns:
+        A JSON-serialisable report dict
+    """
+    from admission import ADMISSION_REJECTED_TOTAL
+    from app import PROFILE_WRITES_TOTAL, SUBMIT_STAGE_SECONDS
+
+    config = {**DEFAULT_CONFIG, **config}
+    write_errors_before = PROFILE_WRITES_TOTAL.get('error')
+    commits_before = _commit_stats(SUBMIT_STAGE_SECONDS)
+    pools = ('crawls', 'urls', 'reads')
+    rejected_before = {pool: ADMISSION_REJECTED_TOTAL.get(pool) for pool in pools}
+
+    standin = FirecrawlStandin(config['latency_ms'], config['jitter_ms'], config['error_rate'])
+    with standin, standin_crawler(standin), serve_app(app) as base_url:
+        generator = TrafficGenerator(base_url, config)
+        elapsed = generator.run()
+
+    samples = generator.samples
+    commits_after = _commit_stats(SUBMIT_STAGE_SECONDS)
+    commit_buckets = [a - b for a, b in zip(commits_after[0], commits_before[0])]
+    commit_count = commits_after[2] - commits_before[2]
+    commit_sum = commits_after[1] - commits_before[1]
+    p99_commit = histogram_quantile(SUBMIT_STAGE_SECONDS.buckets, commit_buckets, 0.99)
+
+    errors = sum(endpoint['errors'] for endpoint in summarize_samples(samples).values()) if samples else 0
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'git_commit': git_commit(),
+        'config': config,
+        'elapsed_s': elapsed,
+        'requests': len(samples),
+        'achieved_rps': len(samples) / elapsed if elapsed else 0,
+        'errors': errors,
+        'error_rate': errors / len(samples) if samples else 0,
+        'endpoints': summarize_samples(samples) if samples else {},
+        'db': {
+            'lock_errors': sum(sample[4] for sample in samples),
+            'write_errors': PROFILE_WRITES_TOTAL.get('error') - write_errors_before,
+            'commits': commit_count,
+            'commit_mean_ms': commit_sum / commit_count * 1000 if commit_count else None,
+            'commit_p99_ms_upper_bound': p99_commit * 1000 if p99_commit not in (None, float('inf')) else p99_commit,
+        },
+        'standin': {'requests': standin.requests, 'errors': standin.errors},
+        'admission': admission_report(app, {
+            pool: ADMISSION_REJECTED_TOTAL.get(pool) - rejected_before[pool] for pool in pools
+        }),
+    }
+
+def admission_report(app, rejected):
+    """Describe the app's admission limits and how many requests each pool rejected."""
+    controller = app.extensions.get('admission')
+    if controller is None:
+        return {'enabled': False}
+    return {
+        'enabled': True,
+        'limits': {pool: stats['limit'] for pool, stats in controller.stats().items()},
+        'rejected': rejected,
+    }
+
+def save_report(report, directory):
+    """Write a report to a timestamped JSON file and return its path."""
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%dT%H%M%S')
+    path = os.path.join(directory, f"{stamp}-{report['git_commit']}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return path
+
+def format_report(report):
+    """Render a report as a short human-readable summary."""
+    lines = [
+        f"commit {report['git_commit']}: {report['requests']} requests in {report['elapsed_s']:.1f}s "
+        f"({report['achieved_rps']:.1f} rps), error rate {report['error_rate']:.2%}",
+    ]
+    for endpoint, stats in report['endpoints'].items():
+        lines.append(
+            f"  {endpoint:<24} n={stats['count']:<6} p50={stats['p50_ms']:.1f}ms p90={stats['p90_ms']:.1f}ms "
+            f"p99={stats['p99_ms']:.1f}ms max={stats['max_ms']:.1f}ms errors={stats['error_rate']:.2%}"
+            f" shed={stats.get('shed', 0)}"
+        )
+    admission = report.get('admission', {})
+    if admission.get('enabled'):
+        limits = ' '.join(f"{pool}={limit}" for pool, limit in admission['limits'].items())
+        rejected = ' '.join(f"{pool}={count}" for pool, count in admission['rejected'].items())
+        lines.append(f"  admission: limits {limits}; rejected {rejected}")
+    elif admission:
+        lines.append("  admission: disabled")
+    db_stats = report['db']
+    commit_mean = db_stats['commit_mean_ms']
+    lines.append(
+        f"  db: lock errors={db_stats['lock_errors']} write errors={db_stats['write_errors']} "
+        f"commits={db_stats['commits']} commit mean="
+        + (f"{commit_mean:.2f}ms" if commit_mean is not None else "n/a")
+    )
+    return '\n'.join(lines)
+
+def compare_reports(before, after):
+    """Render the key differences between two reports."""
+    def delta(old, new):
+        if old in (None, 0) or new is None:
+            return ''
+        return f" ({(new - old) / old:+.1%})"
+
+    lines = [f"{before['git_commit']} -> {after['git_commit']}"]
+    lines.append(f"  achieved rps: {before['achieved_rps']:.1f} -> {after['achieved_rps']:.1f}"
+                 f"{delta(before['achieved_rps'], after['achieved_rps'])}")
+    lines.append(f"  error rate: {before['error_rate']:.2%} -> {after['error_rate']:.2%}")
+    for endpoint in sorted(set(before['endpoints']) | set(after['endpoints'])):
+        old = before['endpoints'].get(endpoint, {})
+        new = after['endpoints'].get(endpoint, {})
+        for key in ('p50_ms', 'p99_ms'):
+            old_value, new_value = old.get(key), new.get(key)
+            if old_value is None or new_value is None:
+                continue
+            lines.append(f"  {endpoint} {key}: {old_value:.1f} -> {new_value:.1f}{delta(old_value, new_value)}")
+    lines.append(f"  db lock errors: {before['db']['lock_errors']} -> {after['db']['lock_errors']}")
+    return '\n'.join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run a load test')
+    for key, value in DEFAULT_CONFIG.items():
+        run_parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    run_parser.add_argument('--database-url', help='Database to load (defaults to a temporary SQLite file)')
+    run_parser.add_argument('--output', default=os.path.join(os.path.dirname(__file__), 'results'))
+    run_parser.add_argument('--log-level', default='CRITICAL', help='Server log level during the run')
+    run_parser.add_argument('--max-crawls', type=int, help='Admission limit on in-flight crawl requests')
+    run_parser.add_argument('--max-queued-urls', type=int, help='Admission limit on URLs of in-flight crawls')
+    run_parser.add_argument('--max-reads', type=int, help='Admission limit on in-flight profile reads')
+    run_parser.add_argument('--no-admission', action='store_true', help='Run without admission control')
+
+    compare_parser = subparsers.add_parser('compare', help='Compare two saved reports')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        with open(args.before) as f:
+            before = json.load(f)
+        with open(args.after) as f:
+            after = json.load(f)
+        print(compare_reports(before, after))
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        from app import create_app, db
+        from log_config import configure_logging
+
+        configure_logging(level=args.log_level.upper())
+        app_config = {
+            'SQLALCHEMY_DATABASE_URI': args.database_url or f"sqlite:///{os.path.join(tmpdir, 'loadtest.db')}",
+        }
+        if args.no_admission:
+            app_config['ADMISSION_ENABLED'] = False
+        for key, value in (('ADMISSION_MAX_CRAWLS', args.max_crawls),
+                           ('ADMISSION_MAX_QUEUED_URLS', args.max_queued_urls),
+                           ('ADMISSION_MAX_READS', args.max_reads)):
+            if value is not None:
+                app_config[key] = value
+        app = create_app(app_config)
+        with app.app_context():
+            db.create_all()
+
+        config = {key: getattr(args, key) for key in DEFAULT_CONFIG}
+        report = run_load_test(app, config)
+
+    path = save_report(report, args.output)
+    print(format_report(report))
+    print(f"Saved report to {path}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
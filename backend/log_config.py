@@ -0,0 +1,178 @@
+"""
+Logging configuration for the backend.
+
+By default this matches the previous ``logging.basicConfig(level=INFO)`` setup.
+Environment variables switch on the structured mode:
+
+    FIASCO_LOG_FORMAT       'text' (default) or 'json'
+    FIASCO_LOG_ASYNC        '1' to hand records to a background thread
+    FIASCO_LOG_SAMPLE_RATE  fraction of per-URL info lines to keep (default 1.0)
+    FIASCO_LOG_LEVEL        log level name (default INFO)
+
+Messages use lazy %-style arguments, so a record below the log level is never
+formatted, and per-URL lines dropped by SampledLogger never create a record.
+In async mode, formatting and handler I/O happen on the listener thread
+instead of the request thread.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+crawl_id_var = contextvars.ContextVar('crawl_id', default=None)
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+# Attributes present on every LogRecord; anything else was passed via extra=
+_STANDARD_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {
+    'message', 'asctime', 'crawl_id', 'request_id'
+}
+
+# Fraction of per-URL lines kept by SampledLogger, set by configure_logging
+_sample_rate = 1.0
+
+class SampledLogger:
+    """
+    Logger wrapper for high-volume per-URL lines.
+
+    A fraction of calls is dropped before a LogRecord is even created, which
+    is where most of the cost of a logging call goes.
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    def _sample(self):
+        return _sample_rate >= 1.0 or random.random() < _sample_rate
+
+    def debug(self, msg, *args, **kwargs):
+        if self.logger.isEnabledFor(logging.DEBUG) and self._sample():
+            self.logger.log(logging.DEBUG, msg, *args, stacklevel=2, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        if self.logger.isEnabledFor(logging.INFO) and self._sample():
+            self.logger.log(logging.INFO, msg, *args, stacklevel=2, **kwargs)
+
+class ContextFilter(logging.Filter):
+    """Attach the current crawl and request ids to every record."""
+
+    def filter(self, record):
+        record.crawl_id = crawl_id_var.get()
+        record.request_id = request_id_var.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects including any extra fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+
+        crawl_id = getattr(record, 'crawl_id', None)
+        if crawl_id:
+            entry['crawl_id'] = crawl_id
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+
+        return json.dumps(entry, default=str)
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that leaves message formatting to the listener thread.
+
+    The stdlib QueueHandler formats the message before enqueueing it so that
+    records can be pickled. Our queue is in-process, so only the traceback
+    (which would keep frames alive) is rendered up front.
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_listener = None
+
+def configure_logging(log_format=None, async_logging=None, sample_rate=None, level=None, stream=None):
+    """
+    Configure the root logger.
+
+    Arguments default to the FIASCO_LOG_* environment variables.
+
+    Args:
+        log_format: 'text' or 'json'
+        async_logging: Whether to write records from a background thread
+        sample_rate: Fraction of per-URL lines to keep (see SampledLogger)
+        level: The root log level
+        stream: The stream to write to (defaults to stderr)
+
+    Returns:
+        The handler attached to the root logger
+    """
+    global _listener, _sample_rate
+
+    if log_format is None:
+        log_format = os.environ.get('FIASCO_LOG_FORMAT', 'text').lower()
+    if async_logging is None:
+        async_logging = os.environ.get('FIASCO_LOG_ASYNC', '').lower() in ('1', 'true', 'yes')
+    if sample_rate is None:
+        sample_rate = float(os.environ.get('FIASCO_LOG_SAMPLE_RATE', '1.0'))
+    if level is None:
+        level = os.environ.get('FIASCO_LOG_LEVEL', 'INFO').upper()
+
+    shutdown_logging()
+
+    output_handler = logging.StreamHandler(stream or sys.stderr)
+    if log_format == 'json':
+        output_handler.setFormatter(JsonFormatter())
+    else:
+        output_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+
+    if async_logging:
+        handler = LazyQueueHandler(queue.SimpleQueue())
+        _listener = logging.handlers.QueueListener(handler.queue, output_handler, respect_handler_level=True)
+        _listener.start()
+    else:
+        handler = output_handler
+
+    # Filters run on the calling thread, so ids are captured before queueing
+    handler.addFilter(ContextFilter())
+    _sample_rate = sample_rate
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    return handler
+
+def shutdown_logging():
+    """Stop the background listener, flushing any queued records."""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,297 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition output.
+
+Counters, gauges and histograms are kept in plain dicts keyed by label values
+and guarded by a per-metric lock, so recording a sample costs a lock, a dict
+lookup and (for histograms) a bisect. Crawl stages are timed through
+StageTimer, which collects stage durations while a crawl runs and records them
+once the final data source is known.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+
+# Default latency buckets in seconds, from 1ms up to 30s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+class _Metric:
+    """Base class holding the name, help text and label names of a metric."""
+
+    metric_type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _check_labels(self, labelvalues):
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labelvalues}")
+
+    def clear(self):
+        """Drop all recorded samples."""
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        """Return the metric in Prometheus text exposition format."""
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.metric_type}',
+        ]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}')
+        return '\n'.join(lines)
+
+class Counter(_Metric):
+    """A monotonically increasing counter."""
+
+    metric_type = 'counter'
+
+    def inc(self, *labelvalues, amount=1):
+        """Increase the counter for the given label values."""
+        self._check_labels(labelvalues)
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def get(self, *labelvalues):
+        """Return the current value for the given label values."""
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+class Gauge(_Metric):
+    """A value that can go up and down."""
+
+    metric_type = 'gauge'
+
+    def set(self, value, *labelvalues):
+        """Set the gauge for the given label values."""
+        self._check_labels(labelvalues)
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def inc(self, *labelvalues, amount=1):
+        """Increase the gauge for the given label values."""
+        self._check_labels(labelvalues)
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def dec(self, *labelvalues, amount=1):
+        """Decrease the gauge for the given label values."""
+        self.inc(*labelvalues, amount=-amount)
+
+    def get(self, *labelvalues):
+        """Return the current value for the given label values."""
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+class _HistogramTimer:
+    """Context manager that observes the elapsed time into a histogram."""
+
+    __slots__ = ('_histogram', '_labelvalues', '_start')
+
+    def __init__(self, histogram, labelvalues):
+        self._histogram = histogram
+        self._labelvalues = labelvalues
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.observe(time.perf_counter() - self._start, *self._labelvalues)
+
+class Histogram(_Metric):
+    """A cumulative histogram of observed values."""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labelvalues):
+        """Record a single observation for the given label values."""
+        self._check_labels(labelvalues)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labelvalues)
+            if series is None:
+                # Per-bucket counts (plus +Inf), sum, count
+                series = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *labelvalues):
+        """Return a context manager that observes the duration of its block."""
+        return _HistogramTimer(self, labelvalues)
+
+    def collect(self):
+        """Return a snapshot of (bucket_counts, sum, count) for every label combination."""
+        with self._lock:
+            return {labelvalues: (list(series[0]), series[1], series[2])
+                    for labelvalues, series in self._values.items()}
+
+    def get_count(self, *labelvalues):
+        """Return the number of observations for the given label values."""
+        with self._lock:
+            series = self._values.get(labelvalues)
+            return series[2] if series else 0
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.metric_type}',
+        ]
+        items = sorted(self.collect().items())
+        for labelvalues, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labelvalues, le)} {cumulative}')
+            label_str = _format_labels(self.labelnames, labelvalues)
+            lines.append(f'{self.name}_sum{label_str} {_format_value(total)}')
+            lines.append(f'{self.name}_count{label_str} {count}')
+        return '\n'.join(lines)
+
+class MetricsRegistry:
+    """A collection of metrics that can be rendered together."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} is already registered with a different definition")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """Create or return a registered counter."""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        """Create or return a registered gauge."""
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Create or return a registered histogram."""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def clear(self):
+        """Drop recorded samples from every metric, keeping the definitions."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+    def render(self):
+        """Render every metric in Prometheus text exposition format."""
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+# Content type for the text exposition format
+CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+_current_stage_timer = contextvars.ContextVar('current_stage_timer', default=None)
+
+class _Stage:
+    """Context manager that times one stage for the active StageTimer."""
+
+    __slots__ = ('_timer', '_name', '_start')
+
+    def __init__(self, timer, name):
+        self._timer = timer
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._timer is not None:
+            self._timer.durations.append((self._name, time.perf_counter() - self._start))
+
+class StageTimer:
+    """
+    Collect stage durations for one unit of work and record them together.
+
+    Durations are buffered until finish() is called with the platform and
+    data source, so every stage ends up labelled with the final outcome.
+    Stages may nest; each one is recorded with its own wall-clock time.
+    """
+
+    __slots__ = ('histogram', 'counter', 'durations', '_start', '_token')
+
+    def __init__(self, histogram, counter=None):
+        self.histogram = histogram
+        self.counter = counter
+        self.durations = []
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._token = _current_stage_timer.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_stage_timer.reset(self._token)
+
+    def add(self, name, duration):
+        """
+        Add a stage timed outside this timer, such as a scrape shared by
+        several crawls; it also counts towards the total.
+        """
+        self.durations.append((name, duration))
+        self._start -= duration
+
+    def finish(self, platform, data_source):
+        """Record every buffered stage plus the total duration."""
+        total = time.perf_counter() - self._start
+        histogram = self.histogram
+        for name, duration in self.durations:
+            histogram.observe(duration, name, platform, data_source)
+        histogram.observe(total, 'total', platform, data_source)
+        if self.counter is not None:
+            self.counter.inc(platform, data_source)
+        self.durations = []
+
+def stage(name):
+    """
+    Time a named stage of the StageTimer active in the current context.
+
+    Outside of a StageTimer this only costs a context variable lookup and two
+    clock reads.
+    """
+    return _Stage(_current_stage_timer.get(), name)
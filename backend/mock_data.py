@@ -0,0 +1,254 @@
+"""
+Seedable mock profile generation.
+
+Mock fields are described by small per-platform spec tables, so generating a
+profile only draws the values for the requested platform. Every generator
+takes a ``random.Random``-compatible rng; rng_for_url() derives one from the
+URL so the same URL always produces the same profile. generate_mock_columns()
+produces many profiles at once as columns, using NumPy when it is installed.
+"""
+
+import hashlib
+import random
+from datetime import datetime, timedelta
+
+# NumPy is imported on first bulk generation, see load_numpy()
+_numpy = None
+
+BOOL = (True, False)
+
+# Field kinds: ('choice', options), ('int', low, high), ('float2', low, high),
+# ('days_ago', low, high). Integer bounds are inclusive, as with randint.
+PRIVACY_SPECS = {
+    'twitter': (
+        ('account_privacy', 'choice', ('public', 'private')),
+        ('who_can_message', 'choice', ('everyone', 'followers only', 'no one')),
+        ('location_sharing', 'choice', BOOL),
+        ('data_personalization', 'choice', BOOL),
+        ('tagged_photo_review', 'choice', BOOL),
+    ),
+    'facebook': (
+        ('profile_visibility', 'choice', ('public', 'friends', 'friends of friends', 'only me')),
+        ('friend_list_visibility', 'choice', ('public', 'friends', 'only me')),
+        ('future_post_privacy', 'choice', ('public', 'friends', 'only me')),
+        ('tagged_photo_review', 'choice', BOOL),
+        ('face_recognition', 'choice', BOOL),
+    ),
+    'instagram': (
+        ('account_privacy', 'choice', ('public', 'private')),
+        ('activity_status', 'choice', BOOL),
+        ('story_sharing', 'choice', ('public', 'close friends only')),
+        ('mentioned_story_sharing', 'choice', BOOL),
+        ('data_sharing_with_partners', 'choice', BOOL),
+    ),
+    'linkedin': (
+        ('profile_visibility', 'choice', ('public', 'connections only')),
+        ('connection_visibility', 'choice', ('public', 'connections only')),
+        ('profile_photo_visibility', 'choice', ('public', 'connections only')),
+        ('active_status', 'choice', BOOL),
+        ('profile_edit_notifications', 'choice', BOOL),
+    ),
+    'tiktok': (
+        ('account_privacy', 'choice', ('public', 'private')),
+        ('comment_permissions', 'choice', ('everyone', 'friends', 'no one')),
+        ('duet_permissions', 'choice', ('everyone', 'friends', 'no one')),
+        ('stitch_permissions', 'choice', ('everyone', 'friends', 'no one')),
+        ('download_permissions', 'choice', BOOL),
+    ),
+}
+
+# Privacy settings for platforms not specifically listed
+DEFAULT_PRIVACY_SPEC = (
+    ('account_privacy', 'choice', ('public', 'private')),
+    ('content_visibility', 'choice', ('public', 'followers/friends', 'private')),
+    ('message_permissions', 'choice', ('everyone', 'followers/friends', 'no one')),
+    ('data_usage_consent', 'choice', BOOL),
+    ('targeted_ads', 'choice', BOOL),
+)
+
+# Activity metrics common to every platform
+COMMON_ACTIVITY_SPEC = (
+    ('post_count', 'int', 10, 500),
+    ('follower_count', 'int', 50, 10000),
+    ('following_count', 'int', 50, 1000),
+    ('last_active', 'days_ago', 0, 30),
+    ('account_created', 'days_ago', 365, 3650),
+    ('posts_per_month', 'int', 1, 30),
+    ('mentions_other_users', 'int', 0, 100),
+    ('hashtags_used', 'int', 0, 200),
+    ('engagement_rate', 'float2', 0.5, 15.0),
+    ('posts_with_location', 'int', 0, 50),
+)
+
+PLATFORM_ACTIVITY_SPECS = {
+    'twitter': (
+        ('retweet_count', 'int', 10, 500),
+        ('like_count', 'int', 50, 5000),
+        ('lists_count', 'int', 0, 20),
+        ('verification_status', 'choice', BOOL),
+        ('tweets_with_media', 'int', 0, 100),
+    ),
+    'facebook': (
+        ('friend_count', 'int', 50, 2000),
+        ('page_likes', 'int', 10, 500),
+        ('group_memberships', 'int', 0, 50),
+        ('events_attended', 'int', 0, 100),
+        ('photos_uploaded', 'int', 0, 300),
+    ),
+    'instagram': (
+        ('average_likes', 'int', 10, 500),
+        ('highlight_reels', 'int', 0, 20),
+        ('saved_posts', 'int', 0, 200),
+        ('tagged_photos', 'int', 0, 100),
+        ('stories_posted', 'int', 0, 1000),
+    ),
+    'linkedin': (
+        ('connections', 'int', 50, 2000),
+        ('endorsements', 'int', 0, 100),
+        ('articles_published', 'int', 0, 50),
+        ('skills_listed', 'int', 0, 50),
+        ('recommendations', 'int', 0, 20),
+    ),
+    'tiktok': (
+        ('video_count', 'int', 10, 300),
+        ('total_likes', 'int', 1000, 1000000),
+        ('average_watch_time', 'int', 5, 30),
+        ('completion_rate', 'float2', 0.2, 0.9),
+        ('most_viewed_video', 'int', 1000, 1000000),
+    ),
+}
+
+def load_numpy():
+    """Import NumPy on first use, returning None when it is not installed."""
+    global _numpy
+
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:  # pragma: no cover - exercised when NumPy is not installed
+            numpy = False
+        _numpy = numpy
+    return _numpy or None
+
+def __getattr__(name):
+    # Keeps mock_data.np available without importing NumPy at module import
+    if name == 'np':
+        return load_numpy()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def privacy_spec(platform):
+    """Return the privacy settings spec for a platform."""
+    return PRIVACY_SPECS.get(platform, DEFAULT_PRIVACY_SPEC)
+
+def activity_spec(platform):
+    """Return the activity data spec for a platform."""
+    return COMMON_ACTIVITY_SPEC + PLATFORM_ACTIVITY_SPECS.get(platform, ())
+
+def rng_for_url(url, seed=0):
+    """
+    Return a random generator seeded from a URL.
+
+    Args:
+        url: The profile URL
+        seed: A run-wide seed mixed into the per-URL seed
+
+    Returns:
+        A random.Random instance that always yields the same values for the same URL and seed
+    """
+    digest = hashlib.blake2b(f'{seed}:{url}'.encode('utf-8'), digest_size=8).digest()
+    return random.Random(int.from_bytes(digest, 'big'))
+
+def _draw(field, rng, now):
+    kind = field[1]
+    if kind == 'choice':
+        return rng.choice(field[2])
+    if kind == 'int':
+        return rng.randint(field[2], field[3])
+    if kind == 'float2':
+        return round(rng.uniform(field[2], field[3]), 2)
+    if kind == 'days_ago':
+        return (now - timedelta(days=rng.randint(field[2], field[3]))).strftime('%Y-%m-%d')
+    raise ValueError(f"Unknown mock field kind: {kind}")
+
+def generate_from_spec(spec, rng=random, now=None):
+    """
+    Generate a dict of mock values from a field spec.
+
+    Args:
+        spec: A tuple of field definitions
+        rng: A random.Random-compatible generator (defaults to the global one)
+        now: The reference time for date fields (defaults to datetime.now())
+
+    Returns:
+        A dict mapping each field name to a generated value
+    """
+    if now is None:
+        now = datetime.now()
+    return {field[0]: _draw(field, rng, now) for field in spec}
+
+def generate_privacy_settings(platform, rng=random):
+    """Generate mock privacy settings for a single platform."""
+    return generate_from_spec(privacy_spec(platform), rng)
+
+def generate_activity_data(platform, rng=random, now=None):
+    """Generate mock activity data for a single platform."""
+    return generate_from_spec(activity_spec(platform), rng, now)
+
+def _numpy_column(np, field, size, gen, now):
+    kind = field[1]
+    if kind == 'choice':
+        options = field[2]
+        indexes = gen.integers(0, len(options), size)
+        if options is BOOL:
+            return indexes == 0
+        return np.asarray(options, dtype=object)[indexes]
+    if kind == 'int':
+        return gen.integers(field[2], field[3] + 1, size)
+    if kind == 'float2':
+        return np.round(gen.uniform(field[2], field[3], size), 2)
+    if kind == 'days_ago':
+        days = gen.integers(field[2], field[3] + 1, size)
+        today = np.datetime64(now.date(), 'D')
+        return (today - days.astype('timedelta64[D]')).astype(str)
+    raise ValueError(f"Unknown mock field kind: {kind}")
+
+def generate_mock_columns(platform, count, seed=0, now=None, use_numpy=True):
+    """
+    Generate mock privacy settings and activity data for many profiles at once.
+
+    Values are returned column by column, which is the cheapest layout to
+    produce and to bulk insert. With NumPy, columns are ndarrays; without it
+    they are lists. The two paths are each deterministic for a given seed but
+    do not produce the same values.
+
+    Args:
+        platform: The platform to generate profiles for
+        count: The number of profiles to generate
+        seed: The seed for the generator
+        now: The reference time for date fields (defaults to datetime.now())
+        use_numpy: Set to False to force the pure Python path
+
+    Returns:
+        A tuple of (privacy_columns, activity_columns), each a dict of field name to column
+    """
+    if now is None:
+        now = datetime.now()
+
+    np = load_numpy() if use_numpy else None
+    if np is not None:
+        gen = np.random.default_rng(seed)
+        privacy = {field[0]: _numpy_column(np, field, count, gen, now) for field in privacy_spec(platform)}
+        activity = {field[0]: _numpy_column(np, field, count, gen, now) for field in activity_spec(platform)}
+        return privacy, activity
+
+    rng = random.Random(seed)
+    privacy = {field[0]: [_draw(field, rng, now) for _ in range(count)] for field in privacy_spec(platform)}
+    activity = {field[0]: [_draw(field, rng, now) for _ in range(count)] for field in activity_spec(platform)}
+    return privacy, activity
+
+def iter_column_rows(columns):
+    """Yield one dict per row from a dict of equal-length columns."""
+    keys = list(columns)
+    values = [column.tolist() if hasattr(column, 'tolist') else column for column in columns.values()]
+    for row in zip(*values):
+        yield dict(zip(keys, row))
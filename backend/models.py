@@ -2,10 +2,18 @@
 Database models for the Flask application.
 """
 from flask_sqlalchemy import SQLAlchemy
-import json
+from sqlalchemy import inspect, text
 from datetime import datetime
+from json_codec import Fragment, dumps_text, loads
+from sharding import ShardedSession, shard_engines
 
-db = SQLAlchemy()
+# The session routes queries to the current user's shard when sharding is on (see sharding)
+db = SQLAlchemy(session_options={'class_': ShardedSession})
+
+# Profile.to_dict projection returning every field
+ALL_PROFILE_FIELDS = dict.fromkeys(
+    ('platform', 'username', 'timestamp', 'privacy_settings', 'activity_data', 'risk_assessment')
+)
 
 class User(db.Model):
     """Model for user data."""
@@ -33,6 +41,14 @@ class Profile(db.Model):
     url = db.Column(db.String(255), nullable=False)
     platform = db.Column(db.String(50))
     username = db.Column(db.String(100))
+    # Normalized username for search (see search.normalize_username)
+    username_key = db.Column(db.String(100))
+    # Copy of the risk assessment's risk_level, so listings can filter on it by index
+    risk_level = db.Column(db.String(20))
+    # Hash of the stored crawl content (see ProfileResult.content_hash)
+    content_hash = db.Column(db.String(32))
+    # Last crawl of the profile, including crawls that changed nothing
+    last_checked_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -43,30 +59,54 @@ class Profile(db.Model):
     privacy_settings = db.relationship('PrivacySetting', backref='profile', lazy=True, cascade="all, delete-orphan")
     activity_data = db.relationship('ActivityData', backref='profile', lazy=True, cascade="all, delete-orphan")
     risk_assessment = db.relationship('RiskAssessment', backref='profile', lazy=True, cascade="all, delete-orphan")
+    trigrams = db.relationship('ProfileTrigram', lazy=True, cascade="all, delete-orphan")
+    
+    # Keyset pagination of a user's profiles in id order, optionally filtered
+    __table_args__ = (
+        db.Index('ix_profile_user_id_id', 'user_id', 'id'),
+        # Lookup of the previous crawl of a URL when saving
+        db.Index('ix_profile_user_id_url', 'user_id', 'url'),
+        # Every stored profile of a URL, for re-extraction
+        db.Index('ix_profile_url', 'url'),
+        db.Index('ix_profile_user_id_platform_id', 'user_id', 'platform', 'id'),
+        db.Index('ix_profile_user_id_risk_level_id', 'user_id', 'risk_level', 'id'),
+        db.Index('ix_profile_user_id_platform_risk_level_id', 'user_id', 'platform', 'risk_level', 'id'),
+        # Exact and prefix username search across all users
+        db.Index('ix_profile_username_key_platform_id', 'username_key', 'platform', 'id'),
+    )
     
     def __repr__(self):
         return f'<Profile {self.url}>'
     
-    def to_dict(self):
-        privacy_settings = {}
-        for setting in self.privacy_settings:
-            privacy_settings[setting.key] = setting.get_value()
-            
-        activity_data = {}
-        for data in self.activity_data:
-            activity_data[data.key] = data.get_value()
-            
-        # There should be only one risk assessment
-        risk_data = self.risk_assessment[0] if self.risk_assessment else None
+    def to_dict(self, fragments=False, fields=None):
+        """
+        Return the API dict shape of the profile.
         
-        return {
-            'platform': self.platform,
-            'username': self.username,
-            'timestamp': self.updated_at.isoformat() if self.updated_at else None,
-            'privacy_settings': privacy_settings,
-            'activity_data': activity_data,
-            'risk_assessment': risk_data.to_dict() if risk_data else None
-        }
+        Args:
+            fragments: Return the stored risk lists as json_codec Fragments
+                instead of decoding them, for responses encoded by json_codec
+            fields: A projection from projection.parse_fields limiting the
+                returned keys, or None for every key
+        """
+        if fields is None:
+            fields = ALL_PROFILE_FIELDS
+        
+        data = {}
+        if 'platform' in fields:
+            data['platform'] = self.platform
+        if 'username' in fields:
+            data['username'] = self.username
+        if 'timestamp' in fields:
+            data['timestamp'] = self.updated_at.isoformat() if self.updated_at else None
+        if 'privacy_settings' in fields:
+            data['privacy_settings'] = {setting.key: setting.get_value() for setting in self.privacy_settings}
+        if 'activity_data' in fields:
+            data['activity_data'] = {activity.key: activity.get_value() for activity in self.activity_data}
+        if 'risk_assessment' in fields:
+            # There should be only one risk assessment
+            risk_data = self.risk_assessment[0] if self.risk_assessment else None
+            data['risk_assessment'] = risk_data.to_dict(fragments, fields['risk_assessment']) if risk_data else None
+        return data
 
 class PrivacySetting(db.Model):
     """Model for privacy settings data."""
@@ -102,6 +142,16 @@ class PrivacySetting(db.Model):
         elif isinstance(value, (int, float)):
             self.value_type = 'number'
             self.value_number = float(value)
+    
+    def has_value(self, value):
+        """Return True if set_value(value) would store the value already stored."""
+        if isinstance(value, str):
+            return self.value_type == 'string' and self.value_string == value
+        elif isinstance(value, bool):
+            return self.value_type == 'boolean' and self.value_boolean == value
+        elif isinstance(value, (int, float)):
+            return self.value_type == 'number' and self.value_number == float(value)
+        return False
 
 class ActivityData(db.Model):
     """Model for activity data."""
@@ -137,6 +187,16 @@ class ActivityData(db.Model):
         elif isinstance(value, (int, float)):
             self.value_type = 'number'
             self.value_number = float(value)
+    
+    def has_value(self, value):
+        """Return True if set_value(value) would store the value already stored."""
+        if isinstance(value, str):
+            return self.value_type == 'string' and self.value_string == value
+        elif isinstance(value, bool):
+            return self.value_type == 'boolean' and self.value_boolean == value
+        elif isinstance(value, (int, float)):
+            return self.value_type == 'number' and self.value_number == float(value)
+        return False
 
 class RiskAssessment(db.Model):
     """Model for risk assessment data."""
@@ -152,16 +212,108 @@ class RiskAssessment(db.Model):
     def __repr__(self):
         return f'<RiskAssessment {self.id}>'
     
-    def to_dict(self):
-        return {
-            'privacy_score': self.privacy_score,
-            'risk_level': self.risk_level,
-            'risk_factors': json.loads(self.risk_factors) if self.risk_factors else [],
-            'recommendations': json.loads(self.recommendations) if self.recommendations else []
-        }
+    def to_dict(self, fragments=False, fields=None):
+        decode = Fragment if fragments else loads
+        data = {}
+        if fields is None or 'privacy_score' in fields:
+            data['privacy_score'] = self.privacy_score
+        if fields is None or 'risk_level' in fields:
+            data['risk_level'] = self.risk_level
+        if fields is None or 'risk_factors' in fields:
+            data['risk_factors'] = decode(self.risk_factors) if self.risk_factors else []
+        if fields is None or 'recommendations' in fields:
+            data['recommendations'] = decode(self.recommendations) if self.recommendations else []
+        return data
     
     def set_risk_factors(self, factors):
-        self.risk_factors = json.dumps(factors)
+        self.risk_factors = dumps_text(factors)
     
     def set_recommendations(self, recommendations):
-        self.recommendations = json.dumps(recommendations)
\ No newline at end of file
+        self.recommendations = dumps_text(recommendations)
+
+class ProfileTrigram(db.Model):
+    """A trigram of a profile's normalized username, for fuzzy search (see search)."""
+    trigram = db.Column(db.String(3), primary_key=True)
+    profile_id = db.Column(db.Integer, db.ForeignKey('profile.id'), primary_key=True)
+    
+    # Removing a profile's trigrams when its username changes
+    __table_args__ = (
+        db.Index('ix_profile_trigram_profile_id', 'profile_id'),
+    )
+    
+    def __repr__(self):
+        return f'<ProfileTrigram {self.trigram!r} {self.profile_id}>'
+
+class SubmissionResult(db.Model):
+    """Latest submission results per user, shared by every worker process."""
+    user_id = db.Column(db.String(36), primary_key=True)
+    payload = db.Column(db.Text, nullable=False)  # Stored as JSON
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SubmissionResult {self.user_id}>'
+
+class IdempotencyKey(db.Model):
+    """An Idempotency-Key claimed by a request, with its response once it finished (see idempotency)."""
+    key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    # The response; status is None while the request is in progress
+    status = db.Column(db.Integer)
+    content_type = db.Column(db.String(100))
+    body = db.Column(db.LargeBinary)  # zlib-compressed
+    claimed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key}>'
+
+def _backfill_search_index(conn):
+    from search import rebuild_search_index
+    rebuild_search_index(conn)
+
+# Statements (or functions of the connection) filling columns added to existing tables by create_schema
+SCHEMA_BACKFILLS = {
+    ('profile', 'risk_level'): (
+        'UPDATE profile SET risk_level = '
+        '(SELECT risk_level FROM risk_assessment WHERE risk_assessment.profile_id = profile.id)'
+    ),
+    ('profile', 'username_key'): _backfill_search_index,
+}
+
+def create_schema():
+    """
+    Create missing tables, and add the columns and indexes added to existing tables since.
+    
+    There is no migration tool; new columns must be nullable. Must be called
+    inside an application context. With sharding on, every shard is upgraded.
+    """
+    for engine in shard_engines(db):
+        upgrade_schema(engine)
+
+def upgrade_schema(engine):
+    """Create missing tables, columns and indexes in the database of an engine; see create_schema."""
+    db.metadata.create_all(engine)
+    
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(
+                    f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} {column_type}'
+                ))
+                backfill = SCHEMA_BACKFILLS.get((table.name, column.name))
+                if callable(backfill):
+                    backfill(conn)
+                elif backfill:
+                    conn.execute(text(backfill))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+        
+        # Optional SQLite FTS5 username index, kept in sync by triggers
+        from search import create_fts_index
+        create_fts_index(conn)
@@ -0,0 +1,90 @@
+"""
+Keyset pagination of a user's stored profiles.
+
+Profiles are listed in id order. A page holds up to ``limit`` profiles and a
+cursor naming the last profile returned; the next page starts after it, so
+every page is an index range scan no matter how deep it is, and profiles
+added while paging never shift later pages. The platform and risk_level
+filters are served by the (user_id, platform, risk_level, id) indexes on
+Profile.
+"""
+
+import base64
+import binascii
+
+from models import Profile
+from projection import profile_query_options
+
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 500
+
+CURSOR_PREFIX = 'p1:'
+
+def encode_cursor(profile_id):
+    """Return the opaque cursor for the page after a profile."""
+    return base64.urlsafe_b64encode(f'{CURSOR_PREFIX}{profile_id}'.encode('ascii')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Return the profile id a cursor points after.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if not value.startswith(CURSOR_PREFIX) or not value[len(CURSOR_PREFIX):].isdigit():
+        raise ValueError("Invalid cursor")
+    return int(value[len(CURSOR_PREFIX):])
+
+def parse_limit(value):
+    """
+    Parse a limit parameter, clamped to 1..MAX_PAGE_LIMIT.
+
+    Raises:
+        ValueError: If the value is not an integer
+    """
+    if value is None or value == '':
+        return DEFAULT_PAGE_LIMIT
+    return max(1, min(int(value), MAX_PAGE_LIMIT))
+
+def list_profiles_page(user_id, limit=DEFAULT_PAGE_LIMIT, cursor=None, platform=None, risk_level=None,
+                       fields=None, fragments=True):
+    """
+    Load one page of a user's profiles.
+
+    Args:
+        user_id: The ID of the user
+        limit: The maximum number of profiles returned
+        cursor: The next_cursor of the previous page, or None for the first page
+        platform: Only list profiles of this platform
+        risk_level: Only list profiles with this risk level
+        fields: A projection from projection.parse_fields
+        fragments: Return stored risk lists as json_codec Fragments
+
+    Returns:
+        A dict with the profiles (each with its url) and next_cursor, which
+        is None on the last page
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    query = Profile.query.filter(Profile.user_id == user_id)
+    if platform:
+        query = query.filter(Profile.platform == platform)
+    if risk_level:
+        query = query.filter(Profile.risk_level == risk_level)
+    if cursor:
+        query = query.filter(Profile.id > decode_cursor(cursor))
+
+    # One extra row tells whether there is a next page
+    profiles = query.order_by(Profile.id).options(*profile_query_options(fields)).limit(limit + 1).all()
+    has_more = len(profiles) > limit
+    profiles = profiles[:limit]
+
+    return {
+        'profiles': [{'url': profile.url, **profile.to_dict(fragments, fields)} for profile in profiles],
+        'next_cursor': encode_cursor(profiles[-1].id) if has_more else None,
+    }
@@ -0,0 +1,220 @@
+"""
+Opt-in request profiling with collapsed-stack (flamegraph) output.
+
+When enabled, selected view functions are wrapped with a sampling profiler
+that runs for requests carrying the profiling header with the configured
+token, or picked by the sample rate. Without a token the header is ignored,
+so clients cannot make the server profile (and write to disk) at will.
+
+Each profiled request writes one ``.folded`` file in the collapsed-stack
+format understood by flamegraph.pl, speedscope and inferno. When profiling is
+disabled nothing is wrapped, so handlers run exactly as before.
+"""
+
+import functools
+import hmac
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+from flask import make_response, request
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILED_ENDPOINTS = ('submit_profiles', 'get_profiles')
+
+PROFILING_DEFAULTS = {
+    'PROFILING_ENABLED': os.environ.get('FIASCO_PROFILING', '').lower() in ('1', 'true', 'yes'),
+    'PROFILING_HEADER': 'X-Fiasco-Profile',
+    # The header value must match this token to trigger profiling; unset, only sampling profiles
+    'PROFILING_TOKEN': os.environ.get('FIASCO_PROFILING_TOKEN', ''),
+    'PROFILING_SAMPLE_RATE': float(os.environ.get('FIASCO_PROFILING_SAMPLE_RATE', '0')),
+    'PROFILING_INTERVAL': 0.005,
+    'PROFILING_DIR': os.environ.get('FIASCO_PROFILING_DIR', ''),
+    'PROFILING_MAX_FILES': 100,
+    'PROFILING_MAX_BYTES': 50 * 1024 * 1024,
+}
+
+PROFILE_FILE_SUFFIX = '.folded'
+
+class StackSampler:
+    """
+    Periodically sample the call stack of one thread.
+
+    Stacks are stored as collapsed strings (root first, frames separated by
+    ';') with a count of how many samples hit each one.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='fiasco-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = collapse_frame(frame)
+            self.samples[stack] = self.samples.get(stack, 0) + 1
+
+def collapse_frame(frame):
+    """Return the collapsed-stack representation of a frame and its callers."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    names.reverse()
+    return ';'.join(names)
+
+def format_collapsed(samples):
+    """Format sampled stacks as collapsed-stack lines."""
+    return ''.join(f'{stack} {count}\n' for stack, count in sorted(samples.items()))
+
+def enforce_retention(directory, max_files, max_bytes):
+    """
+    Delete the oldest profile files until the directory is within its limits.
+
+    Args:
+        directory: The directory holding profile files
+        max_files: The maximum number of profile files to keep
+        max_bytes: The maximum total size of profile files to keep
+
+    Returns:
+        The number of files removed
+    """
+    entries = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.endswith(PROFILE_FILE_SUFFIX):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+
+    entries.sort()
+    total_bytes = sum(size for _, _, size in entries)
+    removed = 0
+
+    while entries and (len(entries) > max_files or total_bytes > max_bytes):
+        _, name, size = entries.pop(0)
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+        removed += 1
+
+    return removed
+
+class RequestProfiler:
+    """Decide which requests to profile and write their collapsed stacks."""
+
+    def __init__(self, config):
+        self.header = config['PROFILING_HEADER']
+        self.token = config['PROFILING_TOKEN']
+        self.sample_rate = config['PROFILING_SAMPLE_RATE']
+        self.interval = config['PROFILING_INTERVAL']
+        self.directory = config['PROFILING_DIR']
+        self.max_files = config['PROFILING_MAX_FILES']
+        self.max_bytes = config['PROFILING_MAX_BYTES']
+        self._write_lock = threading.Lock()
+
+    def should_profile(self):
+        """Return True if the current request should be profiled."""
+        header_value = request.headers.get(self.header)
+        if header_value and self.token:
+            return hmac.compare_digest(header_value, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def wrap(self, endpoint, view):
+        """Wrap a view function so selected requests are profiled."""
+
+        @functools.wraps(view)
+        def profiled_view(*args, **kwargs):
+            if not self.should_profile():
+                return view(*args, **kwargs)
+
+            sampler = StackSampler(threading.get_ident(), self.interval).start()
+            start = time.perf_counter()
+            try:
+                response = view(*args, **kwargs)
+            finally:
+                samples = sampler.stop()
+                profile_id = self.write(endpoint, samples, time.perf_counter() - start)
+
+            if profile_id:
+                response = _with_header(response, f'{self.header}-Id', profile_id)
+            return response
+
+        return profiled_view
+
+    def write(self, endpoint, samples, duration):
+        """Write samples to a new profile file and apply the retention policy."""
+        if not samples:
+            return None
+
+        profile_id = f'{time.strftime("%Y%m%dT%H%M%S")}-{endpoint}-{uuid.uuid4().hex[:8]}'
+        path = os.path.join(self.directory, profile_id + PROFILE_FILE_SUFFIX)
+
+        try:
+            with self._write_lock:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(path, 'w') as f:
+                    f.write(format_collapsed(samples))
+                enforce_retention(self.directory, self.max_files, self.max_bytes)
+        except OSError as e:
+            logger.error("Failed to write profile %s: %s", profile_id, e)
+            return None
+
+        logger.info("Wrote profile %s (%d samples, %.3fs)", profile_id, sum(samples.values()), duration)
+        return profile_id
+
+def _with_header(response, name, value):
+    """Attach a header to whatever a view returned."""
+    response = make_response(response)
+    response.headers[name] = value
+    return response
+
+def init_profiling(app, endpoints=DEFAULT_PROFILED_ENDPOINTS):
+    """
+    Enable request profiling for the given endpoints if the app is configured for it.
+
+    Args:
+        app: The Flask application
+        endpoints: The names of the endpoints to wrap
+
+    Returns:
+        The RequestProfiler, or None if profiling is disabled
+    """
+    for key, value in PROFILING_DEFAULTS.items():
+        app.config.setdefault(key, value)
+
+    if not app.config['PROFILING_ENABLED']:
+        return None
+
+    if not app.config['PROFILING_DIR']:
+        app.config['PROFILING_DIR'] = os.path.join(app.instance_path, 'profiles')
+
+    profiler = RequestProfiler(app.config)
+    for endpoint in endpoints:
+        view = app.view_functions.get(endpoint)
+        if view is not None:
+            app.view_functions[endpoint] = profiler.wrap(endpoint, view)
+
+    logger.info("Request profiling enabled for %s; writing to %s", ', '.join(endpoints), profiler.directory)
+    return profiler
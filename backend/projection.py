@@ -0,0 +1,105 @@
+"""
+Field projection for GET /profiles/<user_id>.
+
+Clients pass ``fields=`` with a comma separated list of profile fields, and
+``risk_assessment.<field>`` for single risk assessment fields, e.g.
+``fields=platform,risk_assessment.privacy_score,risk_assessment.risk_level``
+for the dashboard overview. The projection decides both which keys are
+returned and which columns and child tables are loaded, so child tables that
+are not asked for are never queried.
+"""
+
+from sqlalchemy.orm import load_only, selectinload
+
+from models import ActivityData, PrivacySetting, Profile, RiskAssessment
+
+PROFILE_FIELDS = ('platform', 'username', 'timestamp', 'privacy_settings', 'activity_data', 'risk_assessment')
+RISK_FIELDS = ('privacy_score', 'risk_level', 'risk_factors', 'recommendations')
+
+# Profile columns read for each field; url and user_id are always loaded
+_PROFILE_COLUMNS = {
+    'platform': (Profile.platform,),
+    'username': (Profile.username,),
+    'timestamp': (Profile.updated_at,),
+}
+_RISK_COLUMNS = {
+    'privacy_score': RiskAssessment.privacy_score,
+    'risk_level': RiskAssessment.risk_level,
+    'risk_factors': RiskAssessment.risk_factors,
+    'recommendations': RiskAssessment.recommendations,
+}
+
+def parse_fields(value):
+    """
+    Parse a ``fields`` query parameter.
+
+    Args:
+        value: The parameter value, or None
+
+    Returns:
+        A dict of profile field to None (the whole field) or a tuple of risk
+        assessment fields, or None to return every field
+
+    Raises:
+        ValueError: If a field is unknown
+    """
+    if not value:
+        return None
+
+    fields = {}
+    for name in value.split(','):
+        name = name.strip()
+        if not name:
+            continue
+        field, _, subfield = name.partition('.')
+        if field not in PROFILE_FIELDS:
+            raise ValueError(f"Unknown field {name!r}")
+        if subfield:
+            if field != 'risk_assessment' or subfield not in RISK_FIELDS:
+                raise ValueError(f"Unknown field {name!r}")
+            if field not in fields:
+                fields[field] = ()
+            if fields[field] is not None and subfield not in fields[field]:
+                fields[field] += (subfield,)
+        else:
+            fields[field] = None
+    return fields or None
+
+def profile_query_options(fields=None):
+    """
+    Return the loader options that load exactly what a projection needs.
+
+    Args:
+        fields: A projection from parse_fields, or None for every field
+
+    Returns:
+        A list of SQLAlchemy loader options for a Profile query
+    """
+    if fields is None:
+        return [
+            selectinload(Profile.privacy_settings),
+            selectinload(Profile.activity_data),
+            selectinload(Profile.risk_assessment),
+        ]
+
+    columns = [Profile.url, Profile.user_id]
+    for field in fields:
+        columns.extend(_PROFILE_COLUMNS.get(field, ()))
+    options = [load_only(*columns)]
+
+    if 'privacy_settings' in fields:
+        options.append(selectinload(Profile.privacy_settings).load_only(
+            PrivacySetting.key, PrivacySetting.value_type, PrivacySetting.value_string,
+            PrivacySetting.value_boolean, PrivacySetting.value_number
+        ))
+    if 'activity_data' in fields:
+        options.append(selectinload(Profile.activity_data).load_only(
+            ActivityData.key, ActivityData.value_type, ActivityData.value_string,
+            ActivityData.value_boolean, ActivityData.value_number
+        ))
+    if 'risk_assessment' in fields:
+        risk_fields = fields['risk_assessment'] or RISK_FIELDS
+        options.append(selectinload(Profile.risk_assessment).load_only(
+            *(_RISK_COLUMNS[field] for field in risk_fields)
+        ))
+    return options
@@ -0,0 +1,187 @@
+"""
+Replay archived scrapes through the current extractors and update stored profiles.
+
+Reads the latest archived scrape of every URL (or of the given URLs) from the
+scrape archive, runs extract_profile_data_from_scrape on it in a pool of
+worker processes, and saves the new results for every stored profile with
+that URL. Profiles whose content did not change are left untouched.
+
+Usage:
+    python reextract.py [--archive DIR] [--workers N] [--batch-size N] [--dry-run] [URL ...]
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from crawler import extract_profile_data_from_scrape
+from scrape_archive import ScrapeArchive
+from sharding import fan_out
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 200
+
+# Archive opened once per worker process, see _init_worker
+_worker_archive = None
+
+def _init_worker(directory):
+    global _worker_archive
+    _worker_archive = ScrapeArchive(directory)
+
+def extract_batch(records):
+    """
+    Re-extract a batch of archived scrapes in a worker.
+
+    Returns:
+        A list of (record, ProfileResult or None, error message or None)
+    """
+    results = []
+    for record in records:
+        try:
+            payload = _worker_archive.get(record['key'])
+            # Extractors fill fields they cannot find with random values; seed
+            # them from the page so replaying the same page gives the same result
+            random.seed(record['key'])
+            result = extract_profile_data_from_scrape(payload, record['platform'], record['username'])
+            results.append((record, result, None))
+        except Exception as e:
+            results.append((record, None, str(e)))
+    return results
+
+def _batches(records, batch_size):
+    records = iter(records)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def _run_batches(directory, batches, workers):
+    """Yield the extracted batches, keeping at most a few batches per worker in flight."""
+    if workers <= 1:
+        _init_worker(directory)
+        for batch in batches:
+            yield extract_batch(batch)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(directory,)) as executor:
+        pending = []
+        for batch in batches:
+            pending.append(executor.submit(extract_batch, batch))
+            if len(pending) >= workers * 2:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+def update_profiles(extracted, dry_run=False):
+    """
+    Save re-extracted results for every stored profile of their URLs, and commit.
+
+    Args:
+        extracted: A dict of URL to (archive record, ProfileResult)
+        dry_run: Count the changes without writing them
+
+    Returns:
+        A tuple of (the URLs with stored profiles, profiles updated, profiles unchanged)
+    """
+    from app import save_profile
+    from models import db, Profile
+
+    profiles = Profile.query.filter(Profile.url.in_(list(extracted))).all()
+    stored_urls = {profile.url for profile in profiles}
+    updated = unchanged = 0
+    for profile in profiles:
+        record, result = extracted[profile.url]
+        if profile.content_hash == result.content_hash():
+            unchanged += 1
+            continue
+        updated += 1
+        if not dry_run:
+            save_profile(profile.user_id, profile.url, result,
+                         checked_at=datetime.utcfromtimestamp(record['scraped_at']))
+
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    db.session.expunge_all()
+    return stored_urls, updated, unchanged
+
+def reextract(app, directory, workers=None, batch_size=DEFAULT_BATCH_SIZE, urls=None, dry_run=False):
+    """
+    Re-extract archived scrapes and update the stored profiles.
+
+    Args:
+        app: The Flask application whose database is updated
+        directory: The scrape archive directory
+        workers: Worker processes (defaults to the CPU count; 1 runs in this process)
+        batch_size: Scrapes per worker task and per database commit
+        urls: Only re-extract these URLs
+        dry_run: Count the changes without writing them
+
+    Returns:
+        A dict of counts: scrapes, updated, unchanged, no_profile and errors
+    """
+    workers = workers or os.cpu_count() or 1
+    stats = {'scrapes': 0, 'updated': 0, 'unchanged': 0, 'no_profile': 0, 'errors': 0}
+
+    archive = ScrapeArchive(directory)
+    try:
+        records = archive.iter_latest(urls)
+        with app.app_context():
+            for results in _run_batches(directory, _batches(records, batch_size), workers):
+                extracted = {}
+                for record, result, error in results:
+                    stats['scrapes'] += 1
+                    if error is not None:
+                        logger.error("Re-extraction failed for %s: %s", record['url'], error, extra={'url': record['url']})
+                        stats['errors'] += 1
+                    else:
+                        extracted[record['url']] = (record, result)
+
+                if not extracted:
+                    continue
+                # Profiles of a URL may belong to users on any shard
+                stored_urls = set()
+                for found, updated, unchanged in fan_out(update_profiles, extracted, dry_run):
+                    stored_urls |= found
+                    stats['updated'] += updated
+                    stats['unchanged'] += unchanged
+                stats['no_profile'] += len(set(extracted) - stored_urls)
+    finally:
+        archive.close()
+
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-extract archived scrapes and update stored profiles.")
+    parser.add_argument('urls', nargs='*', help="Only re-extract these URLs")
+    parser.add_argument('--archive', default=os.environ.get('FIASCO_SCRAPE_ARCHIVE_DIR'),
+                        help="Scrape archive directory (default: FIASCO_SCRAPE_ARCHIVE_DIR)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="Worker processes (default: one per CPU)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--dry-run', action='store_true', help="Count changes without writing them")
+    args = parser.parse_args(argv)
+
+    if not args.archive:
+        parser.error("no archive directory; pass --archive or set FIASCO_SCRAPE_ARCHIVE_DIR")
+
+    logging.basicConfig(level=logging.INFO)
+
+    from app import create_app
+
+    stats = reextract(create_app(), args.archive, workers=args.workers, batch_size=args.batch_size,
+                      urls=args.urls or None, dry_run=args.dry_run)
+    print(json.dumps(stats))
+    return 1 if stats['errors'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""
+Move users to the shards they belong to under a new shard layout.
+
+Every user on a source database whose shard under the target layout is a
+different database is copied there, with their profiles, the profiles'
+settings, activity, risk and search rows, and their latest submission, and
+then deleted from the source. Users already on the right database are not
+touched; with consistent hashing, going from N to N+1 shards moves about
+1/(N+1) of the users. A shard count of 0 means the single database at
+DATABASE_URL, so the same tool splits an unsharded database or merges the
+shards back.
+
+Users are moved in batches. A batch is committed to its targets before it
+is deleted from its source, and any rows a target already holds for a
+moved user are replaced, so an interrupted run can simply be run again.
+Stop writes (or keep serving the old layout) while it runs, then restart
+the app with the new FIASCO_SHARDS.
+
+Usage:
+    python reshard.py --from-shards N --to-shards M [--from-url TEMPLATE] [--to-url TEMPLATE]
+                      [--batch-size N] [--dry-run]
+"""
+
+import argparse
+import json
+import logging
+import sys
+from collections import defaultdict
+
+from sqlalchemy import delete, insert, select
+
+from sharding import SHARDING_DEFAULTS, ShardRing, get_shard_ring
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+
+# Largest IN list sent in one statement
+_IN_CHUNK = 500
+
+def _chunks(values, size=_IN_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def shard_layout(app):
+    """
+    Return the hash ring and the engine of every shard of an app.
+
+    The single database of an app without sharding is a ring of one shard.
+    """
+    from models import db
+
+    with app.app_context():
+        ring = get_shard_ring(app)
+        if ring is None:
+            return ShardRing(['default']), {'default': db.engine}
+        return ring, app.extensions['shard_engines']
+
+def _same_database(a, b):
+    return a.url.render_as_string(hide_password=False) == b.url.render_as_string(hide_password=False)
+
+def _tables():
+    from models import db, Profile, SubmissionResult, User
+
+    profiles = Profile.__table__
+    # Tables of rows belonging to a profile: settings, activity, risk and trigrams
+    children = [
+        table for table in db.metadata.sorted_tables
+        if any(key.column.table is profiles for key in table.foreign_keys)
+    ]
+    return User.__table__, profiles, children, SubmissionResult.__table__
+
+def _user_batches(engine, batch_size):
+    """Yield the user IDs stored in a database (with a user row or a stored submission) in batches."""
+    users, _, _, results = _tables()
+    last_id = ''
+    while True:
+        with engine.connect() as conn:
+            user_ids = sorted(
+                set(conn.scalars(select(users.c.id).where(users.c.id > last_id).order_by(users.c.id).limit(batch_size)))
+                | set(conn.scalars(
+                    select(results.c.user_id).where(results.c.user_id > last_id)
+                    .order_by(results.c.user_id).limit(batch_size)
+                ))
+            )[:batch_size]
+        if not user_ids:
+            return
+        yield user_ids
+        last_id = user_ids[-1]
+
+def _profile_ids(conn, user_ids):
+    _, profiles, _, _ = _tables()
+    return [
+        profile_id
+        for chunk in _chunks(user_ids)
+        for profile_id in conn.scalars(select(profiles.c.id).where(profiles.c.user_id.in_(chunk)))
+    ]
+
+def delete_users(conn, user_ids):
+    """Delete users and every row belonging to them."""
+    users, profiles, children, results = _tables()
+    profile_ids = _profile_ids(conn, user_ids)
+    for table in children:
+        for chunk in _chunks(profile_ids):
+            conn.execute(delete(table).where(table.c.profile_id.in_(chunk)))
+    for chunk in _chunks(user_ids):
+        conn.execute(delete(profiles).where(profiles.c.user_id.in_(chunk)))
+        conn.execute(delete(results).where(results.c.user_id.in_(chunk)))
+        conn.execute(delete(users).where(users.c.id.in_(chunk)))
+
+def copy_users(source, target, user_ids):
+    """
+    Copy users and every row belonging to them, replacing what the target has for them.
+
+    Profile IDs are assigned by the target, and the rows of each profile
+    are pointed at its new ID.
+
+    Args:
+        source: A connection to the source database
+        target: A connection to the target database, in a transaction
+        user_ids: The users to copy
+
+    Returns:
+        The number of profiles copied
+    """
+    users, profiles, children, results = _tables()
+    delete_users(target, user_ids)
+
+    for table, column in ((users, users.c.id), (results, results.c.user_id)):
+        for chunk in _chunks(user_ids):
+            rows = [dict(row._mapping) for row in source.execute(select(table).where(column.in_(chunk)))]
+            if rows:
+                target.execute(insert(table), rows)
+
+    new_ids = {}
+    for chunk in _chunks(user_ids):
+        for row in source.execute(select(profiles).where(profiles.c.user_id.in_(chunk)).order_by(profiles.c.id)):
+            values = dict(row._mapping)
+            old_id = values.pop('id')
+            new_ids[old_id] = target.execute(insert(profiles), values).inserted_primary_key[0]
+
+    for table in children:
+        # Surrogate keys are reassigned; the trigram table's key includes profile_id
+        surrogate = 'id' in table.c and table.c.id.primary_key
+        for chunk in _chunks(new_ids):
+            rows = []
+            for row in source.execute(select(table).where(table.c.profile_id.in_(chunk))):
+                values = dict(row._mapping)
+                if surrogate:
+                    del values['id']
+                values['profile_id'] = new_ids[values['profile_id']]
+                rows.append(values)
+            if rows:
+                target.execute(insert(table), rows)
+    return len(new_ids)
+
+def reshard(source_app, target_app, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """
+    Move every user stored under source_app's shard layout to their shard under target_app's.
+
+    Args:
+        source_app: An app configured with the current layout
+        target_app: An app configured with the new layout
+        batch_size: Users read, copied and deleted per transaction
+        dry_run: Count the users and profiles that would move without moving them
+
+    Returns:
+        A dict of counts: users (scanned), moved and profiles (moved), and
+        the users moved to each target shard
+    """
+    from models import upgrade_schema
+
+    _, source_engines = shard_layout(source_app)
+    target_ring, target_engines = shard_layout(target_app)
+    if not dry_run:
+        for engine in target_engines.values():
+            upgrade_schema(engine)
+
+    stats = {'users': 0, 'moved': 0, 'profiles': 0, 'by_target': defaultdict(int)}
+    for source_name, source in source_engines.items():
+        for user_ids in _user_batches(source, batch_size):
+            stats['users'] += len(user_ids)
+            moves = defaultdict(list)
+            for user_id in user_ids:
+                target_name = target_ring.shard_for(user_id)
+                if not _same_database(source, target_engines[target_name]):
+                    moves[target_name].append(user_id)
+            if not moves:
+                continue
+
+            moved = [user_id for batch in moves.values() for user_id in batch]
+            with source.connect() as conn:
+                if dry_run:
+                    stats['profiles'] += len(_profile_ids(conn, moved))
+                else:
+                    for target_name, batch in moves.items():
+                        with target_engines[target_name].begin() as target:
+                            stats['profiles'] += copy_users(conn, target, batch)
+            if not dry_run:
+                with source.begin() as conn:
+                    delete_users(conn, moved)
+
+            stats['moved'] += len(moved)
+            for target_name, batch in moves.items():
+                stats['by_target'][target_name] += len(batch)
+            logger.info("Moved %d of %d users from %s", len(moved), len(user_ids), source_name)
+
+    stats['by_target'] = dict(stats['by_target'])
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move users to their shards under a new shard layout.")
+    parser.add_argument('--from-shards', type=int, required=True,
+                        help="Current shard count (0 for the single database at DATABASE_URL)")
+    parser.add_argument('--to-shards', type=int, required=True,
+                        help="New shard count (0 for the single database at DATABASE_URL)")
+    parser.add_argument('--from-url', default=SHARDING_DEFAULTS['SHARD_DATABASE_URL'],
+                        help="Current shard URL template (default: FIASCO_SHARD_DATABASE_URL)")
+    parser.add_argument('--to-url', help="New shard URL template (default: the current one)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--dry-run', action='store_true', help="Count the users that would move without moving them")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    from app import create_app
+
+    source_app = create_app({'SHARD_COUNT': args.from_shards, 'SHARD_DATABASE_URL': args.from_url})
+    target_app = create_app({'SHARD_COUNT': args.to_shards, 'SHARD_DATABASE_URL': args.to_url or args.from_url})
+    stats = reshard(source_app, target_app, batch_size=args.batch_size, dry_run=args.dry_run)
+    print(json.dumps(stats))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""
+Stores for the latest submission results of each user.
+
+The API keeps the results of a user's last POST /profiles around for quick
+lookups. MemoryResultStore keeps them in this process, bounded by entry
+count, total size and age, which is only correct with a single worker.
+DatabaseResultStore keeps them in the submission_result table so every
+worker process sees the same data. Both behave like a dict keyed by user_id.
+
+The store is picked with FIASCO_RESULT_STORE ('memory' or 'database'). The
+memory store limits are set with FIASCO_RESULT_STORE_MAX_ENTRIES,
+FIASCO_RESULT_STORE_MAX_BYTES and FIASCO_RESULT_STORE_TTL (seconds, 0 to
+disable expiry).
+"""
+
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from json_codec import dumps, dumps_text, loads
+from metrics import REGISTRY
+from sharding import fan_out, use_user_shard
+
+RESULT_STORES = ('memory', 'database')
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TTL = 3600
+
+# Fast compression; payloads are small and written on every submission
+COMPRESSION_LEVEL = 1
+
+RESULT_STORE_ENTRIES = REGISTRY.gauge(
+    'fiasco_result_store_entries',
+    'Entries held by the in-memory result store.'
+)
+RESULT_STORE_BYTES = REGISTRY.gauge(
+    'fiasco_result_store_bytes',
+    'Compressed payload bytes held by the in-memory result store.'
+)
+RESULT_STORE_EVICTIONS_TOTAL = REGISTRY.counter(
+    'fiasco_result_store_evictions_total',
+    'Entries dropped from the in-memory result store by reason.',
+    ('reason',)
+)
+
+def encode_payload(value):
+    """Serialize and compress a results payload."""
+    return zlib.compress(dumps(value), COMPRESSION_LEVEL)
+
+def decode_payload(data):
+    """Inverse of encode_payload."""
+    return loads(zlib.decompress(data))
+
+class MemoryResultStore(MutableMapping):
+    """
+    Results held in this process, with LRU eviction and TTL expiry.
+
+    Payloads are kept as compressed JSON, so every read returns a fresh copy.
+    The least recently used entries are evicted once max_entries or
+    max_bytes is exceeded, and entries older than ttl are dropped when they
+    are next touched or during writes.
+
+    Args:
+        max_entries: Maximum number of users kept
+        max_bytes: Maximum total size of the compressed payloads
+        ttl: Seconds an entry is kept after it was written (None or 0 to keep until evicted)
+        clock: Monotonic time source, replaceable in tests
+    """
+
+    backend = 'memory'
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL,
+                 clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl or None
+        self.clock = clock
+        self._lock = threading.Lock()
+        # user_id -> (expires_at, payload bytes), least recently used first
+        self._data = OrderedDict()
+        # user_id -> expires_at in write order, which is also expiry order
+        self._expiry = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = {'capacity': 0, 'expired': 0, 'oversize': 0}
+
+    def _drop(self, user_id, reason=None):
+        _, payload = self._data.pop(user_id)
+        del self._expiry[user_id]
+        self._bytes -= len(payload)
+        if reason is not None:
+            self._evictions[reason] += 1
+            RESULT_STORE_EVICTIONS_TOTAL.inc(reason)
+
+    def _expire(self, now):
+        if self.ttl is None:
+            return
+        while self._expiry:
+            user_id, expires_at = next(iter(self._expiry.items()))
+            if expires_at > now:
+                return
+            self._drop(user_id, 'expired')
+
+    def _update_gauges(self):
+        RESULT_STORE_ENTRIES.set(len(self._data))
+        RESULT_STORE_BYTES.set(self._bytes)
+
+    def _get_live(self, user_id):
+        entry = self._data.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] <= self.clock():
+            self._drop(user_id, 'expired')
+            self._update_gauges()
+            return None
+        self._data.move_to_end(user_id)
+        return entry
+
+    def __getitem__(self, user_id):
+        with self._lock:
+            entry = self._get_live(user_id)
+            if entry is None:
+                self._misses += 1
+                raise KeyError(user_id)
+            self._hits += 1
+            payload = entry[1]
+        return decode_payload(payload)
+
+    def __setitem__(self, user_id, value):
+        payload = encode_payload(value)
+        with self._lock:
+            now = self.clock()
+            if user_id in self._data:
+                self._drop(user_id)
+
+            if len(payload) > self.max_bytes:
+                self._evictions['oversize'] += 1
+                RESULT_STORE_EVICTIONS_TOTAL.inc('oversize')
+            else:
+                expires_at = now + self.ttl if self.ttl is not None else float('inf')
+                self._data[user_id] = (expires_at, payload)
+                self._expiry[user_id] = expires_at
+                self._bytes += len(payload)
+
+            self._expire(now)
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._data)), 'capacity')
+            self._update_gauges()
+
+    def __delitem__(self, user_id):
+        with self._lock:
+            if user_id not in self._data:
+                raise KeyError(user_id)
+            self._drop(user_id)
+            self._update_gauges()
+
+    def __contains__(self, user_id):
+        with self._lock:
+            return self._get_live(user_id) is not None
+
+    def __iter__(self):
+        with self._lock:
+            self._expire(self.clock())
+            self._update_gauges()
+            return iter(list(self._data))
+
+    def __len__(self):
+        with self._lock:
+            self._expire(self.clock())
+            self._update_gauges()
+            return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._expiry.clear()
+            self._bytes = 0
+            self._update_gauges()
+
+    def stats(self):
+        """
+        Return memory and hit-rate statistics.
+
+        Returns:
+            A dict with entries, bytes (compressed payloads), limits, hits,
+            misses and evictions by reason
+        """
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': dict(self._evictions),
+            }
+
+class DatabaseResultStore(MutableMapping):
+    """
+    Results kept in the database, shared between worker processes.
+
+    Every operation runs in its own application context, and so in its own
+    session, so writing results never commits or rolls back the caller's
+    pending work. With sharding on, each user's entry is kept on their shard.
+
+    Args:
+        app: The Flask application whose database is used
+        db: The Flask-SQLAlchemy extension
+        model: The model storing one JSON payload per user
+    """
+
+    backend = 'database'
+
+    def __init__(self, app, db, model):
+        self.app = app
+        self.db = db
+        self.model = model
+
+    def __getitem__(self, user_id):
+        with self.app.app_context(), use_user_shard(user_id):
+            row = self.db.session.get(self.model, user_id)
+            if row is None:
+                raise KeyError(user_id)
+            return loads(row.payload)
+
+    def __setitem__(self, user_id, value):
+        with self.app.app_context(), use_user_shard(user_id):
+            self.db.session.merge(self.model(user_id=user_id, payload=dumps_text(value)))
+            self.db.session.commit()
+
+    def __delitem__(self, user_id):
+        with self.app.app_context(), use_user_shard(user_id):
+            deleted = self.model.query.filter_by(user_id=user_id).delete()
+            self.db.session.commit()
+        if not deleted:
+            raise KeyError(user_id)
+
+    def __contains__(self, user_id):
+        with self.app.app_context(), use_user_shard(user_id):
+            return self.db.session.get(self.model, user_id) is not None
+
+    def __iter__(self):
+        with self.app.app_context():
+            shards = fan_out(lambda: [row.user_id for row in self.db.session.query(self.model.user_id)])
+        return iter([user_id for user_ids in shards for user_id in user_ids])
+
+    def __len__(self):
+        with self.app.app_context():
+            return sum(fan_out(lambda: self.model.query.count()))
+
+    def stats(self):
+        """Return the number of stored entries."""
+        return {'backend': self.backend, 'entries': len(self)}
+
+    def clear(self):
+        with self.app.app_context():
+            fan_out(self._clear_shard)
+
+    def _clear_shard(self):
+        self.model.query.delete()
+        self.db.session.commit()
+
+def create_result_store(app, db, model, backend=None):
+    """
+    Create the configured result store.
+
+    Args:
+        app: The Flask application
+        db: The Flask-SQLAlchemy extension
+        model: The model used by the database store
+        backend: 'memory' or 'database' (defaults to FIASCO_RESULT_STORE, then 'memory')
+
+    Returns:
+        A dict-like result store
+    """
+    if backend is None:
+        backend = os.environ.get('FIASCO_RESULT_STORE', 'memory').lower()
+    if backend == 'memory':
+        return MemoryResultStore(
+            max_entries=int(os.environ.get('FIASCO_RESULT_STORE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+            max_bytes=int(os.environ.get('FIASCO_RESULT_STORE_MAX_BYTES', DEFAULT_MAX_BYTES)),
+            ttl=float(os.environ.get('FIASCO_RESULT_STORE_TTL', DEFAULT_TTL)),
+        )
+    if backend == 'database':
+        return DatabaseResultStore(app, db, model)
+    raise ValueError(f"Unknown result store {backend!r}, expected one of {RESULT_STORES}")
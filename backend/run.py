@@ -1,8 +1,10 @@
-from app import app, db
+from app import create_app
+from models import create_schema
 
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
-        db.create_all()
+        create_schema()
         print("Database tables created or verified.")
     
     print("Starting Flask server at http://localhost:5000")
@@ -0,0 +1,323 @@
+"""
+Generate scorecards for a list of profile URLs offline.
+
+Reads URLs from a file or stdin (one per line, CSV with a 'url' column, or
+NDJSON like bulk imports), crawls them with crawl_profile in a pool of
+threads or processes, and writes one JSON scorecard per URL (the crawled
+profile with its risk assessment, or the error) to stdout or a file. URLs
+are validated and deduplicated like bulk imports.
+
+URLs are handed to the pool in batches and the results written in input
+order. After every batch the output is flushed and a checkpoint with the
+input position is written, so a run that stops can be continued with
+--resume: the URLs before the position are skipped and the output file is
+cut back to what the checkpoint covers, so no scorecard is written twice.
+Resuming is refused when the output is missing or shorter than the
+checkpoint records.
+With --store the scorecards are also saved as the profiles of a user, one
+commit per batch.
+
+Usage:
+    python scorecard.py [INPUT] [--output FILE] [--format csv|ndjson] [--executor thread|process]
+                        [--workers N] [--batch-size N] [--checkpoint FILE] [--resume]
+                        [--store] [--user-id ID]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from bulk_import import (
+    FORMAT_CSV,
+    FORMAT_NDJSON,
+    UrlDeduplicator,
+    classify_url,
+    iter_upload_urls,
+    new_import_stats,
+)
+from crawler import crawl_profile
+from json_codec import dumps
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_THREADS = 8
+
+# Input file extensions read as NDJSON; anything else is read as CSV
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+
+def score_batch(urls):
+    """
+    Crawl a batch of URLs in a worker.
+
+    Returns:
+        A list of (URL, profile dict or None, error message or None)
+    """
+    results = []
+    for url in urls:
+        try:
+            results.append((url, crawl_profile(url), None))
+        except Exception as e:
+            results.append((url, None, str(e)))
+    return results
+
+def iter_batches(urls, batch_size, skip=0):
+    """
+    Validate, deduplicate and batch URLs, skipping the first skip of them.
+
+    Skipped URLs are still remembered for deduplication, so a resumed run
+    drops the same duplicates as an uninterrupted one.
+
+    Yields:
+        Tuples of (input position after the batch, list of URLs, input counters
+        up to that position); a final batch may be empty when only invalid or
+        duplicate URLs follow the last full batch
+    """
+    stats = {'received': 0, 'invalid': 0, 'duplicates': 0, 'platforms': {}}
+    deduplicator = UrlDeduplicator()
+    batch = []
+    position = yielded = skip
+
+    for position, url in enumerate(urls, start=1):
+        resumed = position <= skip
+        platform = classify_url(url)
+        if platform is None or not deduplicator.add(url):
+            if not resumed:
+                stats['received'] += 1
+                stats['invalid' if platform is None else 'duplicates'] += 1
+            continue
+        if resumed:
+            continue
+
+        stats['received'] += 1
+        stats['platforms'][platform] = stats['platforms'].get(platform, 0) + 1
+        batch.append(url)
+        if len(batch) >= batch_size:
+            yield position, batch, {**stats, 'platforms': dict(stats['platforms'])}
+            batch, yielded = [], position
+
+    if batch or position > yielded:
+        yield position, batch, {**stats, 'platforms': dict(stats['platforms'])}
+
+def _run_batches(batches, executor_type, workers):
+    """Yield each batch with its results, in order, keeping a few batches per worker in flight."""
+    if workers <= 1:
+        for batch in batches:
+            yield batch, score_batch(batch[1])
+        return
+
+    executor_class = ProcessPoolExecutor if executor_type == 'process' else ThreadPoolExecutor
+    with executor_class(max_workers=workers) as executor:
+        pending = []
+        for batch in batches:
+            pending.append((batch, executor.submit(score_batch, batch[1])))
+            if len(pending) >= workers * 2:
+                done, future = pending.pop(0)
+                yield done, future.result()
+        for done, future in pending:
+            yield done, future.result()
+
+def store_batch(app, user_id, results):
+    """
+    Save a batch of scorecards as profiles of a user in one commit.
+
+    If the batch cannot be committed, its profiles are saved one at a time
+    so one bad profile does not lose the rest.
+
+    Returns:
+        The number of profiles saved
+    """
+    from app import ensure_user, save_profile, store_crawl_result
+    from models import db
+    from sharding import use_user_shard
+
+    profiles = [(url, profile) for url, profile, error in results if error is None]
+    if not profiles:
+        return 0
+
+    with app.app_context(), use_user_shard(user_id):
+        ensure_user(user_id)
+        try:
+            for url, profile in profiles:
+                save_profile(user_id, url, profile)
+            db.session.commit()
+            return len(profiles)
+        except Exception as e:
+            logger.warning("Saving a batch of %d profiles failed, saving them one at a time: %s", len(profiles), e)
+            db.session.rollback()
+
+        stored = 0
+        for url, profile in profiles:
+            try:
+                store_crawl_result(user_id, url, profile)
+                stored += 1
+            except Exception as e:
+                logger.error("Error storing %s: %s", url, e, extra={'url': url})
+                db.session.rollback()
+        return stored
+
+def read_checkpoint(path):
+    """Return the checkpoint at path, or None if there is none."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def write_checkpoint(path, checkpoint):
+    """Replace the checkpoint at path atomically."""
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+def _sync(output):
+    output.flush()
+    try:
+        os.fsync(output.fileno())
+    except (OSError, ValueError):
+        # Pipes and terminals cannot be synced
+        pass
+
+def generate_scorecards(urls, output, executor='thread', workers=None, batch_size=DEFAULT_BATCH_SIZE,
+                        checkpoint_path=None, checkpoint=None, app=None, user_id=None):
+    """
+    Crawl URLs and write their scorecards to output as NDJSON.
+
+    Args:
+        urls: An iterable of raw URLs, in input order
+        output: A binary file the scorecards are written to
+        executor: 'thread' or 'process'
+        workers: Pool size (defaults to 8 threads or one process per CPU; 1 runs in this process)
+        batch_size: URLs per pool task, output flush and checkpoint
+        checkpoint_path: Where to write a checkpoint after every batch
+        checkpoint: A checkpoint to resume from, as written to checkpoint_path
+        app: The Flask application to store the scorecards with, if any
+        user_id: The user the stored profiles belong to
+
+    Returns:
+        A dict of counts like a bulk import's, with 'stored' profiles
+    """
+    if workers is None:
+        workers = (os.cpu_count() or 1) if executor == 'process' else DEFAULT_THREADS
+    checkpoint = checkpoint or {}
+    stats = {**new_import_stats(), 'stored': 0}
+    stats.update(checkpoint.get('stats', {}))
+    resumed_stats = dict(stats, platforms=dict(stats['platforms']))
+
+    batches = iter_batches(urls, batch_size, skip=checkpoint.get('position', 0))
+    for (position, batch, input_stats), results in _run_batches(batches, executor, workers):
+        for url, profile, error in results:
+            record = {'url': url, **profile} if error is None else {'url': url, 'error': error}
+            output.write(dumps(record) + b'\n')
+            stats['processed'] += 1
+            stats['succeeded' if error is None else 'failed'] += 1
+        if app is not None:
+            stats['stored'] += store_batch(app, user_id, results)
+
+        for key in ('received', 'invalid', 'duplicates'):
+            stats[key] = resumed_stats[key] + input_stats[key]
+        stats['platforms'] = dict(resumed_stats['platforms'])
+        for platform, count in input_stats['platforms'].items():
+            stats['platforms'][platform] = stats['platforms'].get(platform, 0) + count
+
+        _sync(output)
+        if checkpoint_path:
+            write_checkpoint(checkpoint_path, {
+                'position': position,
+                'output_bytes': output.tell() if output.seekable() else None,
+                'user_id': user_id,
+                'stats': stats,
+            })
+        logger.info("Scored %d URLs (%d failed)", stats['processed'], stats['failed'])
+
+    return stats
+
+def detect_input_format(path, explicit_format=None):
+    """Return the format of an input file: the explicit one, else NDJSON by extension, else CSV."""
+    if explicit_format:
+        return explicit_format
+    return FORMAT_NDJSON if path.lower().endswith(NDJSON_EXTENSIONS) else FORMAT_CSV
+
+def _file_size(path):
+    """Return the size of a file, or -1 if it does not exist."""
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return -1
+
+def _open_output(path, checkpoint):
+    """Open the output, cut back to the checkpoint's end when resuming."""
+    if path == '-':
+        return sys.stdout.buffer
+    if checkpoint is None or checkpoint.get('output_bytes') is None:
+        return open(path, 'wb')
+    output = open(path, 'r+b')
+    output.truncate(checkpoint['output_bytes'])
+    output.seek(0, os.SEEK_END)
+    return output
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crawl profile URLs and write their scorecards as NDJSON.")
+    parser.add_argument('input', nargs='?', default='-', help="File of URLs, or - for stdin (default)")
+    parser.add_argument('--output', '-o', default='-', help="NDJSON output file, or - for stdout (default)")
+    parser.add_argument('--format', choices=(FORMAT_CSV, FORMAT_NDJSON),
+                        help="Input format (default: ndjson for .ndjson/.jsonl files, else csv or one URL per line)")
+    parser.add_argument('--executor', choices=('thread', 'process'), default='thread')
+    parser.add_argument('--workers', type=int,
+                        help=f"Pool size (default: {DEFAULT_THREADS} threads or one process per CPU)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="URLs per task and per checkpoint")
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: OUTPUT.checkpoint when writing to a file)")
+    parser.add_argument('--resume', action='store_true', help="Continue from the checkpoint if there is one")
+    parser.add_argument('--store', action='store_true', help="Also save the scorecards as profiles of a user")
+    parser.add_argument('--user-id', help="User the stored profiles belong to (default: a new user)")
+    args = parser.parse_args(argv)
+
+    checkpoint_path = args.checkpoint or (f'{args.output}.checkpoint' if args.output != '-' else None)
+    if args.resume and not checkpoint_path:
+        parser.error("--resume needs --checkpoint when writing to stdout")
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    checkpoint = read_checkpoint(checkpoint_path) if args.resume else None
+    if checkpoint is not None:
+        output_bytes = checkpoint.get('output_bytes')
+        if args.output != '-' and output_bytes is not None and _file_size(args.output) < output_bytes:
+            parser.error(f"{args.output} is missing or shorter than its checkpoint {checkpoint_path}; "
+                         "restore it or run without --resume")
+        logger.info("Resuming after input position %d", checkpoint['position'])
+
+    app = user_id = None
+    if args.store:
+        from app import create_app
+
+        app = create_app()
+        user_id = args.user_id or (checkpoint or {}).get('user_id') or str(uuid.uuid4())
+
+    stream = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+    output = _open_output(args.output, checkpoint)
+    try:
+        urls = iter_upload_urls(stream, detect_input_format(args.input, args.format))
+        stats = generate_scorecards(urls, output, executor=args.executor, workers=args.workers,
+                                    batch_size=args.batch_size, checkpoint_path=checkpoint_path,
+                                    checkpoint=checkpoint, app=app, user_id=user_id)
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+        if output is not sys.stdout.buffer:
+            output.close()
+
+    print(json.dumps({'user_id': user_id, **stats} if user_id else stats), file=sys.stderr)
+    return 1 if stats['failed'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""
+Content-addressed archive of raw Firecrawl scrape results.
+
+The crawler used to drop the scraped markdown/html as soon as the profile
+data was extracted, so improving an extractor meant scraping every page
+again. When FIASCO_SCRAPE_ARCHIVE_DIR is set, every successful scrape is
+kept here and can be replayed through the current extractors with
+reextract.py.
+
+Each distinct scrape payload is stored once, keyed by the SHA-256 of its
+canonical JSON and compressed with zstd (when the ``zstandard`` package is
+installed) or gzip. Objects are appended to pack files of up to
+MAX_PACK_BYTES, which are memory-mapped for reads. A SQLite index in the
+archive directory maps keys to pack offsets and records every scrape of a
+URL. Appends are serialized with a file lock, so several worker processes
+can share one archive.
+"""
+
+import fcntl
+import gzip
+import hashlib
+import logging
+import mmap
+import os
+import sqlite3
+import threading
+import time
+
+from json_codec import dumps, loads
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CODECS = ('zstd', 'gzip')
+MAX_PACK_BYTES = 256 * 1024 * 1024
+ZSTD_LEVEL = 3
+GZIP_LEVEL = 6
+
+INDEX_FILE = 'index.db'
+LOCK_FILE = 'archive.lock'
+
+ARCHIVE_WRITES_TOTAL = REGISTRY.counter(
+    'fiasco_scrape_archive_writes_total',
+    'Scrapes archived, by whether their payload was new or a duplicate.',
+    ('result',)
+)
+ARCHIVE_BYTES_TOTAL = REGISTRY.counter(
+    'fiasco_scrape_archive_bytes_total',
+    'Payload bytes of newly archived scrapes before and after compression.',
+    ('size',)
+)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS objects (
+    key TEXT PRIMARY KEY,
+    pack INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    raw_length INTEGER NOT NULL,
+    codec TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scrapes (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    platform TEXT,
+    username TEXT,
+    key TEXT NOT NULL,
+    scraped_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_scrapes_url_id ON scrapes (url, id);
+'''
+
+# zstandard is imported on first use, see load_zstd()
+_zstd = None
+_zstd_checked = False
+
+def load_zstd():
+    """Return the zstandard module, or None if it is not installed."""
+    global _zstd, _zstd_checked
+
+    if not _zstd_checked:
+        try:
+            import zstandard
+            _zstd = zstandard
+        except ImportError:
+            _zstd = None
+        _zstd_checked = True
+    return _zstd
+
+def default_codec():
+    """Return zstd when zstandard is installed, otherwise gzip."""
+    return 'zstd' if load_zstd() is not None else 'gzip'
+
+def compress(data, codec):
+    if codec == 'zstd':
+        return load_zstd().ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+def decompress(data, codec):
+    if codec == 'zstd':
+        zstd = load_zstd()
+        if zstd is None:
+            raise RuntimeError("Archive object is zstd compressed but zstandard is not installed")
+        return zstd.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+def content_key(payload):
+    """Return the canonical JSON and content key of a scrape payload."""
+    data = dumps(payload, sort_keys=True)
+    return data, hashlib.sha256(data).hexdigest()
+
+class ScrapeArchive:
+    """
+    Archive of raw scrape payloads in a directory.
+
+    Args:
+        directory: The archive directory, created if needed
+        codec: 'zstd' or 'gzip' for new objects (defaults to default_codec())
+        max_pack_bytes: Size at which a new pack file is started
+    """
+
+    def __init__(self, directory, codec=None, max_pack_bytes=MAX_PACK_BYTES):
+        if codec is None:
+            codec = default_codec()
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec!r}, expected one of {CODECS}")
+        self.directory = directory
+        self.codec = codec
+        self.max_pack_bytes = max_pack_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, INDEX_FILE), check_same_thread=False, timeout=30)
+        self._db.executescript(_SCHEMA)
+        # pack number -> (file, mmap) for reads
+        self._maps = {}
+
+    def _pack_path(self, pack):
+        return os.path.join(self.directory, f'pack-{pack:05d}.dat')
+
+    def _append(self, blob):
+        """Append a blob to the current pack file; the caller holds the archive file lock."""
+        row = self._db.execute('SELECT MAX(pack) FROM objects').fetchone()
+        pack = row[0] or 1
+        path = self._pack_path(pack)
+        if os.path.exists(path) and os.path.getsize(path) + len(blob) > self.max_pack_bytes:
+            pack += 1
+            path = self._pack_path(pack)
+
+        with open(path, 'ab') as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(blob)
+        return pack, offset
+
+    def put(self, url, platform, username, payload):
+        """
+        Archive a scrape of a URL.
+
+        Args:
+            url: The scraped URL
+            platform: The platform detected for the URL
+            username: The username detected for the URL
+            payload: The scrape result returned by Firecrawl
+
+        Returns:
+            The content key of the payload
+        """
+        data, key = content_key(payload)
+        with self._lock, open(os.path.join(self.directory, LOCK_FILE), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                exists = self._db.execute('SELECT 1 FROM objects WHERE key = ?', (key,)).fetchone()
+                if exists:
+                    ARCHIVE_WRITES_TOTAL.inc('duplicate')
+                else:
+                    blob = compress(data, self.codec)
+                    pack, offset = self._append(blob)
+                    self._db.execute(
+                        'INSERT INTO objects (key, pack, offset, length, raw_length, codec) VALUES (?, ?, ?, ?, ?, ?)',
+                        (key, pack, offset, len(blob), len(data), self.codec)
+                    )
+                    ARCHIVE_WRITES_TOTAL.inc('stored')
+                    ARCHIVE_BYTES_TOTAL.inc('raw', amount=len(data))
+                    ARCHIVE_BYTES_TOTAL.inc('compressed', amount=len(blob))
+                self._db.execute(
+                    'INSERT INTO scrapes (url, platform, username, key, scraped_at) VALUES (?, ?, ?, ?, ?)',
+                    (url, platform, username, key, time.time())
+                )
+                self._db.commit()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return key
+
+    def _view(self, pack, end):
+        """Return a memory map of a pack covering at least end bytes."""
+        entry = self._maps.get(pack)
+        if entry is None or len(entry[1]) < end:
+            if entry is not None:
+                entry[1].close()
+                entry[0].close()
+            f = open(self._pack_path(pack), 'rb')
+            entry = (f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            self._maps[pack] = entry
+        return entry[1]
+
+    def get(self, key):
+        """
+        Return the payload stored under a content key.
+
+        Raises:
+            KeyError: If the key is not in the archive
+        """
+        with self._lock:
+            row = self._db.execute('SELECT pack, offset, length, codec FROM objects WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                raise KeyError(key)
+            pack, offset, length, codec = row
+            blob = self._view(pack, offset + length)[offset:offset + length]
+        return loads(decompress(blob, codec))
+
+    def latest(self, url):
+        """Return the most recent scrape record of a URL as a dict, or None."""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT url, platform, username, key, scraped_at FROM scrapes WHERE url = ? ORDER BY id DESC LIMIT 1',
+                (url,)
+            ).fetchone()
+        return _record(row) if row else None
+
+    def iter_latest(self, urls=None, batch_size=1000):
+        """
+        Yield the most recent scrape record of every archived URL, or of the given URLs.
+
+        Yields:
+            Dicts with url, platform, username, key and scraped_at
+        """
+        if urls is not None:
+            for url in urls:
+                record = self.latest(url)
+                if record is not None:
+                    yield record
+            return
+
+        last_url = ''
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    'SELECT url, platform, username, key, scraped_at FROM scrapes WHERE id IN '
+                    '(SELECT MAX(id) FROM scrapes WHERE url > ? GROUP BY url ORDER BY url LIMIT ?) ORDER BY url',
+                    (last_url, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield _record(row)
+            last_url = rows[-1][0]
+
+    def stats(self):
+        """Return object, scrape and byte counts."""
+        with self._lock:
+            objects, stored, raw = self._db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(length), 0), COALESCE(SUM(raw_length), 0) FROM objects'
+            ).fetchone()
+            scrapes, urls = self._db.execute('SELECT COUNT(*), COUNT(DISTINCT url) FROM scrapes').fetchone()
+        return {
+            'objects': objects,
+            'scrapes': scrapes,
+            'urls': urls,
+            'stored_bytes': stored,
+            'raw_bytes': raw,
+            'codec': self.codec,
+        }
+
+    def close(self):
+        with self._lock:
+            for f, view in self._maps.values():
+                view.close()
+                f.close()
+            self._maps.clear()
+            self._db.close()
+
+def _record(row):
+    url, platform, username, key, scraped_at = row
+    return {'url': url, 'platform': platform, 'username': username, 'key': key, 'scraped_at': scraped_at}
+
+# The archive configured for this process, see get_scrape_archive()
+_archive = None
+_archive_pid = None
+
+def get_scrape_archive():
+    """Return the archive configured by FIASCO_SCRAPE_ARCHIVE_DIR, or None if archiving is off."""
+    global _archive, _archive_pid
+
+    directory = os.environ.get('FIASCO_SCRAPE_ARCHIVE_DIR')
+    if not directory:
+        return None
+    if _archive is None or _archive_pid != os.getpid() or _archive.directory != directory:
+        _archive = ScrapeArchive(directory)
+        _archive_pid = os.getpid()
+    return _archive
+
+def archive_scrape(url, platform, username, payload):
+    """
+    Archive a scrape if archiving is enabled; failures are logged, not raised.
+
+    Returns:
+        The content key, or None if nothing was archived
+    """
+    try:
+        archive = get_scrape_archive()
+        if archive is None:
+            return None
+        return archive.put(url, platform, username, payload)
+    except Exception as e:
+        ARCHIVE_WRITES_TOTAL.inc('error')
+        logger.error("Failed to archive scrape of %s: %s", url, e, extra={'url': url})
+        return None
@@ -0,0 +1,300 @@
+"""
+Adaptive concurrency limit for Firecrawl scrapes.
+
+A fixed number of concurrent scrapes is either too low while Firecrawl is
+fast or too high once it slows down, when every extra scrape only queues
+upstream until it times out. AdaptiveLimiter finds the limit with AIMD,
+like TCP congestion control:
+
+- while the smoothed scrape latency stays within FIASCO_SCRAPE_LIMIT_TOLERANCE
+  times the no-load latency and scrapes succeed, the limit grows by one
+  scrape per limit's worth of scrapes, as long as it is actually in use
+- when the smoothed latency rises above that or a scrape fails, the limit
+  is multiplied by FIASCO_SCRAPE_LIMIT_BACKOFF, at most once for the
+  scrapes that were already running when it was last cut
+
+The no-load latency is the lowest smoothed latency seen. It is only raised
+when the limit was down at FIASCO_SCRAPE_LIMIT_MIN during a window of
+BASELINE_WINDOW scrapes and latency still did not come down, to the lowest
+latency of that window: Firecrawl got slower for good. Raising it whenever
+latency stays up would take congestion for the new normal and let the limit
+creep up. Scrapes over the limit wait up to FIASCO_SCRAPE_LIMIT_WAIT seconds
+for a slot and then fail with ScrapeLimitExceeded, which the crawler
+treats like any other failed scrape.
+
+The limit applies to the scrapes of each process: every single scrape,
+sync or async, and every batch scrape request, which holds one slot for its
+whole batch. A batch's latency grows with its size rather than with the load
+upstream, so batches only count when they fail. Waiting coroutines take no
+thread. The current limit, scrapes in flight and limit changes are exported
+as fiasco_scrape_concurrency_limit, fiasco_scrape_in_flight and
+fiasco_scrape_limit_events_total. Set FIASCO_SCRAPE_LIMIT=0 to turn it off.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from async_firecrawl import FirecrawlError
+from metrics import REGISTRY
+
+SCRAPE_LIMIT_ENABLED = os.environ.get('FIASCO_SCRAPE_LIMIT', '1').lower() not in ('0', 'false', 'no')
+SCRAPE_LIMIT_INITIAL = int(os.environ.get('FIASCO_SCRAPE_LIMIT_INITIAL', 8))
+SCRAPE_LIMIT_MIN = int(os.environ.get('FIASCO_SCRAPE_LIMIT_MIN', 1))
+SCRAPE_LIMIT_MAX = int(os.environ.get('FIASCO_SCRAPE_LIMIT_MAX', 64))
+# Smoothed latency over the no-load latency that counts as congestion
+SCRAPE_LIMIT_TOLERANCE = float(os.environ.get('FIASCO_SCRAPE_LIMIT_TOLERANCE', 1.5))
+# Factor the limit is multiplied by on congestion or errors
+SCRAPE_LIMIT_BACKOFF = float(os.environ.get('FIASCO_SCRAPE_LIMIT_BACKOFF', 0.8))
+# Seconds a scrape waits for a slot before it fails
+SCRAPE_LIMIT_WAIT = float(os.environ.get('FIASCO_SCRAPE_LIMIT_WAIT', 30))
+
+# Weight of a new sample in the smoothed latency
+LATENCY_SMOOTHING = 0.2
+# Scrapes after which the no-load latency may be raised, see above
+BASELINE_WINDOW = 1000
+
+SCRAPE_CONCURRENCY_LIMIT = REGISTRY.gauge(
+    'fiasco_scrape_concurrency_limit',
+    'Current adaptive limit of concurrent scrapes in this process.'
+)
+SCRAPE_IN_FLIGHT = REGISTRY.gauge(
+    'fiasco_scrape_in_flight',
+    'Scrapes in flight under the adaptive concurrency limit.'
+)
+SCRAPE_LIMIT_EVENTS_TOTAL = REGISTRY.counter(
+    'fiasco_scrape_limit_events_total',
+    'Adaptive scrape limit events: decreased (on congestion or errors) and rejected '
+    '(a scrape waited too long for a slot).',
+    ('event',)
+)
+
+class ScrapeLimitExceeded(FirecrawlError):
+    """A scrape waited longer than allowed for a slot under the concurrency limit."""
+
+class AdaptiveLimiter:
+    """
+    A concurrency limit that adapts to the latency and errors of what it limits.
+
+    Args:
+        initial: The starting limit
+        min_limit: The lowest the limit goes
+        max_limit: The highest the limit goes
+        tolerance: Smoothed latency over the no-load latency that counts as congestion
+        backoff: Factor the limit is multiplied by on congestion or errors
+        wait: Seconds acquire() waits for a slot by default
+        clock: The monotonic clock to use
+    """
+
+    def __init__(self, initial=SCRAPE_LIMIT_INITIAL, min_limit=SCRAPE_LIMIT_MIN, max_limit=SCRAPE_LIMIT_MAX,
+                 tolerance=SCRAPE_LIMIT_TOLERANCE, backoff=SCRAPE_LIMIT_BACKOFF, wait=SCRAPE_LIMIT_WAIT,
+                 clock=time.monotonic):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.wait = wait
+        self.clock = clock
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.in_flight = 0
+        self.latency = None
+        self.baseline = None
+        # Lowest smoothed latency of the current window, scrapes in it, and
+        # whether the limit was at its minimum during it
+        self._window_min = None
+        self._window_samples = 0
+        self._window_at_min = False
+        self._last_decrease = float('-inf')
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        SCRAPE_CONCURRENCY_LIMIT.set(self.limit)
+
+    def acquire(self, timeout=None):
+        """
+        Wait for a slot under the limit; slots are handed to waiting scrapes in arrival order.
+
+        Returns:
+            The time the slot was taken, to pass to release()
+
+        Raises:
+            ScrapeLimitExceeded: No slot was free within timeout (by default the wait setting)
+        """
+        with self._lock:
+            if self._take_free_slot():
+                return self.clock()
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+
+        if not waiter.wait(self.wait if timeout is None else timeout):
+            with self._lock:
+                # The slot may have been handed over just as the wait ran out
+                if not waiter.is_set():
+                    self._reject(waiter)
+        return self.clock()
+
+    async def acquire_async(self, timeout=None):
+        """Like acquire(), for coroutines; waiting takes no thread."""
+        with self._lock:
+            if self._take_free_slot():
+                return self.clock()
+            waiter = _AsyncWaiter(asyncio.get_running_loop())
+            self._waiters.append(waiter)
+
+        try:
+            await asyncio.wait_for(waiter.future, self.wait if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                if not waiter.is_set():
+                    self._reject(waiter)
+        except asyncio.CancelledError:
+            with self._lock:
+                handed_over = waiter.is_set()
+                if not handed_over:
+                    self._waiters.remove(waiter)
+            if handed_over:
+                self.release(self.clock(), record=False)
+            raise
+        return self.clock()
+
+    def _take_free_slot(self):
+        # Called with the lock held
+        if self._waiters or self.in_flight >= int(self.limit):
+            return False
+        self.in_flight += 1
+        SCRAPE_IN_FLIGHT.set(self.in_flight)
+        return True
+
+    def _reject(self, waiter):
+        # Called with the lock held
+        self._waiters.remove(waiter)
+        SCRAPE_LIMIT_EVENTS_TOTAL.inc('rejected')
+        raise ScrapeLimitExceeded(f"No scrape slot free within the limit of {int(self.limit)}")
+
+    def release(self, started, failed=False, record=True):
+        """
+        Free a slot and adjust the limit by how long the scrape took and whether it failed.
+
+        With record=False the slot is freed without the scrape counting either way.
+        """
+        now = self.clock()
+        with self._lock:
+            in_flight = self.in_flight
+            self.in_flight -= 1
+            if record:
+                self._update(started, now, in_flight, failed)
+            # Hand free slots to waiting scrapes rather than to whoever asks next
+            while self._waiters and self.in_flight < int(self.limit):
+                self._waiters.popleft().set()
+                self.in_flight += 1
+            SCRAPE_IN_FLIGHT.set(self.in_flight)
+
+    def _update(self, started, now, in_flight, failed):
+        latency = now - started
+        if not failed:
+            self.latency = latency if self.latency is None else \
+                self.latency + (latency - self.latency) * LATENCY_SMOOTHING
+            if self._window_min is None or self.latency < self._window_min:
+                self._window_min = self.latency
+            if self.baseline is None or self.latency < self.baseline:
+                self.baseline = self.latency
+            self._window_at_min = self._window_at_min or self.limit <= self.min_limit
+            self._window_samples += 1
+            if self._window_samples >= BASELINE_WINDOW:
+                if self._window_at_min:
+                    self.baseline = self._window_min
+                self._window_min, self._window_samples, self._window_at_min = None, 0, False
+
+        if failed or self.latency > self.baseline * self.tolerance:
+            # Scrapes that started before the last cut saw the old limit; one cut covers them
+            if started >= self._last_decrease:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+                SCRAPE_LIMIT_EVENTS_TOTAL.inc('decreased')
+        elif in_flight * 2 >= self.limit:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        SCRAPE_CONCURRENCY_LIMIT.set(self.limit)
+
+    @contextmanager
+    def slot(self, timeout=None, timed=True):
+        """
+        Hold a slot for the block; an exception in it counts as a failed scrape.
+
+        With timed=False a successful block frees the slot without a latency
+        sample, for work whose duration says nothing about the load upstream.
+        """
+        started = self.acquire(timeout)
+        try:
+            yield
+        except Exception:
+            self.release(started, failed=True)
+            raise
+        except BaseException:
+            # Interrupts say nothing about the scraped service
+            self.release(started, record=False)
+            raise
+        self.release(started, record=timed)
+
+    @asynccontextmanager
+    async def async_slot(self, timeout=None):
+        """Like slot(), for coroutines."""
+        started = await self.acquire_async(timeout)
+        try:
+            yield
+        except Exception:
+            self.release(started, failed=True)
+            raise
+        except BaseException:
+            self.release(started, record=False)
+            raise
+        self.release(started)
+
+class _AsyncWaiter:
+    """A coroutine waiting for a slot; release() hands it one from any thread."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self._set = False
+
+    def set(self):
+        self._set = True
+        try:
+            self.loop.call_soon_threadsafe(self._resolve)
+        except RuntimeError:
+            # The loop is closed, so nothing is waiting any more
+            pass
+
+    def is_set(self):
+        return self._set
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+# The limiter of this process, see get_scrape_limiter()
+_limiter = None
+_limiter_pid = None
+_limiter_lock = threading.Lock()
+
+def get_scrape_limiter():
+    """Return the scrape limiter of this process, or None when limiting is off."""
+    global _limiter, _limiter_pid
+
+    if not SCRAPE_LIMIT_ENABLED:
+        return None
+    with _limiter_lock:
+        if _limiter_pid != os.getpid():
+            _limiter = AdaptiveLimiter()
+            _limiter_pid = os.getpid()
+        return _limiter
+
+def set_scrape_limiter(limiter):
+    """Replace the scrape limiter of this process, or turn limiting off with None."""
+    global _limiter, _limiter_pid
+
+    with _limiter_lock:
+        _limiter = limiter
+        _limiter_pid = os.getpid()
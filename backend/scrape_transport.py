@@ -0,0 +1,287 @@
+"""
+Pooled keep-alive HTTP transport and Firecrawl client for scraping.
+
+A scrape used to open a new connection (and TLS handshake) per request, or
+go through whatever the Firecrawl SDK does internally. FirecrawlClient
+speaks the Firecrawl v1 scrape and batch scrape API over a ConnectionPool
+instead: idle connections are kept alive and reused, TLS sessions are
+resumed on new connections, and connecting and reading have separate
+timeouts. The pool hands each connection to one thread at a time, so one
+client is shared by every thread of a process.
+
+Set FIASCO_FIRECRAWL_CLIENT=sdk to use the Firecrawl SDK instead; its
+thread safety is not documented, so each thread gets its own SDK client
+through ThreadLocalClient.
+
+Connection reuse is counted in fiasco_scrape_connections_total and the
+idle connections of each pool are in fiasco_scrape_pool_idle_connections.
+"""
+
+import http.client
+import json
+import os
+import ssl
+import threading
+import time
+from urllib.parse import urlparse
+
+from async_firecrawl import FirecrawlError
+from metrics import REGISTRY
+
+# 'pooled' for FirecrawlClient, 'sdk' for a FirecrawlApp per thread
+FIRECRAWL_CLIENT = os.environ.get('FIASCO_FIRECRAWL_CLIENT', 'pooled')
+# Idle connections kept per pool; bursts beyond it open connections that are closed after use
+POOL_SIZE = int(os.environ.get('FIASCO_SCRAPE_POOL_SIZE', 32))
+CONNECT_TIMEOUT = float(os.environ.get('FIASCO_SCRAPE_CONNECT_TIMEOUT', 5))
+READ_TIMEOUT = float(os.environ.get('FIASCO_SCRAPE_READ_TIMEOUT', 60))
+# Seconds an idle connection is kept before it is assumed closed by the server
+IDLE_TIMEOUT = float(os.environ.get('FIASCO_SCRAPE_IDLE_TIMEOUT', 30))
+# Seconds between status polls of a batch scrape, and the longest a batch may take
+BATCH_POLL_INTERVAL = float(os.environ.get('FIASCO_BATCH_SCRAPE_POLL_INTERVAL', 0.5))
+BATCH_TIMEOUT = float(os.environ.get('FIASCO_BATCH_SCRAPE_TIMEOUT', 300))
+
+SCRAPE_CONNECTIONS_TOTAL = REGISTRY.counter(
+    'fiasco_scrape_connections_total',
+    'Scrape transport connection events: opened, reused, tls_resumed, stale (reused '
+    'but closed by the server), expired (idle too long) and discarded (pool full).',
+    ('event',)
+)
+SCRAPE_POOL_IDLE = REGISTRY.gauge(
+    'fiasco_scrape_pool_idle_connections',
+    'Idle keep-alive connections in the scrape connection pool, by host.',
+    ('host',)
+)
+
+# Errors of a reused connection the server closed while it was idle
+_STALE_ERRORS = (ConnectionResetError, BrokenPipeError, http.client.RemoteDisconnected)
+
+class _PooledConnection(http.client.HTTPConnection):
+    """An HTTP(S) connection with a connect timeout, then a read timeout."""
+
+    def __init__(self, pool):
+        super().__init__(pool.host, pool.port, timeout=pool.connect_timeout)
+        self.default_port = 443 if pool.ssl_context is not None else 80
+        self._pool = pool
+
+    def connect(self):
+        super().connect()
+        if self._pool.ssl_context is not None:
+            self.sock = self._pool.wrap_tls(self.sock)
+        self.sock.settimeout(self._pool.read_timeout)
+
+class ConnectionPool:
+    """
+    A thread-safe pool of keep-alive connections to one HTTP(S) origin.
+
+    Args:
+        url: The base URL; its path is prefixed to every request path
+        maxsize: Idle connections kept for reuse
+        connect_timeout: Seconds allowed to connect, including the TLS handshake
+        read_timeout: Seconds allowed for each read of a response
+        idle_timeout: Seconds after which an idle connection is not reused
+    """
+
+    def __init__(self, url, maxsize=POOL_SIZE, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 idle_timeout=IDLE_TIMEOUT):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.ssl_context = ssl.create_default_context() if parsed.scheme == 'https' else None
+        self.port = parsed.port or (443 if self.ssl_context is not None else 80)
+        self.base_path = parsed.path.rstrip('/')
+        self.maxsize = maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.idle_timeout = idle_timeout
+        self._idle = []
+        self._tls_session = None
+        self._lock = threading.Lock()
+
+    def wrap_tls(self, sock):
+        """Start TLS on a new connection, resuming the pool's last TLS session."""
+        tls = self.ssl_context.wrap_socket(sock, server_hostname=self.host, session=self._tls_session)
+        if tls.session_reused:
+            SCRAPE_CONNECTIONS_TOTAL.inc('tls_resumed')
+        if tls.session is not None:
+            self._tls_session = tls.session
+        return tls
+
+    def _acquire(self):
+        """Return an idle connection, or a new one, and whether it is reused."""
+        expired = []
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                connection, last_used = self._idle.pop()
+                if now - last_used < self.idle_timeout:
+                    break
+                expired.append(connection)
+            else:
+                connection = None
+            SCRAPE_POOL_IDLE.set(len(self._idle), self.host)
+
+        for stale in expired:
+            stale.close()
+            SCRAPE_CONNECTIONS_TOTAL.inc('expired')
+        if connection is not None:
+            SCRAPE_CONNECTIONS_TOTAL.inc('reused')
+            return connection, True
+        SCRAPE_CONNECTIONS_TOTAL.inc('opened')
+        return _PooledConnection(self), False
+
+    def _release(self, connection):
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append((connection, time.monotonic()))
+                SCRAPE_POOL_IDLE.set(len(self._idle), self.host)
+                return
+        connection.close()
+        SCRAPE_CONNECTIONS_TOTAL.inc('discarded')
+
+    def request(self, method, path, body=None, headers=None):
+        """
+        Send a request on a pooled connection.
+
+        A reused connection that turns out to have been closed by the server
+        is replaced and the request sent once more.
+
+        Returns:
+            The status and body bytes of the response
+
+        Raises:
+            FirecrawlError: The request failed or timed out
+        """
+        while True:
+            connection, reused = self._acquire()
+            try:
+                connection.request(method, self.base_path + path, body=body, headers=headers or {})
+                response = connection.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                if reused and isinstance(e, _STALE_ERRORS):
+                    SCRAPE_CONNECTIONS_TOTAL.inc('stale')
+                    continue
+                raise FirecrawlError(f"{method} {self.host}{path} failed: {e}") from e
+            except BaseException:
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(connection)
+            return response.status, data
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            SCRAPE_POOL_IDLE.set(0, self.host)
+        for connection, _ in idle:
+            connection.close()
+
+class FirecrawlClient:
+    """
+    Thread-safe client for the Firecrawl v1 scrape API on a ConnectionPool.
+
+    Has the scrape_url and batch_scrape_urls methods of FirecrawlApp that
+    the crawler uses, returning plain dicts.
+
+    Args:
+        api_key: The Firecrawl API key
+        api_url: The base URL of the Firecrawl API
+        pool: The ConnectionPool to use; one for api_url with the
+            FIASCO_SCRAPE_* settings by default
+        poll_interval: Seconds between status polls of a batch scrape
+        batch_timeout: Seconds a batch scrape may take in total
+    """
+
+    def __init__(self, api_key, api_url='https://api.firecrawl.dev', pool=None,
+                 poll_interval=BATCH_POLL_INTERVAL, batch_timeout=BATCH_TIMEOUT):
+        self.api_key = api_key
+        self.pool = pool or ConnectionPool(api_url)
+        self.poll_interval = poll_interval
+        self.batch_timeout = batch_timeout
+        self._headers = {'Content-Type': 'application/json', 'Accept': 'application/json',
+                         'Authorization': f'Bearer {api_key}'}
+
+    def _call(self, method, path, payload=None):
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        status, response_body = self.pool.request(method, path, body=body, headers=self._headers)
+        try:
+            data = json.loads(response_body or b'{}')
+        except ValueError:
+            raise FirecrawlError(f"{method} {path} failed with status {status}: invalid JSON response")
+
+        if status != 200 or not data.get('success', True):
+            raise FirecrawlError(f"{method} {path} failed with status {status}: {data.get('error')}")
+        return data
+
+    def scrape_url(self, url, formats=None, **params):
+        """Scrape a URL and return the page data dict, raising FirecrawlError on failure."""
+        return self._call('POST', '/v1/scrape', {'url': url, 'formats': formats or ['markdown'], **params})['data']
+
+    def batch_scrape_urls(self, urls, formats=None, **params):
+        """
+        Scrape URLs in one batch job and wait for it to complete.
+
+        Returns:
+            The completed job status, with the documents of every page in 'data'
+
+        Raises:
+            FirecrawlError: The job could not be started, failed or timed out
+        """
+        started = self._call('POST', '/v1/batch/scrape', {'urls': urls, 'formats': formats or ['markdown'], **params})
+        path = f"/v1/batch/scrape/{started['id']}"
+        give_up_at = time.monotonic() + self.batch_timeout
+        while True:
+            status = self._call('GET', path)
+            if status.get('status') == 'completed':
+                break
+            if status.get('status') == 'failed':
+                raise FirecrawlError(f"Batch scrape {started['id']} failed")
+            if time.monotonic() >= give_up_at:
+                raise FirecrawlError(f"Batch scrape {started['id']} did not complete in {self.batch_timeout:g}s")
+            time.sleep(self.poll_interval)
+
+        # Large jobs are paged; 'next' links to the rest of the documents
+        data = list(status.get('data') or [])
+        page = status
+        while page.get('next'):
+            parsed = urlparse(page['next'])
+            page = self._call('GET', parsed.path + (f'?{parsed.query}' if parsed.query else ''))
+            data.extend(page.get('data') or [])
+        return {**status, 'data': data, 'next': None}
+
+    def close(self):
+        self.pool.close()
+
+class ThreadLocalClient:
+    """
+    Give each thread its own instance of a client that is not thread-safe.
+
+    Attribute access is forwarded to the calling thread's instance, which
+    is created with factory() on first use.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._local = threading.local()
+
+    @property
+    def client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self._factory()
+        return client
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+def create_firecrawl_client(api_key, api_url):
+    """Create the Firecrawl client selected by FIASCO_FIRECRAWL_CLIENT."""
+    if FIRECRAWL_CLIENT == 'sdk':
+        # Imported here as the SDK is only needed when it is selected
+        from firecrawl import FirecrawlApp
+        return ThreadLocalClient(lambda: FirecrawlApp(api_key=api_key, api_url=api_url))
+    return FirecrawlClient(api_key, api_url)
@@ -0,0 +1,312 @@
+"""
+Search of stored profiles by username, across all users and platforms.
+
+Usernames are normalized (NFKC, case-folded, without a leading '@') into
+Profile.username_key, which save_profile keeps current. There are three
+search modes:
+
+- exact: the normalized username equals the query
+- prefix: the normalized username starts with the query
+- fuzzy: the normalized username is similar to the query, scored by the
+  Jaccard similarity of their trigram sets
+
+Exact and prefix searches are range scans of the (username_key, platform, id)
+index. Fuzzy candidates come from the profile_trigram table, which holds one
+row per trigram of each username. A username with a similarity of at least
+FUZZY_THRESHOLD shares at least ceil(FUZZY_THRESHOLD * n) of the query's n
+trigrams. It must therefore share one of the query's n - ceil(FUZZY_THRESHOLD * n) + 1
+rarest trigrams, so only those are probed, and common trigrams such as
+"use" are never scanned. Candidates are then scored exactly.
+
+With sharding on, each shard is searched concurrently and the results are
+merged in the same order.
+
+On SQLite, set FIASCO_SEARCH_FTS5=1 to also keep an FTS5 trigram table of
+usernames, maintained by triggers, and draw fuzzy candidates from it.
+"""
+
+import logging
+import math
+import os
+import unicodedata
+
+from sqlalchemy import bindparam, delete, func, insert, text, update
+
+from models import db, Profile, ProfileTrigram
+from sharding import fan_out, merge_sorted
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MODES = ('prefix', 'exact', 'fuzzy')
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+FUZZY_THRESHOLD = 0.3
+# Candidates scored per fuzzy search at most
+MAX_FUZZY_CANDIDATES = 5000
+# Trigram frequencies are counted up to this many rows when picking probes
+TRIGRAM_COUNT_CAP = 10000
+
+SEARCH_FTS5 = os.environ.get('FIASCO_SEARCH_FTS5', '').lower() in ('1', 'true', 'yes')
+FTS_TABLE = 'profile_search'
+
+# Largest IN list sent in one statement
+_IN_CHUNK = 500
+
+_FTS_SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(username_key, content='', tokenize='trigram')",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON profile
+        WHEN new.username_key IS NOT NULL BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, username_key) VALUES (new.id, new.username_key);
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON profile
+        WHEN old.username_key IS NOT NULL BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, username_key) VALUES ('delete', old.id, old.username_key);
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF username_key ON profile BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, username_key)
+                SELECT 'delete', old.id, old.username_key WHERE old.username_key IS NOT NULL;
+            INSERT INTO {FTS_TABLE} (rowid, username_key)
+                SELECT new.id, new.username_key WHERE new.username_key IS NOT NULL;
+        END""",
+)
+
+def normalize_username(username):
+    """Return the search key of a username or query, or None if it is empty."""
+    if not username:
+        return None
+    key = unicodedata.normalize('NFKC', username).strip().lstrip('@').casefold()
+    return key[:100] or None
+
+def username_trigrams(key):
+    """Return the trigrams of a search key, padded so the start and end of the name count more."""
+    if not key:
+        return set()
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def similarity(a, b):
+    """Jaccard similarity of two trigram sets."""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+def index_profile(profile):
+    """Update a profile's search key and trigrams after its username is set."""
+    key = normalize_username(profile.username)
+    if key == profile.username_key and profile.id is not None:
+        return
+    profile.username_key = key
+    wanted = username_trigrams(key)
+
+    if profile.id is None:
+        profile.trigrams = [ProfileTrigram(trigram=trigram) for trigram in sorted(wanted)]
+        return
+
+    current = {row.trigram: row for row in profile.trigrams}
+    for trigram, row in current.items():
+        if trigram not in wanted:
+            profile.trigrams.remove(row)
+    for trigram in sorted(wanted - current.keys()):
+        profile.trigrams.append(ProfileTrigram(trigram=trigram))
+
+def rebuild_search_index(conn, batch_size=5000):
+    """
+    Recompute every profile's search key and trigrams.
+
+    Args:
+        conn: A connection in a transaction
+        batch_size: Profiles updated per batch
+
+    Returns:
+        The number of profiles indexed
+    """
+    profiles = Profile.__table__
+    trigrams = ProfileTrigram.__table__
+    set_key = update(profiles).where(profiles.c.id == bindparam('b_id')).values(username_key=bindparam('b_key'))
+
+    indexed = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            text('SELECT id, username FROM profile WHERE id > :last_id ORDER BY id LIMIT :limit'),
+            {'last_id': last_id, 'limit': batch_size}
+        ).fetchall()
+        if not rows:
+            return indexed
+
+        keys = {profile_id: normalize_username(username) for profile_id, username in rows}
+        conn.execute(delete(trigrams).where(trigrams.c.profile_id.in_(list(keys))))
+        conn.execute(set_key, [{'b_id': profile_id, 'b_key': key} for profile_id, key in keys.items()])
+        trigram_rows = [
+            {'trigram': trigram, 'profile_id': profile_id}
+            for profile_id, key in keys.items()
+            for trigram in username_trigrams(key)
+        ]
+        if trigram_rows:
+            conn.execute(insert(trigrams), trigram_rows)
+
+        indexed += len(rows)
+        last_id = rows[-1][0]
+
+def create_fts_index(conn, enabled=None):
+    """
+    Create the FTS5 username table and its triggers if enabled and on SQLite.
+
+    Returns:
+        True if the FTS5 table is in use
+    """
+    if enabled is None:
+        enabled = SEARCH_FTS5
+    if not enabled or conn.dialect.name != 'sqlite':
+        return False
+
+    existed = _fts_table_exists(conn)
+    try:
+        for statement in _FTS_SCHEMA:
+            conn.execute(text(statement))
+    except Exception as e:
+        logger.warning("SQLite FTS5 trigram search is unavailable: %s", e)
+        return False
+
+    if not existed:
+        conn.execute(text(
+            f'INSERT INTO {FTS_TABLE} (rowid, username_key) '
+            'SELECT id, username_key FROM profile WHERE username_key IS NOT NULL'
+        ))
+    return True
+
+def _fts_table_exists(conn):
+    return conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+    ).first() is not None
+
+def parse_search_params(args):
+    """
+    Parse the q, mode, platform and limit parameters of a search.
+
+    Args:
+        args: A mapping of query parameters
+
+    Returns:
+        A tuple of (key, mode, platform, limit)
+
+    Raises:
+        ValueError: If a parameter is missing or invalid
+    """
+    key = normalize_username(args.get('q'))
+    if key is None:
+        raise ValueError("q is required")
+    mode = args.get('mode') or 'prefix'
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"mode must be one of {', '.join(SEARCH_MODES)}")
+    try:
+        limit = int(args.get('limit') or DEFAULT_SEARCH_LIMIT)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    return key, mode, args.get('platform') or None, max(1, min(limit, MAX_SEARCH_LIMIT))
+
+def _result(profile, score=None):
+    result = {
+        'user_id': profile.user_id,
+        'url': profile.url,
+        'platform': profile.platform,
+        'username': profile.username,
+        'risk_level': profile.risk_level,
+    }
+    if score is not None:
+        result['score'] = round(score, 4)
+    return result
+
+def _profile_rows(query):
+    return query.with_entities(
+        Profile.id, Profile.user_id, Profile.url, Profile.platform, Profile.username,
+        Profile.username_key, Profile.risk_level
+    )
+
+def _probe_trigrams(query_trigrams, threshold):
+    """Return the rarest query trigrams, enough that every match shares one of them."""
+    needed = math.ceil(threshold * len(query_trigrams))
+    counts = {
+        trigram: db.session.execute(
+            text('SELECT COUNT(*) FROM (SELECT 1 FROM profile_trigram WHERE trigram = :trigram LIMIT :cap)'),
+            {'trigram': trigram, 'cap': TRIGRAM_COUNT_CAP}
+        ).scalar()
+        for trigram in query_trigrams
+    }
+    rarest = sorted(query_trigrams, key=lambda trigram: (counts[trigram], trigram))
+    return [trigram for trigram in rarest[:len(query_trigrams) - needed + 1] if counts[trigram]]
+
+def _fuzzy_candidates(key, query_trigrams, threshold):
+    if SEARCH_FTS5 and db.session.get_bind().dialect.name == 'sqlite' and _fts_table_exists(db.session):
+        # FTS5 ranks usernames sharing the most (and rarest) trigrams first
+        inner = {key[i:i + 3] for i in range(len(key) - 2)}
+        expression = ' OR '.join('"{}"'.format(trigram.replace('"', '""')) for trigram in sorted(inner))
+        return [row[0] for row in db.session.execute(
+            text(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :expression ORDER BY rank LIMIT :limit'),
+            {'expression': expression, 'limit': MAX_FUZZY_CANDIDATES}
+        )]
+
+    probes = _probe_trigrams(query_trigrams, threshold)
+    if not probes:
+        return []
+    # Keep the candidates that share enough of the query's trigrams, reading
+    # each candidate's own trigram rows rather than the common trigrams' lists
+    candidates = db.session.query(ProfileTrigram.profile_id).filter(
+        ProfileTrigram.trigram.in_(probes)
+    ).distinct().limit(MAX_FUZZY_CANDIDATES).subquery()
+    shared = db.session.query(ProfileTrigram.profile_id).join(
+        candidates, ProfileTrigram.profile_id == candidates.c.profile_id
+    ).filter(ProfileTrigram.trigram.in_(sorted(query_trigrams))).group_by(ProfileTrigram.profile_id).having(
+        func.count() >= math.ceil(threshold * len(query_trigrams))
+    )
+    return [row[0] for row in shared]
+
+def find_profiles(key, mode='prefix', platform=None, limit=DEFAULT_SEARCH_LIMIT, threshold=FUZZY_THRESHOLD):
+    """
+    Search stored profiles of every user by normalized username.
+
+    Args:
+        key: The normalized query (see normalize_username)
+        mode: 'exact', 'prefix' or 'fuzzy'
+        platform: Only return profiles of this platform
+        limit: The maximum number of results
+        threshold: The minimum similarity of fuzzy matches
+
+    Returns:
+        A list of dicts with user_id, url, platform, username and risk_level,
+        plus the similarity score for fuzzy searches, best matches first
+    """
+    results = fan_out(_find_profiles, key, mode, platform, limit, threshold)
+    if mode == 'fuzzy' and len(key) >= 3:
+        return merge_sorted(results, lambda result: -result['score'], limit)
+    return merge_sorted(results, lambda result: (normalize_username(result['username']) or '', result['platform'] or ''),
+                        limit)
+
+def _find_profiles(key, mode, platform, limit, threshold):
+    query = Profile.query
+    if platform:
+        query = query.filter(Profile.platform == platform)
+
+    # Queries too short to have inner trigrams match by prefix instead
+    if mode == 'fuzzy' and len(key) >= 3:
+        query_trigrams = username_trigrams(key)
+        candidates = _fuzzy_candidates(key, query_trigrams, threshold)
+        scored = []
+        for start in range(0, len(candidates), _IN_CHUNK):
+            rows = _profile_rows(query.filter(Profile.id.in_(candidates[start:start + _IN_CHUNK])))
+            for row in rows:
+                score = similarity(query_trigrams, username_trigrams(row.username_key))
+                if score >= threshold:
+                    scored.append((score, row))
+        scored.sort(key=lambda item: (-item[0], item[1].id))
+        return [_result(row, score) for score, row in scored[:limit]]
+
+    if mode == 'exact':
+        query = query.filter(Profile.username_key == key)
+    else:
+        # A range over the index; chr(0x10FFFF) sorts after every character
+        query = query.filter(Profile.username_key >= key, Profile.username_key < key + '\U0010ffff')
+    rows = _profile_rows(query.order_by(Profile.username_key, Profile.platform, Profile.id).limit(limit))
+    return [_result(row) for row in rows]
@@ -0,0 +1,211 @@
+"""
+Production entry point running the API in several worker processes.
+
+The parent process imports the app, binds the listening socket and forks the
+workers, which all accept connections from that socket. The parent restarts
+workers that die and stops them all on SIGTERM or SIGINT. Each worker drops
+the database connections and Firecrawl clients inherited from the parent
+before serving its first request (see init_worker).
+
+Shared state lives in the database: unless FIASCO_RESULT_STORE is set, the
+result store is switched to 'database' when more than one worker is started.
+Metrics are still collected per worker.
+
+Usage:
+    python serve.py --workers 4 --port 5000
+
+To run under gunicorn instead, use gunicorn.conf.py:
+    gunicorn -c gunicorn.conf.py app:app
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = int(os.environ.get('FIASCO_WORKERS', os.cpu_count() or 1))
+
+# Seconds to wait for workers to exit on shutdown before killing them
+GRACEFUL_TIMEOUT = 30
+
+def init_worker(app):
+    """
+    Prepare a freshly forked worker process.
+
+    Pooled database connections must not be shared with the parent, so the
+    engine pools are replaced without closing the parent's connections.
+    Firecrawl clients are rebuilt on first use by crawler's fork hook, and the
+    async log listener thread, which does not survive a fork, is restarted.
+    """
+    import crawler
+    from log_config import configure_logging
+    from models import db
+    from sharding import shard_engines
+
+    with app.app_context():
+        # And every shard's engine when sharding is on
+        for engine in {db.engine, *shard_engines(db)}:
+            engine.dispose(close=False)
+    crawler.reset_firecrawl_clients()
+    configure_logging()
+
+class PreforkServer:
+    """
+    A pre-forking WSGI server built on werkzeug.
+
+    Args:
+        app: The WSGI application
+        host: The interface to bind to
+        port: The port to bind to (0 picks a free port)
+        workers: The number of worker processes
+        threaded: Whether each worker handles requests in a thread per request
+        backlog: The listen backlog of the shared socket
+    """
+
+    def __init__(self, app, host='127.0.0.1', port=5000, workers=DEFAULT_WORKERS, threaded=True, backlog=2048):
+        self.app = app
+        self.host = host
+        self.workers = max(1, workers)
+        self.threaded = threaded
+        self.pids = set()
+        self._stopping = False
+
+        self.socket = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        self.socket.listen(backlog)
+
+    @property
+    def port(self):
+        return self.socket.getsockname()[1]
+
+    def start(self):
+        """Fork the worker processes and return."""
+        for _ in range(self.workers - len(self.pids)):
+            self._spawn()
+        return self
+
+    def serve_forever(self):
+        """Start the workers and supervise them until SIGTERM or SIGINT."""
+        signal.signal(signal.SIGTERM, self._handle_stop_signal)
+        signal.signal(signal.SIGINT, self._handle_stop_signal)
+        self.start()
+        logger.info("Serving on http://%s:%d with %d workers", self.host, self.port, self.workers)
+
+        while self.pids:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            self.pids.discard(pid)
+            if not self._stopping:
+                logger.warning("Worker %d exited with status %d, restarting", pid, status)
+                self._spawn()
+
+        self.socket.close()
+
+    def stop(self, timeout=GRACEFUL_TIMEOUT):
+        """Ask every worker to finish its current requests and exit."""
+        self._stopping = True
+        for pid in list(self.pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                self.pids.discard(pid)
+
+        deadline = time.monotonic() + timeout
+        while self.pids and time.monotonic() < deadline:
+            for pid in list(self.pids):
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done = pid
+                if done:
+                    self.pids.discard(pid)
+            time.sleep(0.05)
+
+        for pid in list(self.pids):
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.pids.clear()
+        self.socket.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _handle_stop_signal(self, signum, frame):
+        if not self._stopping:
+            logger.info("Received signal %d, stopping workers", signum)
+            # Stop from a thread so the supervisor loop keeps reaping workers
+            threading.Thread(target=self.stop, daemon=True).start()
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid:
+            self.pids.add(pid)
+            return pid
+
+        # Worker process: never return into the parent's code
+        status = 0
+        try:
+            self._run_worker()
+        except BaseException:
+            logger.exception("Worker %d crashed", os.getpid())
+            status = 1
+        finally:
+            logging.shutdown()
+            os._exit(status)
+
+    def _run_worker(self):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        init_worker(self.app)
+
+        server = make_server(self.host, self.port, self.app, threaded=self.threaded, fd=self.socket.fileno())
+
+        def shutdown(signum, frame):
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        server.serve_forever()
+        server.server_close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the API with several worker processes.")
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--no-threads', dest='threaded', action='store_false',
+                        help="Handle one request at a time in each worker")
+    args = parser.parse_args(argv)
+
+    if args.workers > 1:
+        os.environ.setdefault('FIASCO_RESULT_STORE', 'database')
+
+    from app import create_app
+    from models import create_schema
+
+    app = create_app()
+    with app.app_context():
+        create_schema()
+
+    server = PreforkServer(app, args.host, args.port, args.workers, args.threaded)
+    print(f"Starting {args.workers} workers at http://{args.host}:{server.port}")
+    server.serve_forever()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
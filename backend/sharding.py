@@ -0,0 +1,212 @@
+"""
+Horizontal sharding of the profile database by user_id.
+
+SQLite allows one writer per database file, so every write of every user
+queues behind the same lock. With FIASCO_SHARDS=N, each user's rows (the
+user, their profiles and the profiles' settings, activity, risk and search
+rows, and their latest submission) live in one of N databases instead,
+picked by consistent hashing of the user_id. The shards are named shard0
+.. shardN-1, and their URLs come from FIASCO_SHARD_DATABASE_URL ('{shard}'
+is replaced by the shard number). Each app creates its own shard engines,
+with SQLALCHEMY_ENGINE_OPTIONS, like Flask-SQLAlchemy does for the default
+database.
+
+db.session picks the engine of the current shard, which is selected with
+use_user_shard(user_id), or for a whole function taking the user_id as its
+first argument with @user_sharded. Queries across users run once per shard
+with fan_out() and merge the results. With sharding off all of these are
+no-ops and everything uses SQLALCHEMY_DATABASE_URI.
+
+Because the hash ring has many points per shard, adding a shard moves only
+about 1/N of the users; reshard.py moves their rows.
+"""
+
+import bisect
+import contextlib
+import contextvars
+import functools
+import hashlib
+import heapq
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from flask import current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, make_url
+
+SHARDING_DEFAULTS = {
+    # 0 disables sharding
+    'SHARD_COUNT': int(os.environ.get('FIASCO_SHARDS', 0)),
+    'SHARD_DATABASE_URL': os.environ.get('FIASCO_SHARD_DATABASE_URL', 'sqlite:///fiasco-shard{shard}.db'),
+    # Points per shard on the hash ring
+    'SHARD_VNODES': 64,
+}
+
+FAN_OUT_THREADS = int(os.environ.get('FIASCO_SHARD_FAN_OUT_THREADS', 16))
+
+# Name of the shard db.session uses in this context
+_current_shard = contextvars.ContextVar('fiasco_shard', default=None)
+
+class ShardNotSelected(RuntimeError):
+    """The database was used with sharding on but no shard selected."""
+
+def shard_name(index):
+    """Return the name of a shard."""
+    return f'shard{index}'
+
+def shard_urls(count, template):
+    """Return the database URL of every shard by name."""
+    return {shard_name(index): template.replace('{shard}', str(index)) for index in range(count)}
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+class ShardRing:
+    """
+    A consistent hash ring mapping user_ids to shard names.
+
+    Args:
+        names: The shard names
+        vnodes: Points on the ring per shard; more points spread users more evenly
+    """
+
+    def __init__(self, names, vnodes=SHARDING_DEFAULTS['SHARD_VNODES']):
+        if not names:
+            raise ValueError("a shard ring needs at least one shard")
+        self.names = list(names)
+        points = sorted((_hash(f'{name}#{point}'), name) for name in self.names for point in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._owners = [name for _, name in points]
+
+    def __len__(self):
+        return len(self.names)
+
+    def shard_for(self, user_id):
+        """Return the name of the shard holding a user's rows."""
+        index = bisect.bisect(self._hashes, _hash(user_id))
+        return self._owners[index % len(self._owners)]
+
+def get_shard_ring(app=None):
+    """Return the app's ShardRing, or None if sharding is off."""
+    app = app or current_app
+    return app.extensions.get('shards')
+
+def shard_engines(db, app=None):
+    """Return the engine of every shard, or just the default engine if sharding is off."""
+    app = app or current_app
+    if get_shard_ring(app) is None:
+        return [db.engine]
+    return list(app.extensions['shard_engines'].values())
+
+@contextlib.contextmanager
+def use_shard(name):
+    """Direct db.session to a shard by name (None for the default database) inside the block."""
+    token = _current_shard.set(name)
+    try:
+        yield name
+    finally:
+        _current_shard.reset(token)
+
+def use_user_shard(user_id):
+    """Direct db.session to the shard of a user inside the block; a no-op when sharding is off."""
+    ring = get_shard_ring()
+    return use_shard(ring.shard_for(user_id) if ring is not None else None)
+
+def user_sharded(func):
+    """Run a function whose first argument is a user_id on that user's shard."""
+    @functools.wraps(func)
+    def wrapper(user_id, *args, **kwargs):
+        with use_user_shard(user_id):
+            return func(user_id, *args, **kwargs)
+    return wrapper
+
+class ShardedSession(Session):
+    """A Flask-SQLAlchemy session that uses the current shard's engine when sharding is on."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and get_shard_ring() is not None:
+            name = _current_shard.get()
+            if name is None:
+                raise ShardNotSelected(
+                    "Sharding is on but no shard is selected; use use_user_shard() or fan_out()"
+                )
+            return current_app.extensions['shard_engines'][name]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+# The fan-out pool of this process, see _get_executor()
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor, _executor_pid
+
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=FAN_OUT_THREADS, thread_name_prefix='fiasco-shard')
+            _executor_pid = os.getpid()
+        return _executor
+
+def fan_out(func, *args):
+    """
+    Run func(*args) on every shard concurrently.
+
+    Each call runs in its own application context, and so its own session,
+    so objects from different shards never share an identity map. With
+    sharding off func runs once, in the caller's context.
+
+    Returns:
+        The results in shard order
+    """
+    app = current_app._get_current_object()
+    ring = get_shard_ring(app)
+    if ring is None:
+        return [func(*args)]
+
+    def run(name):
+        with app.app_context(), use_shard(name):
+            return func(*args)
+
+    futures = [_get_executor().submit(contextvars.copy_context().run, run, name) for name in ring.names]
+    return [future.result() for future in futures]
+
+def merge_sorted(results, key, limit=None):
+    """Merge per-shard result lists that are each sorted by key, keeping the first limit."""
+    if len(results) == 1:
+        return results[0][:limit]
+    return list(islice(heapq.merge(*results, key=key), limit))
+
+def make_shard_engine(app, url):
+    """Create a shard's engine, placing relative SQLite paths in the instance folder like Flask-SQLAlchemy."""
+    url = make_url(url)
+    if url.drivername.startswith('sqlite') and url.database not in (None, '', ':memory:') \
+            and not os.path.isabs(url.database):
+        os.makedirs(app.instance_path, exist_ok=True)
+        url = url.set(database=os.path.join(app.instance_path, url.database))
+    return create_engine(url, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+
+def init_sharding(app):
+    """
+    Create the shard engines if sharding is on.
+
+    Args:
+        app: The Flask application
+
+    Returns:
+        The ShardRing, or None if sharding is off
+    """
+    for key, value in SHARDING_DEFAULTS.items():
+        app.config.setdefault(key, value)
+
+    count = app.config['SHARD_COUNT']
+    if count <= 0:
+        app.extensions['shards'] = None
+        return None
+
+    urls = shard_urls(count, app.config['SHARD_DATABASE_URL'])
+    app.extensions['shard_engines'] = {name: make_shard_engine(app, url) for name, url in urls.items()}
+    ring = ShardRing(list(urls), app.config['SHARD_VNODES'])
+    app.extensions['shards'] = ring
+    return ring
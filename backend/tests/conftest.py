@@ -0,0 +1,27 @@
+"""
+Shared test setup.
+
+Tests run against a throwaway SQLite file rather than instance/fiasco.db.
+A file is used instead of an in-memory database so that forked worker
+processes see the same data.
+"""
+
+import os
+import shutil
+import tempfile
+
+_db_dir = tempfile.mkdtemp(prefix='fiasco-tests-')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
+
+import pytest
+from app import app as flask_app, db
+
+@pytest.fixture(autouse=True)
+def create_tables():
+    # Tables are no longer created on import, and some tests drop them
+    with flask_app.app_context():
+        db.create_all()
+    yield
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_db_dir, ignore_errors=True)
@@ -0,0 +1,243 @@
+"""
+Tests for admission control and load shedding.
+"""
+
+import asyncio
+import json
+import threading
+from unittest.mock import patch
+
+import pytest
+from admission import ADMISSION_REJECTED_TOTAL, AdmissionController, Overloaded, submitted_url_count
+from app import create_app, db
+from crawler import generate_mock_results
+
+LIMITS = {
+    'ADMISSION_MAX_CRAWLS': 2,
+    'ADMISSION_MAX_QUEUED_URLS': 5,
+    'ADMISSION_MAX_READS': 2,
+    'ADMISSION_CRAWL_RETRY_AFTER': 7,
+    'ADMISSION_READ_RETRY_AFTER': 1,
+}
+
+@pytest.fixture
+def app():
+    app = create_app(LIMITS)
+    with app.app_context():
+        db.create_all()
+    return app
+
+def _profile_result(*args, **kwargs):
+    return next(generate_mock_results('twitter', 1, seed=3))
+
+def test_controller_limits_crawls_and_urls():
+    controller = AdmissionController({'ADMISSION_ENABLED': True, **LIMITS})
+
+    first = controller.admit_crawl(3)
+    with pytest.raises(Overloaded) as error:
+        controller.admit_crawl(3)
+    assert error.value.status == 429
+    assert error.value.retry_after == 7
+    # The crawl slot taken before the URL pool rejected the request is given back
+    assert controller.stats()['crawls']['in_use'] == 1
+
+    second = controller.admit_crawl(2)
+    with pytest.raises(Overloaded):
+        controller.admit_crawl()
+
+    first.release()
+    first.release()
+    second.release()
+    assert controller.stats() == {
+        'crawls': {'limit': 2, 'in_use': 0},
+        'urls': {'limit': 5, 'in_use': 0},
+        'reads': {'limit': 2, 'in_use': 0},
+    }
+
+def test_controller_rejects_oversized_submissions():
+    controller = AdmissionController(LIMITS)
+    with pytest.raises(Overloaded) as error:
+        controller.admit_crawl(6)
+    assert error.value.status == 413
+    assert error.value.headers() == {}
+
+def test_reads_have_their_own_pool():
+    controller = AdmissionController(LIMITS)
+    crawls = [controller.admit_crawl(), controller.admit_crawl()]
+
+    with controller.admit_read(), controller.admit_read():
+        with pytest.raises(Overloaded) as error:
+            controller.admit_read()
+    assert error.value.status == 503
+
+    with controller.admit_read():
+        assert controller.stats()['reads']['in_use'] == 1
+    for admission in crawls:
+        admission.release()
+
+def test_submitted_url_count():
+    assert submitted_url_count({'urls': ['a', 'b']}) == 2
+    assert submitted_url_count({'urls': ['a', 'b', 'a']}) == 2
+    assert submitted_url_count({'urls': [{}, {}]}) == 2
+    assert submitted_url_count({'urls': 'a'}) == 0
+    assert submitted_url_count(None) == 0
+
+def test_crawl_overload_is_shed_while_reads_are_served(app):
+    controller = app.extensions['admission']
+    client = app.test_client()
+    held = [controller.admit_crawl(), controller.admit_crawl()]
+    rejected_before = ADMISSION_REJECTED_TOTAL.get('crawls')
+
+    response = client.post('/profiles', json={'urls': ['https://twitter.com/a']})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '7'
+    assert response.json['retry_after'] == 7
+    assert ADMISSION_REJECTED_TOTAL.get('crawls') == rejected_before + 1
+
+    response = client.post('/profiles/bulk', data='https://twitter.com/a\n', content_type='text/csv')
+    assert response.status_code == 429
+
+    # Reads are admitted from their own pool
+    assert client.get('/profiles/no-such-user').status_code == 404
+    assert client.get('/health').status_code == 200
+
+    for admission in held:
+        admission.release()
+    with patch('app.crawl_profile_result', side_effect=_profile_result):
+        response = client.post('/profiles', json={'urls': ['https://twitter.com/a']})
+    assert response.status_code == 200
+    assert controller.stats()['crawls']['in_use'] == 0
+    assert controller.stats()['urls']['in_use'] == 0
+
+def test_oversized_submission_is_rejected(app):
+    response = app.test_client().post('/profiles', json={'urls': [f'https://twitter.com/{i}' for i in range(6)]})
+    assert response.status_code == 413
+    assert 'Retry-After' not in response.headers
+
+def test_submissions_of_any_size_are_admitted_by_default():
+    app = create_app({key: value for key, value in LIMITS.items() if key != 'ADMISSION_MAX_QUEUED_URLS'})
+    with app.app_context():
+        db.create_all()
+    urls = [f'https://twitter.com/{i}' for i in range(101)]
+    with patch('app.crawl_profile_result', side_effect=_profile_result):
+        response = app.test_client().post('/profiles', json={'urls': urls})
+    assert response.status_code == 200
+    assert app.extensions['admission'].stats()['crawls']['in_use'] == 0
+
+def test_read_overload_returns_503(app):
+    controller = app.extensions['admission']
+    held = [controller.admit_read(), controller.admit_read()]
+
+    response = app.test_client().get('/profiles/someone')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+    for admission in held:
+        admission.release()
+    assert app.test_client().get('/profiles/someone/list').status_code == 404
+    assert controller.stats()['reads']['in_use'] == 0
+
+def test_bulk_import_holds_its_slot_until_the_stream_ends(app):
+    controller = app.extensions['admission']
+    in_use = []
+
+    def crawl(*args, **kwargs):
+        in_use.append(controller.stats()['crawls']['in_use'])
+        return _profile_result()
+
+    body = '\n'.join(json.dumps({'url': f'https://twitter.com/bulk{i}'}) for i in range(3))
+    with patch('app.crawl_profile_result', side_effect=crawl):
+        response = app.test_client().post('/profiles/bulk?chunk_size=1', data=body,
+                                          content_type='application/x-ndjson')
+        assert response.status_code == 200
+        response.get_data()
+
+    assert in_use == [1, 1, 1]
+    assert controller.stats()['crawls']['in_use'] == 0
+
+def test_admission_can_be_disabled():
+    app = create_app({**LIMITS, 'ADMISSION_ENABLED': False, 'ADMISSION_MAX_READS': 0})
+    assert app.extensions['admission'] is None
+    assert app.test_client().get('/profiles/someone').status_code == 404
+
+def test_concurrent_crawls_beyond_the_limit_are_rejected_fast(app):
+    release = threading.Event()
+    started = threading.Semaphore(0)
+
+    def slow_crawl(*args, **kwargs):
+        started.release()
+        release.wait(5)
+        return _profile_result()
+
+    statuses = []
+    with patch('app.crawl_profile_result', side_effect=slow_crawl):
+        threads = [
+            threading.Thread(target=lambda: statuses.append(
+                app.test_client().post('/profiles', json={'urls': ['https://twitter.com/slow']}).status_code
+            ))
+            for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        assert started.acquire(timeout=5) and started.acquire(timeout=5)
+
+        assert app.test_client().post('/profiles', json={'urls': ['https://twitter.com/x']}).status_code == 429
+        release.set()
+        for thread in threads:
+            thread.join()
+
+    assert statuses == [200, 200]
+
+def test_asgi_sheds_crawls(monkeypatch):
+    import asgi
+
+    app = create_app(LIMITS)
+    monkeypatch.setattr(asgi, 'flask_app', app)
+    held = [app.extensions['admission'].admit_crawl() for _ in range(2)]
+
+    messages = [{'type': 'http.request', 'body': json.dumps({'urls': ['https://twitter.com/a']}).encode()}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': '/profiles', 'query_string': b'', 'headers': []}
+    asyncio.run(asgi.application(scope, receive, send))
+
+    assert sent[0]['status'] == 429
+    assert dict(sent[0]['headers'])[b'retry-after'] == b'7'
+    assert json.loads(sent[1]['body'])['retry_after'] == 7
+    for admission in held:
+        admission.release()
+
+def test_asgi_crawls_repeated_urls_once(monkeypatch):
+    import asgi
+
+    # Three URLs fit the limit of 5 only if the repeats count once
+    app = create_app(LIMITS)
+    with app.app_context():
+        db.create_all()
+    monkeypatch.setattr(asgi, 'flask_app', app)
+    urls = ['https://twitter.com/a', 'https://twitter.com/b', 'https://twitter.com/c'] * 2
+    messages = [{'type': 'http.request', 'body': json.dumps({'urls': urls}).encode()}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    async def crawl(url):
+        return _profile_result()
+
+    scope = {'type': 'http', 'method': 'POST', 'path': '/profiles', 'query_string': b'', 'headers': []}
+    with patch('asgi.crawl_profile_result_async', side_effect=crawl) as crawls:
+        asyncio.run(asgi.application(scope, receive, send))
+
+    assert sent[0]['status'] == 200
+    assert crawls.call_count == 3
+    assert sorted(json.loads(sent[1]['body'])['results']) == urls[:3]
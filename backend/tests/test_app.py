@@ -1,7 +1,11 @@
 import pytest
 import json
+import os
+import subprocess
+import sys
 import uuid
-from app import app as flask_app, crawler_results, db
+from sqlalchemy import inspect
+from app import app as flask_app, create_app, crawler_results, db
 from models import User, Profile
 from unittest.mock import patch, Mock
 
@@ -150,4 +154,20 @@ def test_get_profiles_with_nonexistent_user_id():
     
     # Check response is 404
     assert get_response.status_code == 404
-    assert "error" in get_response.json
\ No newline at end of file
+    assert "error" in get_response.json
+
+def test_create_app_leaves_table_creation_to_init_db(tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'factory.db'}"})
+    with app.app_context():
+        assert not inspect(db.engine).has_table('user')
+    
+    result = app.test_cli_runner().invoke(args=['init-db'])
+    assert result.exit_code == 0
+    with app.app_context():
+        assert inspect(db.engine).has_table('user')
+
+def test_import_does_not_load_firecrawl_or_numpy():
+    code = "import sys, app; print('firecrawl' in sys.modules, 'numpy' in sys.modules)"
+    backend_dir = os.path.join(os.path.dirname(__file__), '..')
+    output = subprocess.run([sys.executable, '-c', code], cwd=backend_dir, capture_output=True, text=True, check=True)
+    assert output.stdout.split() == ['False', 'False']
@@ -0,0 +1,154 @@
+"""
+Tests for the ASGI serving mode.
+"""
+
+import asyncio
+import gzip
+import json
+import uuid
+
+import pytest
+import crawler
+from app import app as flask_app, crawler_results, db
+from asgi import application, match_route
+from async_firecrawl import AsyncFirecrawlClient
+from loadtest.firecrawl_standin import FirecrawlStandin
+
+@pytest.fixture(autouse=True)
+def database():
+    with flask_app.app_context():
+        db.create_all()
+    yield
+
+async def _call(method, path, body=b'', headers=()):
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    path, _, query_string = path.partition('?')
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': query_string.encode(),
+        'headers': [(name.lower().encode(), value.encode()) for name, value in headers],
+    }
+    await application(scope, receive, send)
+    start, body_message = sent
+    return start['status'], dict(start['headers']), body_message['body']
+
+def call(method, path, payload=None, headers=()):
+    body = json.dumps(payload).encode() if payload is not None else b''
+    return asyncio.run(_call(method, path, body, headers))
+
+def test_match_route():
+    assert match_route('/health')[0] == 'health'
+    assert match_route('/profiles')[0] == 'submit_profiles'
+    assert match_route('/profiles/abc%20def')[3] == ('abc def',)
+    assert match_route('/profiles/abc/list')[0] == 'list_profiles'
+    assert match_route('/profiles/') is None
+    assert match_route('/unknown') is None
+
+def test_health_matches_flask():
+    status, headers, body = call('GET', '/health')
+    flask_response = flask_app.test_client().get('/health')
+
+    assert status == 200
+    assert headers[b'content-type'] == b'application/json'
+    assert headers[b'access-control-allow-origin'] == b'*'
+    assert json.loads(body) == flask_response.json
+
+def test_ping_and_metrics():
+    assert call('GET', '/ping')[2] == b'pong'
+    call('GET', '/health')
+    status, headers, body = call('GET', '/metrics')
+    assert status == 200
+    assert b'fiasco_http_request_duration_seconds_count{endpoint="health",method="GET",status="200"}' in body
+
+def test_submit_and_get_profiles_match_flask():
+    user_id = f"asgi-{uuid.uuid4()}"
+    urls = ["https://twitter.com/asgi_user", "https://github.com/asgi_user"]
+
+    status, _, body = call('POST', '/profiles', {"user_id": user_id, "urls": urls})
+    data = json.loads(body)
+    assert status == 200
+    assert data["status"] == "processed"
+    assert data["user_id"] == user_id
+    assert data["urls"] == urls
+    assert set(data["results"]) == set(urls)
+    assert crawler_results[user_id]["urls"] == urls
+
+    status, _, body = call('GET', f'/profiles/{user_id}')
+    flask_response = flask_app.test_client().get(f'/profiles/{user_id}')
+    assert status == 200
+    assert json.loads(body) == flask_response.json
+    assert sorted(json.loads(body)["urls"]) == sorted(urls)
+
+def test_submit_generates_user_id():
+    status, _, body = call('POST', '/profiles', {"urls": ["https://instagram.com/asgi_user"]})
+    assert status == 200
+    assert uuid.UUID(json.loads(body)["user_id"])
+
+def test_errors():
+    assert call('GET', f'/profiles/missing-{uuid.uuid4()}')[0] == 404
+    assert json.loads(call('GET', '/nowhere')[2]) == {"error": "Not Found"}
+    assert call('GET', '/profiles')[0] == 405
+    assert asyncio.run(_call('POST', '/profiles', b'not json'))[0] == 400
+
+def test_preflight():
+    status, headers, _ = call('OPTIONS', '/profiles')
+    assert status == 200
+    assert b'POST' in headers[b'access-control-allow-methods']
+
+def test_projection_and_compression_match_flask():
+    user_id = str(uuid.uuid4())
+    call('POST', '/profiles', {'user_id': user_id, 'urls': [f'https://twitter.com/asgi_gzip_{i}' for i in range(10)]})
+
+    path = f'/profiles/{user_id}?fields=privacy_settings,risk_assessment.privacy_score'
+    status, headers, body = call('GET', path, headers=[('Accept-Encoding', 'gzip')])
+    assert status == 200
+    assert headers[b'content-encoding'] == b'gzip'
+    assert headers[b'vary'] == b'Accept-Encoding'
+    assert json.loads(gzip.decompress(body)) == flask_app.test_client().get(path).json
+
+    assert call('GET', f'/profiles/{user_id}?fields=nope')[0] == 400
+
+def test_list_profiles_matches_flask():
+    user_id = str(uuid.uuid4())
+    call('POST', '/profiles', {'user_id': user_id, 'urls': [f'https://twitter.com/asgi_list_{i}' for i in range(5)]})
+
+    path = f'/profiles/{user_id}/list?limit=2&fields=platform'
+    status, _, body = call('GET', path)
+    assert status == 200
+    assert json.loads(body) == flask_app.test_client().get(path).json
+    assert len(json.loads(body)['profiles']) == 2
+
+    assert call('GET', f'/profiles/{user_id}/list?cursor=bad')[0] == 400
+    assert call('GET', '/profiles/missing-user/list')[0] == 404
+
+def test_concurrent_crawls_use_async_client(monkeypatch):
+    urls = [f"https://twitter.com/async_{i}" for i in range(20)]
+    with FirecrawlStandin(latency_ms=200) as standin:
+        monkeypatch.setattr(crawler, 'FIRECRAWL_API_KEY', 'test-key')
+        monkeypatch.setattr(crawler, 'async_firecrawl_app', AsyncFirecrawlClient('test-key', standin.url))
+
+        async def crawl_all():
+            return await asyncio.gather(*(crawler.crawl_profile_async(url) for url in urls))
+
+        results, elapsed = asyncio.run(_timed(crawl_all))
+
+    assert [result["data_source"] for result in results] == ["firecrawl"] * len(urls)
+    assert standin.requests == len(urls)
+    # Sequential crawls would take at least 4s
+    assert elapsed < 2.0
+
+async def _timed(func):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    result = await func()
+    return result, loop.time() - start
@@ -0,0 +1,114 @@
+"""
+Tests for scraping the URLs of a submission together.
+"""
+
+import json
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+import crawler
+from app import app as flask_app
+from async_firecrawl import FirecrawlError
+from crawler import BATCH_SCRAPES_TOTAL, crawl_profile_results, map_batch_results, scrape_urls
+from loadtest.firecrawl_standin import FirecrawlStandin, StandinScraper, synthetic_page
+
+URLS = [f'https://twitter.com/batched_{i}' for i in range(5)]
+
+class SingleScraper:
+    """A client without batch_scrape_urls."""
+
+    def __init__(self, api_url):
+        self._scraper = StandinScraper(api_url)
+
+    def scrape_url(self, url, formats=None, **params):
+        return self._scraper.scrape_url(url, formats=formats, **params)
+
+def _use_client(monkeypatch, client):
+    monkeypatch.setattr(crawler, 'FIRECRAWL_API_KEY', 'test-key')
+    monkeypatch.setattr(crawler, 'firecrawl_app', client)
+
+def test_batch_scrape_maps_results_and_failures():
+    with FirecrawlStandin(latency_ms=0, fail_urls=[URLS[2]]) as standin:
+        results = scrape_urls(StandinScraper(standin.url), URLS)
+
+    assert standin.batches == 1
+    assert standin.requests == 1
+    assert isinstance(results[URLS[2]], FirecrawlError)
+    for url in URLS[:2] + URLS[3:]:
+        assert results[url] == synthetic_page(url)
+
+def test_batches_are_limited_in_size(monkeypatch):
+    monkeypatch.setattr(crawler, 'BATCH_SCRAPE_MAX_URLS', 2)
+    with FirecrawlStandin(latency_ms=0) as standin:
+        results = scrape_urls(StandinScraper(standin.url), URLS)
+
+    assert standin.batches == 3
+    assert results == {url: synthetic_page(url) for url in URLS}
+
+def test_clients_without_batches_scrape_concurrently():
+    with FirecrawlStandin(latency_ms=200, fail_urls=[URLS[0]]) as standin:
+        start = time.perf_counter()
+        results = scrape_urls(SingleScraper(standin.url), URLS)
+        elapsed = time.perf_counter() - start
+
+    assert standin.requests == len(URLS)
+    assert elapsed < 0.2 * len(URLS) / 2
+    assert isinstance(results[URLS[0]], Exception)
+    assert results[URLS[1]] == synthetic_page(URLS[1])
+
+def test_failed_batch_falls_back_to_single_scrapes():
+    fallbacks = BATCH_SCRAPES_TOTAL.get('fallback')
+    with FirecrawlStandin(latency_ms=0, batch=False) as standin:
+        results = scrape_urls(StandinScraper(standin.url), URLS)
+
+    assert BATCH_SCRAPES_TOTAL.get('fallback') == fallbacks + 1
+    assert results == {url: synthetic_page(url) for url in URLS}
+
+def test_map_batch_results_accepts_sdk_objects():
+    response = SimpleNamespace(data=[
+        SimpleNamespace(markdown='a', metadata={'sourceURL': 'https://Twitter.com/a/', 'statusCode': 200}),
+        SimpleNamespace(markdown='b', metadata={'sourceURL': 'https://twitter.com/b', 'statusCode': 404}),
+    ])
+    results = map_batch_results(['https://twitter.com/a', 'https://twitter.com/b', 'https://twitter.com/c'], response)
+
+    assert results['https://twitter.com/a']['markdown'] == 'a'
+    assert 'status 404' in str(results['https://twitter.com/b'])
+    assert isinstance(results['https://twitter.com/c'], FirecrawlError)
+
+def test_failed_urls_fall_back_on_their_own(monkeypatch):
+    with FirecrawlStandin(latency_ms=0, fail_urls=[URLS[1]]) as standin:
+        _use_client(monkeypatch, StandinScraper(standin.url))
+        profiles = crawl_profile_results([URLS[2], URLS[1], URLS[0], URLS[2]])
+
+    assert standin.batches == 1
+    assert [profile.data_source for profile in profiles] == ['firecrawl', 'mock', 'firecrawl', 'firecrawl']
+    assert [profile.username for profile in profiles] == ['batched_2', 'batched_1', 'batched_0', 'batched_2']
+
+@pytest.mark.parametrize('client', [StandinScraper, SingleScraper])
+def test_submissions_scrape_together(monkeypatch, client):
+    user_id = str(uuid.uuid4())
+    with FirecrawlStandin(latency_ms=0, fail_urls=[URLS[3]]) as standin:
+        _use_client(monkeypatch, client(standin.url))
+        response = flask_app.test_client().post('/profiles', json={'user_id': user_id, 'urls': URLS})
+
+    assert response.status_code == 200
+    assert standin.batches == (1 if client is StandinScraper else 0)
+    results = response.json['results']
+    assert [results[url]['data_source'] for url in URLS] == ['firecrawl'] * 3 + ['mock', 'firecrawl']
+
+    stored = flask_app.test_client().get(f'/profiles/{user_id}').json
+    assert stored['urls'] == URLS
+
+def test_bulk_import_scrapes_each_chunk_together(monkeypatch):
+    body = "\n".join(json.dumps({"url": url}) for url in URLS)
+    with FirecrawlStandin(latency_ms=0) as standin:
+        _use_client(monkeypatch, StandinScraper(standin.url))
+        response = flask_app.test_client().post(
+            f'/profiles/bulk?user_id={uuid.uuid4()}&chunk_size=3', data=body, content_type='application/x-ndjson'
+        )
+        events = [json.loads(line) for line in response.data.decode().splitlines()]
+
+    assert standin.batches == 2
+    assert events[-1]['succeeded'] == len(URLS)
@@ -0,0 +1,147 @@
+"""
+Tests for the bulk import parser and the /profiles/bulk endpoint.
+"""
+
+import io
+import json
+import pytest
+from unittest.mock import patch
+from app import app as flask_app, db
+from crawl_result import ProfileResult
+from models import Profile
+from bulk_import import (
+    FORMAT_CSV,
+    FORMAT_NDJSON,
+    UrlDeduplicator,
+    classify_url,
+    detect_format,
+    iter_import_chunks,
+    iter_lines,
+    iter_upload_urls,
+    new_import_stats,
+)
+
+MOCK_PROFILE_DATA = {
+    "platform": "twitter",
+    "username": "testuser",
+    "privacy_settings": {"account_privacy": "public"},
+    "activity_data": {"post_count": 10},
+    "risk_assessment": {
+        "privacy_score": 40,
+        "risk_level": "medium",
+        "risk_factors": [],
+        "recommendations": []
+    }
+}
+
+@pytest.fixture
+def client():
+    with flask_app.app_context():
+        db.create_all()
+    return flask_app.test_client()
+
+def test_detect_format():
+    assert detect_format('text/csv') == FORMAT_CSV
+    assert detect_format('application/x-ndjson') == FORMAT_NDJSON
+    assert detect_format('application/json') is None
+    assert detect_format('application/octet-stream', 'ndjson') == FORMAT_NDJSON
+    assert detect_format('text/csv', 'xml') is None
+
+def test_iter_lines_skips_oversized_lines():
+    stream = io.BytesIO(b"first\n" + b"x" * 50 + b"\nsecond\n")
+    assert list(iter_lines(stream, max_line_bytes=20)) == ["first", "second"]
+
+def test_csv_upload_with_header():
+    stream = io.BytesIO(b"name,url\nJohn,https://twitter.com/john\nJane,https://x.com/jane\n")
+    assert list(iter_upload_urls(stream, FORMAT_CSV)) == [
+        "https://twitter.com/john",
+        "https://x.com/jane",
+    ]
+
+def test_csv_upload_without_header():
+    stream = io.BytesIO(b"https://twitter.com/john\r\nhttps://facebook.com/jane\r\n")
+    assert list(iter_upload_urls(stream, FORMAT_CSV)) == [
+        "https://twitter.com/john",
+        "https://facebook.com/jane",
+    ]
+
+def test_ndjson_upload_accepts_strings_and_objects():
+    stream = io.BytesIO(b'"https://twitter.com/john"\n{"url": "https://x.com/jane"}\nnot json\n\n')
+    assert list(iter_upload_urls(stream, FORMAT_NDJSON)) == [
+        "https://twitter.com/john",
+        "https://x.com/jane",
+        "",
+    ]
+
+def test_classify_url():
+    assert classify_url("https://twitter.com/john") == "twitter"
+    assert classify_url("https://example.com/john") == "unknown"
+    assert classify_url("ftp://twitter.com/john") is None
+    assert classify_url("not a url") is None
+    assert classify_url("") is None
+
+def test_deduplicator():
+    deduplicator = UrlDeduplicator()
+    assert deduplicator.add("https://twitter.com/john")
+    assert not deduplicator.add("https://twitter.com/john")
+    assert deduplicator.add("https://twitter.com/jane")
+    assert len(deduplicator) == 2
+
+def test_iter_import_chunks_counts_and_chunks():
+    urls = [
+        "https://twitter.com/a",
+        "https://twitter.com/b",
+        "https://twitter.com/a",
+        "garbage",
+        "https://facebook.com/c",
+    ]
+    stats = new_import_stats()
+    chunks = list(iter_import_chunks(urls, stats, chunk_size=2))
+
+    assert chunks == [
+        ["https://twitter.com/a", "https://twitter.com/b"],
+        ["https://facebook.com/c"],
+    ]
+    assert stats["received"] == 5
+    assert stats["duplicates"] == 1
+    assert stats["invalid"] == 1
+    assert stats["platforms"] == {"twitter": 2, "facebook": 1}
+
+def test_iter_import_chunks_is_lazy():
+    def urls():
+        for i in range(10):
+            yield f"https://twitter.com/user{i}"
+        raise AssertionError("the whole upload should not be consumed up front")
+
+    chunks = iter_import_chunks(urls(), new_import_stats(), chunk_size=3)
+    assert len(next(chunks)) == 3
+
+def test_bulk_import_endpoint_streams_progress(client):
+    body = "\n".join(json.dumps({"url": f"https://twitter.com/user{i}"}) for i in range(5))
+    body += "\n" + json.dumps({"url": "https://twitter.com/user0"}) + "\n"
+
+    with patch('app.crawl_profile_result', return_value=ProfileResult.from_dict(MOCK_PROFILE_DATA)):
+        response = client.post(
+            '/profiles/bulk?user_id=bulk-user&chunk_size=2',
+            data=body,
+            content_type='application/x-ndjson'
+        )
+
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.data.decode().splitlines()]
+
+    progress = [event for event in events if event["event"] == "progress"]
+    assert [event["chunk"] for event in progress] == [1, 2, 3]
+    assert [event["processed"] for event in progress] == [2, 4, 5]
+
+    summary = events[-1]
+    assert summary["event"] == "complete"
+    assert summary["succeeded"] == 5
+    assert summary["duplicates"] == 1
+
+    with flask_app.app_context():
+        assert Profile.query.filter_by(user_id="bulk-user").count() == 5
+
+def test_bulk_import_rejects_unknown_format(client):
+    response = client.post('/profiles/bulk', data="{}", content_type='application/json')
+    assert response.status_code == 415
@@ -0,0 +1,132 @@
+"""
+Tests for skipping redundant profile rewrites with content hashes.
+"""
+
+import copy
+import uuid
+
+import pytest
+from sqlalchemy import event
+from app import PROFILE_CHANGES_TOTAL, PROFILE_ROW_WRITES_TOTAL, app as flask_app, db, save_profile
+from crawl_result import ProfileResult
+from models import Profile, User
+
+URL = 'https://twitter.com/unchanged'
+
+PROFILE = {
+    'platform': 'twitter',
+    'username': 'unchanged',
+    'timestamp': '2024-01-01T00:00:00',
+    'privacy_settings': {'account_privacy': 'public', 'location_sharing': True},
+    'activity_data': {'post_count': 120, 'verified': False},
+    'risk_assessment': {
+        'privacy_score': 40,
+        'risk_level': 'medium',
+        'risk_factors': ['Public account exposes your content to anyone'],
+        'recommendations': ['Set your account to private']
+    },
+    'data_source': 'mock'
+}
+
+@pytest.fixture
+def user_id():
+    user_id = str(uuid.uuid4())
+    with flask_app.app_context():
+        db.session.add(User(id=user_id))
+        save_profile(user_id, URL, PROFILE)
+        db.session.commit()
+    return user_id
+
+def _save(user_id, data):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split()[0].upper())
+
+    with flask_app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            save_profile(user_id, URL, data)
+            db.session.commit()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+    return statements
+
+def _row_writes():
+    return {(table, operation): PROFILE_ROW_WRITES_TOTAL.get(table, operation)
+            for table in ('privacy_setting', 'activity_data', 'risk_assessment')
+            for operation in ('insert', 'update', 'delete')}
+
+def _load(user_id):
+    with flask_app.app_context():
+        profile = Profile.query.filter_by(user_id=user_id, url=URL).one()
+        return {
+            'updated_at': profile.updated_at,
+            'last_checked_at': profile.last_checked_at,
+            'rows': {row.key: (row.id, row.get_value()) for row in profile.privacy_settings + profile.activity_data},
+            'risk': [(risk.id, risk.privacy_score) for risk in profile.risk_assessment],
+            'risk_level': profile.risk_level,
+        }
+
+def test_hash_ignores_timestamp_and_data_source():
+    changed = dict(PROFILE, timestamp='2025-06-01T12:00:00', data_source='firecrawl')
+    assert ProfileResult.from_dict(changed).content_hash() == ProfileResult.from_dict(PROFILE).content_hash()
+
+    changed['activity_data'] = {'post_count': 121, 'verified': False}
+    assert ProfileResult.from_dict(changed).content_hash() != ProfileResult.from_dict(PROFILE).content_hash()
+
+def test_unchanged_crawl_only_touches_last_checked(user_id):
+    before = _load(user_id)
+    unchanged = PROFILE_CHANGES_TOTAL.get('unchanged')
+    row_writes = _row_writes()
+
+    statements = _save(user_id, dict(PROFILE, timestamp='2025-01-01T00:00:00'))
+
+    after = _load(user_id)
+    assert statements.count('UPDATE') == 1
+    assert 'INSERT' not in statements and 'DELETE' not in statements
+    assert after['updated_at'] == before['updated_at']
+    assert after['last_checked_at'] > before['last_checked_at']
+    assert after['rows'] == before['rows'] and after['risk'] == before['risk']
+    assert PROFILE_CHANGES_TOTAL.get('unchanged') == unchanged + 1
+    assert _row_writes() == row_writes
+
+def test_changed_crawl_writes_only_differences(user_id):
+    before = _load(user_id)
+    updated = PROFILE_CHANGES_TOTAL.get('updated')
+    changed = copy.deepcopy(PROFILE)
+    changed['privacy_settings'] = {'account_privacy': 'private', 'location_sharing': True}
+    changed['activity_data'] = {'post_count': 120, 'verified': 1, 'follower_count': 10}
+    changed['risk_assessment']['risk_level'] = 'low'
+
+    _save(user_id, changed)
+
+    after = _load(user_id)
+    assert after['rows']['account_privacy'] == (before['rows']['account_privacy'][0], 'private')
+    assert after['rows']['location_sharing'] == before['rows']['location_sharing']
+    assert after['rows']['post_count'] == before['rows']['post_count']
+    # True and 1 are stored differently, so the row is rewritten
+    assert after['rows']['verified'] == (before['rows']['verified'][0], 1.0)
+    assert after['rows']['follower_count'][1] == 10.0
+    assert after['risk'] == before['risk']
+    assert after['risk_level'] == 'low'
+    assert PROFILE_CHANGES_TOTAL.get('updated') == updated + 1
+
+    removed = copy.deepcopy(changed)
+    removed['activity_data'] = {'post_count': 120}
+    removed['risk_assessment'] = None
+    _save(user_id, removed)
+    after = _load(user_id)
+    assert set(after['rows']) == {'account_privacy', 'location_sharing', 'post_count'}
+    assert after['risk'] == [] and after['risk_level'] is None
+
+def test_profiles_without_hash_are_rewritten_once(user_id):
+    with flask_app.app_context():
+        profile = Profile.query.filter_by(user_id=user_id, url=URL).one()
+        profile.content_hash = None
+        db.session.commit()
+
+    assert _save(user_id, PROFILE).count('UPDATE') == 1
+    with flask_app.app_context():
+        assert Profile.query.filter_by(user_id=user_id, url=URL).one().content_hash is not None
+    assert _save(user_id, PROFILE).count('UPDATE') == 1
@@ -0,0 +1,63 @@
+"""
+Tests for negotiated response compression.
+"""
+
+import gzip
+import io
+
+import pytest
+from app import app as flask_app, create_app
+from compression import choose_encoding, load_brotli
+
+URLS = [f'https://twitter.com/compressed_{i}' for i in range(10)]
+
+@pytest.fixture
+def user_id():
+    response = flask_app.test_client().post('/profiles', json={'urls': URLS})
+    return response.json['user_id']
+
+def test_choose_encoding():
+    assert choose_encoding(None) is None
+    assert choose_encoding('identity') is None
+    assert choose_encoding('gzip, deflate') == 'gzip'
+    assert choose_encoding('gzip;q=0') is None
+    expected = 'br' if load_brotli() is not None else 'gzip'
+    assert choose_encoding('gzip, br') == expected
+    assert choose_encoding('*') == expected
+    assert choose_encoding('br;q=0.5, gzip') == 'gzip'
+
+def test_large_responses_are_gzipped(user_id):
+    client = flask_app.test_client()
+    plain = client.get(f'/profiles/{user_id}')
+    response = client.get(f'/profiles/{user_id}', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in plain.headers
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert int(response.headers['Content-Length']) == len(response.data) < len(plain.data)
+    assert gzip.decompress(response.data) == plain.data
+
+def test_brotli_when_installed(user_id):
+    brotli = pytest.importorskip('brotli')
+    client = flask_app.test_client()
+    response = client.get(f'/profiles/{user_id}', headers={'Accept-Encoding': 'gzip, br'})
+
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.data) == client.get(f'/profiles/{user_id}').data
+
+def test_small_and_streamed_responses_are_not_compressed():
+    client = flask_app.test_client()
+    assert 'Content-Encoding' not in client.get('/health', headers={'Accept-Encoding': 'gzip'}).headers
+
+    upload = io.BytesIO(b'url\nhttps://twitter.com/streamed\n')
+    response = client.post('/profiles/bulk', data=upload, content_type='text/csv',
+                           headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert b'"complete"' in response.data
+
+def test_compression_can_be_disabled(user_id):
+    # Uses the test database from DATABASE_URL
+    app = create_app({'COMPRESSION_ENABLED': False})
+    response = app.test_client().get(f'/profiles/{user_id}', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
@@ -0,0 +1,66 @@
+"""
+Tests for the slotted crawl result classes.
+"""
+
+import json
+
+import pytest
+from crawl_result import FieldSet, ProfileResult, RiskResult, as_dict, as_profile_result
+from crawler import crawl_profile, crawl_profile_result, generate_mock_profiles, generate_mock_results
+
+PROFILE = {
+    'platform': 'twitter',
+    'username': 'testuser',
+    'timestamp': '2024-01-01T00:00:00',
+    'privacy_settings': {'account_privacy': 'public', 'tweet_visibility': 'everyone'},
+    'activity_data': {'tweet_count': 120, 'follower_count': 500},
+    'risk_assessment': {
+        'privacy_score': 40,
+        'risk_level': 'medium',
+        'risk_factors': ['Public account exposes your content to anyone'],
+        'recommendations': ['Set your account to private']
+    },
+    'data_source': 'mock'
+}
+
+def test_round_trip_preserves_api_shape():
+    result = ProfileResult.from_dict(PROFILE)
+    assert isinstance(result.privacy_settings, FieldSet)
+    assert isinstance(result.risk_assessment, RiskResult)
+    assert result.to_dict() == PROFILE
+    assert list(result.to_dict()) == list(PROFILE)
+    assert json.loads(result.to_json()) == PROFILE
+
+def test_error_result_shape():
+    error = {'platform': 'unknown', 'username': 'unknown', 'timestamp': 'now', 'error': 'boom', 'data_source': 'error'}
+    assert ProfileResult.from_dict(error).to_dict() == error
+
+def test_results_share_key_tuples():
+    first, second = generate_mock_results('instagram', 2)
+    assert first.privacy_settings.keys is second.privacy_settings.keys
+    assert first.activity_data.keys is second.activity_data.keys
+
+def test_results_are_slotted():
+    result = ProfileResult.from_dict(PROFILE)
+    assert not hasattr(result, '__dict__')
+    with pytest.raises(AttributeError):
+        result.unexpected = True
+
+def test_field_set_lookup():
+    fields = FieldSet.from_dict(PROFILE['activity_data'])
+    assert fields.get('tweet_count') == 120
+    assert fields.get('missing', 0) == 0
+    assert 'follower_count' in fields and len(fields) == 2
+    assert dict(fields.items()) == PROFILE['activity_data']
+
+def test_conversion_helpers():
+    result = as_profile_result(PROFILE)
+    assert as_profile_result(result) is result
+    assert as_dict(result) == PROFILE
+    assert as_dict({'error': 'boom'}) == {'error': 'boom'}
+
+def test_crawler_dict_and_result_paths_agree():
+    assert list(crawl_profile_result('https://twitter.com/agree').to_dict()) == list(crawl_profile('https://twitter.com/agree'))
+    profile = next(generate_mock_profiles('twitter', 1))
+    result = next(generate_mock_results('twitter', 1)).to_dict()
+    assert {**profile, 'timestamp': None} == {**result, 'timestamp': None}
@@ -0,0 +1,175 @@
+"""
+Tests for deadline-aware submissions with partial results.
+"""
+
+import asyncio
+import json
+import threading
+import time
+import uuid
+from dataclasses import replace
+from unittest.mock import patch
+
+import pytest
+from app import app as flask_app, create_app, db
+from crawler import generate_mock_results
+from deadline import DEADLINE_CRAWLS_TOTAL, MAX_DEADLINE_MS, deadline_placeholder, parse_deadline, parse_fallback
+from models import Profile
+
+@pytest.fixture
+def app():
+    app = create_app({'ADMISSION_MAX_CRAWLS': 2})
+    with app.app_context():
+        db.create_all()
+    return app
+
+def _result(url):
+    return replace(next(generate_mock_results('twitter', 1, seed=len(url))), username=url.rsplit('/', 1)[-1])
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+def test_parse_deadline():
+    assert parse_deadline(None) is None
+    assert parse_deadline(250) == 0.25
+    assert parse_deadline(10 ** 9) == MAX_DEADLINE_MS / 1000
+    for value in (0, -5, '100', True):
+        with pytest.raises(ValueError):
+            parse_deadline(value)
+
+def test_parse_fallback():
+    assert parse_fallback(None) == 'pending'
+    assert parse_fallback('mock') == 'mock'
+    with pytest.raises(ValueError):
+        parse_fallback('wait')
+
+def test_placeholders_are_marked():
+    pending = deadline_placeholder('https://twitter.com/alice')
+    assert pending['pending'] is True
+    assert pending['data_source'] == 'pending'
+    assert pending['username'] == 'alice'
+    assert pending['risk_assessment'] is None
+
+    mock = deadline_placeholder('https://twitter.com/alice', 'mock')
+    assert mock['pending'] is True
+    assert mock['data_source'] == 'mock_fallback'
+    assert mock['risk_assessment']['risk_level'] in ('low', 'medium', 'high')
+
+def test_slow_crawls_return_placeholders_and_finish_in_background(app):
+    release = threading.Event()
+
+    def crawl(url):
+        if 'slow' in url:
+            release.wait(5)
+        return _result(url)
+
+    user_id = str(uuid.uuid4())
+    fast, slow = 'https://twitter.com/fast', 'https://twitter.com/slow'
+    late_before = DEADLINE_CRAWLS_TOTAL.get('completed_late')
+    client = app.test_client()
+
+    with patch('app.crawl_profile_result', side_effect=crawl):
+        start = time.perf_counter()
+        response = client.post('/profiles', json={'user_id': user_id, 'urls': [fast, slow], 'deadline_ms': 200})
+        elapsed = time.perf_counter() - start
+
+        assert response.status_code == 200
+        assert elapsed < 2
+        assert response.json['status'] == 'partial'
+        assert response.json['pending'] == [slow]
+        assert response.json['results'][fast]['data_source'] == 'mock'
+        assert response.json['results'][slow]['pending'] is True
+
+        # Only the finished crawl is stored; the late one still holds the admission
+        assert list(client.get(f'/profiles/{user_id}').json['urls']) == [fast]
+        assert app.extensions['admission'].stats()['crawls']['in_use'] == 1
+
+        release.set()
+        with app.app_context():
+            assert _wait_for(lambda: db.session.query(Profile).filter_by(user_id=user_id, url=slow).count() == 1)
+
+    assert _wait_for(lambda: app.extensions['admission'].stats()['crawls']['in_use'] == 0)
+    assert DEADLINE_CRAWLS_TOTAL.get('completed_late') == late_before + 1
+    assert sorted(client.get(f'/profiles/{user_id}').json['urls']) == [fast, slow]
+    with app.app_context():
+        submission = app.extensions['result_store'][user_id]
+    assert submission['results'][slow]['username'] == 'slow'
+    assert 'pending' not in submission['results'][slow]
+
+def test_mock_fallback_placeholder(app):
+    release = threading.Event()
+
+    def crawl(url):
+        release.wait(5)
+        return _result(url)
+
+    with patch('app.crawl_profile_result', side_effect=crawl):
+        response = app.test_client().post('/profiles', json={
+            'urls': ['https://instagram.com/late'], 'deadline_ms': 50, 'on_deadline': 'mock'
+        })
+        release.set()
+
+    result = response.json['results']['https://instagram.com/late']
+    assert result['data_source'] == 'mock_fallback'
+    assert result['pending'] is True
+    assert _wait_for(lambda: app.extensions['admission'].stats()['crawls']['in_use'] == 0)
+
+def test_submission_within_deadline_is_complete(app):
+    urls = ['https://twitter.com/a', 'https://twitter.com/b']
+    with patch('app.crawl_profile_result', side_effect=_result):
+        response = app.test_client().post('/profiles', json={'urls': urls, 'deadline_ms': 5000})
+
+    assert response.json['status'] == 'processed'
+    assert response.json['pending'] == []
+    assert all(response.json['results'][url]['data_source'] == 'mock' for url in urls)
+
+def test_invalid_deadline_is_rejected(app):
+    response = app.test_client().post('/profiles', json={'urls': [], 'deadline_ms': 'soon'})
+    assert response.status_code == 400
+    response = app.test_client().post('/profiles', json={'urls': [], 'deadline_ms': 10, 'on_deadline': 'x'})
+    assert response.status_code == 400
+
+def test_asgi_deadline(monkeypatch):
+    import asgi
+
+    with flask_app.app_context():
+        db.create_all()
+
+    async def crawl(url):
+        if 'slow' in url:
+            await asyncio.sleep(0.3)
+        return _result(url)
+
+    monkeypatch.setattr(asgi, 'crawl_profile_result_async', crawl)
+    user_id = str(uuid.uuid4())
+    fast, slow = 'https://twitter.com/fast', 'https://twitter.com/slow'
+    body = json.dumps({'user_id': user_id, 'urls': [fast, slow], 'deadline_ms': 50}).encode()
+
+    async def run():
+        messages = [{'type': 'http.request', 'body': body}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'POST', 'path': '/profiles', 'query_string': b'', 'headers': []}
+        await asgi.application(scope, receive, send)
+        await asyncio.gather(*asgi._background_tasks)
+        return sent
+
+    start, response = asyncio.run(run())
+    payload = json.loads(response['body'])
+    assert start['status'] == 200
+    assert payload['pending'] == [slow]
+    assert payload['results'][slow]['data_source'] == 'pending'
+
+    with flask_app.app_context():
+        assert Profile.query.filter_by(user_id=user_id).count() == 2
@@ -0,0 +1,230 @@
+"""
+Tests for Idempotency-Key handling on POST /profiles.
+"""
+
+import asyncio
+import json
+import threading
+import uuid
+from unittest.mock import patch
+
+import pytest
+from app import create_app
+from crawler import generate_mock_results
+from idempotency import (
+    IDEMPOTENCY_REQUESTS_TOTAL,
+    IdempotencyConflict,
+    MemoryIdempotencyStore,
+    StoredResponse,
+    stored_body,
+)
+from models import create_schema
+
+URLS = ['https://twitter.com/idem_a', 'https://twitter.com/idem_b']
+
+def _make_app(**config):
+    app = create_app({'ADMISSION_MAX_CRAWLS': 1, **config})
+    with app.app_context():
+        create_schema()
+    return app
+
+@pytest.fixture
+def app():
+    return _make_app()
+
+class CountingCrawl:
+    """A crawl double counting its calls, optionally held until released."""
+
+    def __init__(self, hold=False):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not hold:
+            self.release.set()
+
+    def __call__(self, url):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        return next(generate_mock_results('twitter', 1, seed=len(url)))
+
+def _post(client, key, body, **headers):
+    return client.post('/profiles', json=body, headers={'Idempotency-Key': key, **headers})
+
+def test_duplicate_gets_the_stored_response(app):
+    client = app.test_client()
+    body = {'user_id': str(uuid.uuid4()), 'urls': URLS}
+    crawl = CountingCrawl()
+    replayed = IDEMPOTENCY_REQUESTS_TOTAL.get('replayed')
+
+    with patch('app.crawl_profile_result', side_effect=crawl):
+        first = _post(client, 'key-1', body)
+        second = _post(client, 'key-1', body)
+        # Without a user_id the duplicate still gets the original's generated one
+        third = _post(client, 'key-2', {'urls': URLS[:1]})
+        fourth = _post(client, 'key-2', {'urls': URLS[:1]})
+
+    assert crawl.calls == 3
+    assert first.status_code == second.status_code == 200
+    assert second.json == first.json
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first.headers
+    assert fourth.json['user_id'] == third.json['user_id']
+    assert IDEMPOTENCY_REQUESTS_TOTAL.get('replayed') == replayed + 2
+
+def test_duplicate_attaches_to_the_running_request(app):
+    client = app.test_client()
+    body = {'user_id': str(uuid.uuid4()), 'urls': URLS}
+    crawl = CountingCrawl(hold=True)
+    attached = IDEMPOTENCY_REQUESTS_TOTAL.get('attached')
+    responses = {}
+
+    def post(name):
+        responses[name] = _post(app.test_client(), 'key-attach', body)
+
+    with patch('app.crawl_profile_result', side_effect=crawl):
+        original = threading.Thread(target=post, args=('original',))
+        original.start()
+        assert crawl.started.wait(5)
+        # The only crawl slot is taken, but the duplicate never needs one
+        duplicate = threading.Thread(target=post, args=('duplicate',))
+        duplicate.start()
+        duplicate.join(0.2)
+        assert duplicate.is_alive()
+        assert client.post('/profiles', json={'urls': URLS}).status_code == 429
+        crawl.release.set()
+        original.join(5)
+        duplicate.join(5)
+
+    assert crawl.calls == len(URLS)
+    assert responses['duplicate'].json == responses['original'].json
+    assert IDEMPOTENCY_REQUESTS_TOTAL.get('attached') == attached + 1
+
+def test_reused_key_and_timeouts_are_refused():
+    app = _make_app(IDEMPOTENCY_WAIT=0.1)
+    client = app.test_client()
+    crawl = CountingCrawl(hold=True)
+
+    with patch('app.crawl_profile_result', side_effect=crawl):
+        original = threading.Thread(target=_post, args=(app.test_client(), 'key-busy', {'urls': URLS}))
+        original.start()
+        assert crawl.started.wait(5)
+        busy = _post(client, 'key-busy', {'urls': URLS})
+        mismatch = _post(client, 'key-busy', {'urls': URLS[:1]})
+        crawl.release.set()
+        original.join(5)
+
+    assert busy.status_code == 409
+    assert busy.headers['Retry-After'] == '1'
+    assert mismatch.status_code == 422
+    assert _post(client, '', {'urls': URLS}).status_code == 400
+    assert _post(client, 'x' * 256, {'urls': URLS}).status_code == 400
+
+def test_server_errors_release_the_key(app):
+    client = app.test_client()
+    body = {'urls': URLS[:1]}
+    with patch('app.crawl_submission', side_effect=RuntimeError('database down')):
+        assert _post(client, 'key-error', body).status_code == 500
+    with patch('app.crawl_profile_result', side_effect=CountingCrawl()):
+        response = _post(client, 'key-error', body)
+    assert response.status_code == 200
+    assert 'Idempotent-Replayed' not in response.headers
+
+def test_requests_rejected_by_admission_release_the_key(app):
+    held = app.extensions['admission'].admit_crawl()
+    client = app.test_client()
+    assert _post(client, 'key-shed', {'urls': URLS}).status_code == 429
+    held.release()
+    with patch('app.crawl_profile_result', side_effect=CountingCrawl()):
+        assert _post(client, 'key-shed', {'urls': URLS}).status_code == 200
+
+def test_memory_store_expires_and_is_bounded():
+    now = [0.0]
+    store = MemoryIdempotencyStore(max_keys=2, ttl=10, clock=lambda: now[0])
+    response = StoredResponse(200, 'application/json', b'{}')
+
+    for key in ('a', 'b', 'c'):
+        claim, _ = store.claim(key, 'print', wait=0)
+        store.complete(claim, response)
+    assert len(store) == 2
+    # 'a' was evicted, so it can be claimed again
+    assert store.claim('a', 'print', wait=0)[0] is not None
+    _, stored = store.claim('c', 'print', wait=0)
+    assert stored_body(stored) == b'{}'
+
+    now[0] = 11
+    assert len(store) == 0
+    assert store.claim('c', 'print', wait=0)[0] is not None
+    with pytest.raises(IdempotencyConflict):
+        store.claim('c', 'other', wait=0)
+
+def test_database_store_is_shared_between_workers(tmp_path):
+    config = {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'idem.db'}",
+        'IDEMPOTENCY_STORE': 'database',
+        'IDEMPOTENCY_POLL_INTERVAL': 0.01,
+        'IDEMPOTENCY_MAX_KEYS': 3,
+    }
+    first, second = _make_app(**config), _make_app(**config)
+    body = {'user_id': str(uuid.uuid4()), 'urls': URLS}
+    crawl = CountingCrawl(hold=True)
+    responses = {}
+
+    def post(name, app):
+        responses[name] = _post(app.test_client(), 'key-db', body)
+
+    with patch('app.crawl_profile_result', side_effect=crawl):
+        original = threading.Thread(target=post, args=('original', first))
+        original.start()
+        assert crawl.started.wait(5)
+        duplicate = threading.Thread(target=post, args=('duplicate', second))
+        duplicate.start()
+        duplicate.join(0.2)
+        assert duplicate.is_alive()
+        crawl.release.set()
+        original.join(5)
+        duplicate.join(5)
+
+        assert crawl.calls == len(URLS)
+        assert responses['duplicate'].json == responses['original'].json
+        assert responses['duplicate'].headers['Idempotent-Replayed'] == 'true'
+        assert _post(second.test_client(), 'key-db', {'urls': URLS[:1]}).status_code == 422
+
+        for index in range(4):
+            _post(second.test_client(), f'key-db-{index}', {'urls': URLS[:1]})
+
+    store = second.extensions['idempotency']
+    with second.app_context():
+        assert store.model.query.count() == 3
+
+def test_asgi_replays_by_key(monkeypatch):
+    import asgi
+
+    app = _make_app()
+    monkeypatch.setattr(asgi, 'flask_app', app)
+    body = json.dumps({'user_id': str(uuid.uuid4()), 'urls': URLS}).encode()
+
+    def call():
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': body}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'POST', 'path': '/profiles', 'query_string': b'',
+                 'headers': [(b'idempotency-key', b'key-asgi'), (b'content-type', b'application/json')]}
+        asyncio.run(asgi.application(scope, receive, send))
+        return sent[0], json.loads(sent[1]['body'])
+
+    async def crawl(url):
+        return next(generate_mock_results('twitter', 1, seed=len(url)))
+
+    with patch('asgi.crawl_profile_result_async', side_effect=crawl) as crawls:
+        (first, first_body), (second, second_body) = call(), call()
+
+    assert crawls.call_count == len(URLS)
+    assert first['status'] == second['status'] == 200
+    assert second_body == first_body
+    assert (b'idempotent-replayed', b'true') in second['headers']
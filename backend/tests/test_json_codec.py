@@ -0,0 +1,83 @@
+"""
+Tests for the JSON codec and Flask JSON provider.
+"""
+
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+from flask.json.provider import DefaultJSONProvider
+import json_codec
+from app import app as flask_app, db, load_user_profiles
+from json_codec import Fragment, dumps, loads
+
+BACKENDS = ['json'] + (['orjson'] if json_codec.orjson is not None else [])
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    previous = json_codec.BACKEND
+    json_codec.set_backend(request.param)
+    yield request.param
+    json_codec.BACKEND = previous
+
+def test_dumps_is_compact_utf8(backend):
+    encoded = dumps({'b': [1, 2.5, None], 'a': 'café'}, sort_keys=True)
+    assert encoded == '{"a":"café","b":[1,2.5,null]}'.encode('utf-8')
+    assert loads(encoded) == {'a': 'café', 'b': [1, 2.5, None]}
+
+def test_fragments_are_spliced_unchanged(backend):
+    factors = json.dumps(['Public account', 'Location "on"'])
+    payload = {'risk_factors': Fragment(factors), 'recommendations': [Fragment('[]'), Fragment(b'{"a":1}')]}
+    encoded = dumps(payload)
+    assert factors.encode('utf-8') in encoded
+    assert json.loads(encoded) == {
+        'risk_factors': ['Public account', 'Location "on"'],
+        'recommendations': [[], {'a': 1}]
+    }
+
+def test_unsupported_values_use_default(backend):
+    with pytest.raises(TypeError):
+        dumps({'value': object()})
+    assert loads(dumps({'value': {1, 2}}, default=sorted)) == {'value': [1, 2]}
+
+def test_large_integers_fall_back_to_stdlib(backend):
+    assert loads(dumps({'value': 2 ** 70})) == {'value': 2 ** 70}
+
+def test_set_backend_rejects_unknown_names():
+    with pytest.raises(ValueError):
+        json_codec.set_backend('simdjson')
+
+def test_provider_matches_flask_output(backend):
+    payload = {'z': 1, 'a': {'when': datetime(2024, 1, 1), 'id': uuid.UUID(int=1)}}
+    with flask_app.app_context():
+        assert json.loads(flask_app.json.dumps(payload)) == json.loads(json.dumps(
+            payload, default=flask_app.json.default, sort_keys=True
+        ))
+        assert list(json.loads(flask_app.json.dumps(payload))) == ['a', 'z']
+
+def test_pretty_debug_responses_match_flask(backend):
+    payload = {'z': [1, 2], 'a': 'café'}
+    with flask_app.app_context():
+        pretty = flask_app.json.dumps(payload, indent=2)
+        assert pretty == DefaultJSONProvider(flask_app).dumps(payload, indent=2)
+        assert '"a": "caf\\u00e9",\n' in pretty
+
+def test_get_profiles_splices_stored_risk_lists(backend):
+    client = flask_app.test_client()
+    post = client.post('/profiles', json={'urls': ['https://twitter.com/fragments']})
+    user_id = post.json['user_id']
+
+    with flask_app.app_context():
+        body = load_user_profiles(user_id)
+        risk = body['results']['https://twitter.com/fragments']['risk_assessment']
+        assert isinstance(risk['risk_factors'], Fragment)
+        assert load_user_profiles(user_id, fragments=False)['results'] == json.loads(
+            flask_app.json.dumps(body)
+        )['results']
+        db.session.remove()
+
+    response = client.get(f'/profiles/{user_id}')
+    assert response.status_code == 200
+    assert response.json['results']['https://twitter.com/fragments']['risk_assessment'] == \
+        post.json['results']['https://twitter.com/fragments']['risk_assessment']
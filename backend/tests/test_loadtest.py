@@ -0,0 +1,106 @@
+"""
+Tests for the load-test harness and the Firecrawl stand-in.
+"""
+
+import pytest
+from app import app as flask_app, create_app, db
+from crawler import crawl_profile
+from loadtest.firecrawl_standin import FirecrawlStandin, StandinScraper, synthetic_page
+from loadtest.runner import (
+    GET_ENDPOINT,
+    POST_ENDPOINT,
+    compare_reports,
+    histogram_quantile,
+    percentile,
+    run_load_test,
+    save_report,
+    standin_crawler,
+)
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile(values, 1.0) == 100
+    assert percentile([], 0.5) is None
+
+def test_histogram_quantile():
+    assert histogram_quantile((0.1, 1.0), [5, 4, 1], 0.5) == 0.1
+    assert histogram_quantile((0.1, 1.0), [5, 4, 1], 0.9) == 1.0
+    assert histogram_quantile((0.1, 1.0), [5, 4, 1], 0.99) == float('inf')
+    assert histogram_quantile((0.1, 1.0), [0, 0, 0], 0.5) is None
+
+def test_standin_serves_scrapes():
+    with FirecrawlStandin(latency_ms=0) as standin:
+        data = StandinScraper(standin.url).scrape_url("https://twitter.com/standin")
+
+    assert data == synthetic_page("https://twitter.com/standin")
+    assert "Followers" in data["markdown"]
+    assert standin.requests == 1
+
+def test_standin_error_rate():
+    with FirecrawlStandin(latency_ms=0, error_rate=1.0) as standin:
+        with pytest.raises(Exception):
+            StandinScraper(standin.url).scrape_url("https://twitter.com/standin")
+    assert standin.errors == 1
+
+def test_crawler_uses_standin():
+    with FirecrawlStandin(latency_ms=0) as standin, standin_crawler(standin):
+        result = crawl_profile("https://instagram.com/standin")
+    assert result["data_source"] == "firecrawl"
+    assert standin.requests == 1
+
+    with FirecrawlStandin(latency_ms=0, error_rate=1.0) as standin, standin_crawler(standin):
+        result = crawl_profile("https://instagram.com/standin")
+    assert result["data_source"] == "mock"
+
+def test_run_load_test_reports_percentiles(tmp_path):
+    with flask_app.app_context():
+        db.create_all()
+
+    report = run_load_test(flask_app, {
+        'rps': 20,
+        'duration': 1.0,
+        'latency_ms': 5,
+        'jitter_ms': 0,
+        'workers': 4,
+        'urls_per_post': 1,
+    })
+
+    assert report['requests'] == 20
+    assert POST_ENDPOINT in report['endpoints']
+    assert report['endpoints'][POST_ENDPOINT]['p50_ms'] > 0
+    assert report['error_rate'] == 0
+    assert report['db']['commits'] >= report['endpoints'][POST_ENDPOINT]['count']
+    assert report['standin']['requests'] >= 1
+
+    path = save_report(report, str(tmp_path))
+    assert path.endswith('.json')
+
+    summary = compare_reports(report, report)
+    assert 'achieved rps' in summary
+    if GET_ENDPOINT in report['endpoints']:
+        assert GET_ENDPOINT in summary
+
+def test_reads_stay_fast_while_crawls_are_shed():
+    app = create_app({'ADMISSION_MAX_CRAWLS': 1})
+    with app.app_context():
+        db.create_all()
+
+    report = run_load_test(app, {
+        'rps': 30,
+        'duration': 1.5,
+        'post_ratio': 0.7,
+        'latency_ms': 500,
+        'jitter_ms': 0,
+        'workers': 16,
+        'urls_per_post': 1,
+    })
+
+    posts = report['endpoints'][POST_ENDPOINT]
+    assert posts['shed'] > 0
+    assert posts['status_counts'].get('200', 0) >= 1
+    assert report['admission']['rejected']['crawls'] == posts['shed']
+    # Reads never wait behind the saturated crawl slot
+    if GET_ENDPOINT in report['endpoints']:
+        assert report['endpoints'][GET_ENDPOINT]['p99_ms'] < 500
@@ -0,0 +1,150 @@
+"""
+Tests for the structured and asynchronous logging configuration.
+"""
+
+import io
+import json
+import logging
+import pytest
+import log_config
+from log_config import (
+    SampledLogger,
+    configure_logging,
+    crawl_id_var,
+    request_id_var,
+    shutdown_logging,
+)
+from crawler import crawl_profile
+
+@pytest.fixture
+def restore_logging():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    shutdown_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+    log_config._sample_rate = 1.0
+
+def read_json_lines(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+def test_json_output_includes_context_and_fields(restore_logging):
+    stream = io.StringIO()
+    configure_logging(log_format='json', async_logging=False, sample_rate=1.0, level='INFO', stream=stream)
+
+    crawl_token = crawl_id_var.set('crawl-1')
+    request_token = request_id_var.set('request-1')
+    try:
+        logging.getLogger('test').info("Crawled %s in %.1fms", 'https://x.com/a', 1.5, extra={'duration_ms': 1.5})
+    finally:
+        crawl_id_var.reset(crawl_token)
+        request_id_var.reset(request_token)
+
+    entry, = read_json_lines(stream)
+    assert entry['message'] == "Crawled https://x.com/a in 1.5ms"
+    assert entry['level'] == 'INFO'
+    assert entry['logger'] == 'test'
+    assert entry['crawl_id'] == 'crawl-1'
+    assert entry['request_id'] == 'request-1'
+    assert entry['duration_ms'] == 1.5
+
+def test_json_output_includes_exceptions(restore_logging):
+    stream = io.StringIO()
+    configure_logging(log_format='json', async_logging=True, sample_rate=1.0, level='INFO', stream=stream)
+
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logging.getLogger('test').exception("Failed")
+    shutdown_logging()
+
+    entry, = read_json_lines(stream)
+    assert 'ValueError: boom' in entry['exc_info']
+
+def test_async_mode_formats_off_the_calling_thread(restore_logging):
+    stream = io.StringIO()
+    configure_logging(log_format='json', async_logging=True, sample_rate=1.0, level='INFO', stream=stream)
+
+    class Lazy:
+        formatted = 0
+
+        def __str__(self):
+            Lazy.formatted += 1
+            return 'lazy'
+
+    crawl_token = crawl_id_var.set('crawl-2')
+    try:
+        logging.getLogger('test').info("value %s", Lazy())
+    finally:
+        crawl_id_var.reset(crawl_token)
+
+    shutdown_logging()
+    entry, = read_json_lines(stream)
+    assert entry['message'] == 'value lazy'
+    # The crawl id is captured on the calling thread even though formatting happened later
+    assert entry['crawl_id'] == 'crawl-2'
+    assert Lazy.formatted == 1
+
+def test_messages_below_level_are_not_formatted(restore_logging):
+    configure_logging(log_format='text', async_logging=False, sample_rate=1.0, level='INFO', stream=io.StringIO())
+
+    class Explodes:
+        def __str__(self):
+            raise AssertionError("should not be formatted")
+
+    logging.getLogger('test').debug("value %s", Explodes())
+
+def test_sampled_logger_drops_lines(restore_logging):
+    stream = io.StringIO()
+    configure_logging(log_format='json', async_logging=False, sample_rate=0.0, level='INFO', stream=stream)
+    url_logger = SampledLogger(logging.getLogger('test'))
+
+    for _ in range(100):
+        url_logger.info("Crawling URL: %s", 'https://x.com/a')
+    logging.getLogger('test').warning("not sampled")
+
+    entries = read_json_lines(stream)
+    assert [entry['message'] for entry in entries] == ["not sampled"]
+
+def test_sampled_logger_keeps_everything_at_full_rate(restore_logging):
+    stream = io.StringIO()
+    configure_logging(log_format='json', async_logging=False, sample_rate=1.0, level='INFO', stream=stream)
+    url_logger = SampledLogger(logging.getLogger('test'))
+
+    for _ in range(10):
+        url_logger.info("Crawling URL: %s", 'https://x.com/a', extra={'url': 'https://x.com/a'})
+
+    entries = read_json_lines(stream)
+    assert len(entries) == 10
+    assert entries[0]['url'] == 'https://x.com/a'
+
+def test_sampled_logger_reports_its_caller(restore_logging):
+    configure_logging(log_format='json', async_logging=False, sample_rate=1.0, level='INFO', stream=io.StringIO())
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logging.getLogger('test.caller').addHandler(handler)
+
+    try:
+        SampledLogger(logging.getLogger('test.caller')).info("Crawling URL: %s", 'https://x.com/a')
+    finally:
+        logging.getLogger('test.caller').removeHandler(handler)
+
+    assert records[0].funcName == 'test_sampled_logger_reports_its_caller'
+    assert records[0].getMessage() == "Crawling URL: https://x.com/a"
+
+def test_crawl_logs_share_a_crawl_id(restore_logging):
+    stream = io.StringIO()
+    configure_logging(log_format='json', async_logging=False, sample_rate=1.0, level='INFO', stream=stream)
+
+    crawl_profile("https://twitter.com/loguser")
+
+    entries = [entry for entry in read_json_lines(stream) if entry['logger'] == 'crawler']
+    assert entries
+    crawl_ids = {entry.get('crawl_id') for entry in entries}
+    assert len(crawl_ids) == 1 and None not in crawl_ids
+    assert any('duration_ms' in entry and entry['data_source'] == 'mock' for entry in entries)
@@ -0,0 +1,100 @@
+"""
+Tests for the metrics module and the /metrics endpoint.
+"""
+
+import json
+import pytest
+from app import app as flask_app, db
+from crawler import CRAWL_STAGE_SECONDS, crawl_profile
+from metrics import MetricsRegistry, StageTimer, stage
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+def test_counter_renders_labels(registry):
+    counter = registry.counter('test_total', 'Test counter.', ('platform',))
+    counter.inc('twitter')
+    counter.inc('twitter', amount=2)
+    counter.inc('face"book')
+
+    output = registry.render()
+    assert '# TYPE test_total counter' in output
+    assert 'test_total{platform="twitter"} 3' in output
+    assert 'test_total{platform="face\\"book"} 1' in output
+
+def test_counter_rejects_wrong_labels(registry):
+    counter = registry.counter('test_total', 'Test counter.', ('platform',))
+    with pytest.raises(ValueError):
+        counter.inc('twitter', 'extra')
+
+def test_gauge_set_inc_dec(registry):
+    gauge = registry.gauge('test_gauge', 'Test gauge.')
+    gauge.set(5)
+    gauge.inc()
+    gauge.dec(amount=2)
+    assert gauge.get() == 4
+    assert 'test_gauge 4' in registry.render()
+
+def test_histogram_buckets_are_cumulative(registry):
+    histogram = registry.histogram('test_seconds', 'Test histogram.', ('stage',), buckets=(0.1, 1.0))
+    histogram.observe(0.05, 'scrape')
+    histogram.observe(0.5, 'scrape')
+    histogram.observe(5, 'scrape')
+
+    output = registry.render()
+    assert 'test_seconds_bucket{stage="scrape",le="0.1"} 1' in output
+    assert 'test_seconds_bucket{stage="scrape",le="1"} 2' in output
+    assert 'test_seconds_bucket{stage="scrape",le="+Inf"} 3' in output
+    assert 'test_seconds_count{stage="scrape"} 3' in output
+    assert 'test_seconds_sum{stage="scrape"} 5.55' in output
+
+def test_registry_returns_existing_metric(registry):
+    first = registry.counter('test_total', 'Test counter.')
+    assert registry.counter('test_total', 'Test counter.') is first
+    with pytest.raises(ValueError):
+        registry.gauge('test_total', 'Test gauge.')
+
+def test_stage_timer_labels_stages_with_outcome(registry):
+    histogram = registry.histogram('test_stage_seconds', 'Stages.', ('stage', 'platform', 'data_source'))
+    counter = registry.counter('test_crawls_total', 'Crawls.', ('platform', 'data_source'))
+
+    with StageTimer(histogram, counter) as timer:
+        with stage('scrape'):
+            pass
+        with stage('extract'):
+            pass
+        timer.finish('twitter', 'firecrawl')
+
+    assert histogram.get_count('scrape', 'twitter', 'firecrawl') == 1
+    assert histogram.get_count('extract', 'twitter', 'firecrawl') == 1
+    assert histogram.get_count('total', 'twitter', 'firecrawl') == 1
+    assert counter.get('twitter', 'firecrawl') == 1
+
+def test_stage_without_timer_is_a_no_op():
+    with stage('scrape'):
+        pass
+
+def test_crawl_profile_records_stages():
+    before = CRAWL_STAGE_SECONDS.get_count('risk_assessment', 'twitter', 'mock')
+    crawl_profile("https://twitter.com/metricsuser")
+    assert CRAWL_STAGE_SECONDS.get_count('risk_assessment', 'twitter', 'mock') == before + 1
+
+def test_metrics_endpoint_exposes_stage_histograms():
+    with flask_app.app_context():
+        db.create_all()
+    client = flask_app.test_client()
+
+    client.post(
+        '/profiles',
+        data=json.dumps({"urls": ["https://twitter.com/metricsuser"]}),
+        content_type='application/json'
+    )
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    body = response.data.decode()
+    assert 'fiasco_crawl_stage_duration_seconds_bucket{stage="total",platform="twitter",data_source="mock"' in body
+    assert 'fiasco_submit_stage_duration_seconds_count{stage="commit",platform="twitter",data_source="mock"}' in body
+    assert 'fiasco_http_request_duration_seconds_count{endpoint="submit_profiles",method="POST",status="200"}' in body
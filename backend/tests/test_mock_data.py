@@ -0,0 +1,85 @@
+"""
+Tests for seedable mock profile generation.
+"""
+
+from datetime import datetime
+from unittest.mock import patch
+import pytest
+import crawler
+from crawler import crawl_profile, generate_mock_profiles
+from mock_data import (
+    COMMON_ACTIVITY_SPEC,
+    PLATFORM_ACTIVITY_SPECS,
+    PRIVACY_SPECS,
+    generate_activity_data,
+    generate_mock_columns,
+    generate_privacy_settings,
+    iter_column_rows,
+    np,
+    rng_for_url,
+)
+
+NOW = datetime(2024, 1, 31)
+
+def test_privacy_settings_only_include_platform_fields():
+    settings = generate_privacy_settings('tiktok')
+    assert set(settings) == {field[0] for field in PRIVACY_SPECS['tiktok']}
+
+def test_activity_data_includes_common_and_platform_fields():
+    activity = generate_activity_data('linkedin', now=NOW)
+    expected = {field[0] for field in COMMON_ACTIVITY_SPEC + PLATFORM_ACTIVITY_SPECS['linkedin']}
+    assert set(activity) == expected
+    assert 10 <= activity['post_count'] <= 500
+    assert 0.5 <= activity['engagement_rate'] <= 15.0
+    assert '2023-12-31' <= activity['last_active'] <= '2024-01-31'
+
+def test_rng_for_url_is_deterministic():
+    first = generate_activity_data('twitter', rng_for_url('https://twitter.com/a', 1), NOW)
+    second = generate_activity_data('twitter', rng_for_url('https://twitter.com/a', 1), NOW)
+    other_url = generate_activity_data('twitter', rng_for_url('https://twitter.com/b', 1), NOW)
+    other_seed = generate_activity_data('twitter', rng_for_url('https://twitter.com/a', 2), NOW)
+
+    assert first == second
+    assert first != other_url
+    assert first != other_seed
+
+def test_crawl_profile_is_reproducible_with_mock_seed():
+    with patch.object(crawler, 'MOCK_SEED', '7'):
+        first = crawl_profile('https://twitter.com/seeded')
+        second = crawl_profile('https://twitter.com/seeded')
+        anonymous_first = crawl_profile('https://twitter.com')
+        anonymous_second = crawl_profile('https://twitter.com')
+
+    for key in ('privacy_settings', 'activity_data', 'risk_assessment'):
+        assert first[key] == second[key]
+    assert anonymous_first['username'] == anonymous_second['username']
+
+@pytest.mark.parametrize('use_numpy', [False, True])
+def test_generate_mock_columns(use_numpy):
+    if use_numpy and np is None:
+        pytest.skip("NumPy is not installed")
+
+    privacy, activity = generate_mock_columns('twitter', 500, seed=3, now=NOW, use_numpy=use_numpy)
+    again_privacy, _ = generate_mock_columns('twitter', 500, seed=3, now=NOW, use_numpy=use_numpy)
+
+    rows = list(iter_column_rows(activity))
+    assert len(rows) == 500
+    assert all(10 <= row['post_count'] <= 500 for row in rows)
+    assert all(isinstance(row['verification_status'], bool) for row in rows)
+    assert {row['verification_status'] for row in rows} == {True, False}
+    assert all(row['account_created'] <= '2023-01-31' for row in rows)
+
+    privacy_rows = list(iter_column_rows(privacy))
+    assert {row['account_privacy'] for row in privacy_rows} == {'public', 'private'}
+    assert privacy_rows == list(iter_column_rows(again_privacy))
+
+def test_generate_mock_profiles_have_crawler_shape():
+    profiles = list(generate_mock_profiles('instagram', 20, seed=5))
+
+    assert len(profiles) == 20
+    assert len({profile['username'] for profile in profiles}) == 20
+    for profile in profiles:
+        assert profile['platform'] == 'instagram'
+        assert profile['data_source'] == 'mock'
+        assert 'average_likes' in profile['activity_data']
+        assert 0 <= profile['risk_assessment']['privacy_score'] <= 100
@@ -6,6 +6,7 @@ import pytest
 import json
 from unittest.mock import patch, MagicMock
 from app import app as flask_app, crawler_results, db
+from crawl_result import ProfileResult
 from models import User, Profile
 
 @pytest.fixture
@@ -63,7 +64,7 @@ def test_profiles_endpoint_with_mocked_crawler():
     }
     
     # Patch the crawler function to return our mock data
-    with patch('app.crawl_profile', return_value=mock_profile_data):
+    with patch('app.crawl_profile_result', return_value=ProfileResult.from_dict(mock_profile_data)):
         # Test data
         urls = ["https://twitter.com/testuser"]
         
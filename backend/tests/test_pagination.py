@@ -0,0 +1,126 @@
+"""
+Tests for keyset pagination of a user's profiles.
+"""
+
+import sqlite3
+import uuid
+
+import pytest
+from sqlalchemy import inspect, text
+from app import app as flask_app, create_app, db, save_profile
+from crawler import generate_mock_results
+from models import Profile, User, create_schema
+from pagination import decode_cursor, encode_cursor, list_profiles_page
+
+@pytest.fixture
+def user_id():
+    user_id = str(uuid.uuid4())
+    with flask_app.app_context():
+        db.session.add(User(id=user_id))
+        for platform in ('twitter', 'instagram'):
+            for index, profile in enumerate(generate_mock_results(platform, 15, seed=7)):
+                save_profile(user_id, f'https://{platform}.com/page_{index}', profile)
+        db.session.commit()
+    return user_id
+
+def _walk(client, path):
+    urls, pages = [], 0
+    while path:
+        response = client.get(path)
+        assert response.status_code == 200
+        urls.extend(profile['url'] for profile in response.json['profiles'])
+        pages += 1
+        cursor = response.json['next_cursor']
+        path = f"{path.split('&cursor=')[0]}&cursor={cursor}" if cursor else None
+    return urls, pages
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(12345)) == 12345
+    for cursor in ('', 'not-a-cursor', encode_cursor(1)[:-2] + '!!'):
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
+
+def test_pages_cover_every_profile_once_in_stable_order(user_id):
+    client = flask_app.test_client()
+    urls, pages = _walk(client, f'/profiles/{user_id}/list?limit=7')
+
+    assert pages == 5
+    assert urls == client.get(f'/profiles/{user_id}').json['urls']
+    assert len(set(urls)) == 30
+
+def test_new_profiles_do_not_shift_later_pages(user_id):
+    client = flask_app.test_client()
+    first = client.get(f'/profiles/{user_id}/list?limit=10').json
+    client.post('/profiles', json={'user_id': user_id, 'urls': ['https://twitter.com/late_arrival']})
+
+    second = client.get(f"/profiles/{user_id}/list?limit=10&cursor={first['next_cursor']}").json
+    assert second['profiles'][0]['url'] == 'https://twitter.com/page_10'
+    assert second['profiles'][-1]['url'] == 'https://instagram.com/page_4'
+
+def test_filters(user_id):
+    client = flask_app.test_client()
+    urls, _ = _walk(client, f'/profiles/{user_id}/list?limit=4&platform=instagram')
+    assert len(urls) == 15
+    assert all(url.startswith('https://instagram.com/') for url in urls)
+
+    full = client.get(f'/profiles/{user_id}').json
+    high = [url for url in full['urls'] if full['results'][url]['platform'] == 'twitter'
+            and full['results'][url]['risk_assessment']['risk_level'] == 'high']
+    assert high
+    urls, _ = _walk(client, f'/profiles/{user_id}/list?limit=3&platform=twitter&risk_level=high')
+    assert urls == high
+
+def test_fields_and_errors(user_id):
+    client = flask_app.test_client()
+    page = client.get(f'/profiles/{user_id}/list?limit=2&fields=risk_assessment.risk_level').json
+    assert page['limit'] == 2
+    assert set(page['profiles'][0]) == {'url', 'risk_assessment'}
+
+    assert client.get(f'/profiles/{user_id}/list?limit=ten').status_code == 400
+    assert client.get(f'/profiles/{user_id}/list?cursor=bogus').status_code == 400
+    assert client.get(f'/profiles/{user_id}/list?fields=bogus').status_code == 400
+    assert client.get('/profiles/no-such-user/list').status_code == 404
+    assert client.get(f'/profiles/{user_id}/list?limit=100000').json['limit'] == 500
+
+@pytest.mark.parametrize('filters, index', [
+    ({}, 'ix_profile_user_id_id'),
+    ({'platform': 'twitter'}, 'ix_profile_user_id_platform_id'),
+    ({'risk_level': 'high'}, 'ix_profile_user_id_risk_level_id'),
+    ({'platform': 'twitter', 'risk_level': 'high'}, 'ix_profile_user_id_platform_risk_level_id'),
+])
+def test_listing_queries_use_indexes(filters, index):
+    with flask_app.app_context():
+        query = Profile.query.filter(Profile.user_id == 'u', Profile.id > 10)
+        for column, value in filters.items():
+            query = query.filter(getattr(Profile, column) == value)
+        statement = query.order_by(Profile.id).limit(51).statement.compile(
+            db.engine, compile_kwargs={'literal_binds': True}
+        )
+        plan = ' '.join(row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {statement}')))
+
+    assert f'USING INDEX {index}' in plan or f'USING COVERING INDEX {index}' in plan
+    assert 'TEMP B-TREE' not in plan
+
+def test_create_schema_upgrades_existing_database(tmp_path):
+    path = tmp_path / 'old.db'
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE user (id VARCHAR(36) PRIMARY KEY, created_at DATETIME, updated_at DATETIME);
+        CREATE TABLE profile (id INTEGER PRIMARY KEY, url VARCHAR(255) NOT NULL, platform VARCHAR(50),
+            username VARCHAR(100), created_at DATETIME, updated_at DATETIME, user_id VARCHAR(36) NOT NULL);
+        CREATE TABLE risk_assessment (id INTEGER PRIMARY KEY, privacy_score INTEGER, risk_level VARCHAR(20),
+            risk_factors TEXT, recommendations TEXT, profile_id INTEGER NOT NULL);
+        INSERT INTO user (id) VALUES ('old');
+        INSERT INTO profile (id, url, platform, user_id) VALUES (1, 'https://twitter.com/old', 'twitter', 'old');
+        INSERT INTO risk_assessment (privacy_score, risk_level, profile_id) VALUES (30, 'high', 1);
+    ''')
+    conn.close()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+    with app.app_context():
+        create_schema()
+        create_schema()
+        assert 'risk_level' in {column['name'] for column in inspect(db.engine).get_columns('profile')}
+        assert 'ix_profile_user_id_risk_level_id' in {index['name'] for index in inspect(db.engine).get_indexes('profile')}
+        page = list_profiles_page('old', risk_level='high', fragments=False)
+        assert [profile['url'] for profile in page['profiles']] == ['https://twitter.com/old']
@@ -0,0 +1,126 @@
+"""
+Tests for the opt-in request profiler.
+"""
+
+import os
+import sys
+import time
+from flask import Flask, jsonify
+from profiling import collapse_frame, enforce_retention, init_profiling
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+def make_app(tmp_path, **config):
+    app = Flask(__name__)
+    app.config.update(
+        PROFILING_ENABLED=True,
+        PROFILING_DIR=str(tmp_path),
+        PROFILING_INTERVAL=0.001,
+        PROFILING_SAMPLE_RATE=0.0,
+        PROFILING_TOKEN='secret',
+    )
+    app.config.update(config)
+
+    @app.route('/slow')
+    def submit_profiles():
+        busy_wait(0.05)
+        return jsonify({"status": "ok"})
+
+    return app
+
+def profile_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.folded'))
+
+def test_disabled_profiling_leaves_views_untouched(tmp_path):
+    app = make_app(tmp_path, PROFILING_ENABLED=False)
+    view = app.view_functions['submit_profiles']
+
+    assert init_profiling(app) is None
+    assert app.view_functions['submit_profiles'] is view
+
+def test_header_triggers_profile(tmp_path):
+    app = make_app(tmp_path)
+    init_profiling(app)
+    client = app.test_client()
+
+    response = client.get('/slow')
+    assert response.status_code == 200
+    assert 'X-Fiasco-Profile-Id' not in response.headers
+    assert profile_files(tmp_path) == []
+
+    response = client.get('/slow', headers={'X-Fiasco-Profile': 'secret'})
+    assert response.status_code == 200
+    assert response.json == {"status": "ok"}
+
+    profile_id = response.headers['X-Fiasco-Profile-Id']
+    assert profile_files(tmp_path) == [profile_id + '.folded']
+
+    with open(tmp_path / (profile_id + '.folded')) as f:
+        lines = f.read().splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(' ', 1)
+        assert int(count) > 0
+    assert any('busy_wait' in line for line in lines)
+
+def test_header_is_ignored_without_a_token(tmp_path):
+    app = make_app(tmp_path, PROFILING_TOKEN='')
+    init_profiling(app)
+    client = app.test_client()
+
+    response = client.get('/slow', headers={'X-Fiasco-Profile': '1'})
+    assert 'X-Fiasco-Profile-Id' not in response.headers
+    assert profile_files(tmp_path) == []
+
+def test_token_is_required(tmp_path):
+    app = make_app(tmp_path)
+    init_profiling(app)
+    client = app.test_client()
+
+    response = client.get('/slow', headers={'X-Fiasco-Profile': 'wrong'})
+    assert 'X-Fiasco-Profile-Id' not in response.headers
+
+    response = client.get('/slow', headers={'X-Fiasco-Profile': 'secret'})
+    assert 'X-Fiasco-Profile-Id' in response.headers
+
+def test_sample_rate_profiles_without_header(tmp_path):
+    app = make_app(tmp_path, PROFILING_SAMPLE_RATE=1.0)
+    init_profiling(app)
+
+    response = app.test_client().get('/slow')
+    assert 'X-Fiasco-Profile-Id' in response.headers
+
+def test_retention_removes_oldest_files(tmp_path):
+    for i in range(5):
+        path = tmp_path / f'profile-{i}.folded'
+        path.write_text('main 1\n' * 10)
+        os.utime(path, (1000 + i, 1000 + i))
+    (tmp_path / 'notes.txt').write_text('keep me')
+
+    assert enforce_retention(str(tmp_path), max_files=3, max_bytes=10 ** 6) == 2
+    assert profile_files(tmp_path) == ['profile-2.folded', 'profile-3.folded', 'profile-4.folded']
+
+    assert enforce_retention(str(tmp_path), max_files=10, max_bytes=100) == 2
+    assert profile_files(tmp_path) == ['profile-4.folded']
+    assert (tmp_path / 'notes.txt').exists()
+
+def test_retention_is_applied_after_each_profile(tmp_path):
+    app = make_app(tmp_path, PROFILING_MAX_FILES=2)
+    init_profiling(app)
+    client = app.test_client()
+
+    for _ in range(4):
+        client.get('/slow', headers={'X-Fiasco-Profile': 'secret'})
+
+    assert len(profile_files(tmp_path)) == 2
+
+def test_collapse_frame_is_root_first():
+    def inner():
+        return collapse_frame(sys._getframe())
+
+    stack = inner().split(';')
+    assert stack[-1].startswith('inner ')
+    assert stack[-2].startswith('test_collapse_frame_is_root_first ')
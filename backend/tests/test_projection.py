@@ -0,0 +1,69 @@
+"""
+Tests for field projection on GET /profiles/<user_id>.
+"""
+
+import pytest
+from sqlalchemy import event
+from app import app as flask_app, db
+from projection import parse_fields
+
+URLS = ['https://twitter.com/projected', 'https://instagram.com/projected']
+
+@pytest.fixture
+def user_id():
+    response = flask_app.test_client().post('/profiles', json={'urls': URLS})
+    return response.json['user_id']
+
+@pytest.fixture
+def statements():
+    executed = []
+    with flask_app.app_context():
+        engine = db.engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', record)
+
+def test_parse_fields():
+    assert parse_fields(None) is None
+    assert parse_fields('') is None
+    assert parse_fields('platform, risk_assessment.risk_level,risk_assessment.privacy_score') == {
+        'platform': None,
+        'risk_assessment': ('risk_level', 'privacy_score'),
+    }
+    assert parse_fields('risk_assessment.risk_level,risk_assessment') == {'risk_assessment': None}
+    for value in ('email', 'platform.name', 'risk_assessment.email'):
+        with pytest.raises(ValueError):
+            parse_fields(value)
+
+def test_overview_projection_returns_only_requested_fields(user_id):
+    full = flask_app.test_client().get(f'/profiles/{user_id}').json
+    response = flask_app.test_client().get(
+        f'/profiles/{user_id}?fields=platform,risk_assessment.privacy_score,risk_assessment.risk_level'
+    )
+
+    assert response.status_code == 200
+    assert response.json['urls'] == full['urls']
+    for url in URLS:
+        risk = full['results'][url]['risk_assessment']
+        assert response.json['results'][url] == {
+            'platform': full['results'][url]['platform'],
+            'risk_assessment': {'privacy_score': risk['privacy_score'], 'risk_level': risk['risk_level']},
+        }
+
+def test_projection_skips_unneeded_child_tables(user_id, statements):
+    flask_app.test_client().get(f'/profiles/{user_id}?fields=username,risk_assessment.risk_level')
+
+    queried = ' '.join(statements).lower()
+    assert 'risk_assessment' in queried
+    assert 'privacy_setting' not in queried
+    assert 'activity_data' not in queried
+    assert 'risk_factors' not in queried
+
+def test_unknown_field_is_rejected(user_id):
+    response = flask_app.test_client().get(f'/profiles/{user_id}?fields=password')
+    assert response.status_code == 400
+    assert 'password' in response.json['error']
@@ -0,0 +1,129 @@
+"""
+Tests for the bounded in-memory result store.
+"""
+
+import gc
+import tracemalloc
+
+import pytest
+from metrics import REGISTRY
+from result_store import MemoryResultStore, decode_payload, encode_payload
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def _payload(user_id, urls=3):
+    urls = [f'https://twitter.com/{user_id}_{i}' for i in range(urls)]
+    return {
+        'urls': urls,
+        'results': {url: {'platform': 'twitter', 'privacy_settings': {'account_privacy': 'public'}} for url in urls},
+        'timestamp': None,
+    }
+
+def test_payload_round_trip_is_compact():
+    payload = _payload('compact', urls=20)
+    encoded = encode_payload(payload)
+    assert decode_payload(encoded) == payload
+    assert len(encoded) < len(repr(payload)) / 3
+
+def test_reads_return_copies():
+    store = MemoryResultStore()
+    store['a'] = _payload('a')
+    store['a']['urls'].append('mutated')
+    assert store['a'] == _payload('a')
+
+def test_evicts_least_recently_used_entry():
+    store = MemoryResultStore(max_entries=2)
+    store['a'] = _payload('a')
+    store['b'] = _payload('b')
+    store['a']
+    store['c'] = _payload('c')
+
+    assert 'a' in store and 'c' in store
+    assert 'b' not in store
+    assert store.stats()['evictions']['capacity'] == 1
+
+def test_enforces_max_bytes():
+    entry_size = len(encode_payload(_payload('user_0000')))
+    store = MemoryResultStore(max_bytes=entry_size * 5)
+    for i in range(50):
+        store[f'user_{i:04d}'] = _payload(f'user_{i:04d}')
+
+    stats = store.stats()
+    assert stats['bytes'] <= entry_size * 5 + 16
+    assert 3 <= stats['entries'] <= 6
+    assert 'user_0049' in store
+
+def test_oversize_payload_is_not_stored():
+    store = MemoryResultStore(max_bytes=10)
+    store['big'] = _payload('big')
+    assert 'big' not in store
+    assert store.stats()['evictions']['oversize'] == 1
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    store = MemoryResultStore(ttl=60, clock=clock)
+    store['a'] = _payload('a')
+    clock.now = 30
+    store['b'] = _payload('b')
+
+    clock.now = 61
+    assert 'a' not in store
+    assert store['b']['urls'] == _payload('b')['urls']
+
+    clock.now = 100
+    assert len(store) == 0
+    assert store.stats()['evictions']['expired'] == 2
+    with pytest.raises(KeyError):
+        store['b']
+
+def test_overwrite_refreshes_ttl_and_size():
+    clock = FakeClock()
+    store = MemoryResultStore(ttl=60, clock=clock)
+    store['a'] = _payload('a', urls=10)
+    clock.now = 50
+    store['a'] = _payload('a', urls=1)
+    clock.now = 100
+
+    assert 'a' in store
+    assert store.stats()['bytes'] == len(encode_payload(_payload('a', urls=1)))
+
+def test_stats_and_gauges():
+    store = MemoryResultStore()
+    store['a'] = _payload('a')
+    store['a']
+    with pytest.raises(KeyError):
+        store['missing']
+    del store['a']
+
+    stats = store.stats()
+    assert (stats['entries'], stats['bytes'], stats['hits'], stats['misses']) == (0, 0, 1, 1)
+    assert 'fiasco_result_store_bytes 0' in REGISTRY.render()
+
+def test_memory_stays_flat_over_simulated_soak():
+    # Three simulated hours of one submission per second with a 10 minute TTL
+    clock = FakeClock()
+    store = MemoryResultStore(max_entries=1000, ttl=600, clock=clock)
+
+    def run(seconds):
+        for _ in range(seconds):
+            clock.now += 1
+            store[f'user_{int(clock.now)}'] = _payload(f'user_{int(clock.now)}')
+
+    tracemalloc.start()
+    try:
+        run(1200)
+        gc.collect()
+        baseline = tracemalloc.get_traced_memory()[0]
+        run(3 * 3600)
+        gc.collect()
+        growth = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+
+    assert store.stats()['entries'] <= 600
+    assert growth < 64 * 1024
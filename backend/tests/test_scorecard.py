@@ -0,0 +1,134 @@
+"""
+Tests for the offline scorecard CLI.
+"""
+
+import io
+import json
+import uuid
+from unittest.mock import patch
+
+import pytest
+from app import create_app, save_profile
+from crawler import crawl_profile
+from models import Profile, create_schema
+from scorecard import generate_scorecards, main, read_checkpoint
+from sharding import use_user_shard
+
+URLS = [f'https://twitter.com/card_{i}' for i in range(9)]
+
+class Crash(BaseException):
+    """Stands in for the process being killed mid-run."""
+
+def _write_input(tmp_path, lines):
+    path = tmp_path / 'urls.txt'
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+def _read_output(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def test_scorecards_are_written_in_input_order(tmp_path):
+    input_path = _write_input(tmp_path, URLS[:5] + ['not a url', URLS[0]] + URLS[5:])
+    output_path = str(tmp_path / 'cards.ndjson')
+
+    assert main([input_path, '-o', output_path, '--workers', '3', '--batch-size', '2']) == 0
+
+    cards = _read_output(output_path)
+    assert [card['url'] for card in cards] == URLS
+    assert all(card['risk_assessment']['risk_level'] in ('low', 'medium', 'high') for card in cards)
+    stats = read_checkpoint(output_path + '.checkpoint')['stats']
+    assert stats['received'] == 11
+    assert (stats['invalid'], stats['duplicates'], stats['succeeded']) == (1, 1, 9)
+
+def test_process_pool_and_errors():
+    def crawl(url):
+        if url == URLS[2]:
+            raise ValueError('unreachable')
+        return crawl_profile(url)
+
+    output = io.BytesIO()
+    with patch('scorecard.crawl_profile', side_effect=crawl):
+        stats = generate_scorecards(URLS[:3], output, workers=1)
+    assert json.loads(output.getvalue().splitlines()[2]) == {'url': URLS[2], 'error': 'unreachable'}
+    assert (stats['succeeded'], stats['failed']) == (2, 1)
+
+    output = io.BytesIO()
+    stats = generate_scorecards(URLS, output, executor='process', workers=2, batch_size=2)
+    assert [json.loads(line)['url'] for line in output.getvalue().splitlines()] == URLS
+    assert stats['succeeded'] == len(URLS)
+
+def test_resume_continues_after_the_last_checkpoint(tmp_path):
+    input_path = _write_input(tmp_path, URLS[:4] + [URLS[1]] + URLS[4:])
+    output_path = str(tmp_path / 'cards.ndjson')
+    crawled = []
+
+    def crawl(url):
+        if url == URLS[5]:
+            raise Crash()
+        crawled.append(url)
+        return crawl_profile(url)
+
+    with patch('scorecard.crawl_profile', side_effect=crawl), pytest.raises(Crash):
+        main([input_path, '-o', output_path, '--workers', '1', '--batch-size', '2'])
+    checkpoint = read_checkpoint(output_path + '.checkpoint')
+    assert checkpoint['position'] == 4
+    # A half-written line after the checkpoint is cut off on resume
+    with open(output_path, 'ab') as f:
+        f.write(b'{"url": "https://twitter.com/card_4", "plat')
+
+    crawled.clear()
+    with patch('scorecard.crawl_profile', side_effect=crawl_profile) as crawl_after:
+        assert main([input_path, '-o', output_path, '--workers', '1', '--batch-size', '2', '--resume']) == 0
+    assert [call.args[0] for call in crawl_after.call_args_list] == URLS[4:]
+    assert [card['url'] for card in _read_output(output_path)] == URLS
+    stats = read_checkpoint(output_path + '.checkpoint')['stats']
+    assert (stats['received'], stats['duplicates'], stats['processed']) == (10, 1, 9)
+
+    # A finished run resumes to nothing
+    with patch('scorecard.crawl_profile', side_effect=crawl_profile) as crawl_again:
+        main([input_path, '-o', output_path, '--resume'])
+    assert not crawl_again.called
+    assert len(_read_output(output_path)) == len(URLS)
+
+def test_resume_refuses_a_missing_or_cut_output(tmp_path, capsys):
+    input_path = _write_input(tmp_path, URLS[:4])
+    output_path = str(tmp_path / 'cards.ndjson')
+    assert main([input_path, '-o', output_path, '--workers', '1', '--batch-size', '2']) == 0
+
+    with open(output_path, 'r+b') as f:
+        f.truncate(10)
+    with pytest.raises(SystemExit) as error:
+        main([input_path, '-o', output_path, '--resume'])
+    assert error.value.code == 2
+    assert 'shorter than its checkpoint' in capsys.readouterr().err
+
+    (tmp_path / 'cards.ndjson').unlink()
+    with pytest.raises(SystemExit):
+        main([input_path, '-o', output_path, '--resume'])
+
+def test_scorecards_can_be_stored(tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'cards.db'}"})
+    with app.app_context():
+        create_schema()
+    user_id = str(uuid.uuid4())
+
+    stats = generate_scorecards(URLS, io.BytesIO(), workers=2, batch_size=4, app=app, user_id=user_id)
+
+    assert stats['stored'] == len(URLS)
+    with app.app_context(), use_user_shard(user_id):
+        assert Profile.query.filter_by(user_id=user_id).count() == len(URLS)
+
+    # A batch that cannot be committed as a whole is saved one profile at a time
+    calls = []
+
+    def fail_once(user, url, profile, checked_at=None):
+        calls.append(url)
+        if len(calls) == 1:
+            raise ValueError('bad row')
+        return save_profile(user, url, profile, checked_at)
+
+    with patch('app.save_profile', side_effect=fail_once):
+        stats = generate_scorecards(URLS[:2], io.BytesIO(), workers=1, app=app, user_id=user_id)
+    assert stats['stored'] == 2
+    assert calls == [URLS[0]] + URLS[:2]
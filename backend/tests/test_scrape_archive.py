@@ -0,0 +1,125 @@
+"""
+Tests for the raw scrape archive and offline re-extraction.
+"""
+
+import uuid
+
+import pytest
+import crawler
+import reextract as reextract_module
+from app import app as flask_app, db
+from loadtest.firecrawl_standin import FirecrawlStandin, StandinScraper, synthetic_page
+from models import Profile
+from scrape_archive import ScrapeArchive, content_key
+from reextract import reextract
+
+URLS = [f'https://twitter.com/archived_{i}' for i in range(6)]
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    directory = str(tmp_path / 'archive')
+    monkeypatch.setenv('FIASCO_SCRAPE_ARCHIVE_DIR', directory)
+    return directory
+
+@pytest.fixture
+def standin(monkeypatch):
+    with FirecrawlStandin() as standin:
+        monkeypatch.setattr(crawler, 'FIRECRAWL_API_KEY', 'test-key')
+        monkeypatch.setattr(crawler, 'firecrawl_app', StandinScraper(standin.url))
+        yield standin
+
+def test_round_trip_and_dedup(tmp_path):
+    archive = ScrapeArchive(str(tmp_path), codec='gzip')
+    page = synthetic_page(URLS[0])
+    key = archive.put(URLS[0], 'twitter', 'archived_0', page)
+    assert archive.put(URLS[1], 'twitter', 'archived_1', dict(page)) == key
+    archive.put(URLS[0], 'twitter', 'archived_0', synthetic_page(URLS[2]))
+
+    assert archive.get(key) == page
+    assert archive.latest(URLS[1])['key'] == key
+    assert archive.latest(URLS[0])['key'] == content_key(synthetic_page(URLS[2]))[1]
+    stats = archive.stats()
+    assert (stats['objects'], stats['scrapes'], stats['urls']) == (2, 3, 2)
+    assert stats['stored_bytes'] < stats['raw_bytes']
+    with pytest.raises(KeyError):
+        archive.get('missing')
+    archive.close()
+
+def test_mixed_codecs_and_pack_rollover(tmp_path):
+    pytest.importorskip('zstandard')
+    writer = ScrapeArchive(str(tmp_path), codec='zstd', max_pack_bytes=400)
+    reader = ScrapeArchive(str(tmp_path), codec='gzip', max_pack_bytes=400)
+
+    keys = {}
+    for index, url in enumerate(URLS):
+        archive = writer if index % 2 else reader
+        keys[url] = archive.put(url, 'twitter', None, synthetic_page(url))
+        # Reads see objects appended since the pack was first mapped
+        assert reader.get(keys[url]) == synthetic_page(url)
+
+    assert len(list(tmp_path.glob('pack-*.dat'))) > 1
+    assert [record['url'] for record in writer.iter_latest(batch_size=2)] == sorted(URLS)
+    for url, key in keys.items():
+        assert writer.get(key) == synthetic_page(url)
+    writer.close()
+    reader.close()
+
+def test_crawls_archive_their_scrapes(archive_dir, standin):
+    for url in URLS[:2]:
+        assert crawler.crawl_profile(url)['data_source'] == 'firecrawl'
+
+    archive = ScrapeArchive(archive_dir)
+    assert archive.get(archive.latest(URLS[0])['key']) == synthetic_page(URLS[0])
+    assert archive.stats()['urls'] == 2
+    archive.close()
+
+def test_crawls_without_archive_dir_are_not_archived(tmp_path, standin, monkeypatch):
+    monkeypatch.delenv('FIASCO_SCRAPE_ARCHIVE_DIR', raising=False)
+    assert crawler.crawl_profile(URLS[0])['data_source'] == 'firecrawl'
+    assert not list(tmp_path.iterdir())
+
+def _stored(user_id):
+    with flask_app.app_context():
+        profiles = Profile.query.filter_by(user_id=user_id).all()
+        return {profile.url: profile.to_dict() for profile in profiles}
+
+def test_reextract_updates_only_changed_profiles(archive_dir, standin, monkeypatch):
+    user_id = str(uuid.uuid4())
+    flask_app.test_client().post('/profiles', json={'user_id': user_id, 'urls': URLS})
+    crawler.crawl_profile('https://twitter.com/never_stored')
+    before = _stored(user_id)
+
+    def improved_extractor(scrape_result, platform, username):
+        result = crawler.extract_profile_data_from_scrape(scrape_result, platform, username)
+        if 'Protected Tweets' in scrape_result['markdown']:
+            result.risk_assessment.recommendations.append('Review who follows you')
+        return result
+
+    monkeypatch.setattr(reextract_module, 'extract_profile_data_from_scrape', improved_extractor)
+    stats = reextract(flask_app, archive_dir, workers=1, batch_size=4)
+    assert stats['scrapes'] == len(URLS) + 1
+    assert stats['no_profile'] == 1
+    assert stats['errors'] == 0
+
+    after = _stored(user_id)
+    for url in URLS:
+        protected = 'Protected Tweets' in synthetic_page(url)['markdown']
+        assert ('Review who follows you' in after[url]['risk_assessment']['recommendations']) == protected
+        assert after[url]['privacy_settings'] == before[url]['privacy_settings']
+
+    # Replaying the same pages is deterministic, so a second run changes nothing
+    assert reextract(flask_app, archive_dir, workers=1, batch_size=4)['unchanged'] == len(URLS)
+
+def test_reextract_in_worker_processes(archive_dir, standin):
+    user_id = str(uuid.uuid4())
+    urls = [f'https://twitter.com/worker_{user_id[:8]}_{i}' for i in range(6)]
+    flask_app.test_client().post('/profiles', json={'user_id': user_id, 'urls': urls})
+
+    dry = reextract(flask_app, archive_dir, workers=2, batch_size=2, urls=urls, dry_run=True)
+    assert dry['scrapes'] == len(urls)
+    first = reextract(flask_app, archive_dir, workers=2, batch_size=2, urls=urls)
+    assert first['updated'] == dry['updated']
+    assert first['updated'] + first['unchanged'] == len(urls)
+    assert reextract(flask_app, archive_dir, workers=2, batch_size=2, urls=urls)['unchanged'] == len(urls)
+    with flask_app.app_context():
+        assert db.session.query(Profile).filter(Profile.user_id == user_id, Profile.last_checked_at.is_(None)).count() == 0
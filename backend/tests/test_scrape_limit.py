@@ -0,0 +1,271 @@
+"""
+Tests for the adaptive scrape concurrency limit.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+import crawler
+from loadtest.firecrawl_standin import LoadDependentScraper
+from scrape_limit import (
+    SCRAPE_CONCURRENCY_LIMIT,
+    AdaptiveLimiter,
+    ScrapeLimitExceeded,
+    get_scrape_limiter,
+    set_scrape_limiter,
+)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def limiter():
+    previous = get_scrape_limiter()
+    limiter = AdaptiveLimiter(initial=4, max_limit=64, wait=5)
+    set_scrape_limiter(limiter)
+    yield limiter
+    set_scrape_limiter(previous)
+
+class BatchScraper(LoadDependentScraper):
+    """A LoadDependentScraper that also takes batches, counting those in flight."""
+
+    def __init__(self, fail=False, per_url=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.fail = fail
+        self.per_url = per_url
+        self.batches = 0
+        self.peak_batches = 0
+
+    def batch_scrape_urls(self, urls, formats=None, **params):
+        with self._lock:
+            self.batches += 1
+            self.peak_batches = max(self.peak_batches, self.batches)
+        try:
+            time.sleep(0.01 + self.per_url * len(urls))
+            if self.fail:
+                raise Exception("Batch scrape failed with status 500")
+            return {'data': [{'markdown': url, 'metadata': {'sourceURL': url}} for url in urls]}
+        finally:
+            with self._lock:
+                self.batches -= 1
+
+def _run(scraper, threads, scrapes):
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(lambda index: crawler._scrape_one(scraper, f'https://x.com/u{index}'),
+                                 range(scrapes)))
+
+def _scrape(limiter, clock, seconds, failed=False):
+    started = limiter.acquire()
+    clock.now += seconds
+    limiter.release(started, failed=failed)
+
+def test_limit_grows_while_latency_is_flat():
+    clock = FakeClock()
+    limiter = AdaptiveLimiter(initial=2, max_limit=5, clock=clock)
+    # One scrape at a time does not use the limit, so it stays
+    for _ in range(10):
+        _scrape(limiter, clock, 0.1)
+    assert limiter.limit < 3
+
+    for _ in range(20):
+        started = [limiter.acquire() for _ in range(int(limiter.limit))]
+        clock.now += 0.1
+        for start in started:
+            limiter.release(start)
+    assert limiter.limit == 5
+    assert SCRAPE_CONCURRENCY_LIMIT.get() == 5
+
+def test_limit_is_cut_once_per_round_on_latency_or_errors():
+    clock = FakeClock()
+    limiter = AdaptiveLimiter(initial=10, clock=clock)
+    for _ in range(5):
+        _scrape(limiter, clock, 0.1)
+    limit = limiter.limit
+
+    # Slow scrapes that were all running when the limit was cut cut it once
+    started = [limiter.acquire() for _ in range(4)]
+    clock.now += 1
+    for start in started:
+        limiter.release(start)
+    assert limiter.limit == pytest.approx(limit * 0.8)
+
+    _scrape(limiter, clock, 0.1, failed=True)
+    assert limiter.limit == pytest.approx(limit * 0.8 ** 2)
+
+    for _ in range(50):
+        _scrape(limiter, clock, 0.1, failed=True)
+    assert limiter.limit == limiter.min_limit == 1
+
+def test_scrapes_wait_for_a_slot():
+    limiter = AdaptiveLimiter(initial=1, wait=0.05)
+    started = limiter.acquire()
+    with pytest.raises(ScrapeLimitExceeded):
+        limiter.acquire()
+
+    threading.Timer(0.05, limiter.release, args=(started,)).start()
+    limiter.release(limiter.acquire(timeout=5))
+    assert limiter.in_flight == 0
+
+def test_limit_settles_near_the_scrapers_capacity(limiter):
+    scraper = LoadDependentScraper(base=0.002, capacity=8, overload=24)
+    pages = _run(scraper, threads=32, scrapes=3000)
+
+    assert scraper.peak <= 24
+    assert scraper.errors == 0
+    assert all(page == {'markdown': f'https://x.com/u{index}'} for index, page in enumerate(pages))
+    assert 4 <= limiter.limit <= 20
+
+def test_limit_grows_when_the_scraper_has_room(limiter):
+    scraper = LoadDependentScraper(base=0.002, capacity=64, overload=64)
+    _run(scraper, threads=32, scrapes=2000)
+    assert limiter.limit > 16
+    assert scraper.peak > 16
+
+def test_unlimited_scrapes_overload_the_scraper():
+    previous = get_scrape_limiter()
+    set_scrape_limiter(None)
+    try:
+        scraper = LoadDependentScraper(base=0.002, capacity=8, overload=24)
+        pages = _run(scraper, threads=32, scrapes=1000)
+    finally:
+        set_scrape_limiter(previous)
+    assert scraper.errors > 0
+    assert any(isinstance(page, Exception) for page in pages)
+
+def test_batch_scrapes_hold_a_slot_each():
+    previous = get_scrape_limiter()
+    limiter = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1, wait=5)
+    set_scrape_limiter(limiter)
+    try:
+        scraper = BatchScraper()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(
+                lambda index: crawler.scrape_urls(scraper, [f'https://x.com/b{index}_{n}' for n in range(3)]),
+                range(4)
+            ))
+    finally:
+        set_scrape_limiter(previous)
+
+    assert scraper.peak_batches == 1
+    assert scraper.scrapes == 0
+    assert limiter.in_flight == 0
+    assert all(result[f'https://x.com/b{index}_0']['markdown'] == f'https://x.com/b{index}_0'
+               for index, result in enumerate(results))
+
+def test_failed_batches_cut_the_limit(limiter):
+    scraper = BatchScraper(fail=True)
+    results = crawler.scrape_urls(scraper, ['https://x.com/f1', 'https://x.com/f2'])
+    # The batch failure counts against the limit; its URLs are scraped one at a time
+    assert limiter.limit < 4
+    assert results == {url: {'markdown': url} for url in ('https://x.com/f1', 'https://x.com/f2')}
+
+    limiter.limit = 1
+    held = limiter.acquire()
+    limiter.wait = 0.01
+    results = crawler.scrape_urls(BatchScraper(), ['https://x.com/w1', 'https://x.com/w2'])
+    limiter.release(held, record=False)
+    assert all(isinstance(result, ScrapeLimitExceeded) for result in results.values())
+
+def test_batch_latency_does_not_cut_the_limit(limiter):
+    scraper = BatchScraper(per_url=0.001, base=0.002, capacity=64, overload=64)
+
+    def work(index):
+        # Singles set the no-load latency; batches of 2 to 40 URLs take far longer
+        if index % 2:
+            return crawler._scrape_one(scraper, f'https://x.com/s{index}')
+        size = (2, 10, 40)[index // 2 % 3]
+        return crawler.scrape_urls(scraper, [f'https://x.com/m{index}_{n}' for n in range(size)])
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(work, range(300)))
+    assert limiter.limit >= 4
+
+def test_async_scrapes_are_limited():
+    previous = get_scrape_limiter()
+    limiter = AdaptiveLimiter(initial=2, min_limit=2, max_limit=2, wait=5)
+    set_scrape_limiter(limiter)
+    running = []
+    peak = []
+
+    class AsyncScraper:
+        async def scrape_url(self, url, formats=None):
+            running.append(url)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(url)
+            return {'markdown': f'# {url}'}
+
+    async def crawl_all():
+        return await asyncio.gather(*(crawler._crawl_profile_async(f'https://twitter.com/async_{index}')
+                                      for index in range(6)))
+
+    try:
+        with patch('crawler.FIRECRAWL_API_KEY', 'key'), \
+                patch('crawler.get_async_firecrawl_app', return_value=AsyncScraper()):
+            asyncio.run(crawl_all())
+    finally:
+        set_scrape_limiter(previous)
+
+    assert len(peak) == 6
+    assert max(peak) == 2
+    assert limiter.in_flight == 0
+
+def test_cancelled_async_waits_give_their_slot_back():
+    limiter = AdaptiveLimiter(initial=1, wait=5)
+
+    async def scenario():
+        held = limiter.acquire()
+        waiting = asyncio.create_task(limiter.async_slot().__aenter__())
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        limiter.release(held)
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        # The slot handed to the cancelled wait comes back once its thread finishes
+        for _ in range(100):
+            if limiter.in_flight == 0:
+                break
+            await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert limiter.in_flight == 0
+
+def test_async_waits_take_no_thread():
+    limiter = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1, wait=5)
+
+    async def wait_for_slot():
+        async with limiter.async_slot():
+            await asyncio.sleep(0)
+
+    async def scenario():
+        held = limiter.acquire()
+        waiting = [asyncio.create_task(wait_for_slot()) for _ in range(64)]
+        await asyncio.sleep(0.01)
+        # The default executor is still free for other work while they wait
+        assert await asyncio.wait_for(asyncio.to_thread(lambda: 'done'), 1) == 'done'
+        assert len(limiter._waiters) == 64
+        limiter.release(held)
+        await asyncio.wait_for(asyncio.gather(*waiting), 5)
+
+    asyncio.run(scenario())
+    assert limiter.in_flight == 0
+
+def test_async_waits_time_out():
+    limiter = AdaptiveLimiter(initial=1, wait=5)
+
+    async def scenario():
+        held = limiter.acquire()
+        with pytest.raises(ScrapeLimitExceeded):
+            await limiter.acquire_async(timeout=0.01)
+        limiter.release(held)
+
+    asyncio.run(scenario())
+    assert limiter.in_flight == 0 and not limiter._waiters
@@ -0,0 +1,132 @@
+"""
+Tests for the pooled keep-alive scrape transport.
+"""
+
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import crawler
+from async_firecrawl import FirecrawlError
+from crawler import map_batch_results
+from loadtest.firecrawl_standin import FirecrawlStandin, synthetic_page
+from scrape_transport import SCRAPE_CONNECTIONS_TOTAL, ConnectionPool, FirecrawlClient, ThreadLocalClient
+
+URLS = [f'https://twitter.com/pooled_{i}' for i in range(4)]
+
+def _connection_events():
+    return {event: SCRAPE_CONNECTIONS_TOTAL.get(event) for event in ('opened', 'reused', 'stale', 'expired')}
+
+def _new_events(before):
+    return {event: count - before[event] for event, count in _connection_events().items()}
+
+@pytest.fixture
+def standin():
+    with FirecrawlStandin(latency_ms=0, fail_urls=[URLS[1]]) as standin:
+        yield standin
+
+def test_connections_are_kept_alive(standin):
+    client = FirecrawlClient('test-key', standin.url)
+    before = _connection_events()
+    for url in URLS[2:] * 5:
+        assert client.scrape_url(url) == synthetic_page(url)
+
+    assert _new_events(before) == {'opened': 1, 'reused': 9, 'stale': 0, 'expired': 0}
+    client.close()
+
+def test_pool_is_shared_by_threads(standin):
+    client = FirecrawlClient('test-key', standin.url, pool=ConnectionPool(standin.url, maxsize=4))
+    before = _connection_events()
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        pages = list(executor.map(client.scrape_url, [URLS[0]] * 400))
+
+    assert pages == [synthetic_page(URLS[0])] * 400
+    events = _new_events(before)
+    assert events['opened'] + events['reused'] == 400
+    assert events['reused'] > events['opened']
+    assert len(client.pool._idle) <= 4
+    client.close()
+
+def test_idle_connections_expire(standin):
+    client = FirecrawlClient('test-key', standin.url, pool=ConnectionPool(standin.url, idle_timeout=0))
+    before = _connection_events()
+    for _ in range(3):
+        client.scrape_url(URLS[0])
+    assert _new_events(before) == {'opened': 3, 'reused': 0, 'stale': 0, 'expired': 2}
+
+def test_failures_raise_and_keep_the_connection(standin):
+    client = FirecrawlClient('test-key', standin.url)
+    before = _connection_events()
+    with pytest.raises(FirecrawlError, match='status 500'):
+        client.scrape_url(URLS[1])
+    client.scrape_url(URLS[0])
+    assert _new_events(before)['opened'] == 1
+
+def test_read_timeout(capfd):
+    with FirecrawlStandin(latency_ms=500) as slow:
+        client = FirecrawlClient('test-key', slow.url, pool=ConnectionPool(slow.url, read_timeout=0.1))
+        with pytest.raises(FirecrawlError, match='timed out'):
+            client.scrape_url(URLS[0])
+        # The stand-in answers the closed connection and must not report it
+        time.sleep(0.6)
+    assert 'Traceback' not in capfd.readouterr().err
+
+class _CloseAfterResponse(socketserver.StreamRequestHandler):
+    """Answer one request without saying so, then close the connection like an idle timeout."""
+
+    def handle(self):
+        length = 0
+        while (line := self.rfile.readline()) not in (b'\r\n', b''):
+            name, _, value = line.partition(b':')
+            if name.lower() == b'content-length':
+                length = int(value)
+        self.rfile.read(length)
+        body = b'{"success": true, "data": {"markdown": "ok"}}'
+        self.wfile.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                         b'Content-Length: %d\r\n\r\n%s' % (len(body), body))
+        self.wfile.flush()
+        self.connection.shutdown(socket.SHUT_RDWR)
+
+def test_stale_connections_are_replaced():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _CloseAfterResponse)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        host, port = server.server_address
+        client = FirecrawlClient('test-key', f'http://{host}:{port}')
+        before = _connection_events()
+        assert client.scrape_url('u') == {'markdown': 'ok'}
+        assert client.scrape_url('u') == {'markdown': 'ok'}
+        assert _new_events(before) == {'opened': 2, 'reused': 1, 'stale': 1, 'expired': 0}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_batch_scrape(standin):
+    client = FirecrawlClient('test-key', standin.url, poll_interval=0.01)
+    results = map_batch_results(URLS, client.batch_scrape_urls(URLS, formats=['markdown', 'html']))
+
+    assert standin.batches == 1
+    assert isinstance(results[URLS[1]], FirecrawlError)
+    assert results[URLS[0]] == synthetic_page(URLS[0])
+
+def test_thread_local_client():
+    client = ThreadLocalClient(object)
+    mine = client.client
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        theirs = executor.submit(lambda: client.client).result()
+    assert client.client is mine
+    assert theirs is not mine
+
+def test_crawler_uses_pooled_client(standin, monkeypatch):
+    monkeypatch.setattr(crawler, 'FIRECRAWL_API_KEY', 'test-key')
+    monkeypatch.setattr(crawler, 'FIRECRAWL_API_URL', standin.url)
+    crawler.reset_firecrawl_clients()
+    try:
+        assert crawler.crawl_profile(URLS[0])['data_source'] == 'firecrawl'
+        assert isinstance(crawler.firecrawl_app, FirecrawlClient)
+    finally:
+        crawler.reset_firecrawl_clients()
@@ -0,0 +1,176 @@
+"""
+Tests for username search across stored profiles.
+"""
+
+import asyncio
+import json
+import sqlite3
+import uuid
+from dataclasses import replace
+
+import pytest
+from sqlalchemy import text
+import search
+from app import app as flask_app, create_app, db, save_profile
+from crawler import generate_mock_results
+from models import Profile, ProfileTrigram, User, create_schema
+from search import (
+    find_profiles,
+    normalize_username,
+    parse_search_params,
+    rebuild_search_index,
+    similarity,
+    username_trigrams,
+)
+
+# Unique per run, so profiles saved by other tests never match
+TAG = uuid.uuid4().hex[:6]
+
+@pytest.fixture(scope='module')
+def users():
+    users = [str(uuid.uuid4()), str(uuid.uuid4())]
+    handles = [
+        (users[0], 'twitter', f'JohnSmith{TAG}'),
+        (users[0], 'instagram', f'@johnsmith{TAG}'),
+        (users[1], 'twitter', f'johnsmith{TAG}_official'),
+        (users[1], 'tiktok', f'jane_doe{TAG}'),
+    ]
+    with flask_app.app_context():
+        db.create_all()
+        for user_id in users:
+            db.session.add(User(id=user_id))
+        for index, (user_id, platform, username) in enumerate(handles):
+            profile = replace(next(generate_mock_results(platform, 1, seed=index)), username=username)
+            save_profile(user_id, f'https://{platform}.com/{username.lstrip("@")}', profile)
+        db.session.commit()
+    return users
+
+def _search(key, mode='prefix', **kwargs):
+    with flask_app.app_context():
+        return find_profiles(key, mode, **kwargs)
+
+def test_normalize_username():
+    assert normalize_username(' @JohnSmith ') == 'johnsmith'
+    assert normalize_username('Ｊｏｈｎ') == 'john'
+    assert normalize_username('@') is None
+    assert normalize_username(None) is None
+
+def test_trigram_similarity():
+    assert username_trigrams('ab') == {'  a', ' ab', 'ab '}
+    assert similarity(username_trigrams('johnsmith'), username_trigrams('johnsmith')) == 1.0
+    assert similarity(username_trigrams('johnsmith'), username_trigrams('jonsmith')) > 0.4
+    assert similarity(username_trigrams('johnsmith'), username_trigrams('zzz')) == 0.0
+
+def test_exact_and_prefix_search(users):
+    exact = _search(f'johnsmith{TAG}', 'exact')
+    assert sorted(result['platform'] for result in exact) == ['instagram', 'twitter']
+    assert {result['user_id'] for result in exact} == {users[0]}
+
+    prefix = _search(f'johnsmith{TAG}')
+    assert len(prefix) == 3
+    assert prefix[-1]['username'] == f'johnsmith{TAG}_official'
+
+    assert [result['platform'] for result in _search(f'johnsmith{TAG}', platform='instagram')] == ['instagram']
+    assert len(_search(f'johnsmith{TAG}', limit=1)) == 1
+    assert _search(f'nobody{TAG}') == []
+
+def test_fuzzy_search(users):
+    results = _search(f'jonsmith{TAG}', 'fuzzy')
+    assert {result['username'].lstrip('@').lower() for result in results} >= {f'johnsmith{TAG}'}
+    assert all(0.3 <= result['score'] <= 1 for result in results)
+    assert [result['score'] for result in results] == sorted((result['score'] for result in results), reverse=True)
+    assert f'jane_doe{TAG}' not in {result['username'] for result in results}
+
+    # Too short for trigrams: falls back to prefix matching
+    assert _search('jo', 'fuzzy', limit=1)
+
+def test_username_change_updates_index(users):
+    url = f'https://twitter.com/rename{TAG}'
+    with flask_app.app_context():
+        for username in (f'before{TAG}', f'after{TAG}'):
+            profile = replace(next(generate_mock_results('twitter', 1, seed=9)), username=username)
+            save_profile(users[1], url, profile)
+            db.session.commit()
+
+        stored = Profile.query.filter_by(user_id=users[1], url=url).one()
+        assert stored.username_key == f'after{TAG}'
+        assert {row.trigram for row in stored.trigrams} == username_trigrams(f'after{TAG}')
+
+    assert _search(f'before{TAG}', 'exact') == []
+    assert [result['url'] for result in _search(f'after{TAG}', 'fuzzy')] == [url]
+
+def test_search_endpoint(users):
+    client = flask_app.test_client()
+    response = client.get(f'/search/profiles?q=%40JohnSmith{TAG}&mode=exact')
+    assert response.status_code == 200
+    assert response.json['query'] == f'johnsmith{TAG}'
+    assert len(response.json['results']) == 2
+
+    assert client.get('/search/profiles').status_code == 400
+    assert client.get('/search/profiles?q=x&mode=regex').status_code == 400
+    assert client.get('/search/profiles?q=x&limit=many').status_code == 400
+
+def test_parse_search_params():
+    assert parse_search_params({'q': 'Bob', 'limit': '1000'}) == ('bob', 'prefix', None, 100)
+    assert parse_search_params({'q': 'bob', 'mode': 'fuzzy', 'platform': 'tiktok'})[1:3] == ('fuzzy', 'tiktok')
+
+def test_asgi_search(users):
+    from asgi import application
+
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'path': '/search/profiles',
+             'query_string': f'q=johnsmith{TAG}&mode=exact'.encode(), 'headers': []}
+    asyncio.run(application(scope, receive, send))
+    assert sent[0]['status'] == 200
+    assert len(json.loads(sent[1]['body'])['results']) == 2
+
+def test_fts5_index(users, monkeypatch):
+    monkeypatch.setattr(search, 'SEARCH_FTS5', True)
+    with flask_app.app_context():
+        try:
+            with db.engine.begin() as conn:
+                if not search.create_fts_index(conn):
+                    pytest.skip("SQLite FTS5 trigram tokenizer not available")
+
+            # Existing profiles are copied in; new ones arrive through the triggers
+            assert _search(f'jonsmith{TAG}', 'fuzzy')
+            profile = replace(next(generate_mock_results('tiktok', 1, seed=4)), username=f'fts_only{TAG}')
+            save_profile(users[1], f'https://tiktok.com/fts{TAG}', profile)
+            db.session.commit()
+            assert [result['username'] for result in _search(f'fts_onyl{TAG}', 'fuzzy')] == [f'fts_only{TAG}']
+        finally:
+            with db.engine.begin() as conn:
+                for suffix in ('insert', 'delete', 'update'):
+                    conn.execute(text(f'DROP TRIGGER IF EXISTS profile_search_{suffix}'))
+                conn.execute(text('DROP TABLE IF EXISTS profile_search'))
+
+def test_create_schema_backfills_search_index(tmp_path):
+    path = tmp_path / 'old.db'
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE user (id VARCHAR(36) PRIMARY KEY, created_at DATETIME, updated_at DATETIME);
+        CREATE TABLE profile (id INTEGER PRIMARY KEY, url VARCHAR(255) NOT NULL, platform VARCHAR(50),
+            username VARCHAR(100), created_at DATETIME, updated_at DATETIME, user_id VARCHAR(36) NOT NULL);
+        INSERT INTO user (id) VALUES ('old');
+        INSERT INTO profile (id, url, platform, username, user_id)
+            VALUES (1, 'https://twitter.com/OldHandle', 'twitter', 'OldHandle', 'old');
+    ''')
+    conn.close()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+    with app.app_context():
+        create_schema()
+        assert [result['url'] for result in find_profiles('oldhandle', 'exact')] == ['https://twitter.com/OldHandle']
+        assert [result['url'] for result in find_profiles('oldhandel', 'fuzzy')] == ['https://twitter.com/OldHandle']
+
+        # Rebuilding is idempotent
+        with db.engine.begin() as conn:
+            assert rebuild_search_index(conn) == 1
+        assert ProfileTrigram.query.count() == len(username_trigrams('oldhandle'))
@@ -0,0 +1,167 @@
+"""
+Tests for the multi-process server and the shared result store.
+"""
+
+import http.client
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import crawler
+from app import app as flask_app, db
+from loadtest.firecrawl_standin import FirecrawlStandin
+from loadtest.runner import standin_crawler
+from models import SubmissionResult
+from result_store import DatabaseResultStore, MemoryResultStore, create_result_store
+from serve import PreforkServer
+
+@pytest.fixture(autouse=True)
+def database():
+    with flask_app.app_context():
+        db.create_all()
+    yield
+
+def _post_profile(port, url):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        body = json.dumps({'user_id': f'serve-{uuid.uuid4()}', 'urls': [url]})
+        connection.request('POST', '/profiles', body=body, headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+def _measure_throughput(workers, requests=24, concurrency=8):
+    """Return requests per second for single-threaded workers on latency-bound crawls."""
+    statuses = []
+    lock = threading.Lock()
+    pending = list(range(requests))
+
+    with PreforkServer(flask_app, port=0, workers=workers, threaded=False) as server:
+        # Warm up every worker so startup is not measured
+        for i in range(workers * 2):
+            _post_profile(server.port, f'https://twitter.com/warmup_{i}')
+
+        def client():
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    index = pending.pop()
+                status, data = _post_profile(server.port, f'https://twitter.com/serve_{index}')
+                with lock:
+                    statuses.append((status, data['results'][f'https://twitter.com/serve_{index}'].get('data_source')))
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+    assert statuses == [(200, 'firecrawl')] * requests
+    return requests / elapsed
+
+def test_throughput_scales_with_workers():
+    # Each crawl waits 100ms on the stand-in, so a single-threaded worker
+    # serves at most ~10 requests per second regardless of CPU count
+    with FirecrawlStandin(latency_ms=100) as standin, standin_crawler(standin):
+        one_worker = _measure_throughput(1)
+        four_workers = _measure_throughput(4)
+
+    assert one_worker < 11
+    assert four_workers / one_worker > 3.0
+
+def test_worker_restarts_after_crash():
+    with PreforkServer(flask_app, port=0, workers=1) as server:
+        _post_profile(server.port, 'https://twitter.com/first')
+        (pid,) = server.pids
+        os.kill(pid, 9)
+        os.waitpid(pid, 0)
+        server.pids.discard(pid)
+        server.start()
+        status, _ = _post_profile(server.port, 'https://twitter.com/second')
+    assert status == 200
+
+def _write_result(user_id):
+    store = DatabaseResultStore(flask_app, db, SubmissionResult)
+    store[user_id] = {'urls': ['https://twitter.com/shared'], 'results': {}, 'timestamp': None}
+
+def test_database_store_is_shared_between_processes():
+    store = DatabaseResultStore(flask_app, db, SubmissionResult)
+    user_id = f'shared-{uuid.uuid4()}'
+    assert user_id not in store
+
+    process = multiprocessing.get_context('fork').Process(target=_write_result, args=(user_id,))
+    process.start()
+    process.join()
+
+    assert process.exitcode == 0
+    assert user_id in store
+    assert store[user_id]['urls'] == ['https://twitter.com/shared']
+    del store[user_id]
+    assert user_id not in store
+    with pytest.raises(KeyError):
+        store[user_id]
+
+def test_memory_store_behaves_like_dict():
+    store = MemoryResultStore()
+    store['a'] = {'urls': []}
+    assert 'a' in store and len(store) == 1 and list(store) == ['a']
+    store.clear()
+    assert len(store) == 0
+
+def test_create_result_store():
+    assert isinstance(create_result_store(flask_app, db, SubmissionResult, 'memory'), MemoryResultStore)
+    assert isinstance(create_result_store(flask_app, db, SubmissionResult, 'database'), DatabaseResultStore)
+    with pytest.raises(ValueError):
+        create_result_store(flask_app, db, SubmissionResult, 'redis')
+
+def _report_clients(queue):
+    queue.put((crawler.firecrawl_app is None, crawler.async_firecrawl_app is None))
+    queue.put(crawler.get_async_firecrawl_app() is not None)
+
+def test_firecrawl_clients_are_rebuilt_after_fork(monkeypatch):
+    monkeypatch.setattr(crawler, 'FIRECRAWL_API_KEY', 'test-key')
+    monkeypatch.setattr(crawler, 'firecrawl_app', None)
+    monkeypatch.setattr(crawler, 'async_firecrawl_app', None)
+    crawler.reset_firecrawl_clients()
+    try:
+        parent_client = crawler.get_async_firecrawl_app()
+        assert parent_client is not None
+        assert crawler.get_async_firecrawl_app() is parent_client
+
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        process = context.Process(target=_report_clients, args=(queue,))
+        process.start()
+        assert queue.get(timeout=10) == (True, True)
+        assert queue.get(timeout=10) is True
+        process.join()
+    finally:
+        crawler.reset_firecrawl_clients()
+
+def test_concurrent_first_crawls_all_get_the_clients(monkeypatch):
+    monkeypatch.setattr(crawler, 'FIRECRAWL_API_KEY', 'test-key')
+    monkeypatch.setattr(crawler, 'firecrawl_app', None)
+    monkeypatch.setattr(crawler, 'async_firecrawl_app', None)
+
+    def slow_client(api_key, api_url):
+        time.sleep(0.05)
+        return object()
+
+    monkeypatch.setattr(crawler, 'create_firecrawl_client', slow_client)
+    crawler.reset_firecrawl_clients()
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            clients = list(executor.map(lambda _: crawler.get_firecrawl_app(), range(8)))
+    finally:
+        crawler.reset_firecrawl_clients()
+    assert clients[0] is not None
+    assert all(client is clients[0] for client in clients)
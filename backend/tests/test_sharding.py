@@ -0,0 +1,178 @@
+"""
+Tests for sharding the profile database by user_id.
+"""
+
+import asyncio
+import json
+import sqlite3
+import uuid
+from dataclasses import replace
+from unittest.mock import patch
+
+import pytest
+from app import create_app, db
+from crawler import generate_mock_results
+from models import SubmissionResult, User, create_schema
+from reshard import reshard
+from result_store import DatabaseResultStore
+from search import find_profiles
+from sharding import ShardNotSelected, ShardRing, fan_out, get_shard_ring, use_user_shard
+
+def _result(url):
+    return replace(next(generate_mock_results('twitter', 1, seed=len(url))), username=url.rsplit('/', 1)[-1])
+
+def _sharded_app(tmp_path, count, **config):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'single.db'}",
+        'SHARD_COUNT': count,
+        'SHARD_DATABASE_URL': f"sqlite:///{tmp_path / 'shard{shard}.db'}",
+        **config,
+    })
+    with app.app_context():
+        create_schema()
+    return app
+
+def _user_count(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM user').fetchone()[0]
+    finally:
+        conn.close()
+
+def _submit(app, user_id, names):
+    urls = [f'https://twitter.com/{name}' for name in names]
+    with patch('app.crawl_profile_result', side_effect=_result):
+        response = app.test_client().post('/profiles', json={'user_id': user_id, 'urls': urls})
+    assert response.status_code == 200
+    return urls
+
+def test_ring_is_stable_and_balanced():
+    ring = ShardRing(['shard0', 'shard1', 'shard2', 'shard3'])
+    user_ids = [str(uuid.UUID(int=i)) for i in range(20000)]
+    owners = [ring.shard_for(user_id) for user_id in user_ids]
+    assert owners == [ShardRing(['shard0', 'shard1', 'shard2', 'shard3']).shard_for(user_id) for user_id in user_ids]
+    for name in ring.names:
+        assert 0.15 < owners.count(name) / len(owners) < 0.35
+
+    # A new shard only takes users, about a fifth of them
+    grown = ShardRing(ring.names + ['shard4'])
+    moved = [(before, grown.shard_for(user_id)) for user_id, before in zip(user_ids, owners)
+             if grown.shard_for(user_id) != before]
+    assert {after for _, after in moved} == {'shard4'}
+    assert 0.1 < len(moved) / len(user_ids) < 0.3
+
+def test_users_are_stored_on_their_shard_only(tmp_path):
+    app = _sharded_app(tmp_path, 3)
+    ring = get_shard_ring(app)
+    user_ids = [str(uuid.uuid4()) for _ in range(12)]
+    for index, user_id in enumerate(user_ids):
+        _submit(app, user_id, [f'alice{index}', f'bob{index}'])
+
+    client = app.test_client()
+    for index, user_id in enumerate(user_ids):
+        response = client.get(f'/profiles/{user_id}')
+        assert response.status_code == 200
+        assert response.json['urls'] == [f'https://twitter.com/alice{index}', f'https://twitter.com/bob{index}']
+        assert client.get(f'/profiles/{user_id}/list?limit=1').json['next_cursor']
+
+    counts = {name: _user_count(tmp_path / f'{name}.db') for name in ring.names}
+    assert counts == {name: sum(ring.shard_for(user_id) == name for user_id in user_ids) for name in ring.names}
+    assert not (tmp_path / 'single.db').exists() or _user_count(tmp_path / 'single.db') == 0
+
+def test_queries_without_a_shard_are_refused(tmp_path):
+    app = _sharded_app(tmp_path, 2)
+    with app.app_context():
+        with pytest.raises(ShardNotSelected):
+            db.session.get(User, 'anyone')
+        with use_user_shard('anyone'):
+            assert db.session.get(User, 'anyone') is None
+        assert sum(fan_out(lambda: User.query.count())) == 0
+
+def test_search_merges_every_shard(tmp_path):
+    app = _sharded_app(tmp_path, 4)
+    ring = get_shard_ring(app)
+    user_ids = [str(uuid.uuid4()) for _ in range(8)]
+    for index, user_id in enumerate(user_ids):
+        _submit(app, user_id, [f'sharded_{index:02d}'])
+    assert len({ring.shard_for(user_id) for user_id in user_ids}) > 1
+
+    with app.app_context():
+        prefix = find_profiles('sharded_', 'prefix', limit=5)
+        assert [result['username'] for result in prefix] == [f'sharded_{index:02d}' for index in range(5)]
+        fuzzy = find_profiles('sharded_03', 'fuzzy')
+        assert fuzzy[0]['username'] == 'sharded_03'
+        assert fuzzy[0]['user_id'] == user_ids[3]
+        assert [result['score'] for result in fuzzy] == sorted((result['score'] for result in fuzzy), reverse=True)
+
+    response = app.test_client().get('/search/profiles?q=sharded_&limit=100')
+    assert len(response.json['results']) == 8
+
+def test_database_result_store_spans_shards(tmp_path):
+    app = _sharded_app(tmp_path, 3)
+    store = DatabaseResultStore(app, db, SubmissionResult)
+    user_ids = [str(uuid.uuid4()) for _ in range(10)]
+    for user_id in user_ids:
+        store[user_id] = {'urls': [], 'results': {}, 'timestamp': None}
+
+    assert len(store) == 10
+    assert sorted(store) == sorted(user_ids)
+    assert user_ids[0] in store
+    del store[user_ids[0]]
+    assert user_ids[0] not in store
+    store.clear()
+    assert len(store) == 0
+
+def test_asgi_routes_by_user(tmp_path, monkeypatch):
+    import asgi
+
+    app = _sharded_app(tmp_path, 2)
+    monkeypatch.setattr(asgi, 'flask_app', app)
+    user_id = str(uuid.uuid4())
+    urls = _submit(app, user_id, ['carol'])
+
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'path': f'/profiles/{user_id}', 'query_string': b'', 'headers': []}
+    asyncio.run(asgi.application(scope, receive, send))
+    assert sent[0]['status'] == 200
+    assert json.loads(sent[1]['body'])['urls'] == urls
+
+def test_reshard_splits_and_grows(tmp_path):
+    single = _sharded_app(tmp_path, 0)
+    user_ids = [str(uuid.uuid4()) for _ in range(30)]
+    for index, user_id in enumerate(user_ids):
+        _submit(single, user_id, [f'dave{index}', f'erin{index}'])
+    expected = {user_id: single.test_client().get(f'/profiles/{user_id}').json for user_id in user_ids}
+
+    three = _sharded_app(tmp_path, 3)
+    assert reshard(single, three, dry_run=True)['profiles'] == 60
+    stats = reshard(single, three, batch_size=7)
+    assert stats['moved'] == 30
+    assert stats['profiles'] == 60
+    assert _user_count(tmp_path / 'single.db') == 0
+
+    def check(app):
+        client = app.test_client()
+        for user_id in user_ids:
+            response = client.get(f'/profiles/{user_id}').json
+            assert response['results'] == expected[user_id]['results']
+        with app.app_context():
+            assert [result['user_id'] for result in find_profiles('dave7', 'exact')] == [user_ids[7]]
+
+    check(three)
+
+    # Growing by one shard only moves the users the new shard takes, and can be rerun
+    four = _sharded_app(tmp_path, 4)
+    ring = get_shard_ring(four)
+    stats = reshard(three, four)
+    assert stats['users'] == 30
+    assert stats['moved'] == sum(ring.shard_for(user_id) == 'shard3' for user_id in user_ids)
+    assert set(stats['by_target']) <= {'shard3'}
+    assert reshard(three, four)['moved'] == 0
+    check(four)